@@ -13,10 +13,15 @@
 # @Author  : relakkes@gmail.com
 # @Time    : 2024/4/6 14:21
 # @Desc    : 异步Aiomysql的增删改查封装
-from typing import Any, Dict, List, Union
+import asyncio
+import time
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Union
 
 import aiomysql
 
+from store.flush_barrier import FlushBarrier, get_flush_barrier
+from tools import metrics, utils
+
 
 class AsyncMysqlDB:
     def __init__(self, pool: aiomysql.Pool) -> None:
@@ -105,3 +110,154 @@ class AsyncMysqlDB:
             async with conn.cursor() as cur:
                 rows = await cur.execute(sql, args)
                 return rows
+
+    async def items_upsert_to_table(self, table_name: str, items: List[Dict[str, Any]],
+                                    update_exclude_fields: Iterable[str] = ("add_ts",),
+                                    max_rows_per_sql: int = 500) -> int:
+        """
+        批量插入数据, 唯一键冲突时更新, 一条 SQL 写入多行 (INSERT ... ON DUPLICATE KEY UPDATE)
+        :param table_name: 表名
+        :param items: 多条记录的字典信息, 字段相同的记录会合并到同一条 SQL 中
+        :param update_exclude_fields: 唯一键冲突时不更新的字段, 默认保留首次插入的 add_ts
+        :param max_rows_per_sql: 单条 SQL 最多写入的行数
+        :return: 影响的行数
+        """
+        groups: Dict[Tuple[str, ...], List[Dict[str, Any]]] = {}
+        for item in items:
+            groups.setdefault(tuple(item.keys()), []).append(item)
+
+        effect_rows = 0
+        async with self.__pool.acquire() as conn:
+            async with conn.cursor() as cur:
+                for fields, group_items in groups.items():
+                    fieldstr = ','.join([f'`{field}`' for field in fields])
+                    update_fields = [field for field in fields if field not in update_exclude_fields]
+                    updatestr = ','.join([f'`{field}`=VALUES(`{field}`)' for field in update_fields])
+                    valstr = '(' + ','.join(['%s'] * len(fields)) + ')'
+                    for i in range(0, len(group_items), max_rows_per_sql):
+                        chunk = group_items[i:i + max_rows_per_sql]
+                        sql = "INSERT INTO %s (%s) VALUES %s" % (table_name, fieldstr, ','.join([valstr] * len(chunk)))
+                        if updatestr:
+                            sql += " ON DUPLICATE KEY UPDATE %s" % updatestr
+                        values = [item[field] for item in chunk for field in fields]
+                        effect_rows += await cur.execute(sql, values)
+        return effect_rows
+
+
+class BatchWriteError(Exception):
+    """批量写入器关闭时仍有记录没有写入数据库"""
+
+
+class AsyncMysqlBatchWriter:
+    """
+    写后批量落库: 按表缓存记录, 条数达到 batch_size 或距离上次写入超过 flush_interval 秒时,
+    合并成多行 INSERT ... ON DUPLICATE KEY UPDATE 写入, 减少数据库往返和连接池获取次数;
+    写入失败的记录放回缓存, 由后台定时任务重试, 关闭时仍写不进去则抛出 BatchWriteError
+    """
+
+    def __init__(self, async_db: AsyncMysqlDB, batch_size: int = 200, flush_interval: float = 1.0,
+                 update_exclude_fields: Iterable[str] = ("add_ts",),
+                 flush_barrier: Optional[FlushBarrier] = None) -> None:
+        """
+        :param async_db: 数据库操作对象
+        :param batch_size: 单表缓存多少条记录后写入
+        :param flush_interval: 后台定时写入的时间间隔(秒)
+        :param update_exclude_fields: 唯一键冲突时不更新的字段
+        :param flush_barrier: 落盘屏障, 为空时使用全局的落盘屏障
+        """
+        self._async_db = async_db
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.update_exclude_fields = tuple(update_exclude_fields)
+        self.flush_barrier = flush_barrier or get_flush_barrier()
+        self._buffers: Dict[str, List[Dict[str, Any]]] = {}
+        self._table_locks: Dict[str, asyncio.Lock] = {}
+        # 上次写入失败的表 -> 异常, 这些表等后台定时任务重试, 不再每添加一条记录就重试
+        self._failed_tables: Dict[str, Exception] = {}
+        self._flush_task: Optional[asyncio.Task] = None
+        self._stop_event = asyncio.Event()
+
+    def start(self) -> None:
+        """
+        开启后台定时写入任务
+        :return:
+        """
+        if self._flush_task is None:
+            self._flush_task = asyncio.create_task(self._flush_cron())
+
+    async def _flush_cron(self) -> None:
+        while not self._stop_event.is_set():
+            try:
+                await asyncio.wait_for(self._stop_event.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                await self.flush()
+
+    async def add(self, table_name: str, item: Dict[str, Any]) -> None:
+        """
+        添加一条待写入的记录
+        :param table_name: 表名
+        :param item: 一条记录的字典信息
+        :return:
+        """
+        buffer = self._buffers.setdefault(table_name, [])
+        buffer.append(item)
+        self.flush_barrier.on_added(f"mysql:{table_name}")
+        if len(buffer) >= self.batch_size and table_name not in self._failed_tables:
+            await self.flush_table(table_name)
+
+    async def flush_table(self, table_name: str) -> None:
+        """
+        将指定表缓存的记录写入数据库, 同一张表的写入串行执行以保证同一条记录的更新顺序
+        :param table_name: 表名
+        :return:
+        """
+        lock = self._table_locks.setdefault(table_name, asyncio.Lock())
+        async with lock:
+            items = self._buffers.pop(table_name, [])
+            if not items:
+                return
+            start = time.perf_counter()
+            try:
+                await self._async_db.items_upsert_to_table(table_name, items, self.update_exclude_fields)
+                metrics.observe_store_write("mysql", time.perf_counter() - start, len(items))
+                self._failed_tables.pop(table_name, None)
+            except Exception as e:
+                # 放回缓存的最前面, 保持同一条记录的更新顺序, 下次写入时重试
+                self._buffers[table_name] = items + self._buffers.get(table_name, [])
+                self._failed_tables[table_name] = e
+                utils.logger.error(
+                    f"[AsyncMysqlBatchWriter.flush_table] upsert {len(items)} items to {table_name} error: {e}, "
+                    f"retry on next flush")
+            else:
+                await self.flush_barrier.on_written(f"mysql:{table_name}", len(items))
+
+    async def flush(self) -> None:
+        """
+        将所有表缓存的记录写入数据库
+        :return:
+        """
+        for table_name in list(self._buffers.keys()):
+            await self.flush_table(table_name)
+
+    def pending_count(self) -> int:
+        """
+        缓存中还没有写入数据库的记录数
+        :return:
+        """
+        return sum(len(items) for items in self._buffers.values())
+
+    async def close(self) -> None:
+        """
+        停止后台定时任务并写入剩余的全部记录, 仍有记录写入失败时抛出 BatchWriteError
+        :return:
+        """
+        # 不直接 cancel 后台任务, 避免打断正在进行的写入导致已取出的记录丢失
+        self._stop_event.set()
+        if self._flush_task is not None:
+            await self._flush_task
+            self._flush_task = None
+        await self.flush()
+        if self.pending_count():
+            errors = {table_name: str(e) for table_name, e in self._failed_tables.items()}
+            raise BatchWriteError(f"[AsyncMysqlBatchWriter.close] {self.pending_count()} items are not written, "
+                                  f"errors: {errors}")
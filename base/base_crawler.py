@@ -9,11 +9,24 @@
 # 使用本代码即表示您同意遵守上述原则和LICENSE中的所有条款。  
 
 
+import asyncio
+import random
+import time
 from abc import ABC, abstractmethod
-from typing import Dict, Optional
+from contextlib import asynccontextmanager
+from http.cookiejar import CookieJar, DefaultCookiePolicy
+from typing import Any, AsyncIterator, Dict, Optional, Set
 
+import httpx
 from playwright.async_api import BrowserContext, BrowserType
 
+import config
+from cache import response_cache
+from tools import http_replay, metrics, rate_limiter, utils
+
+# 这些状态码说明请求被风控: 429 限流, 461/471 出现验证码
+BLOCKED_STATUS_CODES = (429, 461, 471)
+
 
 class AbstractCrawler(ABC):
     @abstractmethod
@@ -87,6 +100,15 @@ class AbstractStoreImage(ABC):
 
 
 class AbstractApiClient(ABC):
+    # 开启 IP 代理时爬虫通过 set_ip_proxy_pool 设置, 请求被风控时从代理池换一个代理
+    ip_proxy_pool: Optional[Any] = None
+    ip_proxy_info: Optional[Any] = None
+    # 子类大多不调用 super().__init__, 这些字典在第一次使用时按实例创建
+    # 代理 -> 长连接的 httpx client / 正在使用该 client 的请求数; 换代理后旧代理的 client 等请求结束后关闭
+    _http_clients: Optional[Dict[Optional[tuple], httpx.AsyncClient]] = None
+    _http_client_inflight: Optional[Dict[Optional[tuple], int]] = None
+    _retired_http_client_keys: Optional[Set[Optional[tuple]]] = None
+
     @abstractmethod
     async def request(self, method, url, **kwargs):
         pass
@@ -94,3 +116,228 @@ class AbstractApiClient(ABC):
     @abstractmethod
     async def update_cookies(self, browser_context: BrowserContext):
         pass
+
+    def get_http_client(self, proxies: Optional[Dict] = None) -> httpx.AsyncClient:
+        """
+        get the long-lived httpx client of this api client, one client per proxy,
+        so that tcp/tls connections are reused between requests
+        :param proxies: httpx proxies, eg: {"http://": "http://ip:port", "https://": "http://ip:port"}
+        :return: httpx async client
+        """
+        if self._http_clients is None:
+            self._http_clients = {}
+        http_clients = self._http_clients
+        key = _http_client_key(proxies)
+        if self._retired_http_client_keys and key == _http_client_key(getattr(self, "proxies", None)):
+            # 代理池又把这个代理租给了当前客户端, 旧的 client 继续使用
+            self._retired_http_client_keys.discard(key)
+        client = http_clients.get(key)
+        if client is None or client.is_closed:
+            transport = None
+            if config.HTTP_REPLAY_SERVER:
+                # 回放时所有请求都转发到本地假平台服务, 不走代理
+                transport = http_replay.ReplayRedirectTransport(config.HTTP_REPLAY_SERVER)
+                proxies = None
+            client = httpx.AsyncClient(
+                proxies=proxies,
+                transport=transport,
+                # do not persist cookies from responses, login state is still carried by the Cookie header
+                cookies=CookieJar(policy=DefaultCookiePolicy(allowed_domains=[])),
+                http2=config.HTTPX_ENABLE_HTTP2 and _is_http2_available(),
+                limits=httpx.Limits(
+                    max_connections=config.HTTPX_MAX_CONNECTIONS,
+                    max_keepalive_connections=config.HTTPX_MAX_KEEPALIVE_CONNECTIONS,
+                    keepalive_expiry=config.HTTPX_KEEPALIVE_EXPIRY_SEC,
+                ),
+            )
+            http_clients[key] = client
+        return client
+
+    @asynccontextmanager
+    async def use_http_client(self, proxies: Optional[Dict] = None) -> AsyncIterator[httpx.AsyncClient]:
+        """
+        borrow the httpx client of the proxy for one request, the client of a rotated out proxy
+        is closed after the last request borrowing it finishes
+        :param proxies: httpx proxies
+        :return: httpx async client
+        """
+        key = _http_client_key(proxies)
+        client = self.get_http_client(proxies)
+        if self._http_client_inflight is None:
+            self._http_client_inflight = {}
+        self._http_client_inflight[key] = self._http_client_inflight.get(key, 0) + 1
+        try:
+            yield client
+        finally:
+            self._http_client_inflight[key] -= 1
+            if self._http_client_inflight[key] <= 0:
+                del self._http_client_inflight[key]
+                if self._retired_http_client_keys and key in self._retired_http_client_keys:
+                    await self._close_http_client(key)
+
+    async def _retire_http_client(self, proxies: Optional[Dict]):
+        """
+        close the httpx client of a rotated out proxy, wait for the requests still using it
+        :param proxies: httpx proxies of the rotated out proxy
+        """
+        key = _http_client_key(proxies)
+        if not self._http_clients or key not in self._http_clients:
+            return
+        if self._retired_http_client_keys is None:
+            self._retired_http_client_keys = set()
+        self._retired_http_client_keys.add(key)
+        if not self._http_client_inflight or not self._http_client_inflight.get(key):
+            await self._close_http_client(key)
+
+    async def _close_http_client(self, key: Optional[tuple]):
+        self._retired_http_client_keys.discard(key)
+        client = self._http_clients.pop(key, None) if self._http_clients else None
+        if client is not None:
+            await client.aclose()
+
+    def set_ip_proxy_pool(self, ip_proxy_pool: Any, ip_proxy_info: Optional[Any] = None):
+        """
+        set the proxy pool used to rotate proxies when requests are blocked
+        :param ip_proxy_pool: proxy pool, see proxy.proxy_ip_pool.ProxyIpPool
+        :param ip_proxy_info: the proxy currently leased by this api client
+        """
+        self.ip_proxy_pool = ip_proxy_pool
+        self.ip_proxy_info = ip_proxy_info
+
+    def classify_block(self, response: httpx.Response) -> Optional[str]:
+        """
+        check whether the response means the request is blocked by the platform,
+        platform clients override it to recognize their own block responses
+        :param response: httpx response
+        :return: the block reason, None if the request is not blocked
+        """
+        if response.status_code in BLOCKED_STATUS_CODES:
+            return f"status code {response.status_code}"
+        return None
+
+    def is_cacheable(self, response: httpx.Response) -> bool:
+        """
+        check whether a response that is not blocked holds valid data, only such responses are cached and recorded.
+        platform clients override it to reject the error payloads their platform returns with status 200
+        :param response: httpx response
+        :return: whether the response can be cached
+        """
+        return True
+
+    async def rotate_proxy(self, reason: str, proxy_info: Optional[Any] = None) -> bool:
+        """
+        return the failed proxy to the proxy pool and lease another one, the failure itself is already
+        reported by send. when concurrent requests fail on the same proxy only the first one rotates it
+        :param reason: why the proxy is rotated
+        :param proxy_info: the proxy used by the failed request, defaults to the current proxy
+        :return: whether the proxy is rotated
+        """
+        if self.ip_proxy_pool is None:
+            return False
+        if proxy_info is None:
+            proxy_info = self.ip_proxy_info
+        if self.ip_proxy_info is not proxy_info:
+            # 另一个并发请求已经换过代理
+            return True
+        old_proxies = getattr(self, "proxies", None)
+        self.ip_proxy_info = await self.ip_proxy_pool.lease()
+        if proxy_info is not None:
+            self.ip_proxy_pool.release(proxy_info, success=None)
+        _, self.proxies = utils.format_proxy_info(self.ip_proxy_info)
+        if _http_client_key(old_proxies) != _http_client_key(self.proxies):
+            await self._retire_http_client(old_proxies)
+        utils.logger.info(
+            f"[{self.__class__.__name__}.rotate_proxy] rotate proxy to "
+            f"{self.ip_proxy_info.ip}:{self.ip_proxy_info.port}, reason: {reason}"
+        )
+        return True
+
+    def _report_proxy(self, proxy_info: Optional[Any], success: bool, latency: Optional[float] = None):
+        if self.ip_proxy_pool is not None and proxy_info is not None:
+            self.ip_proxy_pool.report(proxy_info, success=success, latency=latency)
+
+    async def send(self, method: str, url: str, platform: Optional[str] = None, **kwargs) -> httpx.Response:
+        """
+        send a request with the current proxy, when the request is blocked (captcha, rate limit, ip blocked)
+        or the proxy fails to connect, rotate the proxy, back off with jitter and retry the same request.
+        the last response is returned when retries are used up, so the platform still raises its own error
+        :param method: request method
+        :param url: request url
+        :param platform: platform name, used by the rate limiter and the response cache
+        :param kwargs: httpx request arguments
+        :return: httpx response
+        """
+        if config.ENABLE_RESPONSE_CACHE:
+            cached_response = await response_cache.get_response_cache().lookup(platform, method, url, kwargs)
+            if cached_response is not None:
+                return cached_response
+
+        max_retries = config.BLOCK_RETRY_TIMES
+        for attempt in range(max_retries + 1):
+            if platform:
+                await rate_limiter.acquire(platform, url)
+            proxy_info = self.ip_proxy_info
+            start = time.perf_counter()
+            try:
+                async with self.use_http_client(getattr(self, "proxies", None)) as client:
+                    response = await client.request(method, url, **kwargs)
+            except httpx.TransportError as e:
+                metrics.observe_request(platform, url, "error", time.perf_counter() - start)
+                self._report_proxy(proxy_info, False)
+                # 没有代理池时换不了代理, 保持原来直接抛出的行为
+                if self.ip_proxy_pool is None or attempt >= max_retries:
+                    raise
+                reason = f"transport error: {e!r}"
+            else:
+                metrics.observe_request(platform, url, response.status_code, time.perf_counter() - start)
+                reason = self.classify_block(response)
+                # 每次请求的结果只反馈一次, 换代理时不再重复记失败
+                self._report_proxy(proxy_info, reason is None,
+                                   time.perf_counter() - start if reason is None else None)
+                # 验证码、IP 被封只有换了代理才值得重试, 限流则退避后重试
+                can_retry = self.ip_proxy_pool is not None or response.status_code == 429
+                # 平台用 200 状态码返回的错误内容不缓存, 否则重试时只会读到缓存的错误
+                if reason is None and (config.ENABLE_RESPONSE_CACHE or config.HTTP_RECORD_DIR) \
+                        and self.is_cacheable(response):
+                    if config.ENABLE_RESPONSE_CACHE:
+                        await response_cache.get_response_cache().store(method, url, kwargs, response)
+                    if config.HTTP_RECORD_DIR:
+                        http_replay.get_http_recorder().record(platform, method, url, kwargs, response)
+                if reason is None or not can_retry or attempt >= max_retries:
+                    return response
+            utils.logger.warning(
+                f"[{self.__class__.__name__}.send] request {method}:{url} is blocked, reason: {reason}, "
+                f"retry {attempt + 1}/{max_retries}"
+            )
+            await self.rotate_proxy(reason, proxy_info)
+            await asyncio.sleep(_backoff_with_jitter(attempt))
+
+    async def close(self):
+        """
+        close all httpx clients created by get_http_client
+        """
+        http_clients = self._http_clients or {}
+        self._http_clients = None
+        self._retired_http_client_keys = None
+        for client in http_clients.values():
+            await client.aclose()
+
+
+def _http_client_key(proxies: Optional[Dict]) -> Optional[tuple]:
+    return tuple(sorted(proxies.items())) if isinstance(proxies, dict) else proxies
+
+
+def _backoff_with_jitter(attempt: int) -> float:
+    """
+    exponential backoff with equal jitter: wait between half and the whole of min(max, base * 2^attempt) seconds
+    """
+    backoff = min(config.BLOCK_RETRY_BACKOFF_MAX_SEC, config.BLOCK_RETRY_BACKOFF_SEC * 2 ** attempt)
+    return backoff / 2 + random.uniform(0, backoff / 2)
+
+
+def _is_http2_available() -> bool:
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        return False
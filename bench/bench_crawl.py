@@ -0,0 +1,223 @@
+# 声明：本代码仅供学习和研究目的使用。使用者应遵守以下原则：
+# 1. 不得用于任何商业用途。
+# 2. 使用时应遵守目标平台的使用条款和robots.txt规则。
+# 3. 不得进行大规模爬取或对平台造成运营干扰。
+# 4. 应合理控制请求频率，避免给目标平台带来不必要的负担。
+# 5. 不得用于任何非法或不当的用途。
+#
+# 详细许可条款请参阅项目根目录下的LICENSE文件。
+# 使用本代码即表示您同意遵守上述原则和LICENSE中的所有条款。
+
+
+# -*- coding: utf-8 -*-
+# @Desc    : 快手爬虫 search / detail / creator 三种爬取类型对本地假平台服务的端到端压测,
+#            输出每种类型的 items/s、requests/s 和进程峰值内存
+#            快手接口不需要浏览器签名, 可以不启动浏览器直接跑完整的爬取流程;
+#            默认使用生成的接口数据, 也可以用 --fixtures 回放录制的快手存档(HTTP_RECORD_DIR 录制)
+#            用法: python -m bench.bench_crawl --videos 200 --latency-ms 20 --concurrency 10
+import argparse
+import asyncio
+import json
+import logging
+import time
+from typing import Dict, List, Optional
+
+import config
+from base.base_crawler import AbstractStore
+from media_platform.kuaishou import KuaishouCrawler
+from media_platform.kuaishou.client import KuaiShouClient
+from store.kuaishou import KuaishouStoreFactory
+from tools import utils
+from tools.http_replay import FakePlatformServer, load_fixtures
+
+try:
+    import resource
+except ImportError:  # windows
+    resource = None
+
+KS_GRAPHQL_URL = "https://www.kuaishou.com/graphql"
+KS_PAGE_SIZE = 20
+
+
+class CountingStore(AbstractStore):
+    """只计数不落盘的存储, 压测时排除存储耗时"""
+
+    def __init__(self):
+        self.counts: Dict[str, int] = {"content": 0, "comment": 0, "creator": 0}
+
+    async def store_content(self, content_item: Dict):
+        self.counts["content"] += 1
+
+    async def store_comment(self, comment_item: Dict):
+        self.counts["comment"] += 1
+
+    async def store_creator(self, creator: Dict):
+        self.counts["creator"] += 1
+
+    def total(self) -> int:
+        return sum(self.counts.values())
+
+
+def _fixture(operation_name: str, data: Dict) -> Dict:
+    return {
+        "platform": "ks",
+        "method": "POST",
+        "url": KS_GRAPHQL_URL,
+        "fingerprint": "",
+        "operation_name": operation_name,
+        "status_code": 200,
+        "content_type": "application/json",
+        "content": json.dumps({"data": data}, ensure_ascii=False),
+    }
+
+
+def _video(video_id: str) -> Dict:
+    return {
+        "type": 1,
+        "author": {"id": f"author_{video_id}", "name": "bench", "headerUrl": ""},
+        "photo": {
+            "id": video_id, "caption": f"bench video {video_id}", "timestamp": 1700000000000,
+            "realLikeCount": 100, "viewCount": 1000, "coverUrl": "", "photoUrl": "",
+        },
+    }
+
+
+def build_ks_fixtures(videos: int, comments_per_video: int) -> List[Dict]:
+    """
+    生成快手各接口的响应, 同一接口的多个响应由假平台服务轮流返回
+    :param videos: 搜索结果、创作者作品的视频数
+    :param comments_per_video: 每个视频的一级评论数
+    :return:
+    """
+    fixtures = []
+    pages = max(1, videos // KS_PAGE_SIZE)
+    for page in range(pages):
+        feeds = [_video(f"search_{page}_{i}") for i in range(KS_PAGE_SIZE)]
+        fixtures.append(_fixture("visionSearchPhoto", {
+            "visionSearchPhoto": {"result": 1, "searchSessionId": "bench", "pcursor": str(page + 2), "feeds": feeds}
+        }))
+        fixtures.append(_fixture("visionProfilePhotoList", {
+            "visionProfilePhotoList": {
+                "result": 1, "pcursor": "no_more" if page == pages - 1 else str(page + 1),
+                "feeds": [_video(f"creator_{page}_{i}") for i in range(KS_PAGE_SIZE)],
+            }
+        }))
+    for i in range(videos):
+        fixtures.append(_fixture("visionVideoDetail", {"visionVideoDetail": _video(f"detail_{i}")}))
+    fixtures.append(_fixture("commentListQuery", {
+        "visionCommentList": {
+            "pcursor": "no_more",
+            "rootComments": [
+                {"commentId": f"comment_{i}", "authorId": "bench", "authorName": "bench", "content": "bench",
+                 "headurl": "", "timestamp": 1700000000000, "subCommentCount": 0, "subCommentsPcursor": "no_more"}
+                for i in range(comments_per_video)
+            ],
+        }
+    }))
+    fixtures.append(_fixture("visionProfile", {
+        "visionProfile": {
+            "result": 1,
+            "userProfile": {"ownerCount": {"fan": 1, "follow": 1, "photo_public": videos},
+                            "profile": {"user_name": "bench", "gender": "F", "headurl": "", "user_text": ""}},
+        }
+    }))
+    return fixtures
+
+
+def peak_rss_mb() -> Optional[float]:
+    if resource is None:
+        return None
+    # linux 上 ru_maxrss 的单位是 KB
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def setup_config(server_url: str, args: argparse.Namespace):
+    config.PLATFORM = "ks"
+    config.HTTP_REPLAY_SERVER = server_url
+    config.ENABLE_RATE_LIMIT = False
+    config.ENABLE_SEEN_SET = False
+    config.ENABLE_CRAWL_JOURNAL = False
+    config.ENABLE_RESPONSE_CACHE = False
+    config.ENABLE_GET_COMMENTS = True
+    config.ENABLE_GET_SUB_COMMENTS = False
+    config.CRAWLER_MAX_COMMENTS_COUNT_SINGLENOTES = args.comments
+    config.CRAWLER_MAX_NOTES_COUNT = max(KS_PAGE_SIZE, args.videos)
+    config.START_PAGE = 1
+    config.KEYWORDS = "bench"
+    config.KS_SPECIFIED_ID_LIST = [f"detail_{i}" for i in range(args.videos)]
+    config.KS_CREATOR_ID_LIST = ["bench_creator"]
+    config.MAX_CONCURRENCY_NUM = args.concurrency
+    config.PIPELINE_COMMENT_CONCURRENCY = args.concurrency
+    config.SAVE_DATA_OPTION = "bench"
+
+
+async def run_crawler_type(crawler_type: str, server: FakePlatformServer, store: CountingStore) -> Dict:
+    config.CRAWLER_TYPE = crawler_type
+    crawler = KuaishouCrawler()
+    crawler.ks_client = KuaiShouClient(
+        headers={"User-Agent": crawler.user_agent, "Content-Type": "application/json;charset=UTF-8"},
+        playwright_page=None,
+        cookie_dict={},
+    )
+    items_before, requests_before = store.total(), server.request_count
+    start = time.perf_counter()
+    if crawler_type == "search":
+        await crawler.search()
+    elif crawler_type == "detail":
+        await crawler.get_specified_videos()
+    else:
+        await crawler.get_creators_and_videos()
+    cost = time.perf_counter() - start
+    await crawler.ks_client.close()
+    items, requests = store.total() - items_before, server.request_count - requests_before
+    return {
+        "type": crawler_type,
+        "items": items,
+        "requests": requests,
+        "seconds": cost,
+        "items_per_sec": items / cost,
+        "requests_per_sec": requests / cost,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="end to end crawler benchmark against the fake platform server")
+    parser.add_argument("--types", default="search,detail,creator", help="comma separated crawler types")
+    parser.add_argument("--fixtures", default="", help="recorded ks.jsonl.gz archive, generated when empty")
+    parser.add_argument("--videos", type=int, default=200)
+    parser.add_argument("--comments", type=int, default=10, help="comments per video")
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--latency-ms", type=float, default=0)
+    parser.add_argument("--error-rate", type=float, default=0)
+    parser.add_argument("--captcha-rate", type=float, default=0)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    # 每条数据都会打 info 日志, 压测时只保留警告和错误
+    utils.logger.setLevel(logging.WARNING)
+    fixtures = load_fixtures(args.fixtures) if args.fixtures else build_ks_fixtures(args.videos, args.comments)
+    server = FakePlatformServer(fixtures, "ks", latency_ms=args.latency_ms, error_rate=args.error_rate,
+                                captcha_rate=args.captcha_rate, seed=args.seed)
+    server_url = await server.start()
+    setup_config(server_url, args)
+    store = CountingStore()
+    KuaishouStoreFactory.STORES["bench"] = lambda: store
+
+    results = []
+    try:
+        for crawler_type in args.types.split(","):
+            results.append(await run_crawler_type(crawler_type, server, store))
+    finally:
+        await server.stop()
+
+    print(f"{'type':<10}{'items':>8}{'requests':>10}{'seconds':>10}{'items/s':>10}{'req/s':>10}{'peak rss(MB)':>14}")
+    for result in results:
+        rss = f"{result['peak_rss_mb']:.1f}" if result["peak_rss_mb"] is not None else "n/a"
+        print(f"{result['type']:<10}{result['items']:>8}{result['requests']:>10}{result['seconds']:>10.2f}"
+              f"{result['items_per_sec']:>10.1f}{result['requests_per_sec']:>10.1f}{rss:>14}")
+    print(f"fake server stats: {server.stats()}, store counts: {store.counts}")
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,97 @@
+# 声明：本代码仅供学习和研究目的使用。使用者应遵守以下原则：
+# 1. 不得用于任何商业用途。
+# 2. 使用时应遵守目标平台的使用条款和robots.txt规则。
+# 3. 不得进行大规模爬取或对平台造成运营干扰。
+# 4. 应合理控制请求频率，避免给目标平台带来不必要的负担。
+# 5. 不得用于任何非法或不当的用途。
+#
+# 详细许可条款请参阅项目根目录下的LICENSE文件。
+# 使用本代码即表示您同意遵守上述原则和LICENSE中的所有条款。
+
+
+# -*- coding: utf-8 -*-
+# @Desc    : 对比每次请求新建 httpx.AsyncClient 与复用长连接客户端的吞吐量
+#            用法: python -m bench.bench_http_client --requests 2000 --concurrency 20
+import argparse
+import asyncio
+import time
+
+import httpx
+
+from base.base_crawler import AbstractApiClient
+
+RESPONSE_BODY = b'{"success": true, "data": {}}'
+
+
+async def _handle_conn(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+    """本地桩服务: 最简单的 HTTP/1.1 keep-alive 服务, 任何请求都返回同一段 json"""
+    try:
+        while True:
+            head = await reader.readuntil(b"\r\n\r\n")
+            content_length = 0
+            for line in head.split(b"\r\n"):
+                if line.lower().startswith(b"content-length:"):
+                    content_length = int(line.split(b":", 1)[1])
+            if content_length:
+                await reader.readexactly(content_length)
+            writer.write(
+                b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n"
+                b"Content-Length: " + str(len(RESPONSE_BODY)).encode() + b"\r\n\r\n" + RESPONSE_BODY
+            )
+            await writer.drain()
+    except (asyncio.IncompleteReadError, ConnectionError):
+        pass
+    finally:
+        writer.close()
+
+
+class BenchClient(AbstractApiClient):
+    def __init__(self, reuse: bool):
+        self.reuse = reuse
+
+    async def request(self, method, url, **kwargs):
+        if self.reuse:
+            client = self.get_http_client()
+            response = await client.request(method, url, **kwargs)
+        else:
+            async with httpx.AsyncClient() as client:
+                response = await client.request(method, url, **kwargs)
+        return response.json()
+
+    async def update_cookies(self, browser_context):
+        pass
+
+
+async def run_bench(url: str, reuse: bool, total: int, concurrency: int) -> float:
+    client = BenchClient(reuse)
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def _one():
+        async with semaphore:
+            await client.request("GET", url)
+
+    start = time.perf_counter()
+    await asyncio.gather(*[_one() for _ in range(total)])
+    cost = time.perf_counter() - start
+    await client.close()
+    return total / cost
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="httpx client reuse benchmark")
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=20)
+    args = parser.parse_args()
+
+    server = await asyncio.start_server(_handle_conn, "127.0.0.1", 0)
+    port = server.sockets[0].getsockname()[1]
+    url = f"http://127.0.0.1:{port}/api/sns/web/v1/feed"
+    async with server:
+        before = await run_bench(url, reuse=False, total=args.requests, concurrency=args.concurrency)
+        after = await run_bench(url, reuse=True, total=args.requests, concurrency=args.concurrency)
+    print(f"new client per request: {before:.0f} req/s")
+    print(f"shared client:          {after:.0f} req/s ({after / before:.1f}x)")
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
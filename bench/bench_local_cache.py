@@ -0,0 +1,92 @@
+# 声明：本代码仅供学习和研究目的使用。使用者应遵守以下原则：
+# 1. 不得用于任何商业用途。
+# 2. 使用时应遵守目标平台的使用条款和robots.txt规则。
+# 3. 不得进行大规模爬取或对平台造成运营干扰。
+# 4. 应合理控制请求频率，避免给目标平台带来不必要的负担。
+# 5. 不得用于任何非法或不当的用途。
+#
+# 详细许可条款请参阅项目根目录下的LICENSE文件。
+# 使用本代码即表示您同意遵守上述原则和LICENSE中的所有条款。
+
+
+# -*- coding: utf-8 -*-
+# @Desc    : 对比原来的字典本地缓存与 LRU + 过期堆本地缓存的 set/get/keys/过期清理耗时
+#            用法: python -m bench.bench_local_cache --keys 1000000
+import argparse
+import asyncio
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from cache.local_cache import ExpiringLocalCache
+
+
+class LegacyExpiringLocalCache:
+    """原来的实现: 无上限字典, 清理时遍历全部 key, keys 按子串线性扫描"""
+
+    def __init__(self):
+        self._cache_container: Dict[str, Tuple[Any, float]] = {}
+
+    def get(self, key: str) -> Optional[Any]:
+        value, expire_time = self._cache_container.get(key, (None, 0))
+        if value is None:
+            return None
+        if expire_time < time.time():
+            del self._cache_container[key]
+            return None
+        return value
+
+    def set(self, key: str, value: Any, expire_time: int) -> None:
+        self._cache_container[key] = (value, time.time() + expire_time)
+
+    def keys(self, pattern: str) -> List[str]:
+        if pattern == '*':
+            return list(self._cache_container.keys())
+        if '*' in pattern:
+            pattern = pattern.replace('*', '')
+        return [key for key in self._cache_container.keys() if pattern in key]
+
+    def _clear(self):
+        # 原实现边遍历边删除会抛 RuntimeError, 这里遍历副本
+        for key, (value, expire_time) in list(self._cache_container.items()):
+            if expire_time < time.time():
+                del self._cache_container[key]
+
+
+def _timeit(func: Callable[[], Any]) -> float:
+    start = time.perf_counter()
+    func()
+    return time.perf_counter() - start
+
+
+def run_bench(cache, total: int) -> Dict[str, float]:
+    # 1% 的 key 属于同一个前缀, 10% 的 key 很快过期
+    keys = [f"{'kuaidaili' if i % 100 == 0 else 'jishuhttp'}_{i}" for i in range(total)]
+    result = {
+        "set": _timeit(lambda: [cache.set(key, i, 1 if i % 10 == 0 else 600) for i, key in enumerate(keys)]),
+        "get": _timeit(lambda: [cache.get(key) for key in keys]),
+        "keys": _timeit(lambda: cache.keys("kuaidaili_*")),
+    }
+    time.sleep(1)
+    result["clear"] = _timeit(cache._clear)
+    # 过期的 key 清理后, 再清理一次的耗时
+    result["clear_again"] = _timeit(cache._clear)
+    return result
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="local cache benchmark")
+    parser.add_argument("--keys", type=int, default=1000000)
+    args = parser.parse_args()
+
+    before = run_bench(LegacyExpiringLocalCache(), args.keys)
+    cache = ExpiringLocalCache(cron_interval=3600, max_size=args.keys)
+    after = run_bench(cache, args.keys)
+    cache.close()
+    print(f"{'op':<12}{'legacy (s)':>12}{'lru+heap (s)':>14}")
+    for op in before:
+        print(f"{op:<12}{before[op]:>12.3f}{after[op]:>14.3f}")
+    print(f"lru+heap stats: {cache.stats()}")
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,71 @@
+# 声明：本代码仅供学习和研究目的使用。使用者应遵守以下原则：
+# 1. 不得用于任何商业用途。
+# 2. 使用时应遵守目标平台的使用条款和robots.txt规则。
+# 3. 不得进行大规模爬取或对平台造成运营干扰。
+# 4. 应合理控制请求频率，避免给目标平台带来不必要的负担。
+# 5. 不得用于任何非法或不当的用途。
+#
+# 详细许可条款请参阅项目根目录下的LICENSE文件。
+# 使用本代码即表示您同意遵守上述原则和LICENSE中的所有条款。
+
+
+# -*- coding: utf-8 -*-
+# @Desc    : 对比 execjs 与常驻 node 签名进程池的签名吞吐量
+#            用法: python -m bench.bench_sign_worker --count 50
+import argparse
+import asyncio
+import time
+
+from media_platform.douyin import help as douyin_help
+from media_platform.zhihu import help as zhihu_help
+from tools import sign_worker
+
+DOUYIN_PARAMS = "aweme_id=7345678901234567890&device_platform=webapp&aid=6383&channel=channel_pc_web"
+USER_AGENT = "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/125.0.0.0"
+ZHIHU_URL = "/api/v4/search_v3?gk_version=gz-gaokao&t=general&q=python&correction=1&offset=0&limit=20"
+ZHIHU_COOKIES = "d_c0=AABCDEFGHIJKLMN_1234567890|1700000000;"
+
+
+def bench_execjs(count: int):
+    start = time.perf_counter()
+    for _ in range(count):
+        douyin_help.get_a_bogus_from_js("/aweme/v1/web/aweme/detail/", DOUYIN_PARAMS, USER_AGENT)
+    douyin_cost = time.perf_counter() - start
+    start = time.perf_counter()
+    for _ in range(count):
+        zhihu_help.sign_from_execjs(ZHIHU_URL, ZHIHU_COOKIES)
+    zhihu_cost = time.perf_counter() - start
+    return count / douyin_cost, count / zhihu_cost
+
+
+async def bench_sign_worker(count: int):
+    # 预热, 进程启动和脚本加载只发生一次
+    await douyin_help.get_a_bogus_from_sign_worker("/aweme/v1/web/aweme/detail/", DOUYIN_PARAMS, USER_AGENT)
+    await zhihu_help.sign(ZHIHU_URL, ZHIHU_COOKIES)
+
+    start = time.perf_counter()
+    await asyncio.gather(*[
+        douyin_help.get_a_bogus_from_sign_worker("/aweme/v1/web/aweme/detail/", DOUYIN_PARAMS, USER_AGENT)
+        for _ in range(count)
+    ])
+    douyin_cost = time.perf_counter() - start
+    start = time.perf_counter()
+    await asyncio.gather(*[zhihu_help.sign(ZHIHU_URL, ZHIHU_COOKIES) for _ in range(count)])
+    zhihu_cost = time.perf_counter() - start
+    await sign_worker.close_all()
+    return count / douyin_cost, count / zhihu_cost
+
+
+def main():
+    parser = argparse.ArgumentParser(description="execjs vs node sign worker benchmark")
+    parser.add_argument("--count", type=int, default=50)
+    args = parser.parse_args()
+
+    execjs_douyin, execjs_zhihu = bench_execjs(args.count)
+    worker_douyin, worker_zhihu = asyncio.run(bench_sign_worker(args.count))
+    print(f"douyin a_bogus  execjs: {execjs_douyin:8.1f} sign/s, sign worker: {worker_douyin:8.1f} sign/s")
+    print(f"zhihu x-zse-96  execjs: {execjs_zhihu:8.1f} sign/s, sign worker: {worker_zhihu:8.1f} sign/s")
+
+
+if __name__ == '__main__':
+    main()
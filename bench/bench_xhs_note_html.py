@@ -0,0 +1,45 @@
+# 声明：本代码仅供学习和研究目的使用。使用者应遵守以下原则：
+# 1. 不得用于任何商业用途。
+# 2. 使用时应遵守目标平台的使用条款和robots.txt规则。
+# 3. 不得进行大规模爬取或对平台造成运营干扰。
+# 4. 应合理控制请求频率，避免给目标平台带来不必要的负担。
+# 5. 不得用于任何非法或不当的用途。
+#
+# 详细许可条款请参阅项目根目录下的LICENSE文件。
+# 使用本代码即表示您同意遵守上述原则和LICENSE中的所有条款。
+
+
+# -*- coding: utf-8 -*-
+# @Desc    : 对比改写前后从小红书笔记详情页 HTML 解析笔记的耗时, 改写前的实现见 bench/legacy_xhs.py
+#            用法: python -m bench.bench_xhs_note_html --rounds 20
+import argparse
+import time
+
+from media_platform.xhs.help import get_note_dict_from_html
+from bench.legacy_xhs import NOTE_HTML_FIXTURE_PATH, NOTE_HTML_NOTE_ID, legacy_get_note_dict
+
+
+def main():
+    parser = argparse.ArgumentParser(description="xhs note html parsing benchmark")
+    parser.add_argument("--rounds", type=int, default=20)
+    args = parser.parse_args()
+
+    with open(NOTE_HTML_FIXTURE_PATH, encoding="utf-8") as f:
+        html = f.read()
+
+    start = time.perf_counter()
+    for _ in range(args.rounds):
+        legacy_get_note_dict(html, NOTE_HTML_NOTE_ID)
+    legacy_cost = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for _ in range(args.rounds):
+        get_note_dict_from_html(html, NOTE_HTML_NOTE_ID)
+    cost = time.perf_counter() - start
+
+    print(f"xhs note html x {args.rounds}: legacy {legacy_cost * 1000:.1f} ms, current {cost * 1000:.1f} ms, "
+          f"{legacy_cost / cost:.1f}x")
+
+
+if __name__ == '__main__':
+    main()
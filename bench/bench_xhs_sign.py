@@ -0,0 +1,49 @@
+# 声明：本代码仅供学习和研究目的使用。使用者应遵守以下原则：
+# 1. 不得用于任何商业用途。
+# 2. 使用时应遵守目标平台的使用条款和robots.txt规则。
+# 3. 不得进行大规模爬取或对平台造成运营干扰。
+# 4. 应合理控制请求频率，避免给目标平台带来不必要的负担。
+# 5. 不得用于任何非法或不当的用途。
+#
+# 详细许可条款请参阅项目根目录下的LICENSE文件。
+# 使用本代码即表示您同意遵守上述原则和LICENSE中的所有条款。
+
+
+# -*- coding: utf-8 -*-
+# @Desc    : 对比改写前后小红书 x-s-common 签名的耗时, 改写前的实现见 bench/legacy_xhs.py
+#            用法: python -m bench.bench_xhs_sign --count 1000
+import argparse
+import random
+import string
+import time
+
+from media_platform.xhs import help as xhs_help
+from bench.legacy_xhs import legacy_x_s_common, random_str
+
+
+def main():
+    parser = argparse.ArgumentParser(description="xhs sign benchmark")
+    parser.add_argument("--count", type=int, default=1000)
+    args = parser.parse_args()
+
+    rnd = random.Random(1)
+    alphabet = string.ascii_letters + string.digits + "+/="
+    samples = [("%032x" % rnd.getrandbits(128), random_str(rnd, 200, 300, alphabet),
+                "XYW_" + random_str(rnd, 300, 400, alphabet), str(1700000000000 + i)) for i in range(args.count)]
+
+    start = time.perf_counter()
+    for a1, b1, x_s, x_t in samples:
+        legacy_x_s_common(a1=a1, b1=b1, x_s=x_s, x_t=x_t)
+    legacy_cost = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for a1, b1, x_s, x_t in samples:
+        xhs_help.sign(a1=a1, b1=b1, x_s=x_s, x_t=x_t)
+    cost = time.perf_counter() - start
+
+    print(f"xhs sign x {len(samples)}: legacy {legacy_cost * 1000:.1f} ms, current {cost * 1000:.1f} ms, "
+          f"{legacy_cost / cost:.1f}x")
+
+
+if __name__ == '__main__':
+    main()
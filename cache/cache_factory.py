@@ -22,19 +22,50 @@ class CacheFactory:
     """
 
     @staticmethod
-    def create_cache(cache_type: str, *args, **kwargs):
+    def create_cache(cache_type: str, *args, is_async: bool = False, **kwargs):
         """
         创建缓存对象
         :param cache_type: 缓存类型
         :param args: 参数
+        :param is_async: 是否创建异步缓存(AbstractAsyncCache), 在协程中使用时不会阻塞事件循环
         :param kwargs: 关键字参数
         :return:
         """
         if cache_type == 'memory':
+            if is_async:
+                from .local_cache import AsyncExpiringLocalCache
+                return AsyncExpiringLocalCache(*args, **kwargs)
             from .local_cache import ExpiringLocalCache
             return ExpiringLocalCache(*args, **kwargs)
         elif cache_type == 'redis':
+            if is_async:
+                from .redis_cache import AsyncRedisCache
+                return AsyncRedisCache()
             from .redis_cache import RedisCache
             return RedisCache()
+        elif cache_type == 'sqlite' and is_async:
+            from .sqlite_cache import AsyncSqliteCache
+            return AsyncSqliteCache(*args, **kwargs)
         else:
             raise ValueError(f'Unknown cache type: {cache_type}')
+
+    @staticmethod
+    def create_seen_set(seen_set_type: str):
+        """
+        按配置创建去重集合
+        :param seen_set_type: 去重集合类型 memory | redis
+        :return:
+        """
+        import config
+        if seen_set_type == 'memory':
+            from .seen_set import BloomSeenSet
+            return BloomSeenSet(
+                initial_capacity=config.SEEN_SET_INITIAL_CAPACITY,
+                error_rate=config.SEEN_SET_ERROR_RATE,
+                persist_path=config.SEEN_SET_PERSIST_PATH,
+            )
+        elif seen_set_type == 'redis':
+            from .seen_set import RedisSeenSet
+            return RedisSeenSet(key_name=config.SEEN_SET_REDIS_KEY)
+        else:
+            raise ValueError(f'Unknown seen set type: {seen_set_type}')
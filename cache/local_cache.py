@@ -16,23 +16,40 @@
 # @Desc    : 本地缓存
 
 import asyncio
+import fnmatch
+import heapq
 import time
-from typing import Any, Dict, List, Optional, Tuple
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Set, Tuple
 
-from cache.abs_cache import AbstractCache
+from cache.abs_cache import AbstractAsyncCache, AbstractCache
+from config import db_config
+
+# 按 key 的前几个字符建立索引, keys(pattern) 只在 pattern 字面前缀对应的桶里匹配
+PREFIX_INDEX_LENGTH = 4
 
 
 class ExpiringLocalCache(AbstractCache):
 
-    def __init__(self, cron_interval: int = 10):
+    def __init__(self, cron_interval: int = 10, max_size: Optional[int] = None):
         """
         初始化本地缓存
         :param cron_interval: 定时清楚cache的时间间隔
+        :param max_size: 最多保存的 key 数量, 超过后淘汰最久未访问的 key, 默认使用配置, 为 0 时不限制
         :return:
         """
         self._cron_interval = cron_interval
-        self._cache_container: Dict[str, Tuple[Any, float]] = {}
+        self._max_size = db_config.CACHE_LOCAL_MAX_SIZE if max_size is None else max_size
+        # 按访问顺序排列, 最久未访问的在最前面
+        self._cache_container: "OrderedDict[str, Tuple[Any, float]]" = OrderedDict()
+        # 过期时间最小堆, 覆盖写入后旧的记录不删除, 弹出时和当前过期时间对比后跳过
+        self._expire_heap: List[Tuple[float, str]] = []
+        self._prefix_index: Dict[str, Set[str]] = {}
         self._cron_task: Optional[asyncio.Task] = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
         # 开启定时清理任务
         self._schedule_clear()
 
@@ -41,8 +58,16 @@ class ExpiringLocalCache(AbstractCache):
         析构函数，清理定时任务
         :return:
         """
+        self.close()
+
+    def close(self):
+        """
+        取消定时清理任务
+        :return:
+        """
         if self._cron_task is not None:
             self._cron_task.cancel()
+            self._cron_task = None
 
     def get(self, key: str) -> Optional[Any]:
         """
@@ -52,13 +77,18 @@ class ExpiringLocalCache(AbstractCache):
         """
         value, expire_time = self._cache_container.get(key, (None, 0))
         if value is None:
+            self.misses += 1
             return None
 
         # 如果键已过期，则删除键并返回None
         if expire_time < time.time():
-            del self._cache_container[key]
+            self._delete(key)
+            self.expirations += 1
+            self.misses += 1
             return None
 
+        self._cache_container.move_to_end(key)
+        self.hits += 1
         return value
 
     def set(self, key: str, value: Any, expire_time: int) -> None:
@@ -69,45 +99,93 @@ class ExpiringLocalCache(AbstractCache):
         :param expire_time:
         :return:
         """
-        self._cache_container[key] = (value, time.time() + expire_time)
+        if self._cron_task is None:
+            self._schedule_clear()
+        expire_at = time.time() + expire_time
+        if key in self._cache_container:
+            self._cache_container.move_to_end(key)
+        else:
+            self._prefix_index.setdefault(key[:PREFIX_INDEX_LENGTH], set()).add(key)
+        self._cache_container[key] = (value, expire_at)
+        heapq.heappush(self._expire_heap, (expire_at, key))
+        if self._max_size and len(self._cache_container) > self._max_size:
+            self._clear()
+            while len(self._cache_container) > self._max_size:
+                self._delete(next(iter(self._cache_container)))
+                self.evictions += 1
+        if len(self._expire_heap) > 2 * len(self._cache_container) + 1024:
+            self._compact_heap()
 
     def keys(self, pattern: str) -> List[str]:
         """
-        获取所有符合pattern的key
+        获取所有符合pattern的key, 支持 glob 通配符(*, ?, [])
         :param pattern: 匹配模式
         :return:
         """
         if pattern == '*':
             return list(self._cache_container.keys())
 
-        # 本地缓存通配符暂时将*替换为空
-        if '*' in pattern:
-            pattern = pattern.replace('*', '')
-
-        return [key for key in self._cache_container.keys() if pattern in key]
+        literal_prefix_length = len(pattern)
+        for index, char in enumerate(pattern):
+            if char in "*?[":
+                literal_prefix_length = index
+                break
+        if literal_prefix_length >= PREFIX_INDEX_LENGTH:
+            candidates = self._prefix_index.get(pattern[:PREFIX_INDEX_LENGTH], ())
+        else:
+            candidates = self._cache_container.keys()
+        return [key for key in candidates if fnmatch.fnmatchcase(key, pattern)]
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "size": len(self._cache_container),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
+
+    def _delete(self, key: str):
+        self._cache_container.pop(key, None)
+        prefix = key[:PREFIX_INDEX_LENGTH]
+        bucket = self._prefix_index.get(prefix)
+        if bucket is not None:
+            bucket.discard(key)
+            if not bucket:
+                del self._prefix_index[prefix]
+
+    def _compact_heap(self):
+        """
+        覆盖写入留下的过期堆记录过多时重建堆
+        :return:
+        """
+        self._expire_heap = [(expire_at, key) for key, (_, expire_at) in self._cache_container.items()]
+        heapq.heapify(self._expire_heap)
 
     def _schedule_clear(self):
         """
-        开启定时清理任务,
+        开启定时清理任务, 没有运行中的事件循环时等第一次 set 时再开启
         :return:
         """
-
         try:
-            loop = asyncio.get_event_loop()
+            loop = asyncio.get_running_loop()
         except RuntimeError:
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
+            return
 
         self._cron_task = loop.create_task(self._start_clear_cron())
 
     def _clear(self):
         """
-        根据过期时间清理缓存
+        根据过期时间清理缓存, 只弹出已过期的堆记录, 耗时和过期 key 的数量成正比
         :return:
         """
-        for key, (value, expire_time) in self._cache_container.items():
-            if expire_time < time.time():
-                del self._cache_container[key]
+        now = time.time()
+        while self._expire_heap and self._expire_heap[0][0] < now:
+            expire_at, key = heapq.heappop(self._expire_heap)
+            item = self._cache_container.get(key)
+            if item is not None and item[1] == expire_at:
+                self._delete(key)
+                self.expirations += 1
 
     async def _start_clear_cron(self):
         """
@@ -119,6 +197,36 @@ class ExpiringLocalCache(AbstractCache):
             await asyncio.sleep(self._cron_interval)
 
 
+class AsyncExpiringLocalCache(AbstractAsyncCache):
+
+    def __init__(self, *args, **kwargs):
+        """
+        进程内缓存的异步接口, 读写都在内存中完成, 和异步 redis 缓存可以互相替换
+        :param args: ExpiringLocalCache 的参数
+        :param kwargs: ExpiringLocalCache 的关键字参数
+        """
+        self._local_cache = ExpiringLocalCache(*args, **kwargs)
+
+    async def get(self, key: str) -> Optional[Any]:
+        return self._local_cache.get(key)
+
+    async def set(self, key: str, value: Any, expire_time: int) -> None:
+        self._local_cache.set(key, value, expire_time)
+
+    async def keys(self, pattern: str) -> List[str]:
+        return self._local_cache.keys(pattern)
+
+    async def mget(self, keys: List[str]) -> List[Optional[Any]]:
+        return [self._local_cache.get(key) for key in keys]
+
+    async def mset(self, mapping: Dict[str, Any], expire_time: int) -> None:
+        for key, value in mapping.items():
+            self._local_cache.set(key, value, expire_time)
+
+    async def close(self) -> None:
+        self._local_cache.close()
+
+
 if __name__ == '__main__':
     cache = ExpiringLocalCache(cron_interval=2)
     cache.set('name', '程序员阿江-Relakkes', 3)
@@ -16,11 +16,12 @@
 # @Desc    : RedisCache实现
 import pickle
 import time
-from typing import Any, List
+from typing import Any, Dict, List, Optional
 
 from redis import Redis
+from redis import asyncio as aioredis
 
-from cache.abs_cache import AbstractCache
+from cache.abs_cache import AbstractAsyncCache, AbstractCache
 from config import db_config
 
 
@@ -71,6 +72,90 @@ class RedisCache(AbstractCache):
         return [key.decode() for key in self._redis_client.keys(pattern)]
 
 
+class AsyncRedisCache(AbstractAsyncCache):
+
+    def __init__(self, redis_client: Optional[aioredis.Redis] = None) -> None:
+        """
+        基于 redis.asyncio 的缓存, 在协程中读写不会阻塞事件循环
+        :param redis_client: 异步 redis 客户端, 默认按配置创建带连接池的客户端
+        """
+        self._redis_client = redis_client or self._connect_redis()
+
+    @staticmethod
+    def _connect_redis() -> aioredis.Redis:
+        """
+        创建带连接池的异步 redis 客户端, 并发的协程复用池中的连接
+        :return:
+        """
+        connection_pool = aioredis.ConnectionPool(
+            host=db_config.REDIS_DB_HOST,
+            port=db_config.REDIS_DB_PORT,
+            db=db_config.REDIS_DB_NUM,
+            password=db_config.REDIS_DB_PWD,
+            max_connections=db_config.REDIS_MAX_CONNECTIONS,
+        )
+        return aioredis.Redis(connection_pool=connection_pool)
+
+    async def get(self, key: str) -> Any:
+        """
+        从缓存中获取键的值, 并且反序列化
+        :param key:
+        :return:
+        """
+        value = await self._redis_client.get(key)
+        if value is None:
+            return None
+        return pickle.loads(value)
+
+    async def set(self, key: str, value: Any, expire_time: int) -> None:
+        """
+        将键的值设置到缓存中, 并且序列化
+        :param key:
+        :param value:
+        :param expire_time:
+        :return:
+        """
+        await self._redis_client.set(key, pickle.dumps(value), ex=expire_time)
+
+    async def keys(self, pattern: str) -> List[str]:
+        """
+        获取所有符合pattern的key, 使用 SCAN 分批迭代, 不会像 KEYS 一样长时间阻塞 redis
+        """
+        return [
+            key.decode()
+            async for key in self._redis_client.scan_iter(match=pattern, count=db_config.REDIS_SCAN_COUNT)
+        ]
+
+    async def mget(self, keys: List[str]) -> List[Optional[Any]]:
+        """
+        批量获取键的值, 一次往返
+        :param keys:
+        :return:
+        """
+        if not keys:
+            return []
+        values = await self._redis_client.mget(keys)
+        return [pickle.loads(value) if value is not None else None for value in values]
+
+    async def mset(self, mapping: Dict[str, Any], expire_time: int) -> None:
+        """
+        批量设置键的值, MSET 不支持过期时间, 用 pipeline 把多个 SET 一次发送
+        :param mapping:
+        :param expire_time:
+        :return:
+        """
+        if not mapping:
+            return
+        async with self._redis_client.pipeline(transaction=False) as pipe:
+            for key, value in mapping.items():
+                pipe.set(key, pickle.dumps(value), ex=expire_time)
+            await pipe.execute()
+
+    async def close(self) -> None:
+        await self._redis_client.close()
+        await self._redis_client.connection_pool.disconnect()
+
+
 if __name__ == '__main__':
     redis_cache = RedisCache()
     # basic usage
@@ -0,0 +1,207 @@
+# 声明：本代码仅供学习和研究目的使用。使用者应遵守以下原则：
+# 1. 不得用于任何商业用途。
+# 2. 使用时应遵守目标平台的使用条款和robots.txt规则。
+# 3. 不得进行大规模爬取或对平台造成运营干扰。
+# 4. 应合理控制请求频率，避免给目标平台带来不必要的负担。
+# 5. 不得用于任何非法或不当的用途。
+#
+# 详细许可条款请参阅项目根目录下的LICENSE文件。
+# 使用本代码即表示您同意遵守上述原则和LICENSE中的所有条款。
+
+
+# -*- coding: utf-8 -*-
+# @Desc    : API 响应缓存, 详情、创作者等幂等读接口的响应按 请求方法 + 去掉签名参数的 url + 请求体 缓存,
+#            重复爬取时直接使用缓存的响应; 回放模式下所有请求只读缓存, 用于离线开发调试
+import hashlib
+import re
+from typing import Any, Dict, List, Optional, Pattern, Set, Tuple
+from urllib.parse import parse_qsl, urlencode, urlsplit
+
+import httpx
+
+import config
+from cache.abs_cache import AbstractAsyncCache
+from tools import utils
+
+# 只保存这些响应头, 其余响应头对解析响应没有用
+_KEEP_HEADERS = ("content-type", "content-encoding")
+
+
+def _encode_body(method: str, url: str, request_kwargs: Dict[str, Any]) -> bytes:
+    """
+    httpx 实际发送的请求体, 录制时的请求参数和回放服务收到的请求体得到相同的字节
+    :param method: 请求方法
+    :param url: 请求 url
+    :param request_kwargs: httpx 请求参数, 使用其中的 content、data、json
+    :return:
+    """
+    body_kwargs = {key: request_kwargs[key] for key in ("content", "data", "json") if request_kwargs.get(key) is not None}
+    if isinstance(body_kwargs.get("data"), (str, bytes)):
+        # 调用方把序列化好的字符串传给 data, httpx 按 content 发送
+        body_kwargs["content"] = body_kwargs.pop("data")
+    if not body_kwargs:
+        return b""
+    return httpx.Request(method, url, **body_kwargs).read()
+
+
+def request_fingerprint(method: str, url: str, request_kwargs: Dict[str, Any], ignore_params: Set[str]) -> str:
+    """
+    请求的指纹: 请求方法 + 去掉签名参数并排序后的 url + 请求体的摘要, 签名不同但内容相同的请求指纹相同
+    :param method: 请求方法
+    :param url: 请求 url
+    :param request_kwargs: httpx 请求参数, 使用其中的 params、data、content、json
+    :param ignore_params: 去掉的签名、时间戳参数
+    :return:
+    """
+    parts = urlsplit(url)
+    query = parse_qsl(parts.query, keep_blank_values=True)
+    params = request_kwargs.get("params")
+    if isinstance(params, dict):
+        query.extend((key, str(value)) for key, value in params.items())
+    query = sorted((key, value) for key, value in query if key not in ignore_params)
+    normalized_url = f"{parts.scheme}://{parts.netloc}{parts.path}?{urlencode(query)}"
+
+    body = _encode_body(method, url, request_kwargs)
+    body_digest = hashlib.sha1(body).hexdigest() if body else ""
+    return hashlib.sha1(f"{method.upper()} {normalized_url} {body_digest}".encode("utf-8")).hexdigest()
+
+
+class ResponseCacheMissError(Exception):
+    """回放模式下请求的响应不在缓存中"""
+
+
+class ResponseCache:
+
+    def __init__(self, cache_client: AbstractAsyncCache, endpoint_ttl: Dict[str, int], default_ttl: int = 0,
+                 ignore_params: Optional[List[str]] = None, replay_only: bool = False):
+        """
+        :param cache_client: 保存响应的异步缓存
+        :param endpoint_ttl: 接口 path 正则 -> 缓存秒数
+        :param default_ttl: 没有匹配的接口的缓存秒数, 为 0 时不缓存
+        :param ignore_params: 计算缓存 key 时去掉的签名、时间戳参数
+        :param replay_only: 回放模式, 只从缓存读取响应, 未命中时抛出 ResponseCacheMissError
+        """
+        self.cache_client = cache_client
+        self.endpoint_ttl: List[Tuple[Pattern, int]] = [
+            (re.compile(pattern), ttl) for pattern, ttl in endpoint_ttl.items()
+        ]
+        self.default_ttl = default_ttl
+        self.ignore_params = set(ignore_params or [])
+        self.replay_only = replay_only
+        # 平台 -> [命中数, 未命中数]
+        self._counters: Dict[str, List[int]] = {}
+
+    def get_ttl(self, url: str) -> int:
+        """
+        接口的缓存秒数, 按配置顺序取第一个匹配的正则
+        :param url:
+        :return:
+        """
+        path = urlsplit(url).path
+        for pattern, ttl in self.endpoint_ttl:
+            if pattern.search(path):
+                return ttl
+        return self.default_ttl
+
+    def cache_key(self, method: str, url: str, request_kwargs: Dict[str, Any]) -> str:
+        """
+        缓存 key: 请求的指纹
+        :param method: 请求方法
+        :param url: 请求 url
+        :param request_kwargs: httpx 请求参数
+        :return:
+        """
+        return f"response_cache:{request_fingerprint(method, url, request_kwargs, self.ignore_params)}"
+
+    def _count(self, platform: str, hit: bool):
+        counter = self._counters.setdefault(platform or "unknown", [0, 0])
+        counter[0 if hit else 1] += 1
+
+    async def lookup(self, platform: str, method: str, url: str,
+                     request_kwargs: Dict[str, Any]) -> Optional[httpx.Response]:
+        """
+        查找缓存的响应, 不缓存的接口直接返回 None
+        :param platform: 平台名称, 用于统计命中率
+        :param method: 请求方法
+        :param url: 请求 url
+        :param request_kwargs: httpx 请求参数
+        :return: 缓存的响应, 未命中时返回 None
+        """
+        if not self.replay_only and self.get_ttl(url) <= 0:
+            return None
+        cached = await self.cache_client.get(self.cache_key(method, url, request_kwargs))
+        self._count(platform, cached is not None)
+        if cached is None:
+            if self.replay_only:
+                raise ResponseCacheMissError(f"[ResponseCache.lookup] {method}:{url} is not in the response cache")
+            return None
+        status_code, headers, content = cached
+        return httpx.Response(status_code, headers=headers, content=content, request=httpx.Request(method, url))
+
+    async def store(self, method: str, url: str, request_kwargs: Dict[str, Any], response: httpx.Response):
+        """
+        缓存成功的响应
+        :param method: 请求方法
+        :param url: 请求 url
+        :param request_kwargs: httpx 请求参数
+        :param response: 响应
+        :return:
+        """
+        ttl = self.get_ttl(url)
+        if self.replay_only or ttl <= 0 or response.status_code != 200:
+            return
+        headers = {key: value for key, value in response.headers.items() if key.lower() in _KEEP_HEADERS}
+        # httpx 已经解压了响应内容, 不再保留 content-encoding
+        headers.pop("content-encoding", None)
+        await self.cache_client.set(
+            self.cache_key(method, url, request_kwargs), (response.status_code, headers, response.content), ttl
+        )
+
+    def stats(self) -> Dict[str, Dict]:
+        return {
+            platform: {"hit": hit, "miss": miss, "hit_rate": round(hit / (hit + miss), 4) if hit + miss else 0.0}
+            for platform, (hit, miss) in self._counters.items()
+        }
+
+    async def close(self):
+        await self.cache_client.close()
+
+
+_response_cache: Optional[ResponseCache] = None
+
+
+def get_response_cache() -> ResponseCache:
+    """
+    获取(或按配置创建)全局的响应缓存
+    :return:
+    """
+    global _response_cache
+    if _response_cache is None:
+        from cache.cache_factory import CacheFactory
+        if config.RESPONSE_CACHE_TYPE == config.CACHE_TYPE_SQLITE:
+            cache_client = CacheFactory.create_cache(
+                config.RESPONSE_CACHE_TYPE, config.RESPONSE_CACHE_SQLITE_PATH, is_async=True
+            )
+        else:
+            cache_client = CacheFactory.create_cache(config.RESPONSE_CACHE_TYPE, is_async=True)
+        _response_cache = ResponseCache(
+            cache_client,
+            endpoint_ttl=config.RESPONSE_CACHE_ENDPOINT_TTL_SEC,
+            default_ttl=config.RESPONSE_CACHE_DEFAULT_TTL_SEC,
+            ignore_params=config.RESPONSE_CACHE_IGNORE_PARAMS,
+            replay_only=config.RESPONSE_CACHE_REPLAY_ONLY,
+        )
+    return _response_cache
+
+
+async def close_response_cache():
+    """
+    输出命中率统计并关闭响应缓存, 程序退出前调用
+    :return:
+    """
+    global _response_cache
+    if _response_cache is None:
+        return
+    utils.logger.info(f"[cache.response_cache.close_response_cache] response cache stats: {_response_cache.stats()}")
+    await _response_cache.close()
+    _response_cache = None
@@ -0,0 +1,284 @@
+# 声明：本代码仅供学习和研究目的使用。使用者应遵守以下原则：
+# 1. 不得用于任何商业用途。
+# 2. 使用时应遵守目标平台的使用条款和robots.txt规则。
+# 3. 不得进行大规模爬取或对平台造成运营干扰。
+# 4. 应合理控制请求频率，避免给目标平台带来不必要的负担。
+# 5. 不得用于任何非法或不当的用途。
+#
+# 详细许可条款请参阅项目根目录下的LICENSE文件。
+# 使用本代码即表示您同意遵守上述原则和LICENSE中的所有条款。
+
+
+# -*- coding: utf-8 -*-
+# @Desc    : 已爬取内容的去重集合, 多个关键词、多天的搜索结果重复时, 同一个内容只调度一次详情和评论爬取
+#            内存实现为可扩容的布隆过滤器(可选持久化到磁盘), redis 实现为 redis set
+import hashlib
+import math
+import os
+import pickle
+from abc import ABC, abstractmethod
+from typing import Dict, List, Optional
+
+from redis import asyncio as aioredis
+
+import config
+from cache.redis_cache import AsyncRedisCache
+from store.flush_barrier import get_flush_barrier
+from tools import utils
+
+
+class BloomFilter:
+
+    def __init__(self, capacity: int, error_rate: float):
+        """
+        固定容量的布隆过滤器
+        :param capacity: 预计元素个数
+        :param error_rate: 元素个数达到 capacity 时的误判率
+        """
+        self.capacity = max(1, capacity)
+        self.error_rate = error_rate
+        self.num_bits = max(8, math.ceil(-self.capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.num_hashes = max(1, round(self.num_bits / self.capacity * math.log(2)))
+        self.bits = bytearray((self.num_bits + 7) // 8)
+        self.count = 0
+
+    def _positions(self, key: str) -> List[int]:
+        # 双重哈希: 用一次 128 位摘要模拟 k 个哈希函数
+        digest = hashlib.blake2b(key.encode("utf-8"), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return [(h1 + i * h2) % self.num_bits for i in range(self.num_hashes)]
+
+    def __contains__(self, key: str) -> bool:
+        return all(self.bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(key))
+
+    def add(self, key: str):
+        for pos in self._positions(key):
+            self.bits[pos >> 3] |= 1 << (pos & 7)
+        self.count += 1
+
+    @property
+    def is_full(self) -> bool:
+        return self.count >= self.capacity
+
+
+class ScalableBloomFilter:
+
+    def __init__(self, initial_capacity: int = 100000, error_rate: float = 0.001,
+                 growth: int = 2, tightening_ratio: float = 0.5):
+        """
+        可扩容的布隆过滤器, 当前过滤器满了之后追加一个容量更大、误判率更低的过滤器, 总误判率不超过 error_rate
+        :param initial_capacity: 第一个过滤器的容量
+        :param error_rate: 总误判率
+        :param growth: 每次扩容的容量倍数
+        :param tightening_ratio: 每次扩容的误判率倍数
+        """
+        self.initial_capacity = initial_capacity
+        self.error_rate = error_rate
+        self.growth = growth
+        self.tightening_ratio = tightening_ratio
+        self.filters: List[BloomFilter] = []
+
+    def __contains__(self, key: str) -> bool:
+        return any(key in bloom_filter for bloom_filter in self.filters)
+
+    def __len__(self) -> int:
+        return sum(bloom_filter.count for bloom_filter in self.filters)
+
+    def add(self, key: str) -> bool:
+        """
+        添加元素
+        :param key:
+        :return: 元素之前不存在时返回 True
+        """
+        if key in self:
+            return False
+        if not self.filters or self.filters[-1].is_full:
+            capacity = self.initial_capacity * (self.growth ** len(self.filters))
+            error_rate = self.error_rate * (1 - self.tightening_ratio) * (self.tightening_ratio ** len(self.filters))
+            self.filters.append(BloomFilter(capacity, error_rate))
+        self.filters[-1].add(key)
+        return True
+
+    @property
+    def size_bytes(self) -> int:
+        return sum(len(bloom_filter.bits) for bloom_filter in self.filters)
+
+
+class AbstractSeenSet(ABC):
+
+    def __init__(self):
+        self.hit_count = 0
+        self.miss_count = 0
+
+    @abstractmethod
+    async def add(self, key: str) -> bool:
+        """
+        添加元素
+        这是一个抽象方法。子类必须实现这个方法。
+        :param key:
+        :return: 元素之前不存在时返回 True
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    async def contains(self, key: str) -> bool:
+        """
+        元素是否已经存在
+        这是一个抽象方法。子类必须实现这个方法。
+        :param key:
+        :return:
+        """
+        raise NotImplementedError
+
+    async def check(self, key: str) -> bool:
+        """
+        元素是否已经存在, 同时统计命中数; 只查询不添加, 内容保存之后再调用 add
+        :param key:
+        :return:
+        """
+        if await self.contains(key):
+            self.hit_count += 1
+            return True
+        self.miss_count += 1
+        return False
+
+    def stats(self) -> Dict:
+        total = self.hit_count + self.miss_count
+        return {
+            "hit": self.hit_count,
+            "miss": self.miss_count,
+            "hit_ratio": round(self.hit_count / total, 4) if total else 0.0,
+        }
+
+    async def close(self):
+        pass
+
+
+class BloomSeenSet(AbstractSeenSet):
+
+    def __init__(self, initial_capacity: int = 100000, error_rate: float = 0.001, persist_path: str = ""):
+        """
+        基于可扩容布隆过滤器的去重集合, 存在误判(把新内容当成已爬取), 不存在漏判
+        :param initial_capacity: 初始容量
+        :param error_rate: 误判率
+        :param persist_path: 持久化文件路径, 为空时只保存在内存中
+        """
+        super().__init__()
+        self.persist_path = persist_path
+        self._bloom = self._load() or ScalableBloomFilter(initial_capacity, error_rate)
+
+    def _load(self) -> Optional[ScalableBloomFilter]:
+        if not self.persist_path or not os.path.exists(self.persist_path):
+            return None
+        with open(self.persist_path, "rb") as f:
+            bloom = pickle.load(f)
+        utils.logger.info(f"[BloomSeenSet._load] load {len(bloom)} seen keys from {self.persist_path}")
+        return bloom
+
+    async def add(self, key: str) -> bool:
+        return self._bloom.add(key)
+
+    async def contains(self, key: str) -> bool:
+        return key in self._bloom
+
+    def save(self):
+        """
+        持久化到磁盘, 先写临时文件再替换, 避免写入中断时损坏已有文件
+        :return:
+        """
+        if not self.persist_path:
+            return
+        save_dir = os.path.dirname(self.persist_path)
+        if save_dir:
+            os.makedirs(save_dir, exist_ok=True)
+        tmp_path = self.persist_path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            pickle.dump(self._bloom, f)
+        os.replace(tmp_path, self.persist_path)
+
+    def stats(self) -> Dict:
+        stats = super().stats()
+        stats.update({"size": len(self._bloom), "memory_bytes": self._bloom.size_bytes})
+        return stats
+
+    async def close(self):
+        self.save()
+
+
+class RedisSeenSet(AbstractSeenSet):
+
+    def __init__(self, key_name: str = "media_crawler:seen", redis_client: Optional[aioredis.Redis] = None):
+        """
+        基于 redis set 的去重集合, 多个爬虫进程可以共享, 没有误判
+        :param key_name: redis key
+        :param redis_client: 异步 redis 客户端, 默认按配置创建带连接池的客户端
+        """
+        super().__init__()
+        self.key_name = key_name
+        self._redis_client = redis_client or AsyncRedisCache._connect_redis()
+
+    async def add(self, key: str) -> bool:
+        return await self._redis_client.sadd(self.key_name, key) == 1
+
+    async def contains(self, key: str) -> bool:
+        return bool(await self._redis_client.sismember(self.key_name, key))
+
+    async def close(self):
+        await self._redis_client.close()
+        await self._redis_client.connection_pool.disconnect()
+
+
+_seen_set: Optional[AbstractSeenSet] = None
+
+
+def get_seen_set() -> AbstractSeenSet:
+    """
+    获取(或按配置创建)全局的去重集合
+    :return:
+    """
+    global _seen_set
+    if _seen_set is None:
+        from cache.cache_factory import CacheFactory
+        _seen_set = CacheFactory.create_seen_set(config.SEEN_SET_TYPE)
+    return _seen_set
+
+
+async def is_seen(platform: str, content_id: str) -> bool:
+    """
+    内容是否已经保存过, 只查询不记录, 内容保存之后调用 mark_seen 记录;
+    未开启去重或开启增量爬取(需要刷新已保存的内容)时总是返回 False
+    :param platform: 平台名称
+    :param content_id: 内容ID
+    :return:
+    """
+    if not config.ENABLE_SEEN_SET or config.ENABLE_INCREMENTAL_CRAWL:
+        return False
+    return await get_seen_set().check(f"{platform}:{content_id}")
+
+
+async def mark_seen(platform: str, content_id: str):
+    """
+    内容保存(或记入断点续爬日志)之后记录下来, 详情、保存失败的内容下次仍会爬取;
+    缓冲写入的存储落盘之后才真正记录, 异常退出时没有落盘的内容下次仍会爬取
+    :param platform: 平台名称
+    :param content_id: 内容ID
+    :return:
+    """
+    if not config.ENABLE_SEEN_SET:
+        return
+    seen_set = get_seen_set()
+    await get_flush_barrier().after_flush(lambda: seen_set.add(f"{platform}:{content_id}"))
+
+
+async def close_seen_set():
+    """
+    输出命中统计并关闭(持久化)去重集合, 程序退出前调用
+    :return:
+    """
+    global _seen_set
+    if _seen_set is None:
+        return
+    utils.logger.info(f"[cache.seen_set.close_seen_set] seen set stats: {_seen_set.stats()}")
+    await _seen_set.close()
+    _seen_set = None
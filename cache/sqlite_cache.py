@@ -0,0 +1,93 @@
+# 声明：本代码仅供学习和研究目的使用。使用者应遵守以下原则：
+# 1. 不得用于任何商业用途。
+# 2. 使用时应遵守目标平台的使用条款和robots.txt规则。
+# 3. 不得进行大规模爬取或对平台造成运营干扰。
+# 4. 应合理控制请求频率，避免给目标平台带来不必要的负担。
+# 5. 不得用于任何非法或不当的用途。
+#
+# 详细许可条款请参阅项目根目录下的LICENSE文件。
+# 使用本代码即表示您同意遵守上述原则和LICENSE中的所有条款。
+
+
+# -*- coding: utf-8 -*-
+# @Desc    : 落盘的 sqlite 缓存, 重启后仍然有效, 读写在单独的线程中执行, 不阻塞事件循环
+import asyncio
+import os
+import pickle
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+
+from cache.abs_cache import AbstractAsyncCache
+
+
+class AsyncSqliteCache(AbstractAsyncCache):
+
+    def __init__(self, db_path: str):
+        """
+        :param db_path: sqlite 文件路径, 为 ":memory:" 时不落盘
+        """
+        if db_path != ":memory:" and os.path.dirname(db_path):
+            os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        # sqlite 连接只在这一个线程中使用
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="sqlite_cache")
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, value BLOB, expire_at REAL)"
+        )
+        # 启动时清理已过期的记录
+        self._conn.execute("DELETE FROM cache WHERE expire_at < ?", (time.time(),))
+        self._conn.commit()
+
+    async def _run(self, func: Callable, *args) -> Any:
+        return await asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+
+    def _get_many(self, keys: List[str]) -> List[Optional[Any]]:
+        placeholders = ",".join("?" * len(keys))
+        rows = self._conn.execute(
+            f"SELECT key, value FROM cache WHERE key IN ({placeholders}) AND expire_at >= ?",
+            (*keys, time.time()),
+        ).fetchall()
+        values = {key: pickle.loads(value) for key, value in rows}
+        return [values.get(key) for key in keys]
+
+    def _set_many(self, mapping: Dict[str, Any], expire_time: int):
+        expire_at = time.time() + expire_time
+        self._conn.executemany(
+            "INSERT OR REPLACE INTO cache (key, value, expire_at) VALUES (?, ?, ?)",
+            [(key, pickle.dumps(value), expire_at) for key, value in mapping.items()],
+        )
+        self._conn.commit()
+
+    def _keys(self, pattern: str) -> List[str]:
+        # sqlite 的 GLOB 和 redis 一样支持 *, ?, [] 通配符
+        rows = self._conn.execute(
+            "SELECT key FROM cache WHERE key GLOB ? AND expire_at >= ?", (pattern, time.time())
+        ).fetchall()
+        return [row[0] for row in rows]
+
+    async def get(self, key: str) -> Optional[Any]:
+        return (await self._run(self._get_many, [key]))[0]
+
+    async def set(self, key: str, value: Any, expire_time: int) -> None:
+        await self._run(self._set_many, {key: value}, expire_time)
+
+    async def keys(self, pattern: str) -> List[str]:
+        return await self._run(self._keys, pattern)
+
+    async def mget(self, keys: List[str]) -> List[Optional[Any]]:
+        if not keys:
+            return []
+        return await self._run(self._get_many, keys)
+
+    async def mset(self, mapping: Dict[str, Any], expire_time: int) -> None:
+        if not mapping:
+            return
+        await self._run(self._set_many, mapping, expire_time)
+
+    async def close(self) -> None:
+        await self._run(self._conn.close)
+        self._executor.shutdown(wait=False)
@@ -35,9 +35,16 @@ async def parse_cmd():
     parser.add_argument('--get_sub_comment', type=str2bool,
                         help=''''whether to crawl level two comment, supported values case insensitive ('yes', 'true', 't', 'y', '1', 'no', 'false', 'f', 'n', '0')''', default=config.ENABLE_GET_SUB_COMMENTS)
     parser.add_argument('--save_data_option', type=str,
-                        help='where to save the data (csv or db or json)', choices=['csv', 'db', 'json'], default=config.SAVE_DATA_OPTION)
+                        help='where to save the data (csv or db or json or jsonl)', choices=['csv', 'db', 'json', 'jsonl'], default=config.SAVE_DATA_OPTION)
     parser.add_argument('--cookies', type=str,
                         help='cookies used for cookie login type', default=config.COOKIES)
+    parser.add_argument('--resume', type=str2bool,
+                        help='''whether to resume from the last crawl journal, supported values case insensitive ('yes', 'true', 't', 'y', '1', 'no', 'false', 'f', 'n', '0')''', default=config.RESUME_CRAWL)
+    parser.add_argument('--incremental', type=str2bool,
+                        help='''whether to only update changed contents and fetch new comments since the last run, supported values case insensitive ('yes', 'true', 't', 'y', '1', 'no', 'false', 'f', 'n', '0')''', default=config.ENABLE_INCREMENTAL_CRAWL)
+    parser.add_argument('--role', type=str,
+                        help='distributed crawl role, empty for single process (coordinator | worker)',
+                        choices=["", "coordinator", "worker"], default=config.DISTRIBUTED_ROLE)
 
     args = parser.parse_args()
 
@@ -51,3 +58,6 @@ async def parse_cmd():
     config.ENABLE_GET_SUB_COMMENTS = args.get_sub_comment
     config.SAVE_DATA_OPTION = args.save_data_option
     config.COOKIES = args.cookies
+    config.RESUME_CRAWL = args.resume
+    config.ENABLE_INCREMENTAL_CRAWL = args.incremental
+    config.DISTRIBUTED_ROLE = args.role
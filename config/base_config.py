@@ -36,15 +36,82 @@ USER_MAX_VIDEOS_COUNT = 20
 # 是否开启 IP 代理
 ENABLE_IP_PROXY = False
 
-# 未启用代理时的最大爬取间隔，单位秒（暂时仅对XHS有效）
-CRAWLER_MAX_SLEEP_SEC = 2
+# 是否开启请求限速，所有平台的 API 请求在发送前统一按令牌桶获取令牌，替代原来各处的 sleep 间隔
+ENABLE_RATE_LIMIT = True
+
+# 每个平台默认的每秒请求数和允许的突发请求数
+RATE_LIMIT_DEFAULT_QPS = 1.0
+RATE_LIMIT_DEFAULT_BURST = 1
+
+# 每次请求前额外等待的随机时间上限，单位秒，避免请求间隔过于规律
+RATE_LIMIT_JITTER_SEC = 1.0
+
+# 按平台和接口路径前缀单独限速，值为 (每秒请求数, 突发请求数)，"default" 覆盖该平台的默认值
+# 平台名称与 PLATFORM 一致：xhs | dy | ks | bili | wb | tieba | zhihu
+RATE_LIMIT_RULES = {
+    "wb": {
+        # 微博对评论接口的限流比较严重，所以间隔提高一些
+        "/comments/hotflow": (0.5, 1),
+    },
+}
 
 # 代理IP池数量
 IP_PROXY_POOL_COUNT = 2
 
+# 代理池后台补充的检查间隔（秒），可用代理少于 IP_PROXY_POOL_COUNT 时从代理商补充，并发验证后入池
+IP_PROXY_REFILL_INTERVAL_SEC = 30
+
+# 代理连续失败多少次后从代理池剔除
+IP_PROXY_MAX_CONSECUTIVE_FAILURES = 3
+
+# 代理在代理商给出的过期时间前多少秒就不再租出
+IP_PROXY_EXPIRE_MARGIN_SEC = 30
+
+# 并发验证新代理的数量
+IP_PROXY_VALIDATE_CONCURRENCY = 10
+
+# API 客户端复用的 httpx 连接池配置：最大连接数、最大保活连接数、保活连接的过期秒数
+HTTPX_MAX_CONNECTIONS = 100
+HTTPX_MAX_KEEPALIVE_CONNECTIONS = 20
+HTTPX_KEEPALIVE_EXPIRY_SEC = 30.0
+
+# 是否开启 HTTP/2，需要额外安装 h2 依赖（pip install httpx[http2]），未安装时自动回退到 HTTP/1.1
+HTTPX_ENABLE_HTTP2 = False
+
+# 请求被风控（验证码、限流、IP被封）或代理连接失败时，换一个代理IP并退避后重试同一个请求的最大次数，为 0 时不重试
+# 未开启 IP 代理时只对限流（429）退避重试
+BLOCK_RETRY_TIMES = 2
+# 重试前的退避秒数，第 n 次重试等待 min(BLOCK_RETRY_BACKOFF_MAX_SEC, BLOCK_RETRY_BACKOFF_SEC * 2^n) 的一半到全部之间的随机秒数
+BLOCK_RETRY_BACKOFF_SEC = 1.0
+BLOCK_RETRY_BACKOFF_MAX_SEC = 30.0
+
+# 抖音 a_bogus、知乎 x-zse-96 签名使用的常驻 node 进程数量，以及单次签名的超时时间（秒）
+SIGN_WORKER_POOL_SIZE = 2
+SIGN_WORKER_TIMEOUT_SEC = 10
+
+# 小红书签名使用的页面数量，大于 1 时会额外打开页面分担签名
+XHS_SIGN_PAGE_COUNT = 1
+
+# 小红书签名合并的时间窗口（毫秒）和单次最多合并的签名数量
+XHS_SIGN_BATCH_WINDOW_MS = 5
+XHS_SIGN_MAX_BATCH_SIZE = 20
+
+# 小红书签名使用的 localStorage b1 缓存有效期（秒）
+XHS_SIGN_LOCAL_STORAGE_TTL_SEC = 60
+
 # 代理IP提供商名称
 IP_PROXY_PROVIDER_NAME = "kuaidaili"
 
+# 额外账号的 cookie 列表，每个账号创建一个会话（开启 IP 代理时每个会话分配一个独立的代理IP），
+# 和浏览器登录的主账号一起分担搜索、详情、评论请求；为空时只使用主账号（贴吧不需要登录，不支持）
+ACCOUNT_COOKIES_LIST = []
+
+# 会话调度策略：least_loaded（进行中请求最少的会话优先）或 round_robin（轮询）
+SESSION_SCHEDULE_STRATEGY = "least_loaded"
+
+# 会话连续失败多少次后停用，出现验证码或 IP 被封时立即停用
+SESSION_MAX_CONSECUTIVE_FAILURES = 5
+
 # 设置为True不会打开浏览器（无头浏览器）
 # 设置False会打开一个浏览器
 # 小红书如果一直扫码登录不通过，打开浏览器手动过一下滑动验证码
@@ -54,8 +121,27 @@ HEADLESS = False
 # 是否保存登录状态
 SAVE_LOGIN_STATE = True
 
-# 数据保存类型选项配置,支持三种类型：csv、db、json, 最好保存到DB，有排重的功能。
-SAVE_DATA_OPTION = "json"  # csv or db or json
+# 数据保存类型选项配置,支持四种类型：csv、db、json、jsonl, 最好保存到DB，有排重的功能。
+# jsonl 为追加写的 JSON Lines 格式，每条记录一行，大批量数据时比 json 快很多
+SAVE_DATA_OPTION = "json"  # csv or db or json or jsonl
+
+# jsonl 存储缓冲区达到多少字节后写入磁盘
+JSONL_FLUSH_BYTES = 64 * 1024
+
+# jsonl 存储距离上次写入磁盘超过多少秒后写入磁盘
+JSONL_FLUSH_INTERVAL_SEC = 1.0
+
+# jsonl 存储 fsync 间隔，单位秒，0 表示每次写入磁盘都 fsync
+JSONL_FSYNC_INTERVAL_SEC = 5.0
+
+# jsonl 单个文件最大字节数，超过后轮转到新文件，0 表示不按大小轮转
+JSONL_ROTATE_MAX_BYTES = 0
+
+# jsonl 单个文件最长写入秒数，超过后轮转到新文件，0 表示不按时间轮转
+JSONL_ROTATE_INTERVAL_SEC = 0
+
+# 程序结束时是否把 jsonl 文件额外导出一份旧版 json 数组格式的文件
+JSONL_EXPORT_JSON_ON_CLOSE = False
 
 # 用户浏览器缓存的浏览器文件配置
 USER_DATA_DIR = "%s_user_data_dir"  # %s will be replaced by platform name
@@ -69,9 +155,161 @@ CRAWLER_MAX_NOTES_COUNT = 200
 # 并发爬虫数量控制
 MAX_CONCURRENCY_NUM = 1
 
+# 搜索流水线各阶段的并发数：同时搜索的关键词数、详情、媒体下载、评论、存储
+PIPELINE_SEARCH_CONCURRENCY = 1
+PIPELINE_DETAIL_CONCURRENCY = MAX_CONCURRENCY_NUM
+PIPELINE_MEDIA_CONCURRENCY = MAX_CONCURRENCY_NUM
+PIPELINE_COMMENT_CONCURRENCY = MAX_CONCURRENCY_NUM
+PIPELINE_STORE_CONCURRENCY = 1
+
+# 搜索流水线每个阶段的队列长度，队列满时上游阶段会等待，保证内存占用有上限
+PIPELINE_QUEUE_SIZE = 100
+
 # 是否开启爬图片模式, 默认不开启爬图片
 ENABLE_GET_IMAGES = False
 
+# 媒体文件(图片、视频)下载的并发数和等待队列长度，下载使用独立的协程池，不占用 API 爬取的并发
+MEDIA_DOWNLOAD_CONCURRENCY = 4
+MEDIA_DOWNLOAD_QUEUE_SIZE = 100
+
+# 媒体文件按块流式写入磁盘的块大小，单位字节
+MEDIA_DOWNLOAD_CHUNK_SIZE = 64 * 1024
+
+# 媒体文件下载中断时的重试次数（从已下载的位置断点续传）和单次请求超时，单位秒
+MEDIA_DOWNLOAD_MAX_RETRIES = 3
+MEDIA_DOWNLOAD_TIMEOUT_SEC = 60
+
+# 是否对媒体文件去重：文件按内容 sha256 只保存一份，已下载过的 url 不再下载，各笔记目录下的文件硬链接到同一份文件
+ENABLE_MEDIA_DEDUP = True
+
+# 去重存储的根目录，包含按摘要分目录的文件和 sqlite 索引
+MEDIA_BLOB_STORE_PATH = "data/blobs"
+
+# 是否把爬取进度(搜索页、笔记详情、评论游标、创作者)保存到 sqlite，关闭时进度只保存在内存中
+ENABLE_CRAWL_JOURNAL = True
+
+# 爬取进度文件路径
+CRAWL_JOURNAL_PATH = "data/crawl_journal.db"
+
+# 是否接着上次的进度爬取（命令行 --resume），跳过已完成的搜索页、笔记和创作者，评论从保存的游标继续翻页
+# 为 False 时会清空当前平台之前的进度
+RESUME_CRAWL = False
+
+# 是否增量爬取（命令行 --incremental），适合每天重复运行的监控任务，依赖上面的爬取进度文件：
+# 互动数据没变的内容不再保存，评论数没变的内容不再爬评论，评论按时间倒序翻页的平台(xhs、bili)翻到上次爬过的评论就停止
+ENABLE_INCREMENTAL_CRAWL = False
+
+# 是否开启 API 响应缓存：重复爬取 detail、creator 时，详情、创作者等幂等读接口直接使用缓存的响应，不再请求平台
+ENABLE_RESPONSE_CACHE = False
+
+# 响应缓存存储 memory | redis（连接信息见 db_config） | sqlite（落盘，重启后仍然有效）
+RESPONSE_CACHE_TYPE = "sqlite"
+
+# sqlite 响应缓存文件路径
+RESPONSE_CACHE_SQLITE_PATH = "data/response_cache.db"
+
+# 按接口 path（正则）配置缓存秒数，只缓存幂等的读接口；没有匹配的接口使用 RESPONSE_CACHE_DEFAULT_TTL_SEC，为 0 时不缓存
+RESPONSE_CACHE_ENDPOINT_TTL_SEC = {
+    # 小红书 笔记详情、创作者主页
+    r"^/api/sns/web/v1/feed$": 3600,
+    r"^/user/profile/[^/]+$": 3600,
+    # 抖音 视频详情、创作者信息
+    r"^/aweme/v1/web/aweme/detail/$": 3600,
+    r"^/aweme/v1/web/user/profile/other/$": 3600,
+    # B站 视频详情
+    r"^/x/web-interface/view/detail$": 3600,
+    # 贴吧帖子、知乎文章详情
+    r"^/p/\d+$": 3600,
+    # 知乎 回答、视频详情、创作者主页
+    r"^/question/\d+/answer/\d+$": 3600,
+    r"^/zvideo/\d+$": 3600,
+    r"^/people/[^/]+$": 3600,
+}
+RESPONSE_CACHE_DEFAULT_TTL_SEC = 0
+
+# 计算缓存 key 时去掉的签名、时间戳参数，签名不同但内容相同的请求使用同一份缓存（请求头里的 X-s 等签名不参与计算）
+RESPONSE_CACHE_IGNORE_PARAMS = ["wts", "w_rid", "a_bogus", "X-Bogus", "msToken", "verifyFp", "fp", "_signature", "timestamp"]
+
+# 回放模式，开发调试用：所有请求只从响应缓存读取，未命中时报错，不请求平台
+# 先把 RESPONSE_CACHE_DEFAULT_TTL_SEC 设大录制一次完整的爬取，再开启回放模式重复运行
+RESPONSE_CACHE_REPLAY_ONLY = False
+
+# 录制目录，不为空时把 API 客户端成功的请求和响应按平台追加到 {目录}/{平台}.jsonl.gz，供本地假平台服务回放（见 tools/http_replay.py）
+HTTP_RECORD_DIR = ""
+
+# 本地假平台服务地址（eg: http://127.0.0.1:8765），不为空时 API 客户端的所有请求都转发到该服务，用于离线压测（见 bench/bench_crawl.py）
+HTTP_REPLAY_SERVER = ""
+
+# 是否开启指标统计：API 请求耗时和状态码、签名耗时、存储写入耗时和批大小、流水线队列长度、代理健康度，关闭时各埋点直接返回
+ENABLE_METRICS = False
+
+# Prometheus 指标 HTTP 服务的地址和端口（http://host:port/metrics），端口为 0 时不启动 HTTP 服务
+METRICS_HOST = "127.0.0.1"
+METRICS_PORT = 9100
+
+# 定时输出一行指标汇总日志的间隔（秒），为 0 时只在结束时输出一次
+METRICS_SUMMARY_INTERVAL_SEC = 60
+
+# 日志级别 DEBUG | INFO | WARNING | ERROR
+LOG_LEVEL = "INFO"
+
+# 按模块（按源码路径，最长前缀匹配）配置日志级别，eg: {"store": "WARNING", "media_platform.xhs.client": "DEBUG"}
+LOG_MODULE_LEVELS = {}
+
+# 按模块配置 INFO 及以下级别日志的采样率，只输出一部分逐条数据的日志，eg: {"store": 0.01}
+LOG_SAMPLE_RATES = {}
+
+# 日志输出格式 text | json（每条日志一行 JSON，便于日志系统采集）
+LOG_FORMAT = "text"
+
+# 日志文件路径，为空时只输出到控制台
+LOG_FILE = ""
+
+# 日志中每个参数（没有参数时为整条消息）的最大字符数，超出部分截断，为 0 时不截断
+LOG_MAX_PAYLOAD_CHARS = 2000
+
+# 是否在后台线程中格式化和写入日志，事件循环中只做级别判断和入队
+LOG_ASYNC_OUTPUT = True
+
+# 是否对搜索结果去重：多个关键词、多天的搜索结果里重复出现的内容只爬一次详情和评论，内容保存之后才记入去重集合；开启增量爬取时不跳过
+ENABLE_SEEN_SET = True
+
+# 去重集合类型 memory(可扩容布隆过滤器) | redis(redis set, 多进程共享，连接信息见 db_config)
+SEEN_SET_TYPE = "memory"
+
+# 布隆过滤器的误判率（误判时会把新内容当成已爬取而跳过）和初始容量，超过容量后自动扩容
+SEEN_SET_ERROR_RATE = 0.001
+SEEN_SET_INITIAL_CAPACITY = 100000
+
+# 布隆过滤器持久化文件路径，为空时只在本次运行内去重；设置后以往运行保存过的内容也会跳过
+SEEN_SET_PERSIST_PATH = ""
+
+# redis 去重集合的 key
+SEEN_SET_REDIS_KEY = "media_crawler:seen"
+
+# 分布式爬取角色（命令行 --role），为空时单进程爬取
+# coordinator：把配置的关键词、指定内容或创作者（按 CRAWLER_TYPE）拆成任务放入 redis 队列（连接信息见 db_config）
+# worker：从队列租用任务爬取，数据保存到本机配置的存储中，队列为空时退出；多个 worker 之间去重可以使用 redis 去重集合
+DISTRIBUTED_ROLE = ""
+
+# 任务队列的 redis key 前缀，每个平台一个队列
+DISTRIBUTED_QUEUE_NAME = "media_crawler:task_queue"
+
+# 任务租约时长（秒），worker 崩溃后任务在租约到期后重新入队
+DISTRIBUTED_LEASE_TIMEOUT_SEC = 600
+
+# 任务最多尝试次数，超过后移入失败列表
+DISTRIBUTED_MAX_ATTEMPTS = 3
+
+# worker 每次租用的任务数，同一批任务只启动一次爬虫（浏览器）
+DISTRIBUTED_WORKER_BATCH_SIZE = 10
+
+# 队列暂时没有可租用任务时的轮询间隔（秒）
+DISTRIBUTED_POLL_INTERVAL_SEC = 5
+
+# coordinator 入队后是否等待所有任务处理完并输出进度
+DISTRIBUTED_COORDINATOR_WAIT = True
+
 # 是否开启爬评论模式, 默认开启爬评论
 ENABLE_GET_COMMENTS = True
 
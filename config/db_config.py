@@ -18,13 +18,24 @@ RELATION_DB_HOST = os.getenv("RELATION_DB_HOST", "localhost")
 RELATION_DB_PORT = os.getenv("RELATION_DB_PORT", 3306)
 RELATION_DB_NAME = os.getenv("RELATION_DB_NAME", "media_crawler")
 
+# mysql 批量写入配置，单表缓存多少条记录后写入，以及最长多少秒写入一次
+RELATION_DB_BATCH_SIZE = int(os.getenv("RELATION_DB_BATCH_SIZE", 200))
+RELATION_DB_BATCH_FLUSH_INTERVAL_SEC = float(os.getenv("RELATION_DB_BATCH_FLUSH_INTERVAL_SEC", 1.0))
+
 
 # redis config
 REDIS_DB_HOST = "127.0.0.1"  # your redis host
 REDIS_DB_PWD = os.getenv("REDIS_DB_PWD", "123456")  # your redis password
 REDIS_DB_PORT = os.getenv("REDIS_DB_PORT", 6379)  # your redis port
 REDIS_DB_NUM = os.getenv("REDIS_DB_NUM", 0)  # your redis db num
+# 异步 redis 缓存连接池的最大连接数，以及 keys 按 SCAN 迭代时每批扫描的数量
+REDIS_MAX_CONNECTIONS = int(os.getenv("REDIS_MAX_CONNECTIONS", 20))
+REDIS_SCAN_COUNT = 500
 
 # cache type
 CACHE_TYPE_REDIS = "redis"
-CACHE_TYPE_MEMORY = "memory"
\ No newline at end of file
+CACHE_TYPE_MEMORY = "memory"
+CACHE_TYPE_SQLITE = "sqlite"  # 只有异步实现
+
+# 本地缓存最多保存的 key 数量，超过后淘汰最久未访问的 key，为 0 时不限制
+CACHE_LOCAL_MAX_SIZE = 100000
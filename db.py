@@ -21,9 +21,9 @@ import aiofiles
 import aiomysql
 
 import config
-from async_db import AsyncMysqlDB
+from async_db import AsyncMysqlBatchWriter, AsyncMysqlDB
 from tools import utils
-from var import db_conn_pool_var, media_crawler_db_var
+from var import db_batch_writer_var, db_conn_pool_var, media_crawler_db_var
 
 
 async def init_mediacrawler_db():
@@ -41,10 +41,17 @@ async def init_mediacrawler_db():
         autocommit=True,
     )
     async_db_obj = AsyncMysqlDB(pool)
+    batch_writer = AsyncMysqlBatchWriter(
+        async_db_obj,
+        batch_size=config.RELATION_DB_BATCH_SIZE,
+        flush_interval=config.RELATION_DB_BATCH_FLUSH_INTERVAL_SEC,
+    )
+    batch_writer.start()
 
-    # 将连接池对象和封装的CRUD sql接口对象放到上下文变量中
+    # 将连接池对象、封装的CRUD sql接口对象和批量写入对象放到上下文变量中
     db_conn_pool_var.set(pool)
     media_crawler_db_var.set(async_db_obj)
+    db_batch_writer_var.set(batch_writer)
 
 
 async def init_db():
@@ -60,14 +67,22 @@ async def init_db():
 
 async def close():
     """
-    关闭连接池
+    写入批量缓存中剩余的记录，然后关闭连接池
     Returns:
 
     """
-    utils.logger.info("[close] close mediacrawler db pool")
-    db_pool: aiomysql.Pool = db_conn_pool_var.get()
-    if db_pool is not None:
-        db_pool.close()
+    batch_writer: AsyncMysqlBatchWriter = db_batch_writer_var.get(None)
+    try:
+        if batch_writer is not None:
+            utils.logger.info("[close] flush mediacrawler db batch writer")
+            await batch_writer.close()
+    finally:
+        # 批量写入失败时同样关闭连接池, 异常继续抛出
+        utils.logger.info("[close] close mediacrawler db pool")
+        db_pool: aiomysql.Pool = db_conn_pool_var.get()
+        if db_pool is not None:
+            db_pool.close()
+            await db_pool.wait_closed()
 
 
 async def init_table_schema():
@@ -0,0 +1,45 @@
+// 常驻签名进程: 只加载一次签名脚本, 通过 stdin/stdout 按行收发 json 调用签名函数
+// 用法: node libs/sign_worker.js libs/douyin.js
+// 请求: {"id": 1, "fn": "sign_datail", "args": ["params", "user_agent"]}
+// 响应: {"id": 1, "result": "..."} 或 {"id": 1, "error": "..."}
+
+const fs = require('fs');
+const path = require('path');
+const readline = require('readline');
+const vm = require('vm');
+
+const scriptPath = path.resolve(process.argv[2]);
+let source = fs.readFileSync(scriptPath, 'utf-8');
+if (source.charCodeAt(0) === 0xFEFF) {
+    source = source.slice(1);
+}
+
+// 签名脚本按 execjs 的方式编写, 顶层函数即对外接口, 这里以全局脚本执行并开放 require
+global.require = require;
+vm.runInThisContext(source, {filename: scriptPath});
+
+const rl = readline.createInterface({input: process.stdin, terminal: false});
+rl.on('line', (line) => {
+    if (!line.trim()) {
+        return;
+    }
+    let req;
+    try {
+        req = JSON.parse(line);
+    } catch (e) {
+        process.stdout.write(JSON.stringify({id: null, error: `invalid request: ${e.message}`}) + '\n');
+        return;
+    }
+    let resp;
+    try {
+        const fn = globalThis[req.fn];
+        if (typeof fn !== 'function') {
+            throw new Error(`function ${req.fn} not found`);
+        }
+        resp = {id: req.id, result: fn.apply(null, req.args || [])};
+    } catch (e) {
+        resp = {id: req.id, error: String(e)};
+    }
+    process.stdout.write(JSON.stringify(resp) + '\n');
+});
+rl.on('close', () => process.exit(0));
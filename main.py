@@ -16,6 +16,7 @@ import cmd_arg
 import config
 import db
 from base.base_crawler import AbstractCrawler
+from cache import response_cache, seen_set
 from media_platform.bilibili import BilibiliCrawler
 from media_platform.douyin import DouYinCrawler
 from media_platform.kuaishou import KuaishouCrawler
@@ -23,6 +24,9 @@ from media_platform.tieba import TieBaCrawler
 from media_platform.weibo import WeiboCrawler
 from media_platform.xhs import XiaoHongShuCrawler
 from media_platform.zhihu import ZhihuCrawler
+from proxy import proxy_ip_pool
+from store import crawl_journal, jsonl_store
+from tools import distributed, downloader, http_replay, metrics, sign_worker
 
 
 class CrawlerFactory:
@@ -52,11 +56,34 @@ async def main():
     if config.SAVE_DATA_OPTION == "db":
         await db.init_db()
 
-    crawler = CrawlerFactory.create_crawler(platform=config.PLATFORM)
-    await crawler.start()
+    await metrics.start_metrics()
 
-    if config.SAVE_DATA_OPTION == "db":
-        await db.close()
+    if config.DISTRIBUTED_ROLE == "coordinator":
+        await distributed.run_coordinator()
+    elif config.DISTRIBUTED_ROLE == "worker":
+        await distributed.run_worker(lambda: CrawlerFactory.create_crawler(platform=config.PLATFORM))
+    else:
+        crawler = CrawlerFactory.create_crawler(platform=config.PLATFORM)
+        await crawler.start()
+    await sign_worker.close_all()
+    await downloader.close_all()
+    await proxy_ip_pool.close_all()
+    await response_cache.close_response_cache()
+    http_replay.close_http_recorder()
+
+    # 先关闭存储, 落盘时记录等待落盘的爬取进度和去重集合, 之后再关闭它们
+    try:
+        if config.SAVE_DATA_OPTION == "db":
+            await db.close()
+
+        if config.SAVE_DATA_OPTION == "jsonl":
+            await jsonl_store.close_all(export_json=config.JSONL_EXPORT_JSON_ON_CLOSE)
+    finally:
+        crawl_journal.close_crawl_journal()
+        await seen_set.close_seen_set()
+
+    # 最后关闭, 汇总日志包含退出时落盘的存储写入
+    await metrics.close_metrics()
 
     
 
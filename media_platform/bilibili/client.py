@@ -46,12 +46,37 @@ class BilibiliClient(AbstractApiClient):
         self.playwright_page = playwright_page
         self.cookie_dict = cookie_dict
 
+    def classify_block(self, response: httpx.Response) -> Optional[str]:
+        """
+        B站风控拦截请求时返回 -412 错误码
+        :param response:
+        :return:
+        """
+        reason = super().classify_block(response)
+        if reason is None and "-412" in response.text:
+            try:
+                if response.json().get("code") == -412:
+                    return "request intercepted, code: -412"
+            except ValueError:
+                pass
+        return reason
+
+    def is_cacheable(self, response: httpx.Response) -> bool:
+        """
+        错误码不为 0 的响应(如 -412 风控、-404 视频不存在)不缓存
+        :param response:
+        :return:
+        """
+        try:
+            return response.json().get("code") == 0
+        except ValueError:
+            return False
+
     async def request(self, method, url, **kwargs) -> Any:
-        async with httpx.AsyncClient(proxies=self.proxies) as client:
-            response = await client.request(
-                method, url, timeout=self.timeout,
-                **kwargs
-            )
+        response = await self.send(
+            method, url, platform="bili", timeout=self.timeout,
+            **kwargs
+        )
         data: Dict = response.json()
         if data.get("code") != 0:
             raise DataFetchError(data.get("message", "unkonw error"))
@@ -192,13 +217,13 @@ class BilibiliClient(AbstractApiClient):
         return await self.get(uri, params, enable_params_sign=True)
 
     async def get_video_media(self, url: str) -> Union[bytes, None]:
-        async with httpx.AsyncClient(proxies=self.proxies) as client:
+        async with self.use_http_client(self.proxies) as client:
             response = await client.request("GET", url, timeout=self.timeout, headers=self.headers)
-            if not response.reason_phrase == "OK":
-                utils.logger.error(f"[BilibiliClient.get_video_media] request {url} err, res:{response.text}")
-                return None
-            else:
-                return response.content
+        if not response.reason_phrase == "OK":
+            utils.logger.error(f"[BilibiliClient.get_video_media] request {url} err, res:{response.text}")
+            return None
+        else:
+            return response.content
 
     async def get_video_comments(self,
                                  video_id: str,
@@ -221,42 +246,57 @@ class BilibiliClient(AbstractApiClient):
         }
         return await self.get(uri, post_data)
 
-    async def get_video_all_comments(self, video_id: str, crawl_interval: float = 1.0, is_fetch_sub_comments=False,
+    async def get_video_all_comments(self, video_id: str, is_fetch_sub_comments=False,
                                      callback: Optional[Callable] = None,
-                                     max_count: int = 10,):
+                                     max_count: int = 10,
+                                     start_cursor: int = 0,
+                                     cursor_callback: Optional[Callable] = None,
+                                     since_time: int = 0,
+                                     newest_time_callback: Optional[Callable] = None):
         """
         get video all comments include sub comments
         :param video_id:
-        :param crawl_interval:
         :param is_fetch_sub_comments:
         :param callback:
         max_count: 一次笔记爬取的最大评论数量
+        start_cursor: 开始翻页的游标, 用于从上次中断的位置继续
+        cursor_callback: 每处理完一页评论后回调下一页的游标
+        since_time: 只获取这个时间(秒)之后的评论, 此时按时间倒序翻页, 翻到更早的评论时停止
+        newest_time_callback: 每处理完一页评论后回调本页一级评论中最新一条的时间, 不包含二级评论
 
         :return:
         """
 
         result = []
         is_end = False
-        next_page = 0
+        next_page = start_cursor
         while not is_end and len(result) < max_count:
-            comments_res = await self.get_video_comments(video_id, CommentOrderType.DEFAULT, next_page)
+            order_mode = CommentOrderType.TIME if since_time else CommentOrderType.DEFAULT
+            comments_res = await self.get_video_comments(video_id, order_mode, next_page)
             cursor_info: Dict = comments_res.get("cursor")
             comment_list: List[Dict] = comments_res.get("replies", [])
             is_end = cursor_info.get("is_end")
             next_page = cursor_info.get("next")
+            if since_time:
+                if comment_list and comment_list[-1].get("ctime", 0) <= since_time:
+                    is_end = True
+                comment_list = [comment for comment in comment_list if comment.get("ctime", 0) > since_time]
             if is_fetch_sub_comments:
                 for comment in comment_list:
                     comment_id = comment['rpid']
                     if (comment.get("rcount", 0) > 0):
                         {
                             await self.get_video_all_level_two_comments(
-                                video_id, comment_id, CommentOrderType.DEFAULT, 10, crawl_interval,  callback)
+                                video_id, comment_id, CommentOrderType.DEFAULT, 10, callback)
                         }
             if len(result) + len(comment_list) > max_count:
                 comment_list = comment_list[:max_count - len(result)]
             if callback:  # 如果有回调函数，就执行回调函数
                 await callback(video_id, comment_list)
-            await asyncio.sleep(crawl_interval)
+            if newest_time_callback and comment_list:
+                newest_time_callback(max(comment.get("ctime", 0) for comment in comment_list))
+            if cursor_callback:
+                cursor_callback(next_page)
             if not is_fetch_sub_comments:
                 result.extend(comment_list)
                 continue
@@ -267,7 +307,6 @@ class BilibiliClient(AbstractApiClient):
                                                level_one_comment_id: int,
                                                order_mode: CommentOrderType,
                                                ps: int = 10,
-                                               crawl_interval: float = 1.0,
                                                callback: Optional[Callable] = None,
                                                ) -> Dict:
         """
@@ -276,7 +315,6 @@ class BilibiliClient(AbstractApiClient):
         :param level_one_comment_id: 一级评论 ID
         :param order_mode:
         :param ps: 一页评论数
-        :param crawl_interval:
         :param callback:
         :return:
         """
@@ -288,7 +326,6 @@ class BilibiliClient(AbstractApiClient):
             comment_list: List[Dict] = result.get("replies", [])
             if callback:  # 如果有回调函数，就执行回调函数
                 await callback(video_id, comment_list)
-            await asyncio.sleep(crawl_interval)
             if (int(result["page"]["count"]) <= pn * ps):
                 break
 
@@ -16,7 +16,6 @@
 
 import asyncio
 import os
-import random
 from asyncio import Task
 from typing import Dict, List, Optional, Tuple, Union
 from datetime import datetime, timedelta
@@ -26,13 +25,17 @@ from playwright.async_api import (BrowserContext, BrowserType, Page, async_playw
 
 import config
 from base.base_crawler import AbstractCrawler
+from cache.seen_set import is_seen, mark_seen
 from proxy.proxy_ip_pool import IpInfoModel, create_ip_pool
 from store import bilibili as bilibili_store
-from tools import utils
+from store import crawl_journal
+from tools import session_pool, utils
+from tools.downloader import get_media_downloader
+from tools.pipeline import CrawlerPipeline
 from var import crawler_type_var, source_keyword_var
 
 from .client import BilibiliClient
-from .exception import DataFetchError
+from .exception import DataFetchError, IPBlockError
 from .field import SearchOrderType
 from .login import BilibiliLogin
 
@@ -47,7 +50,7 @@ class BilibiliCrawler(AbstractCrawler):
         self.user_agent = utils.get_user_agent()
 
     async def start(self):
-        playwright_proxy_format, httpx_proxy_format = None, None
+        playwright_proxy_format, httpx_proxy_format, ip_proxy_pool = None, None, None
         if config.ENABLE_IP_PROXY:
             ip_proxy_pool = await create_ip_pool(config.IP_PROXY_POOL_COUNT, enable_validate_ip=True)
             ip_proxy_info: IpInfoModel = await ip_proxy_pool.get_proxy()
@@ -70,6 +73,9 @@ class BilibiliCrawler(AbstractCrawler):
 
             # Create a client to interact with the xiaohongshu website.
             self.bili_client = await self.create_bilibili_client(httpx_proxy_format)
+            if ip_proxy_pool:
+                # 请求被风控时从代理池换代理重试
+                self.bili_client.set_ip_proxy_pool(ip_proxy_pool, ip_proxy_info)
             if not await self.bili_client.pong():
                 login_obj = BilibiliLogin(
                     login_type=config.LOGIN_TYPE,
@@ -81,6 +87,12 @@ class BilibiliCrawler(AbstractCrawler):
                 await login_obj.begin()
                 await self.bili_client.update_cookies(browser_context=self.browser_context)
 
+            # 配置了多个账号时, 请求分发到各个账号的会话上
+            self.bili_client = await session_pool.create_session_pool_client(
+                "bili", self.bili_client, self.create_account_client,
+                retire_exceptions=(IPBlockError,), ip_proxy_pool=ip_proxy_pool,
+            )
+
             crawler_type_var.set(config.CRAWLER_TYPE)
             if config.CRAWLER_TYPE == "search":
                 # Search for video and retrieve their comment information.
@@ -93,6 +105,8 @@ class BilibiliCrawler(AbstractCrawler):
                     await self.get_creator_videos(int(creator_id))
             else:
                 pass
+            # 关闭 API 客户端复用的 http 连接
+            await self.bili_client.close()
             utils.logger.info(
                 "[BilibiliCrawler.start] Bilibili Crawler finished ...")
 
@@ -136,7 +150,13 @@ class BilibiliCrawler(AbstractCrawler):
         if config.CRAWLER_MAX_NOTES_COUNT < bili_limit_count:
             config.CRAWLER_MAX_NOTES_COUNT = bili_limit_count
         start_page = config.START_PAGE  # start page number
-        for keyword in config.KEYWORDS.split(","):
+        detail_semaphore = asyncio.Semaphore(config.PIPELINE_DETAIL_CONCURRENCY)
+        media_semaphore = asyncio.Semaphore(config.PIPELINE_MEDIA_CONCURRENCY)
+        comment_semaphore = asyncio.Semaphore(config.PIPELINE_COMMENT_CONCURRENCY)
+        pipeline = CrawlerPipeline("bilibili_search")
+        journal = crawl_journal.get_crawl_journal()
+
+        async def search_keyword(keyword: str):
             source_keyword_var.set(keyword)
             utils.logger.info(f"[BilibiliCrawler.search] Current search keyword: {keyword}")
             # 每个关键词最多返回 1000 条数据
@@ -147,9 +167,16 @@ class BilibiliCrawler(AbstractCrawler):
                         utils.logger.info(f"[BilibiliCrawler.search] Skip page: {page}")
                         page += 1
                         continue
+                    # 上次已经搜索过的页直接复用保存的视频列表
+                    video_list = journal.get_payload(crawl_journal.UNIT_SEARCH_PAGE, f"{keyword}:{page}")
+                    if video_list is not None:
+                        utils.logger.info(f"[BilibiliCrawler.search] Resume keyword: {keyword}, page: {page}")
+                        for video_item in video_list:
+                            await pipeline.put("detail", video_item)
+                        page += 1
+                        continue
 
                     utils.logger.info(f"[BilibiliCrawler.search] search bilibili keyword: {keyword}, page: {page}")
-                    video_id_list: List[str] = []
                     videos_res = await self.bili_client.search_video_by_keyword(
                         keyword=keyword,
                         page=page,
@@ -158,19 +185,12 @@ class BilibiliCrawler(AbstractCrawler):
                         pubtime_begin_s=0,  # 作品发布日期起始时间戳
                         pubtime_end_s=0  # 作品发布日期结束日期时间戳
                     )
-                    video_list: List[Dict] = videos_res.get("result")
-
-                    semaphore = asyncio.Semaphore(config.MAX_CONCURRENCY_NUM)
-                    task_list = [self.get_video_info_task(aid=video_item.get("aid"), bvid="", semaphore=semaphore) for video_item in video_list]
-                    video_items = await asyncio.gather(*task_list)
-                    for video_item in video_items:
-                        if video_item:
-                            video_id_list.append(video_item.get("View").get("aid"))
-                            await bilibili_store.update_bilibili_video(video_item)
-                            await bilibili_store.update_up_info(video_item)
-                            await self.get_bilibili_video(video_item, semaphore)
+                    video_list = [{"aid": video_item.get("aid")} for video_item in videos_res.get("result")]
+                    journal.mark_done(crawl_journal.UNIT_SEARCH_PAGE, f"{keyword}:{page}", video_list)
+                    # 视频交给详情阶段处理, 下游队列满时在这里等待
+                    for video_item in video_list:
+                        await pipeline.put("detail", video_item)
                     page += 1
-                    await self.batch_get_video_comments(video_id_list)
             # 按照 START_DAY 至 END_DAY 按照每一天进行筛选，这样能够突破 1000 条视频的限制，最大程度爬取该关键词下的所有视频
             else:
                 for day in pd.date_range(start=config.START_DAY, end=config.END_DAY, freq='D'):
@@ -185,9 +205,15 @@ class BilibiliCrawler(AbstractCrawler):
                             #     utils.logger.info(f"[BilibiliCrawler.search] Skip page: {page}")
                             #     page += 1
                             #     continue
+                            page_key = f"{keyword}:{day.strftime('%Y-%m-%d')}:{page}"
+                            video_list = journal.get_payload(crawl_journal.UNIT_SEARCH_PAGE, page_key)
+                            if video_list is not None:
+                                for video_item in video_list:
+                                    await pipeline.put("detail", video_item)
+                                page += 1
+                                continue
 
                             utils.logger.info(f"[BilibiliCrawler.search] search bilibili keyword: {keyword}, date: {day.ctime()}, page: {page}")
-                            video_id_list: List[str] = []
                             videos_res = await self.bili_client.search_video_by_keyword(
                                 keyword=keyword,
                                 page=page,
@@ -196,24 +222,52 @@ class BilibiliCrawler(AbstractCrawler):
                                 pubtime_begin_s=pubtime_begin_s,  # 作品发布日期起始时间戳
                                 pubtime_end_s=pubtime_end_s  # 作品发布日期结束日期时间戳
                             )
-                            video_list: List[Dict] = videos_res.get("result")
-
-                            semaphore = asyncio.Semaphore(config.MAX_CONCURRENCY_NUM)
-                            task_list = [self.get_video_info_task(aid=video_item.get("aid"), bvid="", semaphore=semaphore) for video_item in video_list]
-                            video_items = await asyncio.gather(*task_list)
-                            for video_item in video_items:
-                                if video_item:
-                                    video_id_list.append(video_item.get("View").get("aid"))
-                                    await bilibili_store.update_bilibili_video(video_item)
-                                    await bilibili_store.update_up_info(video_item)
-                                    await self.get_bilibili_video(video_item, semaphore)
+                            video_list = [{"aid": video_item.get("aid")} for video_item in videos_res.get("result")]
+                            journal.mark_done(crawl_journal.UNIT_SEARCH_PAGE, page_key, video_list)
+                            for video_item in video_list:
+                                await pipeline.put("detail", video_item)
                             page += 1
-                            await self.batch_get_video_comments(video_id_list)
                         # go to next day
                         except Exception as e:
                             print(e)
                             break
 
+        async def fetch_video_detail(video_item: Dict):
+            # 其他关键词或其他日期已经搜到过的视频不再重复爬取
+            if await is_seen("bili", video_item.get("aid")):
+                return
+            if journal.is_done(crawl_journal.UNIT_NOTE, video_item.get("aid")):
+                # 详情已经保存过, 只需要继续爬评论
+                await pipeline.put("comment", {"View": {"aid": video_item.get("aid")}})
+                return
+            video_detail = await self.get_video_info_task(aid=video_item.get("aid"), bvid="", semaphore=detail_semaphore)
+            if video_detail:
+                await pipeline.put("store", video_detail)
+
+        async def store_video(video_detail: Dict):
+            await bilibili_store.update_bilibili_video(video_detail)
+            await bilibili_store.update_up_info(video_detail)
+            journal.after_flush(journal.mark_done, crawl_journal.UNIT_NOTE, video_detail.get("View").get("aid"))
+            await mark_seen("bili", video_detail.get("View").get("aid"))
+            await pipeline.put("media", video_detail)
+            await pipeline.put("comment", video_detail)
+
+        async def fetch_video_media(video_detail: Dict):
+            await self.get_bilibili_video(video_detail, media_semaphore)
+
+        async def fetch_video_comments(video_detail: Dict):
+            if not config.ENABLE_GET_COMMENTS:
+                return
+            await self.get_comments(video_detail.get("View").get("aid"), comment_semaphore,
+                                    comment_count=video_detail.get("View").get("stat", {}).get("reply"))
+
+        pipeline.add_stage("search", search_keyword, config.PIPELINE_SEARCH_CONCURRENCY, config.PIPELINE_QUEUE_SIZE)
+        pipeline.add_stage("detail", fetch_video_detail, config.PIPELINE_DETAIL_CONCURRENCY, config.PIPELINE_QUEUE_SIZE)
+        pipeline.add_stage("store", store_video, config.PIPELINE_STORE_CONCURRENCY, config.PIPELINE_QUEUE_SIZE)
+        pipeline.add_stage("media", fetch_video_media, config.PIPELINE_MEDIA_CONCURRENCY, config.PIPELINE_QUEUE_SIZE)
+        pipeline.add_stage("comment", fetch_video_comments, config.PIPELINE_COMMENT_CONCURRENCY, config.PIPELINE_QUEUE_SIZE)
+        await pipeline.run("search", config.KEYWORDS.split(","))
+
     async def batch_get_video_comments(self, video_id_list: List[str]):
         """
         batch get video comments
@@ -226,7 +280,7 @@ class BilibiliCrawler(AbstractCrawler):
             return
 
         utils.logger.info(
-            f"[BilibiliCrawler.batch_get_video_comments] video ids:{video_id_list}")
+            "[BilibiliCrawler.batch_get_video_comments] video ids:%s", video_id_list)
         semaphore = asyncio.Semaphore(config.MAX_CONCURRENCY_NUM)
         task_list: List[Task] = []
         for video_id in video_id_list:
@@ -235,37 +289,65 @@ class BilibiliCrawler(AbstractCrawler):
             task_list.append(task)
         await asyncio.gather(*task_list)
 
-    async def get_comments(self, video_id: str, semaphore: asyncio.Semaphore):
+    async def get_comments(self, video_id: str, semaphore: asyncio.Semaphore, comment_count: Optional[int] = None):
         """
         get comment for video id
         :param video_id:
         :param semaphore:
+        :param comment_count: 视频当前的评论数, 增量模式下评论数没变时不再爬评论
         :return:
         """
+        journal = crawl_journal.get_crawl_journal()
+        if journal.is_done(crawl_journal.UNIT_COMMENTS, video_id):
+            return
+        if not journal.need_fetch_comments(video_id, comment_count):
+            utils.logger.info(f"[BilibiliCrawler.get_comments] Comment count of video {video_id} not changed, skip")
+            return
+        # 增量模式下只爬上次最新一条评论之后的评论
+        since_time = journal.get_comment_since_time(video_id)
+        newest_time = since_time
+
+        def update_newest_time(comment_time: int):
+            nonlocal newest_time
+            newest_time = max(newest_time, comment_time)
+
         async with semaphore:
             try:
                 utils.logger.info(
                     f"[BilibiliCrawler.get_comments] begin get video_id: {video_id} comments ...")
                 await self.bili_client.get_video_all_comments(
                     video_id=video_id,
-                    crawl_interval=random.random(),
                     is_fetch_sub_comments=config.ENABLE_GET_SUB_COMMENTS,
                     callback=bilibili_store.batch_update_bilibili_video_comments,
                     max_count=config.CRAWLER_MAX_COMMENTS_COUNT_SINGLENOTES,
+                    start_cursor=journal.get_cursor(crawl_journal.UNIT_COMMENTS, video_id, default=0),
+                    cursor_callback=lambda cursor: journal.after_flush(
+                        journal.save_cursor, crawl_journal.UNIT_COMMENTS, video_id, cursor
+                    ),
+                    since_time=since_time,
+                    newest_time_callback=update_newest_time,
                 )
+                journal.after_flush(journal.save_comment_state, video_id, comment_count, newest_time)
+                journal.after_flush(journal.mark_done, crawl_journal.UNIT_COMMENTS, video_id)
 
             except DataFetchError as ex:
                 utils.logger.error(
                     f"[BilibiliCrawler.get_comments] get video_id: {video_id} comment error: {ex}")
+                crawl_journal.report_task_error(ex)
             except Exception as e:
                 utils.logger.error(
                     f"[BilibiliCrawler.get_comments] may be been blocked, err:{e}")
+                crawl_journal.report_task_error(e)
 
     async def get_creator_videos(self, creator_id: int):
         """
         get videos for a creator
         :return:
         """
+        journal = crawl_journal.get_crawl_journal()
+        if journal.is_done(crawl_journal.UNIT_CREATOR, creator_id):
+            utils.logger.info(f"[BilibiliCrawler.get_creator_videos] Skip finished creator: {creator_id}")
+            return
         ps = 30
         pn = 1
         video_bvids_list = []
@@ -275,9 +357,9 @@ class BilibiliCrawler(AbstractCrawler):
                 video_bvids_list.append(video["bvid"])
             if (int(result["page"]["count"]) <= pn * ps):
                 break
-            await asyncio.sleep(random.random())
             pn += 1
         await self.get_specified_videos(video_bvids_list)
+        journal.after_flush(journal.mark_done, crawl_journal.UNIT_CREATOR, creator_id)
 
     async def get_specified_videos(self, bvids_list: List[str]):
         """
@@ -291,8 +373,10 @@ class BilibiliCrawler(AbstractCrawler):
         ]
         video_details = await asyncio.gather(*task_list)
         video_aids_list = []
-        for video_detail in video_details:
-            if video_detail is not None:
+        for bvid, video_detail in zip(bvids_list, video_details):
+            if video_detail is None:
+                crawl_journal.report_task_error("get video detail failed", bvid)
+            else:
                 video_item_view: Dict = video_detail.get("View")
                 video_aid: str = video_item_view.get("aid")
                 if video_aid:
@@ -317,10 +401,12 @@ class BilibiliCrawler(AbstractCrawler):
             except DataFetchError as ex:
                 utils.logger.error(
                     f"[BilibiliCrawler.get_video_info_task] Get video detail error: {ex}")
+                crawl_journal.report_task_error(ex)
                 return None
             except KeyError as ex:
                 utils.logger.error(
                     f"[BilibiliCrawler.get_video_info_task] have not fund note detail video_id:{bvid}, err: {ex}")
+                crawl_journal.report_task_error(ex)
                 return None
 
     async def get_video_play_url_task(self, aid: int, cid: int, semaphore: asyncio.Semaphore) -> Union[Dict, None]:
@@ -367,6 +453,16 @@ class BilibiliCrawler(AbstractCrawler):
         )
         return bilibili_client_obj
 
+    async def create_account_client(self, cookie_str: str, ip_proxy_info: Optional[IpInfoModel]) -> BilibiliClient:
+        """Create API client for an extra account of the session pool"""
+        httpx_proxy = self.format_proxy_info(ip_proxy_info)[1] if ip_proxy_info else None
+        return BilibiliClient(
+            proxies=httpx_proxy,
+            headers={**self.bili_client.headers, "Cookie": cookie_str},
+            playwright_page=self.context_page,
+            cookie_dict=utils.convert_str_cookie_to_dict(cookie_str),
+        )
+
     @staticmethod
     def format_proxy_info(ip_proxy_info: IpInfoModel) -> Tuple[Optional[Dict], Optional[Dict]]:
         """
@@ -453,9 +549,8 @@ class BilibiliCrawler(AbstractCrawler):
             utils.logger.info("[BilibiliCrawler.get_bilibili_video] get video url failed")
             return
 
-        content = await self.bili_client.get_video_media(video_url)
-        if content is None:
-            return
+        # 视频交给媒体下载器流式写入磁盘, 不在内存中保存整个视频, 也不等待下载完成
         extension_file_name = f"video.mp4"
-        await bilibili_store.store_video(aid, content, extension_file_name)
+        await get_media_downloader(self.bili_client.proxies).submit(
+            video_url, bilibili_store.get_bilibili_video_path(aid, extension_file_name), headers=self.bili_client.headers)
 
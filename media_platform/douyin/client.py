@@ -15,8 +15,9 @@ import json
 import urllib.parse
 from typing import Any, Callable, Dict, Optional
 
-import requests
+import httpx
 from playwright.async_api import BrowserContext
+from tenacity import retry, retry_if_exception_type, stop_after_attempt, wait_fixed
 
 from base.base_crawler import AbstractApiClient
 from tools import utils
@@ -91,12 +92,32 @@ class DOUYINClient(AbstractApiClient):
         a_bogus = await get_a_bogus(uri, query_string, post_data, headers["User-Agent"], self.playwright_page)
         params["a_bogus"] = a_bogus
 
+    def classify_block(self, response: httpx.Response) -> Optional[str]:
+        """
+        抖音被风控时返回空内容或 blocked
+        :param response:
+        :return:
+        """
+        if response.text == "" or response.text == "blocked":
+            return f"response text: {response.text!r}"
+        return super().classify_block(response)
+
+    def is_cacheable(self, response: httpx.Response) -> bool:
+        """
+        空内容、blocked 等不是 JSON 的响应不缓存
+        :param response:
+        :return:
+        """
+        try:
+            response.json()
+        except ValueError:
+            return False
+        return True
+
+    @retry(stop=stop_after_attempt(3), wait=wait_fixed(1),
+           retry=retry_if_exception_type(httpx.TransportError), reraise=True)
     async def request(self, method, url, **kwargs):
-        response = None
-        if method == "GET":
-            response = requests.request(method, url, **kwargs)
-        elif method == "POST":
-            response = requests.request(method, url, **kwargs)
+        response = await self.send(method, url, platform="dy", timeout=self.timeout, **kwargs)
         try:
             if response.text == "" or response.text == "blocked":
                 utils.logger.error(f"request params incrr, response.text: {response.text}")
@@ -227,23 +248,25 @@ class DOUYINClient(AbstractApiClient):
     async def get_aweme_all_comments(
             self,
             aweme_id: str,
-            crawl_interval: float = 1.0,
             is_fetch_sub_comments=False,
             callback: Optional[Callable] = None,
             max_count: int = 10,
+            start_cursor: int = 0,
+            cursor_callback: Optional[Callable] = None,
     ):
         """
         获取帖子的所有评论，包括子评论
         :param aweme_id: 帖子ID
-        :param crawl_interval: 抓取间隔
         :param is_fetch_sub_comments: 是否抓取子评论
         :param callback: 回调函数，用于处理抓取到的评论
         :param max_count: 一次帖子爬取的最大评论数量
+        :param start_cursor: 开始翻页的游标, 用于从上次中断的位置继续
+        :param cursor_callback: 每处理完一页评论后回调下一页的游标
         :return: 评论列表
         """
         result = []
         comments_has_more = 1
-        comments_cursor = 0
+        comments_cursor = start_cursor
         while comments_has_more and len(result) < max_count:
             comments_res = await self.get_aweme_comments(aweme_id, comments_cursor)
             comments_has_more = comments_res.get("has_more", 0)
@@ -257,8 +280,9 @@ class DOUYINClient(AbstractApiClient):
             if callback:  # 如果有回调函数，就执行回调函数
                 await callback(aweme_id, comments)
 
-            await asyncio.sleep(crawl_interval)
             if not is_fetch_sub_comments:
+                if cursor_callback:
+                    cursor_callback(comments_cursor)
                 continue
             # 获取二级评论
             for comment in comments:
@@ -280,7 +304,8 @@ class DOUYINClient(AbstractApiClient):
                         result.extend(sub_comments)
                         if callback:  # 如果有回调函数，就执行回调函数
                             await callback(aweme_id, sub_comments)
-                        await asyncio.sleep(crawl_interval)
+            if cursor_callback:
+                cursor_callback(comments_cursor)
         return result
 
     async def get_user_info(self, sec_user_id: str):
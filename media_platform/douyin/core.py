@@ -20,13 +20,16 @@ from playwright.async_api import (BrowserContext, BrowserType, Page,
 
 import config
 from base.base_crawler import AbstractCrawler
+from cache.seen_set import is_seen, mark_seen
 from proxy.proxy_ip_pool import IpInfoModel, create_ip_pool
+from store import crawl_journal
 from store import douyin as douyin_store
-from tools import utils
+from tools import session_pool, utils
+from tools.pipeline import CrawlerPipeline
 from var import crawler_type_var, source_keyword_var
 
 from .client import DOUYINClient
-from .exception import DataFetchError
+from .exception import DataFetchError, IPBlockError
 from .field import PublishTimeType
 from .login import DouYinLogin
 
@@ -40,7 +43,7 @@ class DouYinCrawler(AbstractCrawler):
         self.index_url = "https://www.douyin.com"
 
     async def start(self) -> None:
-        playwright_proxy_format, httpx_proxy_format = None, None
+        playwright_proxy_format, httpx_proxy_format, ip_proxy_pool = None, None, None
         if config.ENABLE_IP_PROXY:
             ip_proxy_pool = await create_ip_pool(config.IP_PROXY_POOL_COUNT, enable_validate_ip=True)
             ip_proxy_info: IpInfoModel = await ip_proxy_pool.get_proxy()
@@ -61,6 +64,12 @@ class DouYinCrawler(AbstractCrawler):
             await self.context_page.goto(self.index_url)
 
             self.dy_client = await self.create_douyin_client(httpx_proxy_format)
+
+            if ip_proxy_pool:
+
+                # 请求被风控时从代理池换代理重试
+
+                self.dy_client.set_ip_proxy_pool(ip_proxy_pool, ip_proxy_info)
             if not await self.dy_client.pong(browser_context=self.browser_context):
                 login_obj = DouYinLogin(
                     login_type=config.LOGIN_TYPE,
@@ -71,6 +80,12 @@ class DouYinCrawler(AbstractCrawler):
                 )
                 await login_obj.begin()
                 await self.dy_client.update_cookies(browser_context=self.browser_context)
+            # 配置了多个账号时, 请求分发到各个账号的会话上
+            self.dy_client = await session_pool.create_session_pool_client(
+                "dy", self.dy_client, self.create_account_client,
+                retire_exceptions=(IPBlockError,), ip_proxy_pool=ip_proxy_pool,
+            )
+
             crawler_type_var.set(config.CRAWLER_TYPE)
             if config.CRAWLER_TYPE == "search":
                 # Search for notes and retrieve their comment information.
@@ -85,6 +100,8 @@ class DouYinCrawler(AbstractCrawler):
                 # 搜索用户并获取用户信息
                 await self.search_users()
 
+            # 关闭 API 客户端复用的 http 连接
+            await self.dy_client.close()
             utils.logger.info("[DouYinCrawler.start] Douyin Crawler finished ...")
 
     async def search(self) -> None:
@@ -93,10 +110,13 @@ class DouYinCrawler(AbstractCrawler):
         if config.CRAWLER_MAX_NOTES_COUNT < dy_limit_count:
             config.CRAWLER_MAX_NOTES_COUNT = dy_limit_count
         start_page = config.START_PAGE  # start page number
-        for keyword in config.KEYWORDS.split(","):
+        comment_semaphore = asyncio.Semaphore(config.PIPELINE_COMMENT_CONCURRENCY)
+        pipeline = CrawlerPipeline("douyin_search")
+        journal = crawl_journal.get_crawl_journal()
+
+        async def search_keyword(keyword: str):
             source_keyword_var.set(keyword)
             utils.logger.info(f"[DouYinCrawler.search] Current keyword: {keyword}")
-            aweme_list: List[str] = []
             page = 0
             dy_search_id = ""
             while (page - start_page + 1) * dy_limit_count <= config.CRAWLER_MAX_NOTES_COUNT:
@@ -104,6 +124,14 @@ class DouYinCrawler(AbstractCrawler):
                     utils.logger.info(f"[DouYinCrawler.search] Skip {page}")
                     page += 1
                     continue
+                # 上次已经搜索过的页直接复用保存的视频列表
+                aweme_list = journal.get_payload(crawl_journal.UNIT_SEARCH_PAGE, f"{keyword}:{page}")
+                if aweme_list is not None:
+                    utils.logger.info(f"[DouYinCrawler.search] Resume keyword: {keyword}, page: {page}")
+                    for aweme_info in aweme_list:
+                        await pipeline.put("store", aweme_info)
+                    page += 1
+                    continue
                 try:
                     utils.logger.info(f"[DouYinCrawler.search] search douyin keyword: {keyword}, page: {page}")
                     posts_res = await self.dy_client.search_info_by_keyword(keyword=keyword,
@@ -111,26 +139,52 @@ class DouYinCrawler(AbstractCrawler):
                                                                             publish_time=PublishTimeType(config.PUBLISH_TIME_TYPE),
                                                                             search_id=dy_search_id
                                                                             )
-                except DataFetchError:
+                except DataFetchError as e:
                     utils.logger.error(f"[DouYinCrawler.search] search douyin keyword: {keyword} failed")
+                    crawl_journal.report_task_error(e, keyword)
                     break
 
                 page += 1
                 if "data" not in posts_res:
                     utils.logger.error(
                         f"[DouYinCrawler.search] search douyin keyword: {keyword} failed，账号也许被风控了。")
+                    crawl_journal.report_task_error("search result has no data", keyword)
                     break
                 dy_search_id = posts_res.get("extra", {}).get("logid", "")
+                aweme_list: List[Dict] = []
                 for post_item in posts_res.get("data"):
                     try:
                         aweme_info: Dict = post_item.get("aweme_info") or \
                                            post_item.get("aweme_mix_info", {}).get("mix_items")[0]
                     except TypeError:
                         continue
-                    aweme_list.append(aweme_info.get("aweme_id", ""))
-                    await douyin_store.update_douyin_aweme(aweme_item=aweme_info)
-            utils.logger.info(f"[DouYinCrawler.search] keyword:{keyword}, aweme_list:{aweme_list}")
-            await self.batch_get_note_comments(aweme_list)
+                    aweme_list.append(aweme_info)
+                journal.mark_done(crawl_journal.UNIT_SEARCH_PAGE, f"{keyword}:{page - 1}", aweme_list)
+                # 搜索结果已包含完整的视频信息, 直接交给存储阶段, 下游队列满时在这里等待
+                for aweme_info in aweme_list:
+                    await pipeline.put("store", aweme_info)
+
+        async def store_aweme(aweme_info: Dict):
+            aweme_id = aweme_info.get("aweme_id", "")
+            # 其他关键词已经搜到过的视频不再重复爬取
+            if await is_seen("dy", aweme_id):
+                return
+            if not journal.is_done(crawl_journal.UNIT_NOTE, aweme_id):
+                await douyin_store.update_douyin_aweme(aweme_item=aweme_info)
+                journal.after_flush(journal.mark_done, crawl_journal.UNIT_NOTE, aweme_id)
+            await mark_seen("dy", aweme_id)
+            await pipeline.put("comment", aweme_info)
+
+        async def fetch_aweme_comments(aweme_info: Dict):
+            if not config.ENABLE_GET_COMMENTS:
+                return
+            await self.get_comments(aweme_info.get("aweme_id", ""), comment_semaphore,
+                                    comment_count=aweme_info.get("statistics", {}).get("comment_count"))
+
+        pipeline.add_stage("search", search_keyword, config.PIPELINE_SEARCH_CONCURRENCY, config.PIPELINE_QUEUE_SIZE)
+        pipeline.add_stage("store", store_aweme, config.PIPELINE_STORE_CONCURRENCY, config.PIPELINE_QUEUE_SIZE)
+        pipeline.add_stage("comment", fetch_aweme_comments, config.PIPELINE_COMMENT_CONCURRENCY, config.PIPELINE_QUEUE_SIZE)
+        await pipeline.run("search", config.KEYWORDS.split(","))
 
     async def get_specified_awemes(self):
         """Get the information and comments of the specified post"""
@@ -139,9 +193,11 @@ class DouYinCrawler(AbstractCrawler):
             self.get_aweme_detail(aweme_id=aweme_id, semaphore=semaphore) for aweme_id in config.DY_SPECIFIED_ID_LIST
         ]
         aweme_details = await asyncio.gather(*task_list)
-        for aweme_detail in aweme_details:
-            if aweme_detail is not None:
-                await douyin_store.update_douyin_aweme(aweme_detail)
+        for aweme_id, aweme_detail in zip(config.DY_SPECIFIED_ID_LIST, aweme_details):
+            if aweme_detail is None:
+                crawl_journal.report_task_error("get aweme detail failed", aweme_id)
+                continue
+            await douyin_store.update_douyin_aweme(aweme_detail)
         await self.batch_get_note_comments(config.DY_SPECIFIED_ID_LIST)
 
     async def get_aweme_detail(self, aweme_id: str, semaphore: asyncio.Semaphore) -> Any:
@@ -151,10 +207,12 @@ class DouYinCrawler(AbstractCrawler):
                 return await self.dy_client.get_video_by_id(aweme_id)
             except DataFetchError as ex:
                 utils.logger.error(f"[DouYinCrawler.get_aweme_detail] Get aweme detail error: {ex}")
+                crawl_journal.report_task_error(ex)
                 return None
             except KeyError as ex:
                 utils.logger.error(
                     f"[DouYinCrawler.get_aweme_detail] have not fund note detail aweme_id:{aweme_id}, err: {ex}")
+                crawl_journal.report_task_error(ex)
                 return None
 
     async def batch_get_note_comments(self, aweme_list: List[str]) -> None:
@@ -174,28 +232,46 @@ class DouYinCrawler(AbstractCrawler):
         if len(task_list) > 0:
             await asyncio.wait(task_list)
 
-    async def get_comments(self, aweme_id: str, semaphore: asyncio.Semaphore) -> None:
+    async def get_comments(self, aweme_id: str, semaphore: asyncio.Semaphore,
+                           comment_count: Optional[int] = None) -> None:
+        journal = crawl_journal.get_crawl_journal()
+        if journal.is_done(crawl_journal.UNIT_COMMENTS, aweme_id):
+            return
+        if not journal.need_fetch_comments(aweme_id, comment_count):
+            utils.logger.info(f"[DouYinCrawler.get_comments] Comment count of aweme {aweme_id} not changed, skip")
+            return
         async with semaphore:
             try:
                 # 将关键词列表传递给 get_aweme_all_comments 方法
                 await self.dy_client.get_aweme_all_comments(
                     aweme_id=aweme_id,
-                    crawl_interval=random.random(),
                     is_fetch_sub_comments=config.ENABLE_GET_SUB_COMMENTS,
                     callback=douyin_store.batch_update_dy_aweme_comments,
-                    max_count=config.CRAWLER_MAX_COMMENTS_COUNT_SINGLENOTES
+                    max_count=config.CRAWLER_MAX_COMMENTS_COUNT_SINGLENOTES,
+                    start_cursor=journal.get_cursor(crawl_journal.UNIT_COMMENTS, aweme_id, default=0),
+                    cursor_callback=lambda cursor: journal.after_flush(
+                        journal.save_cursor, crawl_journal.UNIT_COMMENTS, aweme_id, cursor
+                    ),
                 )
+                # 抖音评论按热度排序, 不能翻到旧评论就停止, 只记录评论数
+                journal.after_flush(journal.save_comment_state, aweme_id, comment_count, 0)
+                journal.after_flush(journal.mark_done, crawl_journal.UNIT_COMMENTS, aweme_id)
                 utils.logger.info(
                     f"[DouYinCrawler.get_comments] aweme_id: {aweme_id} comments have all been obtained and filtered ...")
             except DataFetchError as e:
                 utils.logger.error(f"[DouYinCrawler.get_comments] aweme_id: {aweme_id} get comments failed, error: {e}")
+                crawl_journal.report_task_error(e)
 
     async def get_creators_and_videos(self) -> None:
         """
         Get the information and videos of the specified creator
         """
         utils.logger.info("[DouYinCrawler.get_creators_and_videos] Begin get douyin creators")
+        journal = crawl_journal.get_crawl_journal()
         for user_id in config.DY_CREATOR_ID_LIST:
+            if journal.is_done(crawl_journal.UNIT_CREATOR, user_id):
+                utils.logger.info(f"[DouYinCrawler.get_creators_and_videos] Skip finished creator: {user_id}")
+                continue
             creator_info: Dict = await self.dy_client.get_user_info(user_id)
             if creator_info:
                 await douyin_store.save_creator(user_id, creator=creator_info)
@@ -208,6 +284,7 @@ class DouYinCrawler(AbstractCrawler):
 
             video_ids = [video_item.get("aweme_id") for video_item in all_video_list]
             await self.batch_get_note_comments(video_ids)
+            journal.after_flush(journal.mark_done, crawl_journal.UNIT_CREATOR, user_id)
 
     async def fetch_creator_video_detail(self, video_list: List[Dict]):
         """
@@ -254,6 +331,16 @@ class DouYinCrawler(AbstractCrawler):
         )
         return douyin_client
 
+    async def create_account_client(self, cookie_str: str, ip_proxy_info: Optional[IpInfoModel]) -> DOUYINClient:
+        """Create API client for an extra account of the session pool"""
+        httpx_proxy = self.format_proxy_info(ip_proxy_info)[1] if ip_proxy_info else None
+        return DOUYINClient(
+            proxies=httpx_proxy,
+            headers={**self.dy_client.headers, "Cookie": cookie_str},
+            playwright_page=self.context_page,
+            cookie_dict=utils.convert_str_cookie_to_dict(cookie_str),
+        )
+
     async def launch_browser(
             self,
             chromium: BrowserType,
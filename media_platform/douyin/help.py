@@ -20,7 +20,10 @@ import random
 import execjs
 from playwright.async_api import Page
 
-douyin_sign_obj = execjs.compile(open('libs/douyin.js', encoding='utf-8-sig').read())
+from tools import sign_worker
+
+DOUYIN_SIGN_JS_PATH = "libs/douyin.js"
+douyin_sign_obj = execjs.compile(open(DOUYIN_SIGN_JS_PATH, encoding='utf-8-sig').read())
 
 def get_web_id():
     """
@@ -48,11 +51,28 @@ async def get_a_bogus(url: str, params: str, post_data: dict, user_agent: str, p
     """
     获取 a_bogus 参数, 目前不支持post请求类型的签名
     """
-    return get_a_bogus_from_js(url, params, user_agent)
+    return await get_a_bogus_from_sign_worker(url, params, user_agent)
+
+
+async def get_a_bogus_from_sign_worker(url: str, params: str, user_agent: str):
+    """
+    通过常驻 node 签名进程获取 a_bogus 参数, douyin.js 只在进程启动时加载一次
+    Args:
+        url:
+        params:
+        user_agent:
+
+    Returns:
+
+    """
+    sign_js_name = "sign_datail"
+    if "/reply" in url:
+        sign_js_name = "sign_reply"
+    return await sign_worker.get_sign_pool(DOUYIN_SIGN_JS_PATH).call(sign_js_name, params, user_agent)
 
 def get_a_bogus_from_js(url: str, params: str, user_agent: str):
     """
-    通过js获取 a_bogus 参数
+    通过execjs获取 a_bogus 参数, 每次调用都会启动一个新的 node 进程
     Args:
         url:
         params:
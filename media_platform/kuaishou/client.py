@@ -44,9 +44,19 @@ class KuaiShouClient(AbstractApiClient):
         self.cookie_dict = cookie_dict
         self.graphql = KuaiShouGraphQL()
 
+    def is_cacheable(self, response: httpx.Response) -> bool:
+        """
+        返回 errors 的 graphql 响应不缓存
+        :param response:
+        :return:
+        """
+        try:
+            return not response.json().get("errors")
+        except ValueError:
+            return False
+
     async def request(self, method, url, **kwargs) -> Any:
-        async with httpx.AsyncClient(proxies=self.proxies) as client:
-            response = await client.request(method, url, timeout=self.timeout, **kwargs)
+        response = await self.send(method, url, platform="ks", timeout=self.timeout, **kwargs)
         data: Dict = response.json()
         if data.get("errors"):
             raise DataFetchError(data.get("errors", "unkonw error"))
@@ -180,21 +190,23 @@ class KuaiShouClient(AbstractApiClient):
     async def get_video_all_comments(
         self,
         photo_id: str,
-        crawl_interval: float = 1.0,
         callback: Optional[Callable] = None,
         max_count: int = 10,
+        start_cursor: str = "",
+        cursor_callback: Optional[Callable] = None,
     ):
         """
         get video all comments include sub comments
         :param photo_id:
-        :param crawl_interval:
         :param callback:
         :param max_count:
+        :param start_cursor: 开始翻页的游标, 用于从上次中断的位置继续
+        :param cursor_callback: 每处理完一页评论后回调下一页的游标
         :return:
         """
 
         result = []
-        pcursor = ""
+        pcursor = start_cursor
 
         while pcursor != "no_more" and len(result) < max_count:
             comments_res = await self.get_video_comments(photo_id, pcursor)
@@ -206,18 +218,18 @@ class KuaiShouClient(AbstractApiClient):
             if callback:  # 如果有回调函数，就执行回调函数
                 await callback(photo_id, comments)
             result.extend(comments)
-            await asyncio.sleep(crawl_interval)
             sub_comments = await self.get_comments_all_sub_comments(
-                comments, photo_id, crawl_interval, callback
+                comments, photo_id, callback
             )
             result.extend(sub_comments)
+            if cursor_callback:
+                cursor_callback(pcursor)
         return result
 
     async def get_comments_all_sub_comments(
         self,
         comments: List[Dict],
         photo_id,
-        crawl_interval: float = 1.0,
         callback: Optional[Callable] = None,
     ) -> List[Dict]:
         """
@@ -225,7 +237,6 @@ class KuaiShouClient(AbstractApiClient):
         Args:
             comments: 评论列表
             photo_id: 视频id
-            crawl_interval: 爬取一次评论的延迟单位（秒）
             callback: 一次评论爬取结束后
         Returns:
 
@@ -259,7 +270,6 @@ class KuaiShouClient(AbstractApiClient):
                 comments = vision_sub_comment_list.get("subComments", {})
                 if callback:
                     await callback(photo_id, comments)
-                await asyncio.sleep(crawl_interval)
                 result.extend(comments)
         return result
 
@@ -275,14 +285,12 @@ class KuaiShouClient(AbstractApiClient):
     async def get_all_videos_by_creator(
         self,
         user_id: str,
-        crawl_interval: float = 1.0,
         callback: Optional[Callable] = None,
     ) -> List[Dict]:
         """
         获取指定用户下的所有发过的帖子，该方法会一直查找一个用户下的所有帖子信息
         Args:
             user_id: 用户ID
-            crawl_interval: 爬取一次的延迟单位（秒）
             callback: 一次分页爬取结束后的更新回调函数
         Returns:
 
@@ -308,6 +316,5 @@ class KuaiShouClient(AbstractApiClient):
 
             if callback:
                 await callback(videos)
-            await asyncio.sleep(crawl_interval)
             result.extend(videos)
         return result
@@ -11,8 +11,6 @@
 
 import asyncio
 import os
-import random
-import time
 from asyncio import Task
 from typing import Dict, List, Optional, Tuple
 
@@ -20,13 +18,16 @@ from playwright.async_api import BrowserContext, BrowserType, Page, async_playwr
 
 import config
 from base.base_crawler import AbstractCrawler
+from cache.seen_set import is_seen, mark_seen
 from proxy.proxy_ip_pool import IpInfoModel, create_ip_pool
+from store import crawl_journal
 from store import kuaishou as kuaishou_store
-from tools import utils
+from tools import rate_limiter, session_pool, utils
+from tools.pipeline import CrawlerPipeline
 from var import comment_tasks_var, crawler_type_var, source_keyword_var
 
 from .client import KuaiShouClient
-from .exception import DataFetchError
+from .exception import DataFetchError, IPBlockError
 from .login import KuaishouLogin
 
 
@@ -40,7 +41,7 @@ class KuaishouCrawler(AbstractCrawler):
         self.user_agent = utils.get_user_agent()
 
     async def start(self):
-        playwright_proxy_format, httpx_proxy_format = None, None
+        playwright_proxy_format, httpx_proxy_format, ip_proxy_pool = None, None, None
         if config.ENABLE_IP_PROXY:
             ip_proxy_pool = await create_ip_pool(
                 config.IP_PROXY_POOL_COUNT, enable_validate_ip=True
@@ -63,6 +64,9 @@ class KuaishouCrawler(AbstractCrawler):
 
             # Create a client to interact with the kuaishou website.
             self.ks_client = await self.create_ks_client(httpx_proxy_format)
+            if ip_proxy_pool:
+                # 请求被风控时从代理池换代理重试
+                self.ks_client.set_ip_proxy_pool(ip_proxy_pool, ip_proxy_info)
             if not await self.ks_client.pong():
                 login_obj = KuaishouLogin(
                     login_type=config.LOGIN_TYPE,
@@ -76,6 +80,12 @@ class KuaishouCrawler(AbstractCrawler):
                     browser_context=self.browser_context
                 )
 
+            # 配置了多个账号时, 请求分发到各个账号的会话上
+            self.ks_client = await session_pool.create_session_pool_client(
+                "ks", self.ks_client, self.create_account_client,
+                retire_exceptions=(IPBlockError,), ip_proxy_pool=ip_proxy_pool,
+            )
+
             crawler_type_var.set(config.CRAWLER_TYPE)
             if config.CRAWLER_TYPE == "search":
                 # Search for videos and retrieve their comment information.
@@ -89,6 +99,8 @@ class KuaishouCrawler(AbstractCrawler):
             else:
                 pass
 
+            # 关闭 API 客户端复用的 http 连接
+            await self.ks_client.close()
             utils.logger.info("[KuaishouCrawler.start] Kuaishou Crawler finished ...")
 
     async def search(self):
@@ -97,7 +109,11 @@ class KuaishouCrawler(AbstractCrawler):
         if config.CRAWLER_MAX_NOTES_COUNT < ks_limit_count:
             config.CRAWLER_MAX_NOTES_COUNT = ks_limit_count
         start_page = config.START_PAGE
-        for keyword in config.KEYWORDS.split(","):
+        comment_semaphore = asyncio.Semaphore(config.PIPELINE_COMMENT_CONCURRENCY)
+        pipeline = CrawlerPipeline("kuaishou_search")
+        journal = crawl_journal.get_crawl_journal()
+
+        async def search_keyword(keyword: str):
             search_session_id = ""
             source_keyword_var.set(keyword)
             utils.logger.info(
@@ -111,10 +127,17 @@ class KuaishouCrawler(AbstractCrawler):
                     utils.logger.info(f"[KuaishouCrawler.search] Skip page: {page}")
                     page += 1
                     continue
+                # 上次已经搜索过的页直接复用保存的视频列表
+                feeds = journal.get_payload(crawl_journal.UNIT_SEARCH_PAGE, f"{keyword}:{page}")
+                if feeds is not None:
+                    utils.logger.info(f"[KuaishouCrawler.search] Resume keyword: {keyword}, page: {page}")
+                    for video_detail in feeds:
+                        await pipeline.put("store", video_detail)
+                    page += 1
+                    continue
                 utils.logger.info(
                     f"[KuaishouCrawler.search] search kuaishou keyword: {keyword}, page: {page}"
                 )
-                video_id_list: List[str] = []
                 videos_res = await self.ks_client.search_info_by_keyword(
                     keyword=keyword,
                     pcursor=str(page),
@@ -133,13 +156,33 @@ class KuaishouCrawler(AbstractCrawler):
                     )
                     continue
                 search_session_id = vision_search_photo.get("searchSessionId", "")
-                for video_detail in vision_search_photo.get("feeds"):
-                    video_id_list.append(video_detail.get("photo", {}).get("id"))
-                    await kuaishou_store.update_kuaishou_video(video_item=video_detail)
-
-                # batch fetch video comments
+                feeds = vision_search_photo.get("feeds")
+                journal.mark_done(crawl_journal.UNIT_SEARCH_PAGE, f"{keyword}:{page}", feeds)
+                # 搜索结果已包含完整的视频信息, 直接交给存储阶段, 下游队列满时在这里等待
+                for video_detail in feeds:
+                    await pipeline.put("store", video_detail)
                 page += 1
-                await self.batch_get_video_comments(video_id_list)
+
+        async def store_video(video_detail: Dict):
+            video_id = video_detail.get("photo", {}).get("id")
+            # 其他关键词已经搜到过的视频不再重复爬取
+            if await is_seen("ks", video_id):
+                return
+            if not journal.is_done(crawl_journal.UNIT_NOTE, video_id):
+                await kuaishou_store.update_kuaishou_video(video_item=video_detail)
+                journal.after_flush(journal.mark_done, crawl_journal.UNIT_NOTE, video_id)
+            await mark_seen("ks", video_id)
+            await pipeline.put("comment", video_id)
+
+        async def fetch_video_comments(video_id: str):
+            if not config.ENABLE_GET_COMMENTS:
+                return
+            await self.get_comments(video_id, comment_semaphore)
+
+        pipeline.add_stage("search", search_keyword, config.PIPELINE_SEARCH_CONCURRENCY, config.PIPELINE_QUEUE_SIZE)
+        pipeline.add_stage("store", store_video, config.PIPELINE_STORE_CONCURRENCY, config.PIPELINE_QUEUE_SIZE)
+        pipeline.add_stage("comment", fetch_video_comments, config.PIPELINE_COMMENT_CONCURRENCY, config.PIPELINE_QUEUE_SIZE)
+        await pipeline.run("search", config.KEYWORDS.split(","))
 
     async def get_specified_videos(self):
         """Get the information and comments of the specified post"""
@@ -149,9 +192,11 @@ class KuaishouCrawler(AbstractCrawler):
             for video_id in config.KS_SPECIFIED_ID_LIST
         ]
         video_details = await asyncio.gather(*task_list)
-        for video_detail in video_details:
-            if video_detail is not None:
-                await kuaishou_store.update_kuaishou_video(video_detail)
+        for video_id, video_detail in zip(config.KS_SPECIFIED_ID_LIST, video_details):
+            if video_detail is None:
+                crawl_journal.report_task_error("get video detail failed", video_id)
+                continue
+            await kuaishou_store.update_kuaishou_video(video_detail)
         await self.batch_get_video_comments(config.KS_SPECIFIED_ID_LIST)
 
     async def get_video_info_task(
@@ -162,18 +207,20 @@ class KuaishouCrawler(AbstractCrawler):
             try:
                 result = await self.ks_client.get_video_info(video_id)
                 utils.logger.info(
-                    f"[KuaishouCrawler.get_video_info_task] Get video_id:{video_id} info result: {result} ..."
+                    "[KuaishouCrawler.get_video_info_task] Get video_id:%s info result: %s ...", video_id, result
                 )
                 return result.get("visionVideoDetail")
             except DataFetchError as ex:
                 utils.logger.error(
                     f"[KuaishouCrawler.get_video_info_task] Get video detail error: {ex}"
                 )
+                crawl_journal.report_task_error(ex)
                 return None
             except KeyError as ex:
                 utils.logger.error(
                     f"[KuaishouCrawler.get_video_info_task] have not fund video detail video_id:{video_id}, err: {ex}"
                 )
+                crawl_journal.report_task_error(ex)
                 return None
 
     async def batch_get_video_comments(self, video_id_list: List[str]):
@@ -189,7 +236,7 @@ class KuaishouCrawler(AbstractCrawler):
             return
 
         utils.logger.info(
-            f"[KuaishouCrawler.batch_get_video_comments] video ids:{video_id_list}"
+            "[KuaishouCrawler.batch_get_video_comments] video ids:%s", video_id_list
         )
         semaphore = asyncio.Semaphore(config.MAX_CONCURRENCY_NUM)
         task_list: List[Task] = []
@@ -209,6 +256,9 @@ class KuaishouCrawler(AbstractCrawler):
         :param semaphore:
         :return:
         """
+        journal = crawl_journal.get_crawl_journal()
+        if journal.is_done(crawl_journal.UNIT_COMMENTS, video_id):
+            return
         async with semaphore:
             try:
                 utils.logger.info(
@@ -216,24 +266,31 @@ class KuaishouCrawler(AbstractCrawler):
                 )
                 await self.ks_client.get_video_all_comments(
                     photo_id=video_id,
-                    crawl_interval=random.random(),
                     callback=kuaishou_store.batch_update_ks_video_comments,
                     max_count=config.CRAWLER_MAX_COMMENTS_COUNT_SINGLENOTES,
+                    start_cursor=journal.get_cursor(crawl_journal.UNIT_COMMENTS, video_id, default=""),
+                    cursor_callback=lambda cursor: journal.after_flush(
+                        journal.save_cursor, crawl_journal.UNIT_COMMENTS, video_id, cursor
+                    ),
                 )
+                journal.after_flush(journal.mark_done, crawl_journal.UNIT_COMMENTS, video_id)
             except DataFetchError as ex:
                 utils.logger.error(
                     f"[KuaishouCrawler.get_comments] get video_id: {video_id} comment error: {ex}"
                 )
+                crawl_journal.report_task_error(ex)
             except Exception as e:
                 utils.logger.error(
                     f"[KuaishouCrawler.get_comments] may be been blocked, err:{e}"
                 )
-                # use time.sleeep block main coroutine instead of asyncio.sleep and cacel running comment task
-                # maybe kuaishou block our request, we will take a nap and update the cookie again
+                crawl_journal.report_task_error(e)
+                # maybe kuaishou block our request, cancel running comment task,
+                # pause all kuaishou requests for a while and update the cookie again
                 current_running_tasks = comment_tasks_var.get()
                 for task in current_running_tasks:
                     task.cancel()
-                time.sleep(20)
+                rate_limiter.get_rate_limiter("ks").pause(20)
+                await asyncio.sleep(20)
                 await self.context_page.goto(f"{self.index_url}?isHome=1")
                 await self.ks_client.update_cookies(
                     browser_context=self.browser_context
@@ -276,6 +333,16 @@ class KuaishouCrawler(AbstractCrawler):
         )
         return ks_client_obj
 
+    async def create_account_client(self, cookie_str: str, ip_proxy_info: Optional[IpInfoModel]) -> KuaiShouClient:
+        """Create API client for an extra account of the session pool"""
+        httpx_proxy = self.format_proxy_info(ip_proxy_info)[1] if ip_proxy_info else None
+        return KuaiShouClient(
+            proxies=httpx_proxy,
+            headers={**self.ks_client.headers, "Cookie": cookie_str},
+            playwright_page=self.context_page,
+            cookie_dict=utils.convert_str_cookie_to_dict(cookie_str),
+        )
+
     async def launch_browser(
         self,
         chromium: BrowserType,
@@ -312,7 +379,13 @@ class KuaishouCrawler(AbstractCrawler):
         utils.logger.info(
             "[KuaiShouCrawler.get_creators_and_videos] Begin get kuaishou creators"
         )
+        journal = crawl_journal.get_crawl_journal()
         for user_id in config.KS_CREATOR_ID_LIST:
+            if journal.is_done(crawl_journal.UNIT_CREATOR, user_id):
+                utils.logger.info(
+                    f"[KuaiShouCrawler.get_creators_and_videos] Skip finished creator: {user_id}"
+                )
+                continue
             # get creator detail info from web html content
             createor_info: Dict = await self.ks_client.get_creator_info(user_id=user_id)
             if createor_info:
@@ -321,7 +394,6 @@ class KuaishouCrawler(AbstractCrawler):
             # Get all video information of the creator
             all_video_list = await self.ks_client.get_all_videos_by_creator(
                 user_id=user_id,
-                crawl_interval=random.random(),
                 callback=self.fetch_creator_video_detail,
             )
 
@@ -329,6 +401,7 @@ class KuaishouCrawler(AbstractCrawler):
                 video_item.get("photo", {}).get("id") for video_item in all_video_list
             ]
             await self.batch_get_video_comments(video_ids)
+            journal.after_flush(journal.mark_done, crawl_journal.UNIT_CREATOR, user_id)
 
     async def fetch_creator_video_detail(self, video_list: List[Dict]):
         """
@@ -341,9 +414,11 @@ class KuaishouCrawler(AbstractCrawler):
         ]
 
         video_details = await asyncio.gather(*task_list)
-        for video_detail in video_details:
-            if video_detail is not None:
-                await kuaishou_store.update_kuaishou_video(video_detail)
+        for video_id, video_detail in zip(config.KS_SPECIFIED_ID_LIST, video_details):
+            if video_detail is None:
+                crawl_journal.report_task_error("get video detail failed", video_id)
+                continue
+            await kuaishou_store.update_kuaishou_video(video_detail)
 
     async def close(self):
         """Close browser context"""
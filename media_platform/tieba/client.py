@@ -35,7 +35,7 @@ class BaiduTieBaClient(AbstractApiClient):
             ip_pool=None,
             default_ip_proxy=None,
     ):
-        self.ip_pool: Optional[ProxyIpPool] = ip_pool
+        self.ip_proxy_pool: Optional[ProxyIpPool] = ip_pool
         self.timeout = timeout
         self.headers = {
             "User-Agent": utils.get_user_agent(),
@@ -43,28 +43,38 @@ class BaiduTieBaClient(AbstractApiClient):
         }
         self._host = "https://tieba.baidu.com"
         self._page_extractor = TieBaExtractor()
-        self.default_ip_proxy = default_ip_proxy
+        self.proxies = default_ip_proxy
+
+    def classify_block(self, response: httpx.Response) -> Optional[str]:
+        """
+        贴吧被风控时返回空内容或 blocked
+        Args:
+            response: 请求响应
+
+        Returns:
+            被风控的原因, 没有被风控时返回 None
+        """
+        if response.text == "" or response.text == "blocked":
+            return f"response text: {response.text!r}"
+        return super().classify_block(response)
 
     @retry(stop=stop_after_attempt(3), wait=wait_fixed(1))
-    async def request(self, method, url, return_ori_content=False, proxies=None, **kwargs) -> Union[str, Any]:
+    async def request(self, method, url, return_ori_content=False, **kwargs) -> Union[str, Any]:
         """
         封装httpx的公共请求方法，对请求响应做一些处理
         Args:
             method: 请求方法
             url: 请求的URL
             return_ori_content: 是否返回原始内容
-            proxies: 代理IP
             **kwargs: 其他请求参数，例如请求头、请求体等
 
         Returns:
 
         """
-        actual_proxies = proxies if proxies else self.default_ip_proxy
-        async with httpx.AsyncClient(proxies=actual_proxies) as client:
-            response = await client.request(
-                method, url, timeout=self.timeout,
-                headers=self.headers, **kwargs
-            )
+        response = await self.send(
+            method, url, platform="tieba", timeout=self.timeout,
+            headers=self.headers, **kwargs
+        )
 
         if response.status_code != 200:
             utils.logger.error(f"Request failed, method: {method}, url: {url}, status code: {response.status_code}")
@@ -101,16 +111,7 @@ class BaiduTieBaClient(AbstractApiClient):
                                      **kwargs)
             return res
         except RetryError as e:
-            if self.ip_pool:
-                proxie_model = await self.ip_pool.get_proxy()
-                _, proxies = utils.format_proxy_info(proxie_model)
-                res = await self.request(method="GET", url=f"{self._host}{final_uri}",
-                                         return_ori_content=return_ori_content,
-                                         proxies=proxies,
-                                         **kwargs)
-                self.default_ip_proxy = proxies
-                return res
-
+            # 被风控时 send 已经换过代理IP重试, 这里说明代理池中的IP也都被Block了
             utils.logger.error(f"[BaiduTieBaClient.get] 达到了最大重试次数，IP已经被Block，请尝试更换新的IP代理: {e}")
             raise Exception(f"[BaiduTieBaClient.get] 达到了最大重试次数，IP已经被Block，请尝试更换新的IP代理: {e}")
 
@@ -138,7 +139,7 @@ class BaiduTieBaClient(AbstractApiClient):
         try:
             uri = "/mo/q/sync"
             res: Dict = await self.get(uri)
-            utils.logger.info(f"[BaiduTieBaClient.pong] res: {res}")
+            utils.logger.info("[BaiduTieBaClient.pong] res: %s", res)
             if res and res.get("no") == 0:
                 ping_flag = True
             else:
@@ -203,23 +204,26 @@ class BaiduTieBaClient(AbstractApiClient):
         page_content = await self.get(uri, return_ori_content=True)
         return self._page_extractor.extract_note_detail(page_content)
 
-    async def get_note_all_comments(self, note_detail: TiebaNote, crawl_interval: float = 1.0,
+    async def get_note_all_comments(self, note_detail: TiebaNote,
                                     callback: Optional[Callable] = None,
                                     max_count: int = 10,
+                                    start_cursor: int = 1,
+                                    cursor_callback: Optional[Callable] = None,
                                     ) -> List[TiebaComment]:
         """
         获取指定帖子下的所有一级评论，该方法会一直查找一个帖子下的所有评论信息
         Args:
             note_detail: 帖子详情对象
-            crawl_interval: 爬取一次笔记的延迟单位（秒）
             callback: 一次笔记爬取结束后
             max_count: 一次帖子爬取的最大评论数量
+            start_cursor: 开始翻页的页码, 用于从上次中断的位置继续
+            cursor_callback: 每处理完一页评论后回调下一页的页码
         Returns:
 
         """
         uri = f"/p/{note_detail.note_id}"
         result: List[TiebaComment] = []
-        current_page = 1
+        current_page = start_cursor
         while note_detail.total_replay_page >= current_page and len(result) < max_count:
             params = {
                 "pn": current_page
@@ -235,18 +239,18 @@ class BaiduTieBaClient(AbstractApiClient):
                 await callback(note_detail.note_id, comments)
             result.extend(comments)
             # 获取所有子评论
-            await self.get_comments_all_sub_comments(comments, crawl_interval=crawl_interval, callback=callback)
-            await asyncio.sleep(crawl_interval)
+            await self.get_comments_all_sub_comments(comments, callback=callback)
             current_page += 1
+            if cursor_callback:
+                cursor_callback(current_page)
         return result
 
-    async def get_comments_all_sub_comments(self, comments: List[TiebaComment], crawl_interval: float = 1.0,
+    async def get_comments_all_sub_comments(self, comments: List[TiebaComment],
                                             callback: Optional[Callable] = None) -> List[TiebaComment]:
         """
         获取指定评论下的所有子评论
         Args:
             comments: 评论列表
-            crawl_interval: 爬取一次笔记的延迟单位（秒）
             callback: 一次笔记爬取结束后
 
         Returns:
@@ -283,7 +287,6 @@ class BaiduTieBaClient(AbstractApiClient):
                 if callback:
                     await callback(parment_comment.note_id, sub_comments)
                 all_sub_comments.extend(sub_comments)
-                await asyncio.sleep(crawl_interval)
                 current_page += 1
         return all_sub_comments
 
@@ -333,7 +336,7 @@ class BaiduTieBaClient(AbstractApiClient):
         return await self.get(uri, params=params)
 
     async def get_all_notes_by_creator_user_name(self,
-                                                 user_name: str, crawl_interval: float = 1.0,
+                                                 user_name: str,
                                                  callback: Optional[Callable] = None,
                                                  max_note_count: int = 0,
                                                  creator_page_html_content: str = None,
@@ -343,7 +346,6 @@ class BaiduTieBaClient(AbstractApiClient):
         根据创作者用户名获取创作者所有帖子
         Args:
             user_name: 创作者用户名
-            crawl_interval: 爬取一次笔记的延迟单位（秒）
             callback: 一次笔记爬取结束后的回调函数，是一个awaitable类型的函数
             max_note_count: 帖子最大获取数量，如果为0则获取所有
             creator_page_html_content: 创作者主页HTML内容
@@ -390,7 +392,6 @@ class BaiduTieBaClient(AbstractApiClient):
             notes = await asyncio.gather(*note_detail_task)
             if callback:
                 await callback(notes)
-            await asyncio.sleep(crawl_interval)
             result.extend(notes)
             page_number += 1
             total_get_count += page_per_count
@@ -11,7 +11,6 @@
 
 import asyncio
 import os
-import random
 from asyncio import Task
 from typing import Dict, List, Optional, Tuple
 
@@ -20,8 +19,10 @@ from playwright.async_api import (BrowserContext, BrowserType, Page,
 
 import config
 from base.base_crawler import AbstractCrawler
+from cache.seen_set import is_seen, mark_seen
 from model.m_baidu_tieba import TiebaCreator, TiebaNote
 from proxy.proxy_ip_pool import IpInfoModel, create_ip_pool
+from store import crawl_journal
 from store import tieba as tieba_store
 from tools import utils
 from tools.crawler_util import format_proxy_info
@@ -62,6 +63,9 @@ class TieBaCrawler(AbstractCrawler):
             ip_pool=ip_proxy_pool,
             default_ip_proxy=httpx_proxy_format,
         )
+        if ip_proxy_pool:
+            # 请求被风控时从代理池换代理重试
+            self.tieba_client.set_ip_proxy_pool(ip_proxy_pool, ip_proxy_info)
         crawler_type_var.set(config.CRAWLER_TYPE)
         if config.CRAWLER_TYPE == "search":
             # Search for notes and retrieve their comment information.
@@ -69,13 +73,15 @@ class TieBaCrawler(AbstractCrawler):
             await self.get_specified_tieba_notes()
         elif config.CRAWLER_TYPE == "detail":
             # Get the information and comments of the specified post
-            await self.get_specified_notes()
+            await self.get_specified_notes(config.TIEBA_SPECIFIED_ID_LIST)
         elif config.CRAWLER_TYPE == "creator":
             # Get creator's information and their notes and comments
             await self.get_creators_and_notes()
         else:
             pass
 
+        # 关闭 API 客户端复用的 http 连接
+        await self.tieba_client.close()
         utils.logger.info("[BaiduTieBaCrawler.start] Tieba Crawler finished ...")
 
     async def search(self) -> None:
@@ -89,6 +95,7 @@ class TieBaCrawler(AbstractCrawler):
         if config.CRAWLER_MAX_NOTES_COUNT < tieba_limit_count:
             config.CRAWLER_MAX_NOTES_COUNT = tieba_limit_count
         start_page = config.START_PAGE
+        journal = crawl_journal.get_crawl_journal()
         for keyword in config.KEYWORDS.split(","):
             source_keyword_var.set(keyword)
             utils.logger.info(f"[BaiduTieBaCrawler.search] Current search keyword: {keyword}")
@@ -98,6 +105,14 @@ class TieBaCrawler(AbstractCrawler):
                     utils.logger.info(f"[BaiduTieBaCrawler.search] Skip page {page}")
                     page += 1
                     continue
+                # 上次已经搜索过的页直接复用保存的帖子列表
+                note_id_list = journal.get_payload(crawl_journal.UNIT_SEARCH_PAGE, f"{keyword}:{page}")
+                if note_id_list is not None:
+                    utils.logger.info(f"[BaiduTieBaCrawler.search] Resume keyword: {keyword}, page: {page}")
+                    await self.get_specified_notes(
+                        note_id_list=[note_id for note_id in note_id_list if not await is_seen("tieba", note_id)])
+                    page += 1
+                    continue
                 try:
                     utils.logger.info(f"[BaiduTieBaCrawler.search] search tieba keyword: {keyword}, page: {page}")
                     notes_list: List[TiebaNote] = await self.tieba_client.get_notes_by_keyword(
@@ -111,11 +126,16 @@ class TieBaCrawler(AbstractCrawler):
                         utils.logger.info(f"[BaiduTieBaCrawler.search] Search note list is empty")
                         break
                     utils.logger.info(f"[BaiduTieBaCrawler.search] Note list len: {len(notes_list)}")
-                    await self.get_specified_notes(note_id_list=[note_detail.note_id for note_detail in notes_list])
+                    note_id_list = [note_detail.note_id for note_detail in notes_list]
+                    journal.mark_done(crawl_journal.UNIT_SEARCH_PAGE, f"{keyword}:{page}", note_id_list)
+                    # 其他关键词已经搜到过的帖子不再重复爬取
+                    await self.get_specified_notes(
+                        note_id_list=[note_id for note_id in note_id_list if not await is_seen("tieba", note_id)])
                     page += 1
                 except Exception as ex:
                     utils.logger.error(
                         f"[BaiduTieBaCrawler.search] Search keywords error, current page: {page}, current keyword: {keyword}, err: {ex}")
+                    crawl_journal.report_task_error(ex, keyword)
                     break
 
     async def get_specified_tieba_notes(self):
@@ -155,16 +175,24 @@ class TieBaCrawler(AbstractCrawler):
         Returns:
 
         """
+        journal = crawl_journal.get_crawl_journal()
+        # 评论在帖子保存之后才爬取, 评论已完成(或不爬评论时帖子已保存)的帖子直接跳过
+        finished_unit = crawl_journal.UNIT_COMMENTS if config.ENABLE_GET_COMMENTS else crawl_journal.UNIT_NOTE
+        note_id_list = [note_id for note_id in note_id_list if not journal.is_done(finished_unit, note_id)]
         semaphore = asyncio.Semaphore(config.MAX_CONCURRENCY_NUM)
         task_list = [
             self.get_note_detail_async_task(note_id=note_id, semaphore=semaphore) for note_id in note_id_list
         ]
         note_details = await asyncio.gather(*task_list)
         note_details_model: List[TiebaNote] = []
-        for note_detail in note_details:
-            if note_detail is not None:
+        for note_id, note_detail in zip(note_id_list, note_details):
+            if note_detail is None:
+                crawl_journal.report_task_error("get note detail failed", note_id)
+            else:
                 note_details_model.append(note_detail)
                 await tieba_store.update_tieba_note(note_detail)
+                journal.after_flush(journal.mark_done, crawl_journal.UNIT_NOTE, note_detail.note_id)
+                await mark_seen("tieba", note_detail.note_id)
         await self.batch_get_note_comments(note_details_model)
 
     async def get_note_detail_async_task(self, note_id: str, semaphore: asyncio.Semaphore) -> Optional[TiebaNote]:
@@ -223,14 +251,26 @@ class TieBaCrawler(AbstractCrawler):
         Returns:
 
         """
+        journal = crawl_journal.get_crawl_journal()
+        note_id = note_detail.note_id
+        if journal.is_done(crawl_journal.UNIT_COMMENTS, note_id):
+            return
+        if not journal.need_fetch_comments(note_id, note_detail.total_replay_num):
+            utils.logger.info(f"[BaiduTieBaCrawler.get_comments] Reply count of note {note_id} not changed, skip")
+            return
         async with semaphore:
-            utils.logger.info(f"[BaiduTieBaCrawler.get_comments] Begin get note id comments {note_detail.note_id}")
+            utils.logger.info(f"[BaiduTieBaCrawler.get_comments] Begin get note id comments {note_id}")
             await self.tieba_client.get_note_all_comments(
                 note_detail=note_detail,
-                crawl_interval=random.random(),
                 callback=tieba_store.batch_update_tieba_note_comments,
-                max_count=config.CRAWLER_MAX_COMMENTS_COUNT_SINGLENOTES
+                max_count=config.CRAWLER_MAX_COMMENTS_COUNT_SINGLENOTES,
+                start_cursor=journal.get_cursor(crawl_journal.UNIT_COMMENTS, note_id, default=1),
+                cursor_callback=lambda cursor: journal.after_flush(
+                    journal.save_cursor, crawl_journal.UNIT_COMMENTS, note_id, cursor
+                ),
             )
+            journal.after_flush(journal.save_comment_state, note_id, note_detail.total_replay_num, 0)
+            journal.after_flush(journal.mark_done, crawl_journal.UNIT_COMMENTS, note_id)
 
     async def get_creators_and_notes(self) -> None:
         """
@@ -239,11 +279,15 @@ class TieBaCrawler(AbstractCrawler):
 
         """
         utils.logger.info("[WeiboCrawler.get_creators_and_notes] Begin get weibo creators")
+        journal = crawl_journal.get_crawl_journal()
         for creator_url in config.TIEBA_CREATOR_URL_LIST:
+            if journal.is_done(crawl_journal.UNIT_CREATOR, creator_url):
+                utils.logger.info(f"[BaiduTieBaCrawler.get_creators_and_notes] Skip finished creator: {creator_url}")
+                continue
             creator_page_html_content = await self.tieba_client.get_creator_info_by_url(creator_url=creator_url)
             creator_info: TiebaCreator = self._page_extractor.extract_creator_info(creator_page_html_content)
             if creator_info:
-                utils.logger.info(f"[WeiboCrawler.get_creators_and_notes] creator info: {creator_info}")
+                utils.logger.info("[WeiboCrawler.get_creators_and_notes] creator info: %s", creator_info)
                 if not creator_info:
                     raise Exception("Get creator info error")
 
@@ -252,13 +296,13 @@ class TieBaCrawler(AbstractCrawler):
                 # Get all note information of the creator
                 all_notes_list = await self.tieba_client.get_all_notes_by_creator_user_name(
                     user_name=creator_info.user_name,
-                    crawl_interval=0,
                     callback=tieba_store.batch_update_tieba_notes,
                     max_note_count=config.CRAWLER_MAX_NOTES_COUNT,
                     creator_page_html_content=creator_page_html_content,
                 )
 
                 await self.batch_get_note_comments(all_notes_list)
+                journal.after_flush(journal.mark_done, crawl_journal.UNIT_CREATOR, creator_url)
 
             else:
                 utils.logger.error(
@@ -26,13 +26,14 @@ from httpx import Response
 from playwright.async_api import BrowserContext, Page
 
 import config
+from base.base_crawler import AbstractApiClient
 from tools import utils
 
 from .exception import DataFetchError
 from .field import SearchType
 
 
-class WeiboClient:
+class WeiboClient(AbstractApiClient):
     def __init__(
             self,
             timeout=10,
@@ -50,13 +51,35 @@ class WeiboClient:
         self.cookie_dict = cookie_dict
         self._image_agent_host = "https://i1.wp.com/"
 
+    def classify_block(self, response: httpx.Response) -> Optional[str]:
+        """
+        微博请求过于频繁时返回 418 状态码
+        :param response:
+        :return:
+        """
+        if response.status_code == 418:
+            return "status code 418"
+        return super().classify_block(response)
+
+    def is_cacheable(self, response: httpx.Response) -> bool:
+        """
+        ok 不为 1 的错误响应不缓存, 微博详情等 HTML 页面直接缓存
+        :param response:
+        :return:
+        """
+        if "application/json" not in response.headers.get("content-type", ""):
+            return True
+        try:
+            return response.json().get("ok") == 1
+        except ValueError:
+            return False
+
     async def request(self, method, url, **kwargs) -> Union[Response, Dict]:
         enable_return_response = kwargs.pop("return_response", False)
-        async with httpx.AsyncClient(proxies=self.proxies) as client:
-            response = await client.request(
-                method, url, timeout=self.timeout,
-                **kwargs
-            )
+        response = await self.send(
+            method, url, platform="wb", timeout=self.timeout,
+            **kwargs
+        )
 
         if enable_return_response:
             return response
@@ -154,22 +177,23 @@ class WeiboClient:
     async def get_note_all_comments(
         self,
         note_id: str,
-        crawl_interval: float = 1.0,
         callback: Optional[Callable] = None,
         max_count: int = 10,
+        start_cursor: Optional[List[int]] = None,
+        cursor_callback: Optional[Callable] = None,
     ):
         """
         get note all comments include sub comments
         :param note_id:
-        :param crawl_interval:
         :param callback:
         :param max_count:
+        :param start_cursor: 开始翻页的游标 [max_id, max_id_type], 用于从上次中断的位置继续
+        :param cursor_callback: 每处理完一页评论后回调下一页的游标
         :return:
         """
         result = []
         is_end = False
-        max_id = -1
-        max_id_type = 0
+        max_id, max_id_type = start_cursor or (-1, 0)
         while not is_end and len(result) < max_count:
             comments_res = await self.get_note_comments(note_id, max_id, max_id_type)
             max_id: int = comments_res.get("max_id")
@@ -180,10 +204,11 @@ class WeiboClient:
                 comment_list = comment_list[:max_count - len(result)]
             if callback:  # 如果有回调函数，就执行回调函数
                 await callback(note_id, comment_list)
-            await asyncio.sleep(crawl_interval)
             result.extend(comment_list)
             sub_comment_result = await self.get_comments_all_sub_comments(note_id, comment_list, callback)
             result.extend(sub_comment_result)
+            if cursor_callback:
+                cursor_callback([max_id, max_id_type])
         return result
 
     @staticmethod
@@ -219,26 +244,34 @@ class WeiboClient:
         :return:
         """
         url = f"{self._host}/detail/{note_id}"
-        async with httpx.AsyncClient(proxies=self.proxies) as client:
+        async with self.use_http_client(self.proxies) as client:
             response = await client.request(
                 "GET", url, timeout=self.timeout, headers=self.headers
             )
-            if response.status_code != 200:
-                raise DataFetchError(f"get weibo detail err: {response.text}")
-            match = re.search(r'var \$render_data = (\[.*?\])\[0\]', response.text, re.DOTALL)
-            if match:
-                render_data_json = match.group(1)
-                render_data_dict = json.loads(render_data_json)
-                note_detail = render_data_dict[0].get("status")
-                note_item = {
-                    "mblog": note_detail
-                }
-                return note_item
-            else:
-                utils.logger.info(f"[WeiboClient.get_note_info_by_id] 未找到$render_data的值")
-                return dict()
+        if response.status_code != 200:
+            raise DataFetchError(f"get weibo detail err: {response.text}")
+        match = re.search(r'var \$render_data = (\[.*?\])\[0\]', response.text, re.DOTALL)
+        if match:
+            render_data_json = match.group(1)
+            render_data_dict = json.loads(render_data_json)
+            note_detail = render_data_dict[0].get("status")
+            note_item = {
+                "mblog": note_detail
+            }
+            return note_item
+        else:
+            utils.logger.info(f"[WeiboClient.get_note_info_by_id] 未找到$render_data的值")
+            return dict()
+
+    def get_note_image_url(self, image_url: str) -> str:
+        """
+        微博图片的高清大图地址, 通过图片代理访问
+        Args:
+            image_url: 微博返回的图片地址
 
-    async def get_note_image(self, image_url: str) -> bytes:
+        Returns:
+
+        """
         image_url = image_url[8:]  # 去掉 https://
         sub_url = image_url.split("/")
         image_url = ""
@@ -251,14 +284,17 @@ class WeiboClient:
                 image_url += sub_url[i] + "/"
         # 微博图床对外存在防盗链，所以需要代理访问
         # 由于微博图片是通过 i1.wp.com 来访问的，所以需要拼接一下
-        final_uri = (f"{self._image_agent_host}" f"{image_url}")
-        async with httpx.AsyncClient(proxies=self.proxies) as client:
+        return f"{self._image_agent_host}" f"{image_url}"
+
+    async def get_note_image(self, image_url: str) -> bytes:
+        final_uri = self.get_note_image_url(image_url)
+        async with self.use_http_client(self.proxies) as client:
             response = await client.request("GET", final_uri, timeout=self.timeout)
-            if not response.reason_phrase == "OK":
-                utils.logger.error(f"[WeiboClient.get_note_image] request {final_uri} err, res:{response.text}")
-                return None
-            else:
-                return response.content
+        if not response.reason_phrase == "OK":
+            utils.logger.error(f"[WeiboClient.get_note_image] request {final_uri} err, res:{response.text}")
+            return None
+        else:
+            return response.content
 
 
 
@@ -337,14 +373,13 @@ class WeiboClient:
         }
         return await self.get(uri, params)
 
-    async def get_all_notes_by_creator_id(self, creator_id: str, container_id: str, crawl_interval: float = 1.0,
+    async def get_all_notes_by_creator_id(self, creator_id: str, container_id: str,
                                           callback: Optional[Callable] = None) -> List[Dict]:
         """
         获取指定用户下的所有发过的帖子，该方法会一直查找一个用户下的所有帖子信息
         Args:
             creator_id:
             container_id:
-            crawl_interval:
             callback:
 
         Returns:
@@ -363,7 +398,7 @@ class WeiboClient:
             since_id = notes_res.get("cardlistInfo", {}).get("since_id", "0")
             if "cards" not in notes_res:
                 utils.logger.info(
-                    f"[WeiboClient.get_all_notes_by_creator] No 'notes' key found in response: {notes_res}")
+                    "[WeiboClient.get_all_notes_by_creator] No 'notes' key found in response: %s", notes_res)
                 break
 
             notes = notes_res["cards"]
@@ -372,7 +407,6 @@ class WeiboClient:
             notes = [note for note  in notes if note.get("card_type") == 9]
             if callback:
                 await callback(notes)
-            await asyncio.sleep(crawl_interval)
             result.extend(notes)
             crawler_total_count += 10
             notes_has_more = notes_res.get("cardlistInfo", {}).get("total", 0) > crawler_total_count
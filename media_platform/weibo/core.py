@@ -17,7 +17,6 @@
 
 import asyncio
 import os
-import random
 from asyncio import Task
 from typing import Dict, List, Optional, Tuple
 
@@ -26,13 +25,17 @@ from playwright.async_api import (BrowserContext, BrowserType, Page,
 
 import config
 from base.base_crawler import AbstractCrawler
+from cache.seen_set import is_seen, mark_seen
 from proxy.proxy_ip_pool import IpInfoModel, create_ip_pool
+from store import crawl_journal
 from store import weibo as weibo_store
-from tools import utils
+from tools import session_pool, utils
+from tools.downloader import get_media_downloader
+from tools.pipeline import CrawlerPipeline
 from var import crawler_type_var, source_keyword_var
 
 from .client import WeiboClient
-from .exception import DataFetchError
+from .exception import DataFetchError, IPBlockError
 from .field import SearchType
 from .help import filter_search_result_card
 from .login import WeiboLogin
@@ -50,7 +53,7 @@ class WeiboCrawler(AbstractCrawler):
         self.mobile_user_agent = utils.get_mobile_user_agent()
 
     async def start(self):
-        playwright_proxy_format, httpx_proxy_format = None, None
+        playwright_proxy_format, httpx_proxy_format, ip_proxy_pool = None, None, None
         if config.ENABLE_IP_PROXY:
             ip_proxy_pool = await create_ip_pool(config.IP_PROXY_POOL_COUNT, enable_validate_ip=True)
             ip_proxy_info: IpInfoModel = await ip_proxy_pool.get_proxy()
@@ -72,6 +75,9 @@ class WeiboCrawler(AbstractCrawler):
 
             # Create a client to interact with the xiaohongshu website.
             self.wb_client = await self.create_weibo_client(httpx_proxy_format)
+            if ip_proxy_pool:
+                # 请求被风控时从代理池换代理重试
+                self.wb_client.set_ip_proxy_pool(ip_proxy_pool, ip_proxy_info)
             if not await self.wb_client.pong():
                 login_obj = WeiboLogin(
                     login_type=config.LOGIN_TYPE,
@@ -88,6 +94,12 @@ class WeiboCrawler(AbstractCrawler):
                 await asyncio.sleep(2)
                 await self.wb_client.update_cookies(browser_context=self.browser_context)
 
+            # 配置了多个账号时, 请求分发到各个账号的会话上
+            self.wb_client = await session_pool.create_session_pool_client(
+                "wb", self.wb_client, self.create_account_client,
+                retire_exceptions=(IPBlockError,), ip_proxy_pool=ip_proxy_pool,
+            )
+
             crawler_type_var.set(config.CRAWLER_TYPE)
             if config.CRAWLER_TYPE == "search":
                 # Search for video and retrieve their comment information.
@@ -100,6 +112,8 @@ class WeiboCrawler(AbstractCrawler):
                 await self.get_creators_and_notes()
             else:
                 pass
+            # 关闭 API 客户端复用的 http 连接
+            await self.wb_client.close()
             utils.logger.info("[WeiboCrawler.start] Weibo Crawler finished ...")
 
     async def search(self):
@@ -112,7 +126,11 @@ class WeiboCrawler(AbstractCrawler):
         if config.CRAWLER_MAX_NOTES_COUNT < weibo_limit_count:
             config.CRAWLER_MAX_NOTES_COUNT = weibo_limit_count
         start_page = config.START_PAGE
-        for keyword in config.KEYWORDS.split(","):
+        comment_semaphore = asyncio.Semaphore(config.PIPELINE_COMMENT_CONCURRENCY)
+        pipeline = CrawlerPipeline("weibo_search")
+        journal = crawl_journal.get_crawl_journal()
+
+        async def search_keyword(keyword: str):
             source_keyword_var.set(keyword)
             utils.logger.info(f"[WeiboCrawler.search] Current search keyword: {keyword}")
             page = 1
@@ -121,24 +139,53 @@ class WeiboCrawler(AbstractCrawler):
                     utils.logger.info(f"[WeiboCrawler.search] Skip page: {page}")
                     page += 1
                     continue
+                # 上次已经搜索过的页直接复用保存的微博列表
+                note_list = journal.get_payload(crawl_journal.UNIT_SEARCH_PAGE, f"{keyword}:{page}")
+                if note_list is not None:
+                    utils.logger.info(f"[WeiboCrawler.search] Resume keyword: {keyword}, page: {page}")
+                    for note_item in note_list:
+                        await pipeline.put("store", note_item)
+                    page += 1
+                    continue
                 utils.logger.info(f"[WeiboCrawler.search] search weibo keyword: {keyword}, page: {page}")
                 search_res = await self.wb_client.get_note_by_keyword(
                     keyword=keyword,
                     page=page,
                     search_type=SearchType.DEFAULT
                 )
-                note_id_list: List[str] = []
-                note_list = filter_search_result_card(search_res.get("cards"))
+                # 搜索结果已包含完整的微博信息, 直接交给存储阶段, 下游队列满时在这里等待
+                note_list = [note_item for note_item in filter_search_result_card(search_res.get("cards"))
+                             if note_item and note_item.get("mblog")]
+                journal.mark_done(crawl_journal.UNIT_SEARCH_PAGE, f"{keyword}:{page}", note_list)
                 for note_item in note_list:
-                    if note_item:
-                        mblog: Dict = note_item.get("mblog")
-                        if mblog:
-                            note_id_list.append(mblog.get("id"))
-                            await weibo_store.update_weibo_note(note_item)
-                            await self.get_note_images(mblog)
-
+                    await pipeline.put("store", note_item)
                 page += 1
-                await self.batch_get_notes_comments(note_id_list)
+
+        async def store_note(note_item: Dict):
+            mblog: Dict = note_item.get("mblog")
+            # 其他关键词已经搜到过的微博不再重复爬取
+            if await is_seen("wb", mblog.get("id")):
+                return
+            if journal.is_done(crawl_journal.UNIT_NOTE, mblog.get("id")):
+                # 微博和图片已经保存过, 只需要继续爬评论
+                await pipeline.put("comment", mblog)
+                return
+            await weibo_store.update_weibo_note(note_item)
+            journal.after_flush(journal.mark_done, crawl_journal.UNIT_NOTE, mblog.get("id"))
+            await mark_seen("wb", mblog.get("id"))
+            await pipeline.put("media", mblog)
+            await pipeline.put("comment", mblog)
+
+        async def fetch_note_comments(mblog: Dict):
+            if not config.ENABLE_GET_COMMENTS:
+                return
+            await self.get_note_comments(mblog.get("id"), comment_semaphore, comment_count=mblog.get("comments_count"))
+
+        pipeline.add_stage("search", search_keyword, config.PIPELINE_SEARCH_CONCURRENCY, config.PIPELINE_QUEUE_SIZE)
+        pipeline.add_stage("store", store_note, config.PIPELINE_STORE_CONCURRENCY, config.PIPELINE_QUEUE_SIZE)
+        pipeline.add_stage("media", self.get_note_images, config.PIPELINE_MEDIA_CONCURRENCY, config.PIPELINE_QUEUE_SIZE)
+        pipeline.add_stage("comment", fetch_note_comments, config.PIPELINE_COMMENT_CONCURRENCY, config.PIPELINE_QUEUE_SIZE)
+        await pipeline.run("search", config.KEYWORDS.split(","))
 
     async def get_specified_notes(self):
         """
@@ -151,9 +198,11 @@ class WeiboCrawler(AbstractCrawler):
             config.WEIBO_SPECIFIED_ID_LIST
         ]
         video_details = await asyncio.gather(*task_list)
-        for note_item in video_details:
-            if note_item:
-                await weibo_store.update_weibo_note(note_item)
+        for note_id, note_item in zip(config.WEIBO_SPECIFIED_ID_LIST, video_details):
+            if not note_item:
+                crawl_journal.report_task_error("get note detail failed", note_id)
+                continue
+            await weibo_store.update_weibo_note(note_item)
         await self.batch_get_notes_comments(config.WEIBO_SPECIFIED_ID_LIST)
 
     async def get_note_info_task(self, note_id: str, semaphore: asyncio.Semaphore) -> Optional[Dict]:
@@ -169,10 +218,12 @@ class WeiboCrawler(AbstractCrawler):
                 return result
             except DataFetchError as ex:
                 utils.logger.error(f"[WeiboCrawler.get_note_info_task] Get note detail error: {ex}")
+                crawl_journal.report_task_error(ex)
                 return None
             except KeyError as ex:
                 utils.logger.error(
                     f"[WeiboCrawler.get_note_info_task] have not fund note detail note_id:{note_id}, err: {ex}")
+                crawl_journal.report_task_error(ex)
                 return None
 
     async def batch_get_notes_comments(self, note_id_list: List[str]):
@@ -185,7 +236,7 @@ class WeiboCrawler(AbstractCrawler):
             utils.logger.info(f"[WeiboCrawler.batch_get_note_comments] Crawling comment mode is not enabled")
             return
 
-        utils.logger.info(f"[WeiboCrawler.batch_get_notes_comments] note ids:{note_id_list}")
+        utils.logger.info("[WeiboCrawler.batch_get_notes_comments] note ids:%s", note_id_list)
         semaphore = asyncio.Semaphore(config.MAX_CONCURRENCY_NUM)
         task_list: List[Task] = []
         for note_id in note_id_list:
@@ -193,26 +244,41 @@ class WeiboCrawler(AbstractCrawler):
             task_list.append(task)
         await asyncio.gather(*task_list)
 
-    async def get_note_comments(self, note_id: str, semaphore: asyncio.Semaphore):
+    async def get_note_comments(self, note_id: str, semaphore: asyncio.Semaphore, comment_count: Optional[int] = None):
         """
         get comment for note id
         :param note_id:
         :param semaphore:
+        :param comment_count: 微博当前的评论数, 增量模式下评论数没变时不再爬评论
         :return:
         """
+        journal = crawl_journal.get_crawl_journal()
+        if journal.is_done(crawl_journal.UNIT_COMMENTS, note_id):
+            return
+        if not journal.need_fetch_comments(note_id, comment_count):
+            utils.logger.info(f"[WeiboCrawler.get_note_comments] Comment count of note {note_id} not changed, skip")
+            return
         async with semaphore:
             try:
                 utils.logger.info(f"[WeiboCrawler.get_note_comments] begin get note_id: {note_id} comments ...")
                 await self.wb_client.get_note_all_comments(
                     note_id=note_id,
-                    crawl_interval=random.randint(1,3), # 微博对API的限流比较严重，所以延时提高一些
                     callback=weibo_store.batch_update_weibo_note_comments,
-                    max_count=config.CRAWLER_MAX_COMMENTS_COUNT_SINGLENOTES
+                    max_count=config.CRAWLER_MAX_COMMENTS_COUNT_SINGLENOTES,
+                    start_cursor=journal.get_cursor(crawl_journal.UNIT_COMMENTS, note_id),
+                    cursor_callback=lambda cursor: journal.after_flush(
+                        journal.save_cursor, crawl_journal.UNIT_COMMENTS, note_id, cursor
+                    ),
                 )
+                # 微博评论按热度排序, 不能翻到旧评论就停止, 只记录评论数
+                journal.after_flush(journal.save_comment_state, note_id, comment_count, 0)
+                journal.after_flush(journal.mark_done, crawl_journal.UNIT_COMMENTS, note_id)
             except DataFetchError as ex:
                 utils.logger.error(f"[WeiboCrawler.get_note_comments] get note_id: {note_id} comment error: {ex}")
+                crawl_journal.report_task_error(ex)
             except Exception as e:
                 utils.logger.error(f"[WeiboCrawler.get_note_comments] may be been blocked, err:{e}")
+                crawl_journal.report_task_error(e)
 
     async def get_note_images(self, mblog: Dict):
         """
@@ -227,14 +293,15 @@ class WeiboCrawler(AbstractCrawler):
         pics: Dict = mblog.get("pics")
         if not pics:
             return
+        # 交给媒体下载器流式写入磁盘, 不等待下载完成
+        downloader = get_media_downloader(self.wb_client.proxies)
         for pic in pics:
             url = pic.get("url")
             if not url:
                 continue
-            content = await self.wb_client.get_note_image(url)
-            if content != None:
-                extension_file_name = url.split(".")[-1]
-                await weibo_store.update_weibo_note_image(pic["pid"], content, extension_file_name)
+            extension_file_name = url.split(".")[-1]
+            await downloader.submit(self.wb_client.get_note_image_url(url),
+                                    weibo_store.get_weibo_note_image_path(pic["pid"], extension_file_name))
 
 
     async def get_creators_and_notes(self) -> None:
@@ -244,11 +311,15 @@ class WeiboCrawler(AbstractCrawler):
 
         """
         utils.logger.info("[WeiboCrawler.get_creators_and_notes] Begin get weibo creators")
+        journal = crawl_journal.get_crawl_journal()
         for user_id in config.WEIBO_CREATOR_ID_LIST:
+            if journal.is_done(crawl_journal.UNIT_CREATOR, user_id):
+                utils.logger.info(f"[WeiboCrawler.get_creators_and_notes] Skip finished creator: {user_id}")
+                continue
             createor_info_res: Dict = await self.wb_client.get_creator_info_by_id(creator_id=user_id)
             if createor_info_res:
                 createor_info: Dict = createor_info_res.get("userInfo", {})
-                utils.logger.info(f"[WeiboCrawler.get_creators_and_notes] creator info: {createor_info}")
+                utils.logger.info("[WeiboCrawler.get_creators_and_notes] creator info: %s", createor_info)
                 if not createor_info:
                     raise DataFetchError("Get creator info error")
                 await weibo_store.save_creator(user_id, user_info=createor_info)
@@ -257,13 +328,13 @@ class WeiboCrawler(AbstractCrawler):
                 all_notes_list = await self.wb_client.get_all_notes_by_creator_id(
                     creator_id=user_id,
                     container_id=createor_info_res.get("lfid_container_id"),
-                    crawl_interval=0,
                     callback=weibo_store.batch_update_weibo_notes
                 )
 
                 note_ids = [note_item.get("mblog", {}).get("id") for note_item in all_notes_list if
                             note_item.get("mblog", {}).get("id")]
                 await self.batch_get_notes_comments(note_ids)
+                journal.after_flush(journal.mark_done, crawl_journal.UNIT_CREATOR, user_id)
 
             else:
                 utils.logger.error(
@@ -289,6 +360,16 @@ class WeiboCrawler(AbstractCrawler):
         )
         return weibo_client_obj
 
+    async def create_account_client(self, cookie_str: str, ip_proxy_info: Optional[IpInfoModel]) -> WeiboClient:
+        """Create API client for an extra account of the session pool"""
+        httpx_proxy = self.format_proxy_info(ip_proxy_info)[1] if ip_proxy_info else None
+        return WeiboClient(
+            proxies=httpx_proxy,
+            headers={**self.wb_client.headers, "Cookie": cookie_str},
+            playwright_page=self.context_page,
+            cookie_dict=utils.convert_str_cookie_to_dict(cookie_str),
+        )
+
     @staticmethod
     def format_proxy_info(ip_proxy_info: IpInfoModel) -> Tuple[Optional[Dict], Optional[Dict]]:
         """format proxy info for playwright and httpx"""
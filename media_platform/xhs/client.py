@@ -26,7 +26,8 @@ from html import unescape
 
 from .exception import DataFetchError, IPBlockError
 from .field import SearchNoteType, SearchSortType
-from .help import get_search_id, sign
+from .help import get_note_dict_from_html, get_search_id, sign
+from .signer import XhsSigner
 
 
 class XiaoHongShuClient(AbstractApiClient):
@@ -38,6 +39,7 @@ class XiaoHongShuClient(AbstractApiClient):
         headers: Dict[str, str],
         playwright_page: Page,
         cookie_dict: Dict[str, str],
+        signer: Optional[XhsSigner] = None,
     ):
         self.proxies = proxies
         self.timeout = timeout
@@ -50,6 +52,7 @@ class XiaoHongShuClient(AbstractApiClient):
         self.NOTE_ABNORMAL_CODE = -510001
         self.playwright_page = playwright_page
         self.cookie_dict = cookie_dict
+        self.signer = signer or XhsSigner([playwright_page])
 
     async def _pre_headers(self, url: str, data=None) -> Dict:
         """
@@ -61,25 +64,57 @@ class XiaoHongShuClient(AbstractApiClient):
         Returns:
 
         """
-        encrypt_params = await self.playwright_page.evaluate(
-            "([url, data]) => window._webmsxyw(url,data)", [url, data]
-        )
-        local_storage = await self.playwright_page.evaluate("() => window.localStorage")
+        encrypt_params, b1 = await self.signer.sign(url, data)
         signs = sign(
             a1=self.cookie_dict.get("a1", ""),
-            b1=local_storage.get("b1", ""),
+            b1=b1,
             x_s=encrypt_params.get("X-s", ""),
             x_t=str(encrypt_params.get("X-t", "")),
         )
 
+        # 并发请求时每个请求使用自己的签名头, 不修改共享的 self.headers
         headers = {
+            **self.headers,
             "X-S": signs["x-s"],
             "X-T": signs["x-t"],
             "x-S-Common": signs["x-s-common"],
             "X-B3-Traceid": signs["x-b3-traceid"],
         }
-        self.headers.update(headers)
-        return self.headers
+        return headers
+
+    def classify_block(self, response: httpx.Response) -> Optional[str]:
+        """
+        除了验证码和限流状态码, 返回 IP 被封的错误码也算被风控
+        Args:
+            response: 请求响应
+
+        Returns:
+            被风控的原因, 没有被风控时返回 None
+        """
+        reason = super().classify_block(response)
+        if reason is None and str(self.IP_ERROR_CODE) in response.text:
+            try:
+                if response.json().get("code") == self.IP_ERROR_CODE:
+                    return f"ip blocked, code: {self.IP_ERROR_CODE}"
+            except ValueError:
+                pass
+        return reason
+
+    def is_cacheable(self, response: httpx.Response) -> bool:
+        """
+        接口返回 success 为 false 的错误(如 300012、笔记不存在)时不缓存, 创作者主页等 HTML 页面直接缓存
+        Args:
+            response: 请求响应
+
+        Returns:
+            是否可以缓存
+        """
+        if "application/json" not in response.headers.get("content-type", ""):
+            return True
+        try:
+            return bool(response.json().get("success"))
+        except ValueError:
+            return False
 
     @retry(stop=stop_after_attempt(3), wait=wait_fixed(1))
     async def request(self, method, url, **kwargs) -> Union[str, Any]:
@@ -96,8 +131,7 @@ class XiaoHongShuClient(AbstractApiClient):
         # return response.text
         return_response = kwargs.pop("return_response", False)
 
-        async with httpx.AsyncClient(proxies=self.proxies) as client:
-            response = await client.request(method, url, timeout=self.timeout, **kwargs)
+        response = await self.send(method, url, platform="xhs", timeout=self.timeout, **kwargs)
 
         if response.status_code == 471 or response.status_code == 461:
             # someday someone maybe will bypass captcha
@@ -156,15 +190,15 @@ class XiaoHongShuClient(AbstractApiClient):
         )
 
     async def get_note_media(self, url: str) -> Union[bytes, None]:
-        async with httpx.AsyncClient(proxies=self.proxies) as client:
+        async with self.use_http_client(self.proxies) as client:
             response = await client.request("GET", url, timeout=self.timeout)
-            if not response.reason_phrase == "OK":
-                utils.logger.error(
-                    f"[XiaoHongShuClient.get_note_media] request {url} err, res:{response.text}"
-                )
-                return None
-            else:
-                return response.content
+        if not response.reason_phrase == "OK":
+            utils.logger.error(
+                f"[XiaoHongShuClient.get_note_media] request {url} err, res:{response.text}"
+            )
+            return None
+        else:
+            return response.content
 
     async def pong(self) -> bool:
         """
@@ -198,6 +232,7 @@ class XiaoHongShuClient(AbstractApiClient):
         cookie_str, cookie_dict = utils.convert_cookies(await browser_context.cookies())
         self.headers["Cookie"] = cookie_str
         self.cookie_dict = cookie_dict
+        self.signer.invalidate_local_storage()
 
     async def get_note_by_keyword(
         self,
@@ -324,24 +359,30 @@ class XiaoHongShuClient(AbstractApiClient):
         self,
         note_id: str,
         xsec_token: str,
-        crawl_interval: float = 1.0,
         callback: Optional[Callable] = None,
         max_count: int = 10,
+        start_cursor: str = "",
+        cursor_callback: Optional[Callable] = None,
+        since_time: int = 0,
+        newest_time_callback: Optional[Callable] = None,
     ) -> List[Dict]:
         """
         获取指定笔记下的所有一级评论，该方法会一直查找一个帖子下的所有评论信息
         Args:
             note_id: 笔记ID
             xsec_token: 验证token
-            crawl_interval: 爬取一次笔记的延迟单位（秒）
             callback: 一次笔记爬取结束后
             max_count: 一次笔记爬取的最大评论数量
+            start_cursor: 开始翻页的游标, 用于从上次中断的位置继续
+            cursor_callback: 每处理完一页评论后回调下一页的游标
+            since_time: 只获取这个时间(毫秒)之后的评论, 评论按时间倒序, 翻到更早的评论时停止
+            newest_time_callback: 每处理完一页评论后回调本页一级评论中最新一条的时间, 不包含二级评论
         Returns:
 
         """
         result = []
         comments_has_more = True
-        comments_cursor = ""
+        comments_cursor = start_cursor
         while comments_has_more and len(result) < max_count:
             comments_res = await self.get_note_comments(
                 note_id=note_id, xsec_token=xsec_token, cursor=comments_cursor
@@ -350,30 +391,35 @@ class XiaoHongShuClient(AbstractApiClient):
             comments_cursor = comments_res.get("cursor", "")
             if "comments" not in comments_res:
                 utils.logger.info(
-                    f"[XiaoHongShuClient.get_note_all_comments] No 'comments' key found in response: {comments_res}"
+                    "[XiaoHongShuClient.get_note_all_comments] No 'comments' key found in response: %s", comments_res
                 )
                 break
             comments = comments_res["comments"]
+            if since_time:
+                if comments and int(comments[-1].get("create_time", 0)) <= since_time:
+                    comments_has_more = False
+                comments = [comment for comment in comments if int(comment.get("create_time", 0)) > since_time]
             if len(result) + len(comments) > max_count:
                 comments = comments[: max_count - len(result)]
             if callback:
                 await callback(note_id, comments)
-            await asyncio.sleep(crawl_interval)
+            if newest_time_callback and comments:
+                newest_time_callback(max(int(comment.get("create_time", 0)) for comment in comments))
             result.extend(comments)
             sub_comments = await self.get_comments_all_sub_comments(
                 comments=comments,
                 xsec_token=xsec_token,
-                crawl_interval=crawl_interval,
                 callback=callback,
             )
             result.extend(sub_comments)
+            if cursor_callback:
+                cursor_callback(comments_cursor)
         return result
 
     async def get_comments_all_sub_comments(
         self,
         comments: List[Dict],
         xsec_token: str,
-        crawl_interval: float = 1.0,
         callback: Optional[Callable] = None,
     ) -> List[Dict]:
         """
@@ -381,7 +427,6 @@ class XiaoHongShuClient(AbstractApiClient):
         Args:
             comments: 评论列表
             xsec_token: 验证token
-            crawl_interval: 爬取一次评论的延迟单位（秒）
             callback: 一次评论爬取结束后
 
         Returns:
@@ -419,13 +464,13 @@ class XiaoHongShuClient(AbstractApiClient):
                 sub_comment_cursor = comments_res.get("cursor", "")
                 if "comments" not in comments_res:
                     utils.logger.info(
-                        f"[XiaoHongShuClient.get_comments_all_sub_comments] No 'comments' key found in response: {comments_res}"
+                        "[XiaoHongShuClient.get_comments_all_sub_comments] No 'comments' key found in response: %s",
+                        comments_res,
                     )
                     break
                 comments = comments_res["comments"]
                 if callback:
                     await callback(note_id, comments)
-                await asyncio.sleep(crawl_interval)
                 result.extend(comments)
         return result
 
@@ -476,14 +521,12 @@ class XiaoHongShuClient(AbstractApiClient):
     async def get_all_notes_by_creator(
         self,
         user_id: str,
-        crawl_interval: float = 1.0,
         callback: Optional[Callable] = None,
     ) -> List[Dict]:
         """
         获取指定用户下的所有发过的帖子，该方法会一直查找一个用户下的所有帖子信息
         Args:
             user_id: 用户ID
-            crawl_interval: 爬取一次的延迟单位（秒）
             callback: 一次分页爬取结束后的更新回调函数
 
         Returns:
@@ -504,7 +547,7 @@ class XiaoHongShuClient(AbstractApiClient):
             notes_cursor = notes_res.get("cursor", "")
             if "notes" not in notes_res:
                 utils.logger.info(
-                    f"[XiaoHongShuClient.get_all_notes_by_creator] No 'notes' key found in response: {notes_res}"
+                    "[XiaoHongShuClient.get_all_notes_by_creator] No 'notes' key found in response: %s", notes_res
                 )
                 break
 
@@ -514,7 +557,6 @@ class XiaoHongShuClient(AbstractApiClient):
             )
             if callback:
                 await callback(notes)
-            await asyncio.sleep(crawl_interval)
             result.extend(notes)
         return result
 
@@ -553,31 +595,6 @@ class XiaoHongShuClient(AbstractApiClient):
 
         """
 
-        def camel_to_underscore(key):
-            return re.sub(r"(?<!^)(?=[A-Z])", "_", key).lower()
-
-        def transform_json_keys(json_data):
-            data_dict = json.loads(json_data)
-            dict_new = {}
-            for key, value in data_dict.items():
-                new_key = camel_to_underscore(key)
-                if not value:
-                    dict_new[new_key] = value
-                elif isinstance(value, dict):
-                    dict_new[new_key] = transform_json_keys(json.dumps(value))
-                elif isinstance(value, list):
-                    dict_new[new_key] = [
-                        (
-                            transform_json_keys(json.dumps(item))
-                            if (item and isinstance(item, dict))
-                            else item
-                        )
-                        for item in value
-                    ]
-                else:
-                    dict_new[new_key] = value
-            return dict_new
-
         url = (
             "https://www.xiaohongshu.com/explore/"
             + note_id
@@ -591,17 +608,7 @@ class XiaoHongShuClient(AbstractApiClient):
             method="GET", url=url, return_response=True, headers=copy_headers
         )
 
-        def get_note_dict(html):
-            state = re.findall(r"window.__INITIAL_STATE__=({.*})</script>", html)[
-                0
-            ].replace("undefined", '""')
-
-            if state != "{}":
-                note_dict = transform_json_keys(state)
-                return note_dict["note"]["note_detail_map"][note_id]["note"]
-            return {}
-
         try:
-            return get_note_dict(html)
+            return get_note_dict_from_html(html, note_id)
         except:
             return None
@@ -11,8 +11,6 @@
 
 import asyncio
 import os
-import random
-import time
 from asyncio import Task
 from typing import Dict, List, Optional, Tuple
 
@@ -21,18 +19,23 @@ from tenacity import RetryError
 
 import config
 from base.base_crawler import AbstractCrawler
+from cache.seen_set import is_seen, mark_seen
 from config import CRAWLER_MAX_COMMENTS_COUNT_SINGLENOTES
 from model.m_xiaohongshu import NoteUrlInfo
 from proxy.proxy_ip_pool import IpInfoModel, create_ip_pool
+from store import crawl_journal
 from store import xhs as xhs_store
-from tools import utils
+from tools import session_pool, utils
+from tools.downloader import get_media_downloader
+from tools.pipeline import CrawlerPipeline
 from var import crawler_type_var, source_keyword_var
 
 from .client import XiaoHongShuClient
-from .exception import DataFetchError
+from .exception import DataFetchError, IPBlockError
 from .field import SearchSortType
 from .help import parse_note_info_from_note_url, get_search_id
 from .login import XiaoHongShuLogin
+from .signer import XhsSigner
 
 
 class XiaoHongShuCrawler(AbstractCrawler):
@@ -46,7 +49,7 @@ class XiaoHongShuCrawler(AbstractCrawler):
         self.user_agent = config.UA if config.UA else "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/126.0.0.0 Safari/537.36"
 
     async def start(self) -> None:
-        playwright_proxy_format, httpx_proxy_format = None, None
+        playwright_proxy_format, httpx_proxy_format, ip_proxy_pool = None, None, None
         if config.ENABLE_IP_PROXY:
             ip_proxy_pool = await create_ip_pool(
                 config.IP_PROXY_POOL_COUNT, enable_validate_ip=True
@@ -80,6 +83,9 @@ class XiaoHongShuCrawler(AbstractCrawler):
 
             # Create a client to interact with the xiaohongshu website.
             self.xhs_client = await self.create_xhs_client(httpx_proxy_format)
+            if ip_proxy_pool:
+                # 请求被风控时从代理池换代理重试
+                self.xhs_client.set_ip_proxy_pool(ip_proxy_pool, ip_proxy_info)
             if not await self.xhs_client.pong():
                 login_obj = XiaoHongShuLogin(
                     login_type=config.LOGIN_TYPE,
@@ -93,6 +99,12 @@ class XiaoHongShuCrawler(AbstractCrawler):
                     browser_context=self.browser_context
                 )
 
+            # 配置了多个账号时, 请求分发到各个账号的会话上
+            self.xhs_client = await session_pool.create_session_pool_client(
+                "xhs", self.xhs_client, self.create_account_client,
+                retire_exceptions=(IPBlockError,), ip_proxy_pool=ip_proxy_pool,
+            )
+
             crawler_type_var.set(config.CRAWLER_TYPE)
             if config.CRAWLER_TYPE == "search":
                 # Search for notes and retrieve their comment information.
@@ -106,6 +118,11 @@ class XiaoHongShuCrawler(AbstractCrawler):
             else:
                 pass
 
+            utils.logger.info(
+                f"[XiaoHongShuCrawler.start] sign latency ms: {self.xhs_client.signer.latency_percentiles()}"
+            )
+            # 关闭 API 客户端复用的 http 连接
+            await self.xhs_client.close()
             utils.logger.info("[XiaoHongShuCrawler.start] Xhs Crawler finished ...")
 
     async def search(self) -> None:
@@ -117,7 +134,12 @@ class XiaoHongShuCrawler(AbstractCrawler):
         if config.CRAWLER_MAX_NOTES_COUNT < xhs_limit_count:
             config.CRAWLER_MAX_NOTES_COUNT = xhs_limit_count
         start_page = config.START_PAGE
-        for keyword in config.KEYWORDS.split(","):
+        detail_semaphore = asyncio.Semaphore(config.PIPELINE_DETAIL_CONCURRENCY)
+        comment_semaphore = asyncio.Semaphore(config.PIPELINE_COMMENT_CONCURRENCY)
+        pipeline = CrawlerPipeline("xhs_search")
+        journal = crawl_journal.get_crawl_journal()
+
+        async def search_keyword(keyword: str):
             source_keyword_var.set(keyword)
             utils.logger.info(
                 f"[XiaoHongShuCrawler.search] Current search keyword: {keyword}"
@@ -132,12 +154,19 @@ class XiaoHongShuCrawler(AbstractCrawler):
                     page += 1
                     continue
 
+                # 上次已经搜索过的页直接复用保存的笔记列表
+                post_items = journal.get_payload(crawl_journal.UNIT_SEARCH_PAGE, f"{keyword}:{page}")
+                if post_items is not None:
+                    utils.logger.info(f"[XiaoHongShuCrawler.search] Resume keyword: {keyword}, page: {page}")
+                    for post_item in post_items:
+                        await pipeline.put("detail", post_item)
+                    page += 1
+                    continue
+
                 try:
                     utils.logger.info(
                         f"[XiaoHongShuCrawler.search] search xhs keyword: {keyword}, page: {page}"
                     )
-                    note_ids: List[str] = []
-                    xsec_tokens: List[str] = []
                     notes_res = await self.xhs_client.get_note_by_keyword(
                         keyword=keyword,
                         search_id=search_id,
@@ -149,46 +178,82 @@ class XiaoHongShuCrawler(AbstractCrawler):
                         ),
                     )
                     utils.logger.info(
-                        f"[XiaoHongShuCrawler.search] Search notes res:{notes_res}"
+                        "[XiaoHongShuCrawler.search] Search notes res:%s", notes_res
                     )
                     if not notes_res or not notes_res.get("has_more", False):
                         utils.logger.info("No more content!")
                         break
-                    semaphore = asyncio.Semaphore(config.MAX_CONCURRENCY_NUM)
-                    task_list = [
-                        self.get_note_detail_async_task(
-                            note_id=post_item.get("id"),
-                            xsec_source=post_item.get("xsec_source"),
-                            xsec_token=post_item.get("xsec_token"),
-                            semaphore=semaphore,
-                        )
+                    post_items = [
+                        {key: post_item.get(key) for key in ("id", "xsec_source", "xsec_token")}
                         for post_item in notes_res.get("items", {})
                         if post_item.get("model_type") not in ("rec_query", "hot_query")
                     ]
-                    note_details = await asyncio.gather(*task_list)
-                    for note_detail in note_details:
-                        if note_detail:
-                            await xhs_store.update_xhs_note(note_detail)
-                            await self.get_notice_media(note_detail)
-                            note_ids.append(note_detail.get("note_id"))
-                            xsec_tokens.append(note_detail.get("xsec_token"))
+                    journal.mark_done(crawl_journal.UNIT_SEARCH_PAGE, f"{keyword}:{page}", post_items)
+                    # 笔记交给详情阶段处理, 下游队列满时在这里等待, 不必等本页全部处理完再搜索下一页
+                    for post_item in post_items:
+                        await pipeline.put("detail", post_item)
                     page += 1
-                    utils.logger.info(
-                        f"[XiaoHongShuCrawler.search] Note details: {note_details}"
-                    )
-                    await self.batch_get_note_comments(note_ids, xsec_tokens)
-                except DataFetchError:
+                except DataFetchError as e:
                     utils.logger.error(
                         "[XiaoHongShuCrawler.search] Get note detail error"
                     )
+                    crawl_journal.report_task_error(e, keyword)
                     break
 
+        async def fetch_note_detail(post_item: Dict):
+            # 其他关键词已经搜到过的笔记不再重复爬取
+            if await is_seen("xhs", post_item.get("id")):
+                return
+            if journal.is_done(crawl_journal.UNIT_NOTE, post_item.get("id")):
+                # 详情已经保存过, 只需要继续爬评论
+                await pipeline.put(
+                    "comment",
+                    {"note_id": post_item.get("id"), "xsec_token": post_item.get("xsec_token")},
+                )
+                return
+            note_detail = await self.get_note_detail_async_task(
+                note_id=post_item.get("id"),
+                xsec_source=post_item.get("xsec_source"),
+                xsec_token=post_item.get("xsec_token"),
+                semaphore=detail_semaphore,
+            )
+            if note_detail:
+                await pipeline.put("store", note_detail)
+
+        async def store_note(note_detail: Dict):
+            await xhs_store.update_xhs_note(note_detail)
+            journal.after_flush(journal.mark_done, crawl_journal.UNIT_NOTE, note_detail.get("note_id"))
+            await mark_seen("xhs", note_detail.get("note_id"))
+            await pipeline.put("media", note_detail)
+            await pipeline.put("comment", note_detail)
+
+        async def fetch_note_comments(note_detail: Dict):
+            if not config.ENABLE_GET_COMMENTS:
+                return
+            await self.get_comments(
+                note_id=note_detail.get("note_id"),
+                xsec_token=note_detail.get("xsec_token"),
+                semaphore=comment_semaphore,
+                comment_count=note_detail.get("interact_info", {}).get("comment_count"),
+            )
+
+        pipeline.add_stage("search", search_keyword, config.PIPELINE_SEARCH_CONCURRENCY, config.PIPELINE_QUEUE_SIZE)
+        pipeline.add_stage("detail", fetch_note_detail, config.PIPELINE_DETAIL_CONCURRENCY, config.PIPELINE_QUEUE_SIZE)
+        pipeline.add_stage("store", store_note, config.PIPELINE_STORE_CONCURRENCY, config.PIPELINE_QUEUE_SIZE)
+        pipeline.add_stage("media", self.get_notice_media, config.PIPELINE_MEDIA_CONCURRENCY, config.PIPELINE_QUEUE_SIZE)
+        pipeline.add_stage("comment", fetch_note_comments, config.PIPELINE_COMMENT_CONCURRENCY, config.PIPELINE_QUEUE_SIZE)
+        await pipeline.run("search", config.KEYWORDS.split(","))
+
     async def get_creators_and_notes(self) -> None:
         """Get creator's notes and retrieve their comment information."""
         utils.logger.info(
             "[XiaoHongShuCrawler.get_creators_and_notes] Begin get xiaohongshu creators"
         )
+        journal = crawl_journal.get_crawl_journal()
         for user_id in config.XHS_CREATOR_ID_LIST:
+            if journal.is_done(crawl_journal.UNIT_CREATOR, user_id):
+                utils.logger.info(f"[XiaoHongShuCrawler.get_creators_and_notes] Skip finished creator: {user_id}")
+                continue
             # get creator detail info from web html content
             createor_info: Dict = await self.xhs_client.get_creator_info(
                 user_id=user_id
@@ -196,15 +261,9 @@ class XiaoHongShuCrawler(AbstractCrawler):
             if createor_info:
                 await xhs_store.save_creator(user_id, creator=createor_info)
 
-            # When proxy is not enabled, increase the crawling interval
-            if config.ENABLE_IP_PROXY:
-                crawl_interval = random.random()
-            else:
-                crawl_interval = random.uniform(1, config.CRAWLER_MAX_SLEEP_SEC)
             # Get all note information of the creator
             all_notes_list = await self.xhs_client.get_all_notes_by_creator(
                 user_id=user_id,
-                crawl_interval=crawl_interval,
                 callback=self.fetch_creator_notes_detail,
             )
 
@@ -214,6 +273,7 @@ class XiaoHongShuCrawler(AbstractCrawler):
                 note_ids.append(note_item.get("note_id"))
                 xsec_tokens.append(note_item.get("xsec_token"))
             await self.batch_get_note_comments(note_ids, xsec_tokens)
+            journal.after_flush(journal.mark_done, crawl_journal.UNIT_CREATOR, user_id)
 
     async def fetch_creator_notes_detail(self, note_list: List[Dict]):
         """
@@ -259,11 +319,13 @@ class XiaoHongShuCrawler(AbstractCrawler):
         need_get_comment_note_ids = []
         xsec_tokens = []
         note_details = await asyncio.gather(*get_note_detail_task_list)
-        for note_detail in note_details:
-            if note_detail:
-                need_get_comment_note_ids.append(note_detail.get("note_id", ""))
-                xsec_tokens.append(note_detail.get("xsec_token", ""))
-                await xhs_store.update_xhs_note(note_detail)
+        for full_note_url, note_detail in zip(config.XHS_SPECIFIED_NOTE_URL_LIST, note_details):
+            if not note_detail:
+                crawl_journal.report_task_error("get note detail failed", full_note_url)
+                continue
+            need_get_comment_note_ids.append(note_detail.get("note_id", ""))
+            xsec_tokens.append(note_detail.get("xsec_token", ""))
+            await xhs_store.update_xhs_note(note_detail)
         await self.batch_get_note_comments(need_get_comment_note_ids, xsec_tokens)
 
     async def get_note_detail_async_task(
@@ -286,11 +348,6 @@ class XiaoHongShuCrawler(AbstractCrawler):
         """
         note_detail_from_html, note_detail_from_api = None, None
         async with semaphore:
-            # When proxy is not enabled, increase the crawling interval
-            if config.ENABLE_IP_PROXY:
-                crawl_interval = random.random()
-            else:
-                crawl_interval = random.uniform(1, config.CRAWLER_MAX_SLEEP_SEC)
             try:
                 # 尝试直接获取网页版笔记详情，携带cookie
                 note_detail_from_html: Optional[Dict] = (
@@ -298,7 +355,6 @@ class XiaoHongShuCrawler(AbstractCrawler):
                         note_id, xsec_source, xsec_token, enable_cookie=True
                     )
                 )
-                time.sleep(crawl_interval)
                 if not note_detail_from_html:
                     # 如果网页版笔记详情获取失败，则尝试不使用cookie获取
                     note_detail_from_html = (
@@ -326,11 +382,13 @@ class XiaoHongShuCrawler(AbstractCrawler):
                 utils.logger.error(
                     f"[XiaoHongShuCrawler.get_note_detail_async_task] Get note detail error: {ex}"
                 )
+                crawl_journal.report_task_error(ex)
                 return None
             except KeyError as ex:
                 utils.logger.error(
                     f"[XiaoHongShuCrawler.get_note_detail_async_task] have not fund note detail note_id:{note_id}, err: {ex}"
                 )
+                crawl_journal.report_task_error(ex)
                 return None
 
     async def batch_get_note_comments(
@@ -344,7 +402,7 @@ class XiaoHongShuCrawler(AbstractCrawler):
             return
 
         utils.logger.info(
-            f"[XiaoHongShuCrawler.batch_get_note_comments] Begin batch get note comments, note list: {note_list}"
+            "[XiaoHongShuCrawler.batch_get_note_comments] Begin batch get note comments, note list: %s", note_list
         )
         semaphore = asyncio.Semaphore(config.MAX_CONCURRENCY_NUM)
         task_list: List[Task] = []
@@ -359,25 +417,47 @@ class XiaoHongShuCrawler(AbstractCrawler):
         await asyncio.gather(*task_list)
 
     async def get_comments(
-        self, note_id: str, xsec_token: str, semaphore: asyncio.Semaphore
+        self,
+        note_id: str,
+        xsec_token: str,
+        semaphore: asyncio.Semaphore,
+        comment_count: Optional[str] = None,
     ):
         """Get note comments with keyword filtering and quantity limitation"""
+        journal = crawl_journal.get_crawl_journal()
+        if journal.is_done(crawl_journal.UNIT_COMMENTS, note_id):
+            return
+        if not journal.need_fetch_comments(note_id, comment_count):
+            utils.logger.info(
+                f"[XiaoHongShuCrawler.get_comments] Comment count of note {note_id} not changed, skip"
+            )
+            return
+        # 增量模式下只爬上次最新一条评论之后的评论
+        since_time = journal.get_comment_since_time(note_id)
+        newest_time = since_time
+
+        def update_newest_time(comment_time: int):
+            nonlocal newest_time
+            newest_time = max(newest_time, comment_time)
+
         async with semaphore:
             utils.logger.info(
                 f"[XiaoHongShuCrawler.get_comments] Begin get note id comments {note_id}"
             )
-            # When proxy is not enabled, increase the crawling interval
-            if config.ENABLE_IP_PROXY:
-                crawl_interval = random.random()
-            else:
-                crawl_interval = random.uniform(1, config.CRAWLER_MAX_SLEEP_SEC)
             await self.xhs_client.get_note_all_comments(
                 note_id=note_id,
                 xsec_token=xsec_token,
-                crawl_interval=crawl_interval,
                 callback=xhs_store.batch_update_xhs_note_comments,
                 max_count=CRAWLER_MAX_COMMENTS_COUNT_SINGLENOTES,
+                start_cursor=journal.get_cursor(crawl_journal.UNIT_COMMENTS, note_id, default=""),
+                cursor_callback=lambda cursor: journal.after_flush(
+                    journal.save_cursor, crawl_journal.UNIT_COMMENTS, note_id, cursor
+                ),
+                since_time=since_time,
+                newest_time_callback=update_newest_time,
             )
+            journal.after_flush(journal.save_comment_state, note_id, comment_count, newest_time)
+            journal.after_flush(journal.mark_done, crawl_journal.UNIT_COMMENTS, note_id)
 
     @staticmethod
     def format_proxy_info(
@@ -402,6 +482,16 @@ class XiaoHongShuCrawler(AbstractCrawler):
         cookie_str, cookie_dict = utils.convert_cookies(
             await self.browser_context.cookies()
         )
+        signer = XhsSigner(
+            [self.context_page],
+            batch_window=config.XHS_SIGN_BATCH_WINDOW_MS / 1000,
+            max_batch_size=config.XHS_SIGN_MAX_BATCH_SIZE,
+            local_storage_ttl=config.XHS_SIGN_LOCAL_STORAGE_TTL_SEC,
+        )
+        for _ in range(config.XHS_SIGN_PAGE_COUNT - 1):
+            sign_page = await self.browser_context.new_page()
+            await sign_page.goto(self.index_url)
+            signer.add_page(sign_page)
         xhs_client_obj = XiaoHongShuClient(
             proxies=httpx_proxy,
             headers={
@@ -413,9 +503,21 @@ class XiaoHongShuCrawler(AbstractCrawler):
             },
             playwright_page=self.context_page,
             cookie_dict=cookie_dict,
+            signer=signer,
         )
         return xhs_client_obj
 
+    async def create_account_client(self, cookie_str: str, ip_proxy_info: Optional[IpInfoModel]) -> XiaoHongShuClient:
+        """Create API client for an extra account of the session pool"""
+        httpx_proxy = self.format_proxy_info(ip_proxy_info)[1] if ip_proxy_info else None
+        return XiaoHongShuClient(
+            proxies=httpx_proxy,
+            headers={**self.xhs_client.headers, "Cookie": cookie_str},
+            playwright_page=self.context_page,
+            cookie_dict=utils.convert_str_cookie_to_dict(cookie_str),
+            signer=self.xhs_client.signer,
+        )
+
     async def launch_browser(
         self,
         chromium: BrowserType,
@@ -480,17 +582,16 @@ class XiaoHongShuCrawler(AbstractCrawler):
 
         if not image_list:
             return
+        # 交给媒体下载器流式写入磁盘, 不等待下载完成
+        downloader = get_media_downloader(self.xhs_client.proxies)
         picNum = 0
         for pic in image_list:
             url = pic.get("url")
             if not url:
                 continue
-            content = await self.xhs_client.get_note_media(url)
-            if content is None:
-                continue
             extension_file_name = f"{picNum}.jpg"
             picNum += 1
-            await xhs_store.update_xhs_note_image(note_id, content, extension_file_name)
+            await downloader.submit(url, xhs_store.get_xhs_note_media_path(note_id, extension_file_name))
 
     async def get_notice_video(self, note_item: Dict):
         """
@@ -506,11 +607,9 @@ class XiaoHongShuCrawler(AbstractCrawler):
 
         if not videos:
             return
+        downloader = get_media_downloader(self.xhs_client.proxies)
         videoNum = 0
         for url in videos:
-            content = await self.xhs_client.get_note_media(url)
-            if content is None:
-                continue
             extension_file_name = f"{videoNum}.mp4"
             videoNum += 1
-            await xhs_store.update_xhs_note_image(note_id, content, extension_file_name)
+            await downloader.submit(url, xhs_store.get_xhs_note_media_path(note_id, extension_file_name))
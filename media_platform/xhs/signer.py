@@ -0,0 +1,161 @@
+# 声明：本代码仅供学习和研究目的使用。使用者应遵守以下原则：
+# 1. 不得用于任何商业用途。
+# 2. 使用时应遵守目标平台的使用条款和robots.txt规则。
+# 3. 不得进行大规模爬取或对平台造成运营干扰。
+# 4. 应合理控制请求频率，避免给目标平台带来不必要的负担。
+# 5. 不得用于任何非法或不当的用途。
+#
+# 详细许可条款请参阅项目根目录下的LICENSE文件。
+# 使用本代码即表示您同意遵守上述原则和LICENSE中的所有条款。
+
+
+# -*- coding: utf-8 -*-
+# @Desc    : 小红书请求签名, 合并同一时间窗口内的签名请求为一次 page.evaluate 调用,
+#            缓存 localStorage 中的 b1, 并可以把签名分散到多个页面上执行
+import asyncio
+import time
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Set, Tuple
+
+from playwright.async_api import Page
+
+from tools import metrics, utils
+
+# 一次 evaluate 批量计算多个签名, 需要时顺带读取 b1, 省去单独读取整个 localStorage 的一次往返
+BATCH_SIGN_JS = """
+([reqs, withB1]) => ({
+    signs: reqs.map(([url, data]) => window._webmsxyw(url, data)),
+    b1: withB1 ? window.localStorage.getItem("b1") : null,
+})
+"""
+
+
+class XhsSigner:
+    def __init__(
+            self,
+            pages: List[Page],
+            batch_window: float = 0.005,
+            max_batch_size: int = 20,
+            local_storage_ttl: float = 60,
+    ):
+        """
+        Args:
+            pages: 已经打开小红书首页的页面, 多个页面时签名按轮询分散执行
+            batch_window: 合并签名请求的时间窗口(秒)
+            max_batch_size: 一次 evaluate 最多计算的签名数量
+            local_storage_ttl: b1 缓存的有效期(秒)
+        """
+        self.pages = list(pages)
+        self.batch_window = batch_window
+        self.max_batch_size = max_batch_size
+        self.local_storage_ttl = local_storage_ttl
+
+        self._pending: List[Tuple[str, Any, asyncio.Future]] = []
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+        self._page_index = 0
+        self._b1: Optional[str] = None
+        self._b1_expire_ts = 0.0
+        self._latencies: Deque[float] = deque(maxlen=2000)
+        self._tasks: Set[asyncio.Task] = set()
+
+    def add_page(self, page: Page):
+        """
+        添加一个用于签名的页面
+        Args:
+            page:
+
+        Returns:
+
+        """
+        self.pages.append(page)
+
+    def invalidate_local_storage(self):
+        """
+        使 b1 缓存失效, 登录或者 cookie 更新后调用
+        Returns:
+
+        """
+        self._b1_expire_ts = 0.0
+
+    async def sign(self, url: str, data=None) -> Tuple[Dict, str]:
+        """
+        计算一个请求的签名
+        Args:
+            url: 请求路由(包含查询参数)
+            data: 请求体参数
+
+        Returns: (window._webmsxyw 的返回值, localStorage 中的 b1)
+
+        """
+        start = time.perf_counter()
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((url, data, future))
+        if len(self._pending) >= self.max_batch_size:
+            self._flush()
+        elif self._flush_handle is None:
+            self._flush_handle = asyncio.get_running_loop().call_later(self.batch_window, self._flush)
+        try:
+            return await future
+        finally:
+            latency = time.perf_counter() - start
+            self._latencies.append(latency)
+            metrics.observe_sign("xhs", latency)
+
+    def _flush(self):
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        batch, self._pending = self._pending, []
+        if batch:
+            task = asyncio.create_task(self._sign_batch(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    def _next_page(self) -> Page:
+        page = self.pages[self._page_index % len(self.pages)]
+        self._page_index += 1
+        return page
+
+    async def _sign_batch(self, batch: List[Tuple[str, Any, asyncio.Future]]):
+        with_b1 = time.monotonic() >= self._b1_expire_ts
+        try:
+            result: Dict = await self._next_page().evaluate(
+                BATCH_SIGN_JS, [[[url, data] for url, data, _ in batch], with_b1]
+            )
+        except Exception as e:
+            utils.logger.error(f"[XhsSigner._sign_batch] sign {len(batch)} requests error: {e}")
+            for _, _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        if with_b1:
+            self._b1 = result.get("b1") or ""
+            self._b1_expire_ts = time.monotonic() + self.local_storage_ttl
+        signs: List[Dict] = result.get("signs") or []
+        for index, (_, _, future) in enumerate(batch):
+            if future.done():
+                continue
+            if index < len(signs):
+                future.set_result((signs[index] or {}, self._b1 or ""))
+            else:
+                future.set_exception(Exception("xhs sign result is missing"))
+
+    def latency_percentiles(self, percentiles=(50, 90, 99)) -> Dict[str, float]:
+        """
+        最近签名耗时的分位数, 单位毫秒
+        Args:
+            percentiles: 需要计算的分位
+
+        Returns: eg: {"p50": 3.2, "p90": 8.1, "p99": 15.0, "count": 1000}
+
+        """
+        latencies = sorted(self._latencies)
+        res: Dict[str, float] = {"count": len(latencies)}
+        for p in percentiles:
+            if latencies:
+                index = min(len(latencies) - 1, int(round(p / 100 * (len(latencies) - 1))))
+                res[f"p{p}"] = round(latencies[index] * 1000, 2)
+            else:
+                res[f"p{p}"] = 0.0
+        return res
@@ -58,12 +58,28 @@ class ZhiHuClient(AbstractApiClient):
         d_c0 = self.cookie_dict.get("d_c0")
         if not d_c0:
             raise Exception("d_c0 not found in cookies")
-        sign_res = sign(url, self.default_headers["cookie"])
+        sign_res = await sign(url, self.default_headers["cookie"])
         headers = self.default_headers.copy()
         headers['x-zst-81'] = sign_res["x-zst-81"]
         headers['x-zse-96'] = sign_res["x-zse-96"]
         return headers
 
+    def is_cacheable(self, response: httpx.Response) -> bool:
+        """
+        返回 error 的错误响应不缓存, HTML 页面直接缓存
+        Args:
+            response: 请求响应
+
+        Returns:
+            是否可以缓存
+        """
+        if "application/json" not in response.headers.get("content-type", ""):
+            return True
+        try:
+            return not response.json().get("error")
+        except ValueError:
+            return False
+
     @retry(stop=stop_after_attempt(3), wait=wait_fixed(1))
     async def request(self, method, url, **kwargs) -> Union[str, Any]:
         """
@@ -79,11 +95,10 @@ class ZhiHuClient(AbstractApiClient):
         # return response.text
         return_response = kwargs.pop('return_response', False)
 
-        async with httpx.AsyncClient(proxies=self.proxies, ) as client:
-            response = await client.request(
-                method, url, timeout=self.timeout,
-                **kwargs
-            )
+        response = await self.send(
+            method, url, platform="zhihu", timeout=self.timeout,
+            **kwargs
+        )
 
         if response.status_code != 200:
             utils.logger.error(f"[ZhiHuClient.request] Requset Url: {url}, Request error: {response.text}")
@@ -210,7 +225,7 @@ class ZhiHuClient(AbstractApiClient):
             "vertical": note_type.value,
         }
         search_res = await self.get(uri, params)
-        utils.logger.info(f"[ZhiHuClient.get_note_by_keyword] Search result: {search_res}")
+        utils.logger.info("[ZhiHuClient.get_note_by_keyword] Search result: %s", search_res)
         return self._extractor.extract_contents_from_search(search_res)
 
     async def get_root_comments(self, content_id: str, content_type: str, offset: str = "", limit: int = 10,
@@ -259,21 +274,24 @@ class ZhiHuClient(AbstractApiClient):
         }
         return await self.get(uri, params)
 
-    async def get_note_all_comments(self, content: ZhihuContent, crawl_interval: float = 1.0,
-                                    callback: Optional[Callable] = None) -> List[ZhihuComment]:
+    async def get_note_all_comments(self, content: ZhihuContent,
+                                    callback: Optional[Callable] = None,
+                                    start_cursor: str = "",
+                                    cursor_callback: Optional[Callable] = None) -> List[ZhihuComment]:
         """
         获取指定帖子下的所有一级评论，该方法会一直查找一个帖子下的所有评论信息
         Args:
             content: 内容详情对象(问题｜文章｜视频)
-            crawl_interval: 爬取一次笔记的延迟单位（秒）
             callback: 一次笔记爬取结束后
+            start_cursor: 开始翻页的 offset, 用于从上次中断的位置继续
+            cursor_callback: 每处理完一页评论后回调下一页的 offset
 
         Returns:
 
         """
         result: List[ZhihuComment] = []
         is_end: bool = False
-        offset: str = ""
+        offset: str = start_cursor
         limit: int = 10
         while not is_end:
             root_comment_res = await self.get_root_comments(content.content_id, content.content_type, offset, limit)
@@ -291,18 +309,18 @@ class ZhiHuClient(AbstractApiClient):
                 await callback(comments)
 
             result.extend(comments)
-            await self.get_comments_all_sub_comments(content, comments, crawl_interval=crawl_interval, callback=callback)
-            await asyncio.sleep(crawl_interval)
+            await self.get_comments_all_sub_comments(content, comments, callback=callback)
+            if cursor_callback:
+                cursor_callback(offset)
         return result
 
-    async def get_comments_all_sub_comments(self, content: ZhihuContent, comments: List[ZhihuComment], crawl_interval: float = 1.0,
+    async def get_comments_all_sub_comments(self, content: ZhihuContent, comments: List[ZhihuComment],
                                             callback: Optional[Callable] = None) -> List[ZhihuComment]:
         """
         获取指定评论下的所有子评论
         Args:
             content: 内容详情对象(问题｜文章｜视频)
             comments: 评论列表
-            crawl_interval: 爬取一次笔记的延迟单位（秒）
             callback: 一次笔记爬取结束后
 
         Returns:
@@ -335,7 +353,6 @@ class ZhiHuClient(AbstractApiClient):
                     await callback(sub_comments)
 
                 all_sub_comments.extend(sub_comments)
-                await asyncio.sleep(crawl_interval)
         return all_sub_comments
 
     async def get_creator_info(self, url_token: str) -> Optional[ZhihuCreator]:
@@ -412,13 +429,12 @@ class ZhiHuClient(AbstractApiClient):
         }
         return await self.get(uri, params)
 
-    async def get_all_anwser_by_creator(self, creator: ZhihuCreator, crawl_interval: float = 1.0,
+    async def get_all_anwser_by_creator(self, creator: ZhihuCreator,
                                         callback: Optional[Callable] = None) -> List[ZhihuContent]:
         """
         获取创作者的所有回答
         Args:
             creator: 创作者信息
-            crawl_interval: 爬取一次笔记的延迟单位（秒）
             callback: 一次笔记爬取结束后
 
         Returns:
@@ -432,7 +448,7 @@ class ZhiHuClient(AbstractApiClient):
             res = await self.get_creator_answers(creator.url_token, offset, limit)
             if not res:
                 break
-            utils.logger.info(f"[ZhiHuClient.get_all_anwser_by_creator] Get creator {creator.url_token} answers: {res}")
+            utils.logger.info("[ZhiHuClient.get_all_anwser_by_creator] Get creator %s answers: %s", creator.url_token, res)
             paging_info = res.get("paging", {})
             is_end = paging_info.get("is_end")
             contents = self._extractor.extract_content_list_from_creator(res.get("data"))
@@ -440,17 +456,15 @@ class ZhiHuClient(AbstractApiClient):
                 await callback(contents)
             all_contents.extend(contents)
             offset += limit
-            await asyncio.sleep(crawl_interval)
         return all_contents
 
 
-    async def get_all_articles_by_creator(self, creator: ZhihuCreator, crawl_interval: float = 1.0,
+    async def get_all_articles_by_creator(self, creator: ZhihuCreator,
                                           callback: Optional[Callable] = None) -> List[ZhihuContent]:
         """
         获取创作者的所有文章
         Args:
             creator:
-            crawl_interval:
             callback:
 
         Returns:
@@ -471,17 +485,15 @@ class ZhiHuClient(AbstractApiClient):
                 await callback(contents)
             all_contents.extend(contents)
             offset += limit
-            await asyncio.sleep(crawl_interval)
         return all_contents
 
 
-    async def get_all_videos_by_creator(self, creator: ZhihuCreator, crawl_interval: float = 1.0,
+    async def get_all_videos_by_creator(self, creator: ZhihuCreator,
                                         callback: Optional[Callable] = None) -> List[ZhihuContent]:
         """
         获取创作者的所有视频
         Args:
             creator:
-            crawl_interval:
             callback:
 
         Returns:
@@ -502,7 +514,6 @@ class ZhiHuClient(AbstractApiClient):
                 await callback(contents)
             all_contents.extend(contents)
             offset += limit
-            await asyncio.sleep(crawl_interval)
         return all_contents
 
 
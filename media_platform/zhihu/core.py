@@ -12,7 +12,6 @@
 # -*- coding: utf-8 -*-
 import asyncio
 import os
-import random
 from asyncio import Task
 from typing import Dict, List, Optional, Tuple, cast
 
@@ -22,14 +21,16 @@ from playwright.async_api import (BrowserContext, BrowserType, Page,
 import config
 from constant import zhihu as constant
 from base.base_crawler import AbstractCrawler
+from cache.seen_set import is_seen, mark_seen
 from model.m_zhihu import ZhihuContent, ZhihuCreator
 from proxy.proxy_ip_pool import IpInfoModel, create_ip_pool
+from store import crawl_journal
 from store import zhihu as zhihu_store
-from tools import utils
+from tools import session_pool, utils
 from var import crawler_type_var, source_keyword_var
 
 from .client import ZhiHuClient
-from .exception import DataFetchError
+from .exception import DataFetchError, ForbiddenError, IPBlockError
 from .help import ZhihuExtractor, judge_zhihu_url
 from .login import ZhiHuLogin
 
@@ -51,7 +52,7 @@ class ZhihuCrawler(AbstractCrawler):
         Returns:
 
         """
-        playwright_proxy_format, httpx_proxy_format = None, None
+        playwright_proxy_format, httpx_proxy_format, ip_proxy_pool = None, None, None
         if config.ENABLE_IP_PROXY:
             ip_proxy_pool = await create_ip_pool(config.IP_PROXY_POOL_COUNT, enable_validate_ip=True)
             ip_proxy_info: IpInfoModel = await ip_proxy_pool.get_proxy()
@@ -74,6 +75,9 @@ class ZhihuCrawler(AbstractCrawler):
 
             # Create a client to interact with the zhihu website.
             self.zhihu_client = await self.create_zhihu_client(httpx_proxy_format)
+            if ip_proxy_pool:
+                # 请求被风控时从代理池换代理重试
+                self.zhihu_client.set_ip_proxy_pool(ip_proxy_pool, ip_proxy_info)
             if not await self.zhihu_client.pong():
                 login_obj = ZhiHuLogin(
                     login_type=config.LOGIN_TYPE,
@@ -91,6 +95,12 @@ class ZhihuCrawler(AbstractCrawler):
             await asyncio.sleep(5)
             await self.zhihu_client.update_cookies(browser_context=self.browser_context)
 
+            # 配置了多个账号时, 请求分发到各个账号的会话上
+            self.zhihu_client = await session_pool.create_session_pool_client(
+                "zhihu", self.zhihu_client, self.create_account_client,
+                retire_exceptions=(IPBlockError, ForbiddenError), ip_proxy_pool=ip_proxy_pool,
+            )
+
             crawler_type_var.set(config.CRAWLER_TYPE)
             if config.CRAWLER_TYPE == "search":
                 # Search for notes and retrieve their comment information.
@@ -104,6 +114,8 @@ class ZhihuCrawler(AbstractCrawler):
             else:
                 pass
 
+            # 关闭 API 客户端复用的 http 连接
+            await self.zhihu_client.close()
             utils.logger.info("[ZhihuCrawler.start] Zhihu Crawler finished ...")
 
     async def search(self) -> None:
@@ -113,7 +125,9 @@ class ZhihuCrawler(AbstractCrawler):
         if config.CRAWLER_MAX_NOTES_COUNT < zhihu_limit_count:
             config.CRAWLER_MAX_NOTES_COUNT = zhihu_limit_count
         start_page = config.START_PAGE
-        for keyword in config.KEYWORDS.split(","):
+        journal = crawl_journal.get_crawl_journal()
+        keywords = config.KEYWORDS.split(",")
+        for index, keyword in enumerate(keywords):
             source_keyword_var.set(keyword)
             utils.logger.info(f"[ZhihuCrawler.search] Current search keyword: {keyword}")
             page = 1
@@ -122,6 +136,14 @@ class ZhihuCrawler(AbstractCrawler):
                     utils.logger.info(f"[ZhihuCrawler.search] Skip page {page}")
                     page += 1
                     continue
+                # 上次已经搜索过的页直接复用保存的内容列表
+                content_dicts = journal.get_payload(crawl_journal.UNIT_SEARCH_PAGE, f"{keyword}:{page}")
+                if content_dicts is not None:
+                    utils.logger.info(f"[ZhihuCrawler.search] Resume keyword: {keyword}, page: {page}")
+                    await self.batch_get_content_comments(
+                        [ZhihuContent(**item) for item in content_dicts if not await is_seen("zhihu", item.get("content_id"))])
+                    page += 1
+                    continue
 
                 try:
                     utils.logger.info(f"[ZhihuCrawler.search] search zhihu keyword: {keyword}, page: {page}")
@@ -129,18 +151,27 @@ class ZhihuCrawler(AbstractCrawler):
                         keyword=keyword,
                         page=page,
                     )
-                    utils.logger.info(f"[ZhihuCrawler.search] Search contents :{content_list}")
+                    utils.logger.info("[ZhihuCrawler.search] Search contents :%s", content_list)
                     if not content_list:
                         utils.logger.info("No more content!")
                         break
 
+                    journal.mark_done(crawl_journal.UNIT_SEARCH_PAGE, f"{keyword}:{page}",
+                                      [content.model_dump() for content in content_list])
                     page += 1
+                    # 其他关键词已经搜到过的内容不再重复保存和爬评论
+                    content_list = [content for content in content_list
+                                    if not await is_seen("zhihu", content.content_id)]
                     for content in content_list:
                         await zhihu_store.update_zhihu_content(content)
+                        await mark_seen("zhihu", content.content_id)
 
                     await self.batch_get_content_comments(content_list)
-                except DataFetchError:
+                except DataFetchError as e:
                     utils.logger.error("[ZhihuCrawler.search] Search content error")
+                    # 之后的关键词不再搜索, 一起记为失败
+                    for failed_keyword in keywords[index:]:
+                        journal.mark_task_failed(failed_keyword, e)
                     return
 
     async def batch_get_content_comments(self, content_list: List[ZhihuContent]):
@@ -173,13 +204,25 @@ class ZhihuCrawler(AbstractCrawler):
         Returns:
 
         """
+        journal = crawl_journal.get_crawl_journal()
+        content_id = content_item.content_id
+        if journal.is_done(crawl_journal.UNIT_COMMENTS, content_id):
+            return
+        if not journal.need_fetch_comments(content_id, content_item.comment_count):
+            utils.logger.info(f"[ZhihuCrawler.get_comments] Comment count of content {content_id} not changed, skip")
+            return
         async with semaphore:
-            utils.logger.info(f"[ZhihuCrawler.get_comments] Begin get note id comments {content_item.content_id}")
+            utils.logger.info(f"[ZhihuCrawler.get_comments] Begin get note id comments {content_id}")
             await self.zhihu_client.get_note_all_comments(
                 content=content_item,
-                crawl_interval=random.random(),
-                callback=zhihu_store.batch_update_zhihu_note_comments
+                callback=zhihu_store.batch_update_zhihu_note_comments,
+                start_cursor=journal.get_cursor(crawl_journal.UNIT_COMMENTS, content_id, default=""),
+                cursor_callback=lambda cursor: journal.after_flush(
+                    journal.save_cursor, crawl_journal.UNIT_COMMENTS, content_id, cursor
+                ),
             )
+            journal.after_flush(journal.save_comment_state, content_id, content_item.comment_count, 0)
+            journal.after_flush(journal.mark_done, crawl_journal.UNIT_COMMENTS, content_id)
 
     async def get_creators_and_notes(self) -> None:
         """
@@ -188,7 +231,11 @@ class ZhihuCrawler(AbstractCrawler):
 
         """
         utils.logger.info("[ZhihuCrawler.get_creators_and_notes] Begin get xiaohongshu creators")
+        journal = crawl_journal.get_crawl_journal()
         for user_link in config.ZHIHU_CREATOR_URL_LIST:
+            if journal.is_done(crawl_journal.UNIT_CREATOR, user_link):
+                utils.logger.info(f"[ZhihuCrawler.get_creators_and_notes] Skip finished creator: {user_link}")
+                continue
             utils.logger.info(f"[ZhihuCrawler.get_creators_and_notes] Begin get creator {user_link}")
             user_url_token = user_link.split("/")[-1]
             # get creator detail info from web html content
@@ -197,7 +244,7 @@ class ZhihuCrawler(AbstractCrawler):
                 utils.logger.info(f"[ZhihuCrawler.get_creators_and_notes] Creator {user_url_token} not found")
                 continue
 
-            utils.logger.info(f"[ZhihuCrawler.get_creators_and_notes] Creator info: {createor_info}")
+            utils.logger.info("[ZhihuCrawler.get_creators_and_notes] Creator info: %s", createor_info)
             await zhihu_store.save_creator(creator=createor_info)
 
             # 默认只提取回答信息，如果需要文章和视频，把下面的注释打开即可
@@ -205,7 +252,6 @@ class ZhihuCrawler(AbstractCrawler):
             # Get all anwser information of the creator
             all_content_list = await self.zhihu_client.get_all_anwser_by_creator(
                 creator=createor_info,
-                crawl_interval=random.random(),
                 callback=zhihu_store.batch_update_zhihu_contents
             )
 
@@ -213,19 +259,18 @@ class ZhihuCrawler(AbstractCrawler):
             # Get all articles of the creator's contents
             # all_content_list = await self.zhihu_client.get_all_articles_by_creator(
             #     creator=createor_info,
-            #     crawl_interval=random.random(),
             #     callback=zhihu_store.batch_update_zhihu_contents
             # )
 
             # Get all videos of the creator's contents
             # all_content_list = await self.zhihu_client.get_all_videos_by_creator(
             #     creator=createor_info,
-            #     crawl_interval=random.random(),
             #     callback=zhihu_store.batch_update_zhihu_contents
             # )
 
             # Get all comments of the creator's contents
             await self.batch_get_content_comments(all_content_list)
+            journal.after_flush(journal.mark_done, crawl_journal.UNIT_CREATOR, user_link)
 
     async def get_note_detail(
         self, full_note_url: str, semaphore: asyncio.Semaphore
@@ -290,6 +335,7 @@ class ZhihuCrawler(AbstractCrawler):
                 utils.logger.info(
                     f"[ZhihuCrawler.get_specified_notes] Note {config.ZHIHU_SPECIFIED_ID_LIST[index]} not found"
                 )
+                crawl_journal.report_task_error("note not found", config.ZHIHU_SPECIFIED_ID_LIST[index])
                 continue
 
             note_detail = cast(ZhihuContent, note_detail)  # only for type check
@@ -334,6 +380,16 @@ class ZhihuCrawler(AbstractCrawler):
         )
         return zhihu_client_obj
 
+    async def create_account_client(self, cookie_str: str, ip_proxy_info: Optional[IpInfoModel]) -> ZhiHuClient:
+        """Create API client for an extra account of the session pool"""
+        httpx_proxy = self.format_proxy_info(ip_proxy_info)[1] if ip_proxy_info else None
+        return ZhiHuClient(
+            proxies=httpx_proxy,
+            headers={**self.zhihu_client.default_headers, "cookie": cookie_str},
+            playwright_page=self.context_page,
+            cookie_dict=utils.convert_str_cookie_to_dict(cookie_str),
+        )
+
     async def launch_browser(
             self,
             chromium: BrowserType,
@@ -19,14 +19,29 @@ from parsel import Selector
 
 from constant import zhihu as zhihu_constant
 from model.m_zhihu import ZhihuComment, ZhihuContent, ZhihuCreator
+from tools import sign_worker
 from tools.crawler_util import extract_text_from_html
 
+ZHIHU_SIGN_JS_PATH = "libs/zhihu.js"
 ZHIHU_SGIN_JS = None
 
 
-def sign(url: str, cookies: str) -> Dict:
+async def sign(url: str, cookies: str) -> Dict:
     """
-    zhihu sign algorithm
+    zhihu sign algorithm, run by the long-lived node sign worker
+    Args:
+        url: request url with query string
+        cookies: request cookies with d_c0 key
+
+    Returns:
+
+    """
+    return await sign_worker.get_sign_pool(ZHIHU_SIGN_JS_PATH).call("get_sign", url, cookies)
+
+
+def sign_from_execjs(url: str, cookies: str) -> Dict:
+    """
+    zhihu sign algorithm by execjs, start a new node process for every call
     Args:
         url: request url with query string
         cookies: request cookies with d_c0 key
@@ -36,7 +51,7 @@ def sign(url: str, cookies: str) -> Dict:
     """
     global ZHIHU_SGIN_JS
     if not ZHIHU_SGIN_JS:
-        with open("libs/zhihu.js", mode="r", encoding="utf-8-sig") as f:
+        with open(ZHIHU_SIGN_JS_PATH, mode="r", encoding="utf-8-sig") as f:
             ZHIHU_SGIN_JS = execjs.compile(f.read())
 
     return ZHIHU_SGIN_JS.call("get_sign", url, cookies)
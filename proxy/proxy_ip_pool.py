@@ -13,87 +13,282 @@
 # @Author  : relakkes@gmail.com
 # @Time    : 2023/12/2 13:45
 # @Desc    : ip代理池实现
-import random
-from typing import Dict, List
+#            维持目标数量的可用代理, 后台任务定期补充并发验证新代理, 按延迟和错误率的 EWMA 给代理打分,
+#            租出得分最好的代理, 使用方归还时反馈请求结果, 连续失败或快过期的代理会被剔除
+import asyncio
+import time
+from typing import Dict, List, Optional, Tuple
 
 import httpx
-from tenacity import retry, stop_after_attempt, wait_fixed
 
 import config
 from proxy.providers import new_jisu_http_proxy, new_kuai_daili_proxy
-from tools import utils
+from tools import metrics, utils
 
 from .base_proxy import ProxyProvider
 from .types import IpInfoModel, ProviderNameEnum
 
+# EWMA 平滑系数, 越大越看重最近的请求结果
+EWMA_ALPHA = 0.3
+
+
+def _proxy_key(proxy: IpInfoModel) -> Tuple[str, int, str]:
+    return proxy.ip, proxy.port, proxy.user
+
+
+class ProxyState:
+    """代理的健康状态"""
+
+    def __init__(self, proxy: IpInfoModel, latency: float):
+        self.proxy = proxy
+        self.latency_ewma = latency
+        self.error_ewma = 0.0
+        self.consecutive_failures = 0
+        self.leased_count = 0
+        self.success_count = 0
+        self.fail_count = 0
+
+    @property
+    def score(self) -> float:
+        """得分越低越好, 错误率会放大延迟"""
+        return self.latency_ewma * (1 + 4 * self.error_ewma)
+
+    def record(self, success: bool, latency: Optional[float]):
+        self.error_ewma = EWMA_ALPHA * (0.0 if success else 1.0) + (1 - EWMA_ALPHA) * self.error_ewma
+        if latency is not None:
+            self.latency_ewma = EWMA_ALPHA * latency + (1 - EWMA_ALPHA) * self.latency_ewma
+        if success:
+            self.success_count += 1
+            self.consecutive_failures = 0
+        else:
+            self.fail_count += 1
+            self.consecutive_failures += 1
+
 
 class ProxyIpPool:
-    def __init__(self, ip_pool_count: int, enable_validate_ip: bool, ip_provider: ProxyProvider) -> None:
+    def __init__(self, ip_pool_count: int, enable_validate_ip: bool, ip_provider: ProxyProvider,
+                 refill_interval_sec: float = 30, max_consecutive_failures: int = 3,
+                 expire_margin_sec: int = 30, validate_concurrency: int = 10) -> None:
         """
 
         Args:
-            ip_pool_count:
-            enable_validate_ip:
-            ip_provider:
+            ip_pool_count: 维持的可用代理数量
+            enable_validate_ip: 新代理入池前是否验证
+            ip_provider: 代理商
+            refill_interval_sec: 后台补充代理的检查间隔
+            max_consecutive_failures: 代理连续失败多少次后剔除
+            expire_margin_sec: 代理在过期前多少秒就不再租出
+            validate_concurrency: 并发验证代理的数量
         """
         self.valid_ip_url = "https://httpbin.org/ip"  # 验证 IP 是否有效的地址
         self.ip_pool_count = ip_pool_count
         self.enable_validate_ip = enable_validate_ip
-        self.proxy_list: List[IpInfoModel] = []
         self.ip_provider: ProxyProvider = ip_provider
+        self.refill_interval_sec = refill_interval_sec
+        self.max_consecutive_failures = max_consecutive_failures
+        self.expire_margin_sec = expire_margin_sec
+        self._validate_semaphore = asyncio.Semaphore(validate_concurrency)
+        self._states: Dict[Tuple[str, int, str], ProxyState] = {}
+        # 被剔除的代理 -> 过期时间, 不再入池; 代理商的缓存里在过期前还有它们, 过期后从这里删除
+        self._evicted_keys: Dict[Tuple[str, int, str], Optional[int]] = {}
+        self._refill_lock = asyncio.Lock()
+        self._refill_event = asyncio.Event()
+        self._refill_task: Optional[asyncio.Task] = None
+        self.evicted_count = 0
+
+    @property
+    def proxy_list(self) -> List[IpInfoModel]:
+        return [state.proxy for state in self._states.values()]
 
     async def load_proxies(self) -> None:
         """
-        加载IP代理
+        加载IP代理, 并启动后台补充任务
         Returns:
 
         """
-        self.proxy_list = await self.ip_provider.get_proxies(self.ip_pool_count)
+        await self._refill()
+        if self._refill_task is None:
+            self._refill_task = asyncio.create_task(self._refill_loop())
+
+    def _is_expired(self, proxy: IpInfoModel) -> bool:
+        return bool(proxy.expired_time_ts) and proxy.expired_time_ts - self.expire_margin_sec <= utils.get_unix_timestamp()
+
+    def _evict(self, key: Tuple[str, int, str], reason: str):
+        state = self._states.pop(key, None)
+        if state is None:
+            return
+        self._evicted_keys[key] = state.proxy.expired_time_ts
+        self.evicted_count += 1
+        utils.logger.info(f"[ProxyIpPool._evict] evict proxy {state.proxy.ip}:{state.proxy.port}, reason: {reason}")
+        self._refill_event.set()
 
-    async def _is_valid_proxy(self, proxy: IpInfoModel) -> bool:
+    def _evict_expired(self):
+        for key, state in list(self._states.items()):
+            if self._is_expired(state.proxy):
+                self._evict(key, "expired")
+        # 已经过期的代理代理商的缓存里也没有了, 不用再记着
+        now = utils.get_unix_timestamp()
+        for key, expired_time_ts in list(self._evicted_keys.items()):
+            if expired_time_ts and expired_time_ts <= now:
+                del self._evicted_keys[key]
+
+    async def _is_valid_proxy(self, proxy: IpInfoModel) -> Optional[float]:
         """
         验证代理IP是否有效
         :param proxy:
-        :return:
+        :return: 有效时返回验证请求的耗时(秒), 无效时返回 None
         """
         utils.logger.info(f"[ProxyIpPool._is_valid_proxy] testing {proxy.ip} is it valid ")
+        _, httpx_proxy = utils.format_proxy_info(proxy)
         try:
-            httpx_proxy = {
-                f"{proxy.protocol}": f"http://{proxy.user}:{proxy.password}@{proxy.ip}:{proxy.port}"
-            }
+            start = time.perf_counter()
             async with httpx.AsyncClient(proxies=httpx_proxy) as client:
                 response = await client.get(self.valid_ip_url)
             if response.status_code == 200:
-                return True
-            else:
-                return False
+                return time.perf_counter() - start
+            return None
         except Exception as e:
             utils.logger.info(f"[ProxyIpPool._is_valid_proxy] testing {proxy.ip} err: {e}")
-            raise e
+            return None
+
+    async def _validate(self, proxy: IpInfoModel) -> Optional[float]:
+        if not self.enable_validate_ip:
+            return 0.0
+        async with self._validate_semaphore:
+            return await self._is_valid_proxy(proxy)
+
+    async def _refill(self):
+        """
+        可用代理不足时从代理商获取新代理, 并发验证后入池
+        Returns:
+
+        """
+        async with self._refill_lock:
+            self._evict_expired()
+            need_count = self.ip_pool_count - len(self._states)
+            if need_count <= 0:
+                return
+            # 代理商优先返回缓存中还没过期的代理, 只多要缓存中已知代理(池中和被剔除但还没过期的)的数量,
+            # 代理商只会购买 need_count 个新代理
+            known_count = len(self._states) + len(self._evicted_keys)
+            candidates = []
+            for proxy in await self.ip_provider.get_proxies(known_count + need_count):
+                key = _proxy_key(proxy)
+                if key in self._states or key in self._evicted_keys:
+                    continue
+                if self._is_expired(proxy):
+                    # 快过期的代理还留在代理商的缓存里, 记下来, 下次多要一个
+                    self._evicted_keys[key] = proxy.expired_time_ts
+                    continue
+                candidates.append(proxy)
+            latencies = await asyncio.gather(*[self._validate(proxy) for proxy in candidates])
+            for proxy, latency in zip(candidates, latencies):
+                if latency is None:
+                    self._evicted_keys[_proxy_key(proxy)] = proxy.expired_time_ts
+                    continue
+                self._states[_proxy_key(proxy)] = ProxyState(proxy, latency)
+            utils.logger.info(f"[ProxyIpPool._refill] {len(self._states)}/{self.ip_pool_count} proxies available")
+
+    async def _refill_loop(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._refill_event.wait(), timeout=self.refill_interval_sec)
+            except asyncio.TimeoutError:
+                pass
+            self._refill_event.clear()
+            try:
+                await self._refill()
+            except Exception as e:
+                utils.logger.error(f"[ProxyIpPool._refill_loop] refill proxies error: {e}")
+
+    async def lease(self) -> IpInfoModel:
+        """
+        租出一个代理, 优先租出当前租用数最少、得分最好的代理, 用完后调用 release 反馈结果
+        :return:
+        """
+        self._evict_expired()
+        if not self._states:
+            # 池子被剔除空了, 等不及后台补充
+            await self._refill()
+        if not self._states:
+            raise Exception("[ProxyIpPool.lease] no available proxy")
+        state = min(self._states.values(), key=lambda item: (item.leased_count, item.score))
+        state.leased_count += 1
+        return state.proxy
+
+    def release(self, proxy: IpInfoModel, success: Optional[bool] = True, latency: Optional[float] = None):
+        """
+        归还代理并反馈使用结果, 连续失败次数过多时剔除
+        :param proxy: lease 租出的代理
+        :param success: 使用代理的请求是否成功, 为 None 时只归还不反馈(结果已经通过 report 反馈过)
+        :param latency: 请求耗时(秒)
+        :return:
+        """
+        state = self._states.get(_proxy_key(proxy))
+        if state is not None:
+            state.leased_count = max(0, state.leased_count - 1)
+        if success is not None:
+            self.report(proxy, success, latency)
+
+    def report(self, proxy: IpInfoModel, success: bool, latency: Optional[float] = None):
+        """
+        反馈一次使用代理的请求结果, 不归还代理, 适合长期租用代理的客户端每次请求后调用
+        :param proxy: lease 租出的代理
+        :param success: 请求是否成功
+        :param latency: 请求耗时(秒)
+        :return:
+        """
+        state = self._states.get(_proxy_key(proxy))
+        if state is None:
+            return
+        state.record(success, latency)
+        if state.consecutive_failures >= self.max_consecutive_failures:
+            self._evict(_proxy_key(proxy), f"{state.consecutive_failures} consecutive failures")
 
-    @retry(stop=stop_after_attempt(3), wait=wait_fixed(1))
     async def get_proxy(self) -> IpInfoModel:
         """
-        从代理池中随机提取一个代理IP
+        从代理池中提取一个代理IP, 兼容原来的调用方式, 等同于 lease
         :return:
         """
-        if len(self.proxy_list) == 0:
-            await self._reload_proxies()
+        return await self.lease()
 
-        proxy = random.choice(self.proxy_list)
-        self.proxy_list.remove(proxy) # 取出来一个IP就应该移出掉
-        if self.enable_validate_ip:
-            if not await self._is_valid_proxy(proxy):
-                raise Exception("[ProxyIpPool.get_proxy] current ip invalid and again get it")
-        return proxy
+    def collect_metrics(self) -> List[metrics.GaugeSample]:
+        """
+        代理池的健康度指标, 由 tools.metrics 在抓取时调用
+        :return:
+        """
+        samples: List[metrics.GaugeSample] = [
+            ("crawler_proxy_available", {"provider": type(self.ip_provider).__name__}, len(self._states))
+        ]
+        for state in self._states.values():
+            labels = {"proxy": f"{state.proxy.ip}:{state.proxy.port}"}
+            samples.append(("crawler_proxy_leased", labels, state.leased_count))
+            samples.append(("crawler_proxy_latency_ewma_seconds", labels, state.latency_ewma))
+            samples.append(("crawler_proxy_error_ewma", labels, state.error_ewma))
+        return samples
 
-    async def _reload_proxies(self):
+    def stats(self) -> List[Dict]:
+        return [
+            {
+                "proxy": f"{state.proxy.ip}:{state.proxy.port}",
+                "latency_ewma_ms": round(state.latency_ewma * 1000, 1),
+                "error_ewma": round(state.error_ewma, 3),
+                "leased": state.leased_count,
+                "success": state.success_count,
+                "fail": state.fail_count,
+            }
+            for state in self._states.values()
+        ]
+
+    async def close(self):
         """
-        # 重新加载代理池
+        停止后台补充任务
         :return:
         """
-        self.proxy_list = []
-        await self.load_proxies()
+        if self._refill_task is not None:
+            self._refill_task.cancel()
+            self._refill_task = None
+        utils.logger.info(f"[ProxyIpPool.close] evicted {self.evicted_count} proxies, proxy stats: {self.stats()}")
 
 
 IpProxyProvider: Dict[str, ProxyProvider] = {
@@ -101,6 +296,8 @@ IpProxyProvider: Dict[str, ProxyProvider] = {
     ProviderNameEnum.KUAI_DAILI_PROVIDER.value: new_kuai_daili_proxy()
 }
 
+_pools: List[ProxyIpPool] = []
+
 
 async def create_ip_pool(ip_pool_count: int, enable_validate_ip: bool) -> ProxyIpPool:
     """
@@ -111,11 +308,28 @@ async def create_ip_pool(ip_pool_count: int, enable_validate_ip: bool) -> ProxyI
     """
     pool = ProxyIpPool(ip_pool_count=ip_pool_count,
                        enable_validate_ip=enable_validate_ip,
-                       ip_provider=IpProxyProvider.get(config.IP_PROXY_PROVIDER_NAME)
+                       ip_provider=IpProxyProvider.get(config.IP_PROXY_PROVIDER_NAME),
+                       refill_interval_sec=config.IP_PROXY_REFILL_INTERVAL_SEC,
+                       max_consecutive_failures=config.IP_PROXY_MAX_CONSECUTIVE_FAILURES,
+                       expire_margin_sec=config.IP_PROXY_EXPIRE_MARGIN_SEC,
+                       validate_concurrency=config.IP_PROXY_VALIDATE_CONCURRENCY,
                        )
     await pool.load_proxies()
+    _pools.append(pool)
+    metrics.register_collector(f"proxy_pool:{id(pool)}", pool.collect_metrics)
     return pool
 
 
+async def close_all():
+    """
+    停止所有代理池的后台补充任务, 程序退出前调用
+    :return:
+    """
+    for pool in _pools:
+        metrics.unregister_collector(f"proxy_pool:{id(pool)}")
+        await pool.close()
+    _pools.clear()
+
+
 if __name__ == '__main__':
     pass
@@ -17,13 +17,13 @@ from fastapi import FastAPI, HTTPException, status
 from pydantic import BaseModel
 
 import config
-from cache.abs_cache import AbstractCache
+from cache.abs_cache import AbstractAsyncCache
 from cache.cache_factory import CacheFactory
 from tools import utils
 
 app = FastAPI()
 
-cache_client : AbstractCache = CacheFactory.create_cache(cache_type=config.CACHE_TYPE_MEMORY)
+cache_client: AbstractAsyncCache = CacheFactory.create_cache(cache_type=config.CACHE_TYPE_MEMORY, is_async=True)
 
 
 class SmsNotification(BaseModel):
@@ -44,7 +44,7 @@ def extract_verification_code(message: str) -> str:
 
 
 @app.post("/")
-def receive_sms_notification(sms: SmsNotification):
+async def receive_sms_notification(sms: SmsNotification):
     """
     Receive SMS notification and send it to Redis.
     Args:
@@ -65,7 +65,7 @@ def receive_sms_notification(sms: SmsNotification):
     if sms_code:
         # Save the verification code in Redis and set the expiration time to 3 minutes.
         key = f"{sms.platform}_{sms.current_number}"
-        cache_client.set(key, sms_code, expire_time=60 * 3)
+        await cache_client.set(key, sms_code, expire_time=60 * 3)
 
     return {"status": "ok"}
 
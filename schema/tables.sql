@@ -537,4 +537,26 @@ CREATE TABLE `zhihu_creator` (
 alter table douyin_aweme_comment add column `like_count` varchar(255) NOT NULL DEFAULT '0' COMMENT '点赞数';
 
 alter table xhs_note add column xsec_token varchar(50) default null comment '签名算法';
-alter table douyin_aweme_comment add column `pictures` varchar(500) NOT NULL DEFAULT '' COMMENT '评论图片列表';
\ No newline at end of file
+alter table douyin_aweme_comment add column `pictures` varchar(500) NOT NULL DEFAULT '' COMMENT '评论图片列表';
+-- 批量写入使用 INSERT ... ON DUPLICATE KEY UPDATE，需要把内容/评论/创作者的 id 索引改为唯一索引
+-- 已有数据的库如存在重复记录，需要先去重再执行以下语句
+ALTER TABLE `bilibili_video` DROP INDEX `idx_bilibili_vi_video_i_31c36e`, ADD UNIQUE KEY `uk_bilibili_video_video_id` (`video_id`);
+ALTER TABLE `bilibili_video_comment` DROP INDEX `idx_bilibili_vi_comment_41c34e`, ADD UNIQUE KEY `uk_bilibili_video_comment_comment_id` (`comment_id`);
+ALTER TABLE `bilibili_up_info` DROP INDEX `idx_bilibili_vi_user_123456`, ADD UNIQUE KEY `uk_bilibili_up_info_user_id` (`user_id`);
+ALTER TABLE `douyin_aweme` DROP INDEX `idx_douyin_awem_aweme_i_6f7bc6`, ADD UNIQUE KEY `uk_douyin_aweme_aweme_id` (`aweme_id`);
+ALTER TABLE `douyin_aweme_comment` DROP INDEX `idx_douyin_awem_comment_fcd7e4`, ADD UNIQUE KEY `uk_douyin_aweme_comment_comment_id` (`comment_id`);
+ALTER TABLE `dy_creator` ADD UNIQUE KEY `uk_dy_creator_user_id` (`user_id`);
+ALTER TABLE `kuaishou_video` DROP INDEX `idx_kuaishou_vi_video_i_c5c6a6`, ADD UNIQUE KEY `uk_kuaishou_video_video_id` (`video_id`);
+ALTER TABLE `kuaishou_video_comment` DROP INDEX `idx_kuaishou_vi_comment_ed48fa`, ADD UNIQUE KEY `uk_kuaishou_video_comment_comment_id` (`comment_id`);
+ALTER TABLE `weibo_note` DROP INDEX `idx_weibo_note_note_id_f95b1a`, ADD UNIQUE KEY `uk_weibo_note_note_id` (`note_id`);
+ALTER TABLE `weibo_note_comment` DROP INDEX `idx_weibo_note__comment_c7611c`, ADD UNIQUE KEY `uk_weibo_note_comment_comment_id` (`comment_id`);
+ALTER TABLE `weibo_creator` ADD UNIQUE KEY `uk_weibo_creator_user_id` (`user_id`);
+ALTER TABLE `xhs_creator` ADD UNIQUE KEY `uk_xhs_creator_user_id` (`user_id`);
+ALTER TABLE `xhs_note` DROP INDEX `idx_xhs_note_note_id_209457`, ADD UNIQUE KEY `uk_xhs_note_note_id` (`note_id`);
+ALTER TABLE `xhs_note_comment` DROP INDEX `idx_xhs_note_co_comment_8e8349`, ADD UNIQUE KEY `uk_xhs_note_comment_comment_id` (`comment_id`);
+ALTER TABLE `tieba_note` DROP INDEX `idx_tieba_note_note_id`, ADD UNIQUE KEY `uk_tieba_note_note_id` (`note_id`);
+-- 原 idx_tieba_comment_comment_id 实际建在 note_id 上
+ALTER TABLE `tieba_comment` DROP INDEX `idx_tieba_comment_comment_id`, ADD UNIQUE KEY `uk_tieba_comment_comment_id` (`comment_id`);
+ALTER TABLE `tieba_creator` ADD UNIQUE KEY `uk_tieba_creator_user_id` (`user_id`);
+ALTER TABLE `zhihu_content` DROP INDEX `idx_zhihu_content_content_id`, ADD UNIQUE KEY `uk_zhihu_content_content_id` (`content_id`);
+ALTER TABLE `zhihu_comment` DROP INDEX `idx_zhihu_comment_comment_id`, ADD UNIQUE KEY `uk_zhihu_comment_comment_id` (`comment_id`);
@@ -17,6 +17,7 @@
 from typing import List
 
 import config
+from store import crawl_journal
 from var import source_keyword_var
 
 from .bilibili_store_impl import *
@@ -27,7 +28,8 @@ class BiliStoreFactory:
     STORES = {
         "csv": BiliCsvStoreImplement,
         "db": BiliDbStoreImplement,
-        "json": BiliJsonStoreImplement
+        "json": BiliJsonStoreImplement,
+        "jsonl": BiliJsonlStoreImplement
     }
 
     @staticmethod
@@ -35,7 +37,7 @@ class BiliStoreFactory:
         store_class = BiliStoreFactory.STORES.get(config.SAVE_DATA_OPTION)
         if not store_class:
             raise ValueError(
-                "[BiliStoreFactory.create_store] Invalid save option only supported csv or db or json ...")
+                "[BiliStoreFactory.create_store] Invalid save option only supported csv or db or json or jsonl ...")
         return store_class()
 
 
@@ -44,6 +46,10 @@ async def update_bilibili_video(video_item: Dict):
     video_user_info: Dict = video_item_view.get("owner")
     video_item_stat: Dict = video_item_view.get("stat")
     video_id = str(video_item_view.get("aid"))
+    # 增量模式下互动数据没变的视频不再保存
+    journal = crawl_journal.get_crawl_journal()
+    if not journal.need_update_content(video_id, video_item_stat):
+        return
     save_content_item = {
         "video_id": video_id,
         "video_type": "video",
@@ -63,8 +69,10 @@ async def update_bilibili_video(video_item: Dict):
         "source_keyword": source_keyword_var.get(),
     }
     utils.logger.info(
-        f"[store.bilibili.update_bilibili_video] bilibili video id:{video_id}, title:{save_content_item.get('title')}")
+        "[store.bilibili.update_bilibili_video] bilibili video id:%s, title:%s", video_id, save_content_item.get('title'))
     await BiliStoreFactory.create_store().store_content(content_item=save_content_item)
+    # 保存之后再记录互动数据, 保存失败的内容下次仍会更新
+    journal.after_flush(journal.save_content_state, video_id, video_item_stat)
 
 
 async def update_up_info(video_item: Dict):  
@@ -81,7 +89,7 @@ async def update_up_info(video_item: Dict):
         "is_official": video_item_card.get("official_verify").get("type"), 
     }
     utils.logger.info(
-        f"[store.bilibili.update_up_info] bilibili user_id:{video_item_card.get('mid')}")
+        "[store.bilibili.update_up_info] bilibili user_id:%s", video_item_card.get('mid'))
     await BiliStoreFactory.create_store().store_creator(creator=saver_up_info)
     
 
@@ -110,7 +118,7 @@ async def update_bilibili_video_comment(video_id: str, comment_item: Dict):
         "last_modify_ts": utils.get_current_timestamp(),
     }
     utils.logger.info(
-        f"[store.bilibili.update_bilibili_video_comment] Bilibili video comment: {comment_id}, content: {save_comment_item.get('content')}")
+        "[store.bilibili.update_bilibili_video_comment] Bilibili video comment: %s, content: %s", comment_id, save_comment_item.get('content'))
     await BiliStoreFactory.create_store().store_comment(comment_item=save_comment_item)
 
 
@@ -124,3 +132,16 @@ async def store_video(aid, video_content, extension_file_name):
     """
     await BilibiliVideo().store_video(
         {"aid": aid, "video_content": video_content, "extension_file_name": extension_file_name})
+
+
+def get_bilibili_video_path(aid, extension_file_name: str) -> str:
+    """
+    B站视频的本地保存路径, 供媒体下载器直接写入文件
+    Args:
+        aid:
+        extension_file_name:
+
+    Returns:
+
+    """
+    return BilibiliVideo().make_save_file_name(str(aid), extension_file_name)
@@ -0,0 +1,362 @@
+# 声明：本代码仅供学习和研究目的使用。使用者应遵守以下原则：
+# 1. 不得用于任何商业用途。
+# 2. 使用时应遵守目标平台的使用条款和robots.txt规则。
+# 3. 不得进行大规模爬取或对平台造成运营干扰。
+# 4. 应合理控制请求频率，避免给目标平台带来不必要的负担。
+# 5. 不得用于任何非法或不当的用途。
+#
+# 详细许可条款请参阅项目根目录下的LICENSE文件。
+# 使用本代码即表示您同意遵守上述原则和LICENSE中的所有条款。
+
+
+# -*- coding: utf-8 -*-
+# @Desc    : 爬取进度日志, sqlite 记录每个关键词的搜索页、笔记详情、评论游标和创作者的完成情况,
+#            使用 --resume 重新启动时跳过已完成的部分, 评论从保存的游标继续翻页;
+#            同时跨次保存每个内容的互动数据和最新评论时间, 增量模式下只更新有变化的内容和新评论
+import json
+import os
+import sqlite3
+from typing import Any, Callable, Dict, Optional
+
+import config
+from store.flush_barrier import get_flush_barrier
+from tools import utils
+from var import source_keyword_var
+
+# 进度单元类型
+UNIT_SEARCH_PAGE = "search_page"
+UNIT_NOTE = "note"
+UNIT_COMMENTS = "comments"
+UNIT_CREATOR = "creator"
+
+
+class CrawlJournal:
+
+    def __init__(self, db_path: str, platform: str, resume: bool = False, incremental: bool = False):
+        """
+        Args:
+            db_path: sqlite 文件路径, 为 ":memory:" 时不落盘
+            platform: 平台名称, 不同平台的进度互不影响
+            resume: 是否接着上次的进度爬取, 为 False 时清空该平台之前的进度
+            incremental: 是否增量爬取, 互动数据没变的内容不再保存, 评论数没变的内容不再爬评论
+        """
+        self.platform = platform
+        self.incremental = incremental
+        if db_path != ":memory:" and os.path.dirname(db_path):
+            os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS crawl_unit ("
+            "platform TEXT, unit_type TEXT, unit_key TEXT, done INTEGER DEFAULT 0, "
+            "cursor TEXT, payload TEXT, update_ts INTEGER, "
+            "PRIMARY KEY (platform, unit_type, unit_key))"
+        )
+        # 内容状态跨次保留, 不随进度一起清空
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS content_state ("
+            "platform TEXT, content_id TEXT, counters TEXT, comment_count TEXT, "
+            "newest_comment_time INTEGER DEFAULT 0, update_ts INTEGER, "
+            "PRIMARY KEY (platform, content_id))"
+        )
+        if not resume:
+            self._conn.execute("DELETE FROM crawl_unit WHERE platform = ?", (platform,))
+        self._conn.commit()
+
+        # 因已完成而跳过的单元数, 本次完成的单元数, 从游标继续的单元数
+        self.skip_count = 0
+        self.done_count = 0
+        self.resume_cursor_count = 0
+        # 增量模式下互动数据没变而跳过保存的内容数, 评论数没变而跳过爬评论的内容数
+        self.unchanged_content_count = 0
+        self.unchanged_comments_count = 0
+        # 本次爬取失败的任务(关键词、指定内容或创作者) -> 失败原因, 只保存在内存中
+        self._failed_tasks: Dict[str, str] = {}
+
+    def _get_row(self, unit_type: str, unit_key: str) -> Optional[tuple]:
+        return self._conn.execute(
+            "SELECT done, cursor, payload FROM crawl_unit WHERE platform = ? AND unit_type = ? AND unit_key = ?",
+            (self.platform, unit_type, str(unit_key)),
+        ).fetchone()
+
+    def is_done(self, unit_type: str, unit_key: str) -> bool:
+        """
+        单元是否已经完成, 已完成时计入跳过数
+        Args:
+            unit_type: 单元类型, eg: search_page / note / comments / creator
+            unit_key: 单元标识, eg: 笔记ID
+
+        Returns:
+
+        """
+        row = self._get_row(unit_type, unit_key)
+        if row and row[0]:
+            self.skip_count += 1
+            return True
+        return False
+
+    def get_payload(self, unit_type: str, unit_key: str) -> Optional[Any]:
+        """
+        获取已完成单元保存的结果, eg: 搜索页里的笔记列表
+        Args:
+            unit_type: 单元类型
+            unit_key: 单元标识
+
+        Returns: 单元未完成时返回 None
+
+        """
+        row = self._get_row(unit_type, unit_key)
+        if not row or not row[0]:
+            return None
+        self.skip_count += 1
+        return json.loads(row[2]) if row[2] is not None else None
+
+    def mark_done(self, unit_type: str, unit_key: str, payload: Optional[Any] = None):
+        """
+        标记单元完成
+        Args:
+            unit_type: 单元类型
+            unit_key: 单元标识
+            payload: 需要在恢复时复用的结果, 需要能被 json 序列化
+
+        Returns:
+
+        """
+        self._conn.execute(
+            "INSERT OR REPLACE INTO crawl_unit (platform, unit_type, unit_key, done, cursor, payload, update_ts) "
+            "VALUES (?, ?, ?, 1, NULL, ?, ?)",
+            (self.platform, unit_type, str(unit_key),
+             json.dumps(payload, ensure_ascii=False) if payload is not None else None,
+             utils.get_current_timestamp()),
+        )
+        self._conn.commit()
+        self.done_count += 1
+
+    def after_flush(self, func: Callable, *args: Any):
+        """
+        缓冲写入的存储把已添加的记录全部落盘之后再执行 func(*args), 保存数据之后用它记录进度,
+        异常退出时没有落盘的数据在恢复时会重新爬取
+        Args:
+            func: 记录进度的方法, eg: self.mark_done / self.save_cursor
+            *args: func 的参数
+
+        Returns:
+
+        """
+        get_flush_barrier().defer(lambda: func(*args))
+
+    def get_cursor(self, unit_type: str, unit_key: str, default: Any = None) -> Any:
+        """
+        获取未完成单元保存的翻页游标
+        Args:
+            unit_type: 单元类型
+            unit_key: 单元标识
+            default: 没有保存游标时的返回值
+
+        Returns:
+
+        """
+        row = self._get_row(unit_type, unit_key)
+        if not row or row[0] or row[1] is None:
+            return default
+        self.resume_cursor_count += 1
+        return json.loads(row[1])
+
+    def save_cursor(self, unit_type: str, unit_key: str, cursor: Any):
+        """
+        保存单元的翻页游标, 每处理完一页调用一次
+        Args:
+            unit_type: 单元类型
+            unit_key: 单元标识
+            cursor: 下一页的游标, 需要能被 json 序列化
+
+        Returns:
+
+        """
+        self._conn.execute(
+            "INSERT OR REPLACE INTO crawl_unit (platform, unit_type, unit_key, done, cursor, payload, update_ts) "
+            "VALUES (?, ?, ?, 0, ?, NULL, ?)",
+            (self.platform, unit_type, str(unit_key), json.dumps(cursor, ensure_ascii=False),
+             utils.get_current_timestamp()),
+        )
+        self._conn.commit()
+
+    def _get_content_state(self, content_id: str) -> Optional[tuple]:
+        return self._conn.execute(
+            "SELECT counters, comment_count, newest_comment_time FROM content_state "
+            "WHERE platform = ? AND content_id = ?",
+            (self.platform, str(content_id)),
+        ).fetchone()
+
+    def need_update_content(self, content_id: str, counters: Dict) -> bool:
+        """
+        对比上次保存的互动数据(点赞、评论、分享数等), 只检查不记录, 内容保存之后调用 save_content_state 记录
+        Args:
+            content_id: 内容ID
+            counters: 互动数据
+
+        Returns: 非增量模式或互动数据有变化时返回 True
+
+        """
+        if not self.incremental:
+            return True
+        row = self._get_content_state(content_id)
+        if row and row[0] == json.dumps(counters, ensure_ascii=False, sort_keys=True):
+            self.unchanged_content_count += 1
+            return False
+        return True
+
+    def save_content_state(self, content_id: str, counters: Dict):
+        """
+        内容保存之后记录当时的互动数据, 保存失败的内容下次仍会更新
+        Args:
+            content_id: 内容ID
+            counters: 互动数据
+
+        Returns:
+
+        """
+        self._conn.execute(
+            "INSERT INTO content_state (platform, content_id, counters, update_ts) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT (platform, content_id) DO UPDATE SET counters = excluded.counters, update_ts = excluded.update_ts",
+            (self.platform, str(content_id), json.dumps(counters, ensure_ascii=False, sort_keys=True),
+             utils.get_current_timestamp()),
+        )
+        self._conn.commit()
+
+    def need_fetch_comments(self, content_id: str, comment_count: Optional[Any]) -> bool:
+        """
+        评论数和上次爬完评论时相同时不需要再爬评论
+        Args:
+            content_id: 内容ID
+            comment_count: 当前的评论数, 未知时为 None
+
+        Returns: 非增量模式、评论数未知或有变化时返回 True
+
+        """
+        if not self.incremental or comment_count is None:
+            return True
+        row = self._get_content_state(content_id)
+        if row and row[1] == str(comment_count):
+            self.unchanged_comments_count += 1
+            return False
+        return True
+
+    def get_comment_since_time(self, content_id: str) -> int:
+        """
+        获取上次爬到的最新一条评论的时间, 按时间倒序翻页的平台翻到这个时间之前的评论时停止
+        Args:
+            content_id: 内容ID
+
+        Returns: 非增量模式或没有记录时返回 0
+
+        """
+        if not self.incremental:
+            return 0
+        row = self._get_content_state(content_id)
+        return (row[2] or 0) if row else 0
+
+    def save_comment_state(self, content_id: str, comment_count: Optional[Any], newest_time: int):
+        """
+        评论爬取完成后记录当时的评论数和最新一条评论的时间
+        Args:
+            content_id: 内容ID
+            comment_count: 评论数, 未知时为 None
+            newest_time: 最新一条评论的时间, 时间单位和平台接口一致
+
+        Returns:
+
+        """
+        self._conn.execute(
+            "INSERT INTO content_state (platform, content_id, comment_count, newest_comment_time, update_ts) "
+            "VALUES (?, ?, ?, ?, ?) ON CONFLICT (platform, content_id) DO UPDATE SET "
+            "comment_count = excluded.comment_count, newest_comment_time = excluded.newest_comment_time, "
+            "update_ts = excluded.update_ts",
+            (self.platform, str(content_id), str(comment_count) if comment_count is not None else None,
+             newest_time, utils.get_current_timestamp()),
+        )
+        self._conn.commit()
+
+    def mark_task_failed(self, task_value: str, error: Any):
+        """
+        记录爬取失败的任务, 分布式 worker 把这些任务退回队列重试, 其余任务确认完成
+        Args:
+            task_value: 任务内容, eg: 关键词 / 指定内容ID / 创作者ID, 为空时忽略
+            error: 失败原因
+
+        Returns:
+
+        """
+        if task_value:
+            self._failed_tasks.setdefault(str(task_value), str(error))
+
+    def pop_failed_tasks(self) -> Dict[str, str]:
+        """
+        取出并清空记录的失败任务
+        Returns: 任务内容 -> 失败原因
+
+        """
+        failed_tasks, self._failed_tasks = self._failed_tasks, {}
+        return failed_tasks
+
+    def stats(self) -> Dict:
+        return {
+            "skipped": self.skip_count,
+            "done": self.done_count,
+            "resumed_cursor": self.resume_cursor_count,
+            "unchanged_content": self.unchanged_content_count,
+            "unchanged_comments": self.unchanged_comments_count,
+        }
+
+    def close(self):
+        self._conn.close()
+
+
+_journal: Optional[CrawlJournal] = None
+
+
+def get_crawl_journal() -> CrawlJournal:
+    """
+    获取(或按配置创建)当前平台的爬取进度日志, 未开启时进度只保存在内存中
+    Returns:
+
+    """
+    global _journal
+    if _journal is None:
+        db_path = config.CRAWL_JOURNAL_PATH if config.ENABLE_CRAWL_JOURNAL else ":memory:"
+        _journal = CrawlJournal(db_path, config.PLATFORM, resume=config.RESUME_CRAWL,
+                                incremental=config.ENABLE_INCREMENTAL_CRAWL)
+    return _journal
+
+
+def report_task_error(error: Any, task_value: str = ""):
+    """
+    记录当前任务爬取失败, 用于吞掉异常继续爬取的地方;
+    搜索任务中的失败都记到当前的搜索关键词上, 其他任务记到 task_value(指定内容ID、创作者ID)上
+    Args:
+        error: 失败原因
+        task_value: 任务内容
+
+    Returns:
+
+    """
+    get_crawl_journal().mark_task_failed(source_keyword_var.get() or task_value, error)
+
+
+def close_crawl_journal():
+    """
+    输出进度统计并关闭, 程序退出前调用
+    Returns:
+
+    """
+    global _journal
+    if _journal is None:
+        return
+    utils.logger.info(f"[store.crawl_journal.close_crawl_journal] crawl journal stats: {_journal.stats()}")
+    pending_count = get_flush_barrier().pending_count()
+    if pending_count:
+        utils.logger.warning(f"[store.crawl_journal.close_crawl_journal] {pending_count} progress records are not "
+                             f"saved because their data is not written, they will be crawled again on resume")
+    _journal.close()
+    _journal = None
@@ -16,6 +16,7 @@
 from typing import List
 
 import config
+from store import crawl_journal
 from var import source_keyword_var
 
 from .douyin_store_impl import *
@@ -26,6 +27,7 @@ class DouyinStoreFactory:
         "csv": DouyinCsvStoreImplement,
         "db": DouyinDbStoreImplement,
         "json": DouyinJsonStoreImplement,
+        "jsonl": DouyinJsonlStoreImplement,
     }
 
     @staticmethod
@@ -33,7 +35,7 @@ class DouyinStoreFactory:
         store_class = DouyinStoreFactory.STORES.get(config.SAVE_DATA_OPTION)
         if not store_class:
             raise ValueError(
-                "[DouyinStoreFactory.create_store] Invalid save option only supported csv or db or json ..."
+                "[DouyinStoreFactory.create_store] Invalid save option only supported csv or db or json or jsonl ..."
             )
         return store_class()
 
@@ -66,6 +68,11 @@ async def update_douyin_aweme(aweme_item: Dict):
     aweme_id = aweme_item.get("aweme_id")
     user_info = aweme_item.get("author", {})
     interact_info = aweme_item.get("statistics", {})
+    # 增量模式下互动数据没变的视频不再保存
+    counters = {key: interact_info.get(key) for key in ("digg_count", "collect_count", "comment_count", "share_count")}
+    journal = crawl_journal.get_crawl_journal()
+    if not journal.need_update_content(aweme_id, counters):
+        return
     save_content_item = {
         "aweme_id": aweme_id,
         "aweme_type": str(aweme_item.get("aweme_type")),
@@ -89,11 +96,13 @@ async def update_douyin_aweme(aweme_item: Dict):
         "source_keyword": source_keyword_var.get(),
     }
     utils.logger.info(
-        f"[store.douyin.update_douyin_aweme] douyin aweme id:{aweme_id}, title:{save_content_item.get('title')}"
+        "[store.douyin.update_douyin_aweme] douyin aweme id:%s, title:%s", aweme_id, save_content_item.get('title')
     )
     await DouyinStoreFactory.create_store().store_content(
         content_item=save_content_item
     )
+    # 保存之后再记录互动数据, 保存失败的内容下次仍会更新
+    journal.after_flush(journal.save_content_state, aweme_id, counters)
 
 
 async def batch_update_dy_aweme_comments(aweme_id: str, comments: List[Dict]):
@@ -142,7 +151,7 @@ async def update_dy_aweme_comment(aweme_id: str, comment_item: Dict):
         "pictures": ",".join(_extract_comment_image_list(comment_item)),
     }
     utils.logger.info(
-        f"[store.douyin.update_dy_aweme_comment] douyin aweme comment: {comment_id}, content: {save_comment_item.get('content')}"
+        "[store.douyin.update_dy_aweme_comment] douyin aweme comment: %s, content: %s", comment_id, save_comment_item.get('content')
     )
 
     await DouyinStoreFactory.create_store().store_comment(
@@ -168,5 +177,5 @@ async def save_creator(user_id: str, creator: Dict):
         "videos_count": user_info.get("aweme_count", 0),
         "last_modify_ts": utils.get_current_timestamp(),
     }
-    utils.logger.info(f"[store.douyin.save_creator] creator:{local_db_item}")
+    utils.logger.info("[store.douyin.save_creator] creator:%s", local_db_item)
     await DouyinStoreFactory.create_store().store_creator(local_db_item)
@@ -16,8 +16,9 @@
 
 from typing import Dict, List
 
+from async_db import AsyncMysqlBatchWriter
 from db import AsyncMysqlDB
-from var import media_crawler_db_var
+from var import db_batch_writer_var, media_crawler_db_var
 
 
 async def query_content_by_content_id(content_id: str) -> Dict:
@@ -156,4 +157,43 @@ async def update_creator_by_user_id(user_id: str, creator_item: Dict) -> int:
     """
     async_db_conn: AsyncMysqlDB = media_crawler_db_var.get()
     effect_row: int = await async_db_conn.update_table("dy_creator", creator_item, "user_id", user_id)
-    return effect_row
\ No newline at end of file
+    return effect_row
+
+
+async def upsert_content(content_item: Dict):
+    """
+    新增或更新一条内容记录，按唯一键批量 INSERT ... ON DUPLICATE KEY UPDATE，由批量写入器缓存后异步写入
+    Args:
+        content_item:
+
+    Returns:
+
+    """
+    batch_writer: AsyncMysqlBatchWriter = db_batch_writer_var.get()
+    await batch_writer.add("douyin_aweme", content_item)
+
+
+async def upsert_comment(comment_item: Dict):
+    """
+    新增或更新一条评论记录，按唯一键批量 INSERT ... ON DUPLICATE KEY UPDATE，由批量写入器缓存后异步写入
+    Args:
+        comment_item:
+
+    Returns:
+
+    """
+    batch_writer: AsyncMysqlBatchWriter = db_batch_writer_var.get()
+    await batch_writer.add("douyin_aweme_comment", comment_item)
+
+
+async def upsert_creator(creator_item: Dict):
+    """
+    新增或更新一条创作者信息，按唯一键批量 INSERT ... ON DUPLICATE KEY UPDATE，由批量写入器缓存后异步写入
+    Args:
+        creator_item:
+
+    Returns:
+
+    """
+    batch_writer: AsyncMysqlBatchWriter = db_batch_writer_var.get()
+    await batch_writer.add("dy_creator", creator_item)
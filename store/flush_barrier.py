@@ -0,0 +1,127 @@
+# 声明：本代码仅供学习和研究目的使用。使用者应遵守以下原则：
+# 1. 不得用于任何商业用途。
+# 2. 使用时应遵守目标平台的使用条款和robots.txt规则。
+# 3. 不得进行大规模爬取或对平台造成运营干扰。
+# 4. 应合理控制请求频率，避免给目标平台带来不必要的负担。
+# 5. 不得用于任何非法或不当的用途。
+#
+# 详细许可条款请参阅项目根目录下的LICENSE文件。
+# 使用本代码即表示您同意遵守上述原则和LICENSE中的所有条款。
+
+
+# -*- coding: utf-8 -*-
+# @Desc    : 缓冲写入的落盘屏障, 记录每个缓冲写入器(jsonl 文件 / mysql 表)已添加和已落盘的记录数,
+#            登记的回调等登记之前添加的记录全部落盘之后才执行, 保证爬取进度和去重集合不会先于数据落盘
+import inspect
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from tools import utils
+
+
+class FlushBarrier:
+
+    def __init__(self):
+        # 写入器标识 -> 已添加的记录数 / 已落盘的记录数, 同一个写入器按添加的顺序落盘
+        self._added_counts: Dict[str, int] = {}
+        self._written_counts: Dict[str, int] = {}
+        # (登记时各写入器还没落盘的记录位置, 回调), 按登记顺序执行
+        self._pending: List[Tuple[Dict[str, int], Callable[[], Any]]] = []
+
+    def on_added(self, key: str, count: int = 1):
+        """
+        写入器添加记录到缓冲区时调用
+        Args:
+            key: 写入器标识
+            count: 添加的记录数
+
+        Returns:
+
+        """
+        self._added_counts[key] = self._added_counts.get(key, 0) + count
+
+    async def on_written(self, key: str, count: int):
+        """
+        写入器把缓冲区中最早添加的 count 条记录落盘之后调用, 执行已经满足条件的回调
+        Args:
+            key: 写入器标识
+            count: 落盘的记录数
+
+        Returns:
+
+        """
+        self._written_counts[key] = self._written_counts.get(key, 0) + count
+        ready = [item for item in self._pending if self._is_written(item[0])]
+        if not ready:
+            return
+        self._pending = [item for item in self._pending if not self._is_written(item[0])]
+        for _, callback in ready:
+            try:
+                result = callback()
+                if inspect.isawaitable(result):
+                    await result
+            except Exception as e:
+                utils.logger.error(f"[FlushBarrier.on_written] run flush callback error: {e}")
+
+    def _snapshot(self) -> Dict[str, int]:
+        return {
+            key: count for key, count in self._added_counts.items()
+            if self._written_counts.get(key, 0) < count
+        }
+
+    def _is_written(self, snapshot: Dict[str, int]) -> bool:
+        return all(self._written_counts.get(key, 0) >= count for key, count in snapshot.items())
+
+    def defer(self, callback: Callable[[], Any]):
+        """
+        已添加的记录全部落盘之后执行同步回调, 没有待落盘的记录时立即执行
+        Args:
+            callback: 同步回调
+
+        Returns:
+
+        """
+        snapshot = self._snapshot()
+        if snapshot:
+            self._pending.append((snapshot, callback))
+        else:
+            callback()
+
+    async def after_flush(self, callback: Callable[[], Any]):
+        """
+        已添加的记录全部落盘之后执行回调, 没有待落盘的记录时立即执行
+        Args:
+            callback: 同步回调或返回 awaitable 的回调
+
+        Returns:
+
+        """
+        snapshot = self._snapshot()
+        if snapshot:
+            self._pending.append((snapshot, callback))
+            return
+        result = callback()
+        if inspect.isawaitable(result):
+            await result
+
+    def pending_count(self) -> int:
+        """
+        等待落盘的回调数
+        Returns:
+
+        """
+        return len(self._pending)
+
+
+_flush_barrier: Optional[FlushBarrier] = None
+
+
+def get_flush_barrier() -> FlushBarrier:
+    """
+    获取全局的落盘屏障
+    Returns:
+
+    """
+    global _flush_barrier
+    if _flush_barrier is None:
+        _flush_barrier = FlushBarrier()
+    return _flush_barrier
@@ -0,0 +1,310 @@
+# 声明：本代码仅供学习和研究目的使用。使用者应遵守以下原则：
+# 1. 不得用于任何商业用途。
+# 2. 使用时应遵守目标平台的使用条款和robots.txt规则。
+# 3. 不得进行大规模爬取或对平台造成运营干扰。
+# 4. 应合理控制请求频率，避免给目标平台带来不必要的负担。
+# 5. 不得用于任何非法或不当的用途。
+#
+# 详细许可条款请参阅项目根目录下的LICENSE文件。
+# 使用本代码即表示您同意遵守上述原则和LICENSE中的所有条款。
+
+
+# -*- coding: utf-8 -*-
+# @Desc    : JSON Lines 追加写存储，每条记录一行，避免 json 存储每次读-改-写整个文件
+import asyncio
+import json
+import os
+import pathlib
+import time
+from typing import Dict, List, Optional, TextIO
+
+import config
+from store.flush_barrier import FlushBarrier, get_flush_barrier
+from tools import metrics, utils, words
+
+
+class AsyncJsonlWriter:
+    """
+    单个 .jsonl 文件的长连接写入器
+    记录先序列化到内存缓冲，达到字节阈值或时间阈值时由线程池落盘，按间隔 fsync，
+    并按文件大小/时间轮转到新文件
+    """
+
+    def __init__(
+            self,
+            file_prefix: str,
+            words_file_prefix: Optional[str] = None,
+            flush_bytes: int = 64 * 1024,
+            flush_interval: float = 1.0,
+            fsync_interval: float = 5.0,
+            rotate_max_bytes: int = 0,
+            rotate_interval: float = 0,
+            flush_barrier: Optional[FlushBarrier] = None,
+    ):
+        """
+        Args:
+            file_prefix: 文件路径前缀(不含后缀), eg: data/xhs/jsonl/search_comments_2024-01-14
+            words_file_prefix: 词云文件前缀, 为空则不生成词云
+            flush_bytes: 缓冲区达到多少字节后落盘
+            flush_interval: 距离上次落盘超过多少秒后落盘
+            fsync_interval: 距离上次 fsync 超过多少秒后 fsync, 0 表示每次落盘都 fsync
+            rotate_max_bytes: 单个文件最大字节数, 超过后轮转, 0 表示不按大小轮转
+            rotate_interval: 单个文件最长写入秒数, 超过后轮转, 0 表示不按时间轮转
+            flush_barrier: 落盘屏障, 为空时使用全局的落盘屏障
+        """
+        self.file_prefix = file_prefix
+        self.words_file_prefix = words_file_prefix
+        self.flush_bytes = flush_bytes
+        self.flush_interval = flush_interval
+        self.fsync_interval = fsync_interval
+        self.rotate_max_bytes = rotate_max_bytes
+        self.rotate_interval = rotate_interval
+        self.flush_barrier = flush_barrier or get_flush_barrier()
+        self._barrier_key = f"jsonl:{file_prefix}"
+
+        self.lock = asyncio.Lock()
+        self.file_paths: List[str] = []
+        self._file: Optional[TextIO] = None
+        self._file_size = 0
+        self._file_open_ts = 0.0
+        self._buffer: List[str] = []
+        self._buffer_size = 0
+        self._last_flush_ts = time.monotonic()
+        self._last_fsync_ts = time.monotonic()
+
+    def _next_file_path(self) -> str:
+        """
+        生成下一个文件路径, 首个文件为 {prefix}.jsonl, 轮转后为 {prefix}.1.jsonl, {prefix}.2.jsonl ...
+        Returns:
+
+        """
+        index = len(self.file_paths)
+        while True:
+            file_path = f"{self.file_prefix}.jsonl" if index == 0 else f"{self.file_prefix}.{index}.jsonl"
+            # 跳过轮转前已经写满的文件，同一天多次运行时继续追加到最后一个文件
+            if not self.rotate_max_bytes or not os.path.exists(file_path) \
+                    or os.path.getsize(file_path) < self.rotate_max_bytes:
+                return file_path
+            self.file_paths.append(file_path)
+            index += 1
+
+    def _open_file(self):
+        pathlib.Path(self.file_prefix).parent.mkdir(parents=True, exist_ok=True)
+        file_path = self._next_file_path()
+        self._file = open(file_path, mode="a", encoding="utf-8")
+        self._file_size = self._file.tell()
+        self._file_open_ts = time.monotonic()
+        self.file_paths.append(file_path)
+
+    def _should_rotate(self) -> bool:
+        if self._file is None:
+            return False
+        if self.rotate_max_bytes and self._file_size >= self.rotate_max_bytes:
+            return True
+        if self.rotate_interval and time.monotonic() - self._file_open_ts >= self.rotate_interval:
+            return True
+        return False
+
+    def _close_file(self):
+        if self._file is None:
+            return
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._file.close()
+        self._file = None
+
+    def _flush_sync(self, lines: List[str], force_fsync: bool = False):
+        """
+        在线程池中执行的落盘逻辑
+        Args:
+            lines: 待写入的行
+            force_fsync: 是否强制 fsync
+
+        Returns:
+
+        """
+        if self._should_rotate():
+            self._close_file()
+        if self._file is None:
+            self._open_file()
+        for line in lines:
+            self._file.write(line)
+            self._file_size += len(line.encode("utf-8"))
+            if self.rotate_max_bytes and self._file_size >= self.rotate_max_bytes:
+                self._close_file()
+                self._open_file()
+        self._file.flush()
+        now = time.monotonic()
+        if force_fsync or now - self._last_fsync_ts >= self.fsync_interval:
+            os.fsync(self._file.fileno())
+            self._last_fsync_ts = now
+
+    async def write(self, item: Dict):
+        """
+        追加一条记录
+        Args:
+            item: 记录
+
+        Returns:
+
+        """
+        line = json.dumps(item, ensure_ascii=False) + "\n"
+        async with self.lock:
+            self._buffer.append(line)
+            self._buffer_size += len(line)
+            self.flush_barrier.on_added(self._barrier_key)
+            if self._buffer_size >= self.flush_bytes or \
+                    time.monotonic() - self._last_flush_ts >= self.flush_interval:
+                await self._flush()
+
+    async def _flush(self, force_fsync: bool = False):
+        lines, self._buffer, self._buffer_size = self._buffer, [], 0
+        self._last_flush_ts = time.monotonic()
+        if lines or force_fsync:
+            start = time.perf_counter()
+            await asyncio.to_thread(self._flush_sync, lines, force_fsync)
+            if lines:
+                metrics.observe_store_write("jsonl", time.perf_counter() - start, len(lines))
+                await self.flush_barrier.on_written(self._barrier_key, len(lines))
+
+    async def flush(self):
+        """
+        将缓冲区中的记录落盘并 fsync
+        Returns:
+
+        """
+        async with self.lock:
+            await self._flush(force_fsync=self._file is not None or bool(self._buffer))
+
+    async def close(self):
+        """
+        落盘并关闭文件句柄
+        Returns:
+
+        """
+        async with self.lock:
+            if self._buffer:
+                await self._flush()
+            await asyncio.to_thread(self._close_file)
+
+
+def read_jsonl(file_path: str) -> List[Dict]:
+    """
+    读取 .jsonl 文件中的所有记录, 忽略进程异常退出时可能残留的不完整末行
+    Args:
+        file_path:
+
+    Returns:
+
+    """
+    items: List[Dict] = []
+    with open(file_path, mode="r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                items.append(json.loads(line))
+            except json.JSONDecodeError:
+                utils.logger.warning(f"[jsonl_store.read_jsonl] skip broken line in {file_path}")
+    return items
+
+
+def export_jsonl_to_json(jsonl_file_paths: List[str], json_file_path: str) -> int:
+    """
+    将一个或多个(轮转后的) .jsonl 文件按顺序导出为旧版 json 存储的数组格式, 逐行流式写出不把全部数据读入内存
+    Args:
+        jsonl_file_paths: jsonl 文件列表
+        json_file_path: 导出的 json 文件路径
+
+    Returns: 导出的记录条数
+
+    """
+    count = 0
+    with open(json_file_path, mode="w", encoding="utf-8") as out:
+        out.write("[")
+        for jsonl_file_path in jsonl_file_paths:
+            if not os.path.exists(jsonl_file_path):
+                continue
+            with open(jsonl_file_path, mode="r", encoding="utf-8") as f:
+                for line in f:
+                    line = line.strip()
+                    if not line:
+                        continue
+                    try:
+                        item = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue
+                    item_str = json.dumps(item, ensure_ascii=False, indent=4).replace("\n", "\n    ")
+                    out.write(("," if count else "") + "\n    " + item_str)
+                    count += 1
+        out.write("\n]" if count else "]")
+    return count
+
+
+_writers: Dict[str, AsyncJsonlWriter] = {}
+
+
+def get_writer(file_prefix: str, words_file_prefix: Optional[str] = None) -> AsyncJsonlWriter:
+    """
+    获取(或创建)文件前缀对应的写入器, 同一进程内同一个文件只会有一个文件句柄
+    Args:
+        file_prefix: 文件路径前缀
+        words_file_prefix: 词云文件前缀
+
+    Returns:
+
+    """
+    writer = _writers.get(file_prefix)
+    if writer is None:
+        writer = AsyncJsonlWriter(
+            file_prefix,
+            words_file_prefix=words_file_prefix,
+            flush_bytes=config.JSONL_FLUSH_BYTES,
+            flush_interval=config.JSONL_FLUSH_INTERVAL_SEC,
+            fsync_interval=config.JSONL_FSYNC_INTERVAL_SEC,
+            rotate_max_bytes=config.JSONL_ROTATE_MAX_BYTES,
+            rotate_interval=config.JSONL_ROTATE_INTERVAL_SEC,
+        )
+        _writers[file_prefix] = writer
+    return writer
+
+
+async def flush_all():
+    """
+    将所有写入器的缓冲区落盘
+    Returns:
+
+    """
+    for writer in list(_writers.values()):
+        await writer.flush()
+
+
+async def close_all(export_json: bool = False):
+    """
+    关闭所有写入器, 程序退出前调用
+    Args:
+        export_json: 是否把本次写入的 jsonl 文件导出为旧版 json 数组格式
+
+    Returns:
+
+    """
+    writers = list(_writers.values())
+    _writers.clear()
+    for writer in writers:
+        await writer.close()
+        if not writer.file_paths:
+            continue
+        if export_json:
+            json_file_path = f"{writer.file_prefix}.json"
+            count = await asyncio.to_thread(export_jsonl_to_json, writer.file_paths, json_file_path)
+            utils.logger.info(f"[jsonl_store.close_all] export {count} items to {json_file_path}")
+        if writer.words_file_prefix and config.ENABLE_GET_COMMENTS and config.ENABLE_GET_WORDCLOUD:
+            try:
+                items: List[Dict] = []
+                for file_path in writer.file_paths:
+                    items.extend(await asyncio.to_thread(read_jsonl, file_path))
+                pathlib.Path(writer.words_file_prefix).parent.mkdir(parents=True, exist_ok=True)
+                await words.AsyncWordCloudGenerator().generate_word_frequency_and_cloud(items, writer.words_file_prefix)
+            except Exception as e:
+                utils.logger.error(f"[jsonl_store.close_all] generate word cloud error: {e}")
@@ -16,6 +16,7 @@
 from typing import List
 
 import config
+from store import crawl_journal
 from var import source_keyword_var
 
 from .kuaishou_store_impl import *
@@ -25,7 +26,8 @@ class KuaishouStoreFactory:
     STORES = {
         "csv": KuaishouCsvStoreImplement,
         "db": KuaishouDbStoreImplement,
-        "json": KuaishouJsonStoreImplement
+        "json": KuaishouJsonStoreImplement,
+        "jsonl": KuaishouJsonlStoreImplement
     }
 
     @staticmethod
@@ -33,7 +35,7 @@ class KuaishouStoreFactory:
         store_class = KuaishouStoreFactory.STORES.get(config.SAVE_DATA_OPTION)
         if not store_class:
             raise ValueError(
-                "[KuaishouStoreFactory.create_store] Invalid save option only supported csv or db or json ...")
+                "[KuaishouStoreFactory.create_store] Invalid save option only supported csv or db or json or jsonl ...")
         return store_class()
 
 
@@ -42,6 +44,11 @@ async def update_kuaishou_video(video_item: Dict):
     video_id = photo_info.get("id")
     if not video_id:
         return
+    # 增量模式下互动数据没变的视频不再保存
+    counters = {key: photo_info.get(key) for key in ("realLikeCount", "viewCount")}
+    journal = crawl_journal.get_crawl_journal()
+    if not journal.need_update_content(video_id, counters):
+        return
     user_info = video_item.get("author", {})
     save_content_item = {
         "video_id": video_id,
@@ -61,12 +68,14 @@ async def update_kuaishou_video(video_item: Dict):
         "source_keyword": source_keyword_var.get(),
     }
     utils.logger.info(
-        f"[store.kuaishou.update_kuaishou_video] Kuaishou video id:{video_id}, title:{save_content_item.get('title')}")
+        "[store.kuaishou.update_kuaishou_video] Kuaishou video id:%s, title:%s", video_id, save_content_item.get('title'))
     await KuaishouStoreFactory.create_store().store_content(content_item=save_content_item)
+    # 保存之后再记录互动数据, 保存失败的内容下次仍会更新
+    journal.after_flush(journal.save_content_state, video_id, counters)
 
 
 async def batch_update_ks_video_comments(video_id: str, comments: List[Dict]):
-    utils.logger.info(f"[store.kuaishou.batch_update_ks_video_comments] video_id:{video_id}, comments:{comments}")
+    utils.logger.info("[store.kuaishou.batch_update_ks_video_comments] video_id:%s, comments:%s", video_id, comments)
     if not comments:
         return
     for comment_item in comments:
@@ -87,7 +96,7 @@ async def update_ks_video_comment(video_id: str, comment_item: Dict):
         "last_modify_ts": utils.get_current_timestamp(),
     }
     utils.logger.info(
-        f"[store.kuaishou.update_ks_video_comment] Kuaishou video comment: {comment_id}, content: {save_comment_item.get('content')}")
+        "[store.kuaishou.update_ks_video_comment] Kuaishou video comment: %s, content: %s", comment_id, save_comment_item.get('content'))
     await KuaishouStoreFactory.create_store().store_comment(comment_item=save_comment_item)
 
 async def save_creator(user_id: str, creator: Dict):
@@ -106,5 +115,5 @@ async def save_creator(user_id: str, creator: Dict):
         'interaction': ownerCount.get("photo_public"),
         "last_modify_ts": utils.get_current_timestamp(),
     }
-    utils.logger.info(f"[store.kuaishou.save_creator] creator:{local_db_item}")
+    utils.logger.info("[store.kuaishou.save_creator] creator:%s", local_db_item)
     await KuaishouStoreFactory.create_store().store_creator(local_db_item)
\ No newline at end of file
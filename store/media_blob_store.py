@@ -0,0 +1,192 @@
+# 声明：本代码仅供学习和研究目的使用。使用者应遵守以下原则：
+# 1. 不得用于任何商业用途。
+# 2. 使用时应遵守目标平台的使用条款和robots.txt规则。
+# 3. 不得进行大规模爬取或对平台造成运营干扰。
+# 4. 应合理控制请求频率，避免给目标平台带来不必要的负担。
+# 5. 不得用于任何非法或不当的用途。
+#
+# 详细许可条款请参阅项目根目录下的LICENSE文件。
+# 使用本代码即表示您同意遵守上述原则和LICENSE中的所有条款。
+
+
+# -*- coding: utf-8 -*-
+# @Desc    : 按内容寻址的媒体文件存储, 文件按 sha256 分目录保存一份,
+#            sqlite 索引记录 url -> 摘要 -> 文件, 已知 url 不再下载, 重复内容通过硬链接复用
+import asyncio
+import os
+import shutil
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+import config
+from tools import utils
+
+INDEX_FILE_NAME = "index.db"
+
+
+class MediaBlobStore:
+
+    def __init__(self, root_path: str):
+        """
+        Args:
+            root_path: 存储根目录, 文件保存在 root_path/ab/cd/abcd...
+        """
+        self.root_path = root_path
+        os.makedirs(root_path, exist_ok=True)
+        # 索引读写和文件移动/复制都在这一个线程中执行, 不阻塞事件循环
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="media_blob_store")
+        self._conn = sqlite3.connect(os.path.join(root_path, INDEX_FILE_NAME), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS blob (digest TEXT PRIMARY KEY, size INTEGER, add_ts INTEGER)")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS url_blob (url TEXT PRIMARY KEY, digest TEXT, add_ts INTEGER)")
+        self._conn.commit()
+
+        # url 已知而跳过的下载数, 内容重复而复用的文件数, 新保存的文件数, 节省的字节数
+        self.url_hit_count = 0
+        self.content_hit_count = 0
+        self.stored_count = 0
+        self.bytes_saved = 0
+
+    async def _run(self, func: Callable, *args) -> Any:
+        return await asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+
+    def blob_path(self, digest: str) -> str:
+        """
+        摘要对应的文件路径, 前两级目录取摘要的前 4 个字符, 避免单个目录下文件过多
+        Args:
+            digest: sha256 十六进制摘要
+
+        Returns:
+
+        """
+        return os.path.join(self.root_path, digest[:2], digest[2:4], digest)
+
+    def lookup_url(self, url: str) -> Optional[str]:
+        """
+        查询 url 已下载过的文件
+        Args:
+            url: 媒体文件地址
+
+        Returns: 文件路径, url 未下载过或文件已被删除时返回 None
+
+        """
+        row = self._conn.execute("SELECT digest FROM url_blob WHERE url = ?", (url,)).fetchone()
+        if not row:
+            return None
+        path = self.blob_path(row[0])
+        return path if os.path.exists(path) else None
+
+    def link_url(self, url: str, save_path: str) -> bool:
+        """
+        url 已下载过时, 直接把已有文件链接到 save_path
+        Args:
+            url: 媒体文件地址
+            save_path: 保存路径
+
+        Returns: 是否链接成功
+
+        """
+        path = self.lookup_url(url)
+        if path is None:
+            return False
+        self._link(path, save_path)
+        self.url_hit_count += 1
+        self.bytes_saved += os.path.getsize(path)
+        return True
+
+    def add_file(self, url: str, file_path: str, digest: str, save_path: str) -> str:
+        """
+        把下载完成的文件放入存储并链接到 save_path, 内容已存在时丢弃新文件
+        Args:
+            url: 媒体文件地址
+            file_path: 下载完成的临时文件
+            digest: 文件内容的 sha256 摘要
+            save_path: 保存路径
+
+        Returns: 存储中的文件路径
+
+        """
+        path = self.blob_path(digest)
+        size = os.path.getsize(file_path)
+        if os.path.exists(path):
+            os.remove(file_path)
+            self.content_hit_count += 1
+            self.bytes_saved += size
+        else:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            shutil.move(file_path, path)
+            self.stored_count += 1
+        now = utils.get_current_timestamp()
+        self._conn.execute("INSERT OR IGNORE INTO blob (digest, size, add_ts) VALUES (?, ?, ?)", (digest, size, now))
+        self._conn.execute("INSERT OR REPLACE INTO url_blob (url, digest, add_ts) VALUES (?, ?, ?)",
+                           (url, digest, now))
+        self._conn.commit()
+        self._link(path, save_path)
+        return path
+
+    async def async_link_url(self, url: str, save_path: str) -> bool:
+        """在存储的线程中执行 link_url"""
+        return await self._run(self.link_url, url, save_path)
+
+    async def async_add_file(self, url: str, file_path: str, digest: str, save_path: str) -> str:
+        """在存储的线程中执行 add_file"""
+        return await self._run(self.add_file, url, file_path, digest, save_path)
+
+    @staticmethod
+    def _link(path: str, save_path: str):
+        """硬链接到保存路径, 文件系统不支持时复制"""
+        save_dir = os.path.dirname(save_path)
+        if save_dir:
+            os.makedirs(save_dir, exist_ok=True)
+        if os.path.exists(save_path):
+            os.remove(save_path)
+        try:
+            os.link(path, save_path)
+        except OSError:
+            shutil.copyfile(path, save_path)
+
+    def stats(self) -> Dict:
+        reused = self.url_hit_count + self.content_hit_count
+        total = reused + self.stored_count
+        return {
+            "stored": self.stored_count,
+            "url_hit": self.url_hit_count,
+            "content_hit": self.content_hit_count,
+            "dedup_ratio": round(reused / total, 4) if total else 0.0,
+            "bytes_saved": self.bytes_saved,
+        }
+
+    def close(self):
+        # 等待已提交的写入完成后再关闭索引
+        self._executor.shutdown(wait=True)
+        self._conn.close()
+
+
+_blob_store: Optional[MediaBlobStore] = None
+
+
+def get_media_blob_store() -> MediaBlobStore:
+    """
+    获取(或按配置创建)全局的媒体文件存储
+    Returns:
+
+    """
+    global _blob_store
+    if _blob_store is None:
+        _blob_store = MediaBlobStore(config.MEDIA_BLOB_STORE_PATH)
+    return _blob_store
+
+
+def close_media_blob_store():
+    """
+    输出去重统计并关闭索引, 程序退出前调用
+    Returns:
+
+    """
+    global _blob_store
+    if _blob_store is None:
+        return
+    utils.logger.info(f"[store.media_blob_store.close_media_blob_store] media dedup stats: {_blob_store.stats()}")
+    _blob_store.close()
+    _blob_store = None
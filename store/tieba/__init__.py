@@ -13,6 +13,7 @@
 from typing import List
 
 from model.m_baidu_tieba import TiebaComment, TiebaCreator, TiebaNote
+from store import crawl_journal
 from var import source_keyword_var
 
 from . import tieba_store_impl
@@ -23,7 +24,8 @@ class TieBaStoreFactory:
     STORES = {
         "csv": TieBaCsvStoreImplement,
         "db": TieBaDbStoreImplement,
-        "json": TieBaJsonStoreImplement
+        "json": TieBaJsonStoreImplement,
+        "jsonl": TieBaJsonlStoreImplement
     }
 
     @staticmethod
@@ -31,7 +33,7 @@ class TieBaStoreFactory:
         store_class = TieBaStoreFactory.STORES.get(config.SAVE_DATA_OPTION)
         if not store_class:
             raise ValueError(
-                "[TieBaStoreFactory.create_store] Invalid save option only supported csv or db or json ...")
+                "[TieBaStoreFactory.create_store] Invalid save option only supported csv or db or json or jsonl ...")
         return store_class()
 
 
@@ -59,12 +61,19 @@ async def update_tieba_note(note_item: TiebaNote):
     Returns:
 
     """
+    # 增量模式下回复数没变的帖子不再保存
+    counters = {"total_replay_num": note_item.total_replay_num}
+    journal = crawl_journal.get_crawl_journal()
+    if not journal.need_update_content(note_item.note_id, counters):
+        return
     note_item.source_keyword = source_keyword_var.get()
     save_note_item = note_item.model_dump()
     save_note_item.update({"last_modify_ts": utils.get_current_timestamp()})
-    utils.logger.info(f"[store.tieba.update_tieba_note] tieba note: {save_note_item}")
+    utils.logger.info("[store.tieba.update_tieba_note] tieba note: %s", save_note_item)
 
     await TieBaStoreFactory.create_store().store_content(save_note_item)
+    # 保存之后再记录互动数据, 保存失败的内容下次仍会更新
+    journal.after_flush(journal.save_content_state, note_item.note_id, counters)
 
 
 async def batch_update_tieba_note_comments(note_id: str, comments: List[TiebaComment]):
@@ -95,7 +104,7 @@ async def update_tieba_note_comment(note_id: str, comment_item: TiebaComment):
     """
     save_comment_item = comment_item.model_dump()
     save_comment_item.update({"last_modify_ts": utils.get_current_timestamp()})
-    utils.logger.info(f"[store.tieba.update_tieba_note_comment] tieba note id: {note_id} comment:{save_comment_item}")
+    utils.logger.info("[store.tieba.update_tieba_note_comment] tieba note id: %s comment:%s", note_id, save_comment_item)
     await TieBaStoreFactory.create_store().store_comment(save_comment_item)
 
 
@@ -110,5 +119,5 @@ async def save_creator(user_info: TiebaCreator):
     """
     local_db_item = user_info.model_dump()
     local_db_item["last_modify_ts"] = utils.get_current_timestamp()
-    utils.logger.info(f"[store.tieba.save_creator] creator:{local_db_item}")
+    utils.logger.info("[store.tieba.save_creator] creator:%s", local_db_item)
     await TieBaStoreFactory.create_store().store_creator(local_db_item)
@@ -17,6 +17,7 @@
 import re
 from typing import List
 
+from store import crawl_journal
 from var import source_keyword_var
 
 from .weibo_store_image import *
@@ -28,6 +29,7 @@ class WeibostoreFactory:
         "csv": WeiboCsvStoreImplement,
         "db": WeiboDbStoreImplement,
         "json": WeiboJsonStoreImplement,
+        "jsonl": WeiboJsonlStoreImplement,
     }
 
     @staticmethod
@@ -35,7 +37,7 @@ class WeibostoreFactory:
         store_class = WeibostoreFactory.STORES.get(config.SAVE_DATA_OPTION)
         if not store_class:
             raise ValueError(
-                "[WeibotoreFactory.create_store] Invalid save option only supported csv or db or json ...")
+                "[WeibotoreFactory.create_store] Invalid save option only supported csv or db or json or jsonl ...")
         return store_class()
 
 
@@ -69,6 +71,11 @@ async def update_weibo_note(note_item: Dict):
     mblog: Dict = note_item.get("mblog")
     user_info: Dict = mblog.get("user")
     note_id = mblog.get("id")
+    # 增量模式下互动数据没变的微博不再保存
+    counters = {key: mblog.get(key) for key in ("attitudes_count", "comments_count", "reposts_count")}
+    journal = crawl_journal.get_crawl_journal()
+    if not journal.need_update_content(note_id, counters):
+        return
     content_text = mblog.get("text")
     clean_text = re.sub(r"<.*?>", "", content_text)
     save_content_item = {
@@ -94,8 +101,10 @@ async def update_weibo_note(note_item: Dict):
         "source_keyword": source_keyword_var.get(),
     }
     utils.logger.info(
-        f"[store.weibo.update_weibo_note] weibo note id:{note_id}, title:{save_content_item.get('content')[:24]} ...")
+        "[store.weibo.update_weibo_note] weibo note id:%s, title:%s ...", note_id, save_content_item.get('content')[:24])
     await WeibostoreFactory.create_store().store_content(content_item=save_content_item)
+    # 保存之后再记录互动数据, 保存失败的内容下次仍会更新
+    journal.after_flush(journal.save_content_state, note_id, counters)
 
 
 async def batch_update_weibo_note_comments(note_id: str, comments: List[Dict]):
@@ -150,7 +159,7 @@ async def update_weibo_note_comment(note_id: str, comment_item: Dict):
         "avatar": user_info.get("profile_image_url", ""),
     }
     utils.logger.info(
-        f"[store.weibo.update_weibo_note_comment] Weibo note comment: {comment_id}, content: {save_comment_item.get('content', '')[:24]} ...")
+        "[store.weibo.update_weibo_note_comment] Weibo note comment: %s, content: %s ...", comment_id, save_comment_item.get('content', '')[:24])
     await WeibostoreFactory.create_store().store_comment(comment_item=save_comment_item)
 
 
@@ -169,6 +178,19 @@ async def update_weibo_note_image(picid: str, pic_content, extension_file_name):
         {"pic_id": picid, "pic_content": pic_content, "extension_file_name": extension_file_name})
 
 
+def get_weibo_note_image_path(picid: str, extension_file_name: str) -> str:
+    """
+    微博图片的本地保存路径, 供媒体下载器直接写入文件
+    Args:
+        picid:
+        extension_file_name:
+
+    Returns:
+
+    """
+    return WeiboStoreImage().make_save_file_name(picid, extension_file_name)
+
+
 async def save_creator(user_id: str, user_info: Dict):
     """
     Save creator information to local
@@ -191,5 +213,5 @@ async def save_creator(user_id: str, user_info: Dict):
         'tag_list': '',
         "last_modify_ts": utils.get_current_timestamp(),
     }
-    utils.logger.info(f"[store.weibo.save_creator] creator:{local_db_item}")
+    utils.logger.info("[store.weibo.save_creator] creator:%s", local_db_item)
     await WeibostoreFactory.create_store().store_creator(local_db_item)
@@ -16,6 +16,7 @@
 from typing import List
 
 import config
+from store import crawl_journal
 from var import source_keyword_var
 
 from . import xhs_store_impl
@@ -27,14 +28,15 @@ class XhsStoreFactory:
     STORES = {
         "csv": XhsCsvStoreImplement,
         "db": XhsDbStoreImplement,
-        "json": XhsJsonStoreImplement
+        "json": XhsJsonStoreImplement,
+        "jsonl": XhsJsonlStoreImplement
     }
 
     @staticmethod
     def create_store() -> AbstractStore:
         store_class = XhsStoreFactory.STORES.get(config.SAVE_DATA_OPTION)
         if not store_class:
-            raise ValueError("[XhsStoreFactory.create_store] Invalid save option only supported csv or db or json ...")
+            raise ValueError("[XhsStoreFactory.create_store] Invalid save option only supported csv or db or json or jsonl ...")
         return store_class()
 
 
@@ -77,6 +79,10 @@ async def update_xhs_note(note_item: Dict):
     note_id = note_item.get("note_id")
     user_info = note_item.get("user", {})
     interact_info = note_item.get("interact_info", {})
+    # 增量模式下互动数据没变的笔记不再保存
+    journal = crawl_journal.get_crawl_journal()
+    if not journal.need_update_content(note_id, interact_info):
+        return
     image_list: List[Dict] = note_item.get("image_list", [])
     tag_list: List[Dict] = note_item.get("tag_list", [])
 
@@ -109,8 +115,10 @@ async def update_xhs_note(note_item: Dict):
         "source_keyword": source_keyword_var.get(), # 搜索关键词
         "xsec_token": note_item.get("xsec_token"), # xsec_token
     }
-    utils.logger.info(f"[store.xhs.update_xhs_note] xhs note: {local_db_item}")
+    utils.logger.info("[store.xhs.update_xhs_note] xhs note: %s", local_db_item)
     await XhsStoreFactory.create_store().store_content(local_db_item)
+    # 保存之后再记录互动数据, 保存失败的内容下次仍会更新
+    journal.after_flush(journal.save_content_state, note_id, interact_info)
 
 
 async def batch_update_xhs_note_comments(note_id: str, comments: List[Dict]):
@@ -158,7 +166,7 @@ async def update_xhs_note_comment(note_id: str, comment_item: Dict):
         "last_modify_ts": utils.get_current_timestamp(), # 最后更新时间戳（MediaCrawler程序生成的，主要用途在db存储的时候记录一条记录最新更新时间）
         "like_count": comment_item.get("like_count", 0),
     }
-    utils.logger.info(f"[store.xhs.update_xhs_note_comment] xhs note comment:{local_db_item}")
+    utils.logger.info("[store.xhs.update_xhs_note_comment] xhs note comment:%s", local_db_item)
     await XhsStoreFactory.create_store().store_comment(local_db_item)
 
 
@@ -207,7 +215,7 @@ async def save_creator(user_id: str, creator: Dict):
                                ensure_ascii=False), # 标签
         "last_modify_ts": utils.get_current_timestamp(), # 最后更新时间戳（MediaCrawler程序生成的，主要用途在db存储的时候记录一条记录最新更新时间）
     }
-    utils.logger.info(f"[store.xhs.save_creator] creator:{local_db_item}")
+    utils.logger.info("[store.xhs.save_creator] creator:%s", local_db_item)
     await XhsStoreFactory.create_store().store_creator(local_db_item)
 
 
@@ -225,3 +233,16 @@ async def update_xhs_note_image(note_id, pic_content, extension_file_name):
 
     await XiaoHongShuImage().store_image(
         {"notice_id": note_id, "pic_content": pic_content, "extension_file_name": extension_file_name})
+
+
+def get_xhs_note_media_path(note_id: str, extension_file_name: str) -> str:
+    """
+    小红书笔记图片、视频的本地保存路径, 供媒体下载器直接写入文件
+    Args:
+        note_id:
+        extension_file_name:
+
+    Returns:
+
+    """
+    return XiaoHongShuImage().make_save_file_name(note_id, extension_file_name)
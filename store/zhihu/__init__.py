@@ -14,9 +14,11 @@ from typing import List
 
 import config
 from base.base_crawler import AbstractStore
+from store import crawl_journal
 from model.m_zhihu import ZhihuComment, ZhihuContent, ZhihuCreator
 from store.zhihu.zhihu_store_impl import (ZhihuCsvStoreImplement,
                                           ZhihuDbStoreImplement,
+                                          ZhihuJsonlStoreImplement,
                                           ZhihuJsonStoreImplement)
 from tools import utils
 from var import source_keyword_var
@@ -26,14 +28,15 @@ class ZhihuStoreFactory:
     STORES = {
         "csv": ZhihuCsvStoreImplement,
         "db": ZhihuDbStoreImplement,
-        "json": ZhihuJsonStoreImplement
+        "json": ZhihuJsonStoreImplement,
+        "jsonl": ZhihuJsonlStoreImplement
     }
 
     @staticmethod
     def create_store() -> AbstractStore:
         store_class = ZhihuStoreFactory.STORES.get(config.SAVE_DATA_OPTION)
         if not store_class:
-            raise ValueError("[ZhihuStoreFactory.create_store] Invalid save option only supported csv or db or json ...")
+            raise ValueError("[ZhihuStoreFactory.create_store] Invalid save option only supported csv or db or json or jsonl ...")
         return store_class()
 
 async def batch_update_zhihu_contents(contents: List[ZhihuContent]):
@@ -60,11 +63,18 @@ async def update_zhihu_content(content_item: ZhihuContent):
     Returns:
 
     """
+    # 增量模式下互动数据没变的内容不再保存
+    counters = {"voteup_count": content_item.voteup_count, "comment_count": content_item.comment_count}
+    journal = crawl_journal.get_crawl_journal()
+    if not journal.need_update_content(content_item.content_id, counters):
+        return
     content_item.source_keyword = source_keyword_var.get()
     local_db_item = content_item.model_dump()
     local_db_item.update({"last_modify_ts": utils.get_current_timestamp()})
-    utils.logger.info(f"[store.zhihu.update_zhihu_content] zhihu content: {local_db_item}")
+    utils.logger.info("[store.zhihu.update_zhihu_content] zhihu content: %s", local_db_item)
     await ZhihuStoreFactory.create_store().store_content(local_db_item)
+    # 保存之后再记录互动数据, 保存失败的内容下次仍会更新
+    journal.after_flush(journal.save_content_state, content_item.content_id, counters)
 
 
 
@@ -95,7 +105,7 @@ async def update_zhihu_content_comment(comment_item: ZhihuComment):
     """
     local_db_item = comment_item.model_dump()
     local_db_item.update({"last_modify_ts": utils.get_current_timestamp()})
-    utils.logger.info(f"[store.zhihu.update_zhihu_note_comment] zhihu content comment:{local_db_item}")
+    utils.logger.info("[store.zhihu.update_zhihu_note_comment] zhihu content comment:%s", local_db_item)
     await ZhihuStoreFactory.create_store().store_comment(local_db_item)
 
 
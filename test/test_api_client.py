@@ -0,0 +1,88 @@
+# 声明：本代码仅供学习和研究目的使用。使用者应遵守以下原则：
+# 1. 不得用于任何商业用途。
+# 2. 使用时应遵守目标平台的使用条款和robots.txt规则。
+# 3. 不得进行大规模爬取或对平台造成运营干扰。
+# 4. 应合理控制请求频率，避免给目标平台带来不必要的负担。
+# 5. 不得用于任何非法或不当的用途。
+#
+# 详细许可条款请参阅项目根目录下的LICENSE文件。
+# 使用本代码即表示您同意遵守上述原则和LICENSE中的所有条款。
+
+
+# -*- coding: utf-8 -*-
+from typing import List
+from unittest import IsolatedAsyncioTestCase
+
+from base.base_crawler import AbstractApiClient
+from proxy.types import IpInfoModel
+from tools import utils
+
+
+class DummyClient(AbstractApiClient):
+    async def request(self, method, url, **kwargs):
+        pass
+
+    async def update_cookies(self, browser_context):
+        pass
+
+
+class FakeProxyPool:
+
+    def __init__(self):
+        self.leased: List[IpInfoModel] = []
+
+    async def lease(self) -> IpInfoModel:
+        proxy_info = IpInfoModel(ip=f"10.0.0.{len(self.leased)}", port=8000, user="u", password="p",
+                                 expired_time_ts=None)
+        self.leased.append(proxy_info)
+        return proxy_info
+
+    def release(self, proxy_info: IpInfoModel, success=None):
+        pass
+
+
+class TestAbstractApiClient(IsolatedAsyncioTestCase):
+
+    async def _create_proxy_client(self) -> DummyClient:
+        api_client = DummyClient()
+        pool = FakeProxyPool()
+        proxy_info = await pool.lease()
+        _, api_client.proxies = utils.format_proxy_info(proxy_info)
+        api_client.set_ip_proxy_pool(pool, proxy_info)
+        return api_client
+
+    async def test_reuse_client_per_proxy(self):
+        api_client = DummyClient()
+        proxies = {"http://": "http://127.0.0.1:8888", "https://": "http://127.0.0.1:8888"}
+        client = api_client.get_http_client()
+        self.assertIs(api_client.get_http_client(None), client)
+        proxy_client = api_client.get_http_client(proxies)
+        self.assertIsNot(proxy_client, client)
+        self.assertIs(api_client.get_http_client(dict(proxies)), proxy_client)
+
+        await api_client.close()
+        self.assertTrue(client.is_closed)
+        self.assertTrue(proxy_client.is_closed)
+        self.assertIsNot(api_client.get_http_client(), client)
+        await api_client.close()
+
+    async def test_close_idle_client_after_rotate(self):
+        api_client = await self._create_proxy_client()
+        old_client = api_client.get_http_client(api_client.proxies)
+        await api_client.rotate_proxy("captcha")
+        self.assertTrue(old_client.is_closed)
+        self.assertIsNot(api_client.get_http_client(api_client.proxies), old_client)
+        self.assertEqual(len(api_client._http_clients), 1)
+        await api_client.close()
+
+    async def test_close_client_after_inflight_request_finishes(self):
+        api_client = await self._create_proxy_client()
+        old_proxies = api_client.proxies
+        async with api_client.use_http_client(old_proxies) as old_client:
+            await api_client.rotate_proxy("captcha")
+            # 旧代理上还有请求没结束, client 不能关闭
+            self.assertFalse(old_client.is_closed)
+            self.assertIn(old_client, api_client._http_clients.values())
+        self.assertTrue(old_client.is_closed)
+        self.assertNotIn(old_client, api_client._http_clients.values())
+        await api_client.close()
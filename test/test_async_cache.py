@@ -0,0 +1,69 @@
+# 声明：本代码仅供学习和研究目的使用。使用者应遵守以下原则：
+# 1. 不得用于任何商业用途。
+# 2. 使用时应遵守目标平台的使用条款和robots.txt规则。
+# 3. 不得进行大规模爬取或对平台造成运营干扰。
+# 4. 应合理控制请求频率，避免给目标平台带来不必要的负担。
+# 5. 不得用于任何非法或不当的用途。
+#
+# 详细许可条款请参阅项目根目录下的LICENSE文件。
+# 使用本代码即表示您同意遵守上述原则和LICENSE中的所有条款。
+
+
+# -*- coding: utf-8 -*-
+import asyncio
+import unittest
+from unittest import IsolatedAsyncioTestCase
+
+from cache.abs_cache import AbstractAsyncCache
+from cache.cache_factory import CacheFactory
+from cache.local_cache import AsyncExpiringLocalCache
+from cache.redis_cache import AsyncRedisCache
+
+try:
+    import fakeredis
+except ImportError:
+    fakeredis = None
+
+
+class AsyncCacheTestMixin:
+    cache: AbstractAsyncCache
+
+    async def test_set_and_get(self):
+        await self.cache.set("name", {"value": [1, 2, 3]}, 10)
+        self.assertEqual(await self.cache.get("name"), {"value": [1, 2, 3]})
+        self.assertIsNone(await self.cache.get("missing"))
+
+    async def test_expired_key(self):
+        await self.cache.set("name", "value", 1)
+        await asyncio.sleep(1.1)
+        self.assertIsNone(await self.cache.get("name"))
+
+    async def test_mget_mset(self):
+        await self.cache.mset({"k1": "v1", "k2": 2}, 10)
+        self.assertEqual(await self.cache.mget(["k1", "missing", "k2"]), ["v1", None, 2])
+        self.assertEqual(await self.cache.mget([]), [])
+
+    async def test_keys(self):
+        await self.cache.mset({f"kuaidaili_{i}": i for i in range(20)}, 10)
+        await self.cache.set("jishuhttp_1", 1, 10)
+        self.assertEqual(sorted(await self.cache.keys("kuaidaili_*")), sorted(f"kuaidaili_{i}" for i in range(20)))
+
+
+class TestAsyncExpiringLocalCache(AsyncCacheTestMixin, IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.cache = CacheFactory.create_cache("memory", is_async=True)
+        self.assertIsInstance(self.cache, AsyncExpiringLocalCache)
+
+    async def asyncTearDown(self):
+        await self.cache.close()
+
+
+@unittest.skipIf(fakeredis is None, "fakeredis is not installed")
+class TestAsyncRedisCache(AsyncCacheTestMixin, IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.cache = AsyncRedisCache(redis_client=fakeredis.FakeAsyncRedis())
+
+    async def asyncTearDown(self):
+        await self.cache.close()
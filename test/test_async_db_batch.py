@@ -0,0 +1,134 @@
+# 声明：本代码仅供学习和研究目的使用。使用者应遵守以下原则：
+# 1. 不得用于任何商业用途。
+# 2. 使用时应遵守目标平台的使用条款和robots.txt规则。
+# 3. 不得进行大规模爬取或对平台造成运营干扰。
+# 4. 应合理控制请求频率，避免给目标平台带来不必要的负担。
+# 5. 不得用于任何非法或不当的用途。
+#
+# 详细许可条款请参阅项目根目录下的LICENSE文件。
+# 使用本代码即表示您同意遵守上述原则和LICENSE中的所有条款。
+
+
+# -*- coding: utf-8 -*-
+import asyncio
+from typing import Any, Dict, List, Tuple
+from unittest import IsolatedAsyncioTestCase
+
+from async_db import AsyncMysqlBatchWriter, AsyncMysqlDB, BatchWriteError
+from store.flush_barrier import FlushBarrier
+
+
+class FakeCursor:
+    def __init__(self, executed: List[Tuple[str, List[Any]]], pool: "FakePool"):
+        self.executed = executed
+        self.pool = pool
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        return False
+
+    async def execute(self, sql: str, values: List[Any]) -> int:
+        if self.pool.fail_count > 0:
+            self.pool.fail_count -= 1
+            raise ConnectionError("mysql server has gone away")
+        self.executed.append((sql, values))
+        return sql.count("(%s")
+
+
+class FakeConn:
+    def __init__(self, executed: List[Tuple[str, List[Any]]], pool: "FakePool"):
+        self.executed = executed
+        self.pool = pool
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        return False
+
+    def cursor(self):
+        return FakeCursor(self.executed, self.pool)
+
+
+class FakePool:
+    def __init__(self):
+        self.executed: List[Tuple[str, List[Any]]] = []
+        self.acquire_count = 0
+        # 接下来多少次执行 SQL 失败
+        self.fail_count = 0
+
+    def acquire(self):
+        self.acquire_count += 1
+        return FakeConn(self.executed, self)
+
+
+class TestAsyncMysqlBatchWriter(IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.pool = FakePool()
+        self.async_db = AsyncMysqlDB(self.pool)
+
+    async def test_items_upsert_to_table(self):
+        items: List[Dict] = [{"note_id": str(i), "title": "t", "add_ts": 1} for i in range(5)]
+        effect_rows = await self.async_db.items_upsert_to_table("xhs_note", items, max_rows_per_sql=2)
+        self.assertEqual(effect_rows, 5)
+        self.assertEqual(self.pool.acquire_count, 1)
+        self.assertEqual(len(self.pool.executed), 3)
+        sql, values = self.pool.executed[0]
+        self.assertTrue(sql.startswith("INSERT INTO xhs_note (`note_id`,`title`,`add_ts`) VALUES (%s,%s,%s),(%s,%s,%s)"))
+        self.assertIn("ON DUPLICATE KEY UPDATE `note_id`=VALUES(`note_id`),`title`=VALUES(`title`)", sql)
+        self.assertNotIn("`add_ts`=VALUES", sql)
+        self.assertEqual(values, ["0", "t", 1, "1", "t", 1])
+
+    async def test_flush_by_batch_size(self):
+        writer = AsyncMysqlBatchWriter(self.async_db, batch_size=3, flush_interval=60)
+        for i in range(7):
+            await writer.add("xhs_note_comment", {"comment_id": str(i)})
+        self.assertEqual(len(self.pool.executed), 2)
+        await writer.close()
+        self.assertEqual(len(self.pool.executed), 3)
+        self.assertEqual(sum(len(values) for _, values in self.pool.executed), 7)
+
+    async def test_flush_by_interval(self):
+        writer = AsyncMysqlBatchWriter(self.async_db, batch_size=100, flush_interval=0.05)
+        writer.start()
+        await writer.add("xhs_note", {"note_id": "1"})
+        await asyncio.sleep(0.2)
+        self.assertEqual(len(self.pool.executed), 1)
+        await writer.close()
+        self.assertEqual(len(self.pool.executed), 1)
+
+    async def test_failed_flush_is_retried(self):
+        writer = AsyncMysqlBatchWriter(self.async_db, batch_size=2, flush_interval=60)
+        self.pool.fail_count = 1
+        for i in range(3):
+            await writer.add("xhs_note", {"note_id": str(i)})
+        # 写入失败的记录放回缓存, 等下次写入, 不再每添加一条就重试
+        self.assertEqual(self.pool.executed, [])
+        self.assertEqual(writer.pending_count(), 3)
+        await writer.flush()
+        self.assertEqual([values for _, values in self.pool.executed], [["0", "1", "2"]])
+        await writer.close()
+
+    async def test_flush_barrier_waits_for_retry(self):
+        barrier = FlushBarrier()
+        writer = AsyncMysqlBatchWriter(self.async_db, batch_size=100, flush_interval=60, flush_barrier=barrier)
+        done: List[str] = []
+        await writer.add("xhs_note", {"note_id": "1"})
+        barrier.defer(lambda: done.append("1"))
+        self.pool.fail_count = 1
+        await writer.flush()
+        self.assertEqual(done, [])
+        await writer.flush()
+        self.assertEqual(done, ["1"])
+        await writer.close()
+
+    async def test_close_raises_when_items_are_not_written(self):
+        writer = AsyncMysqlBatchWriter(self.async_db, batch_size=100, flush_interval=60)
+        await writer.add("xhs_note", {"note_id": "1"})
+        self.pool.fail_count = 10
+        with self.assertRaises(BatchWriteError):
+            await writer.close()
+        self.assertEqual(writer.pending_count(), 1)
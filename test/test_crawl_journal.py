@@ -0,0 +1,193 @@
+# 声明：本代码仅供学习和研究目的使用。使用者应遵守以下原则：
+# 1. 不得用于任何商业用途。
+# 2. 使用时应遵守目标平台的使用条款和robots.txt规则。
+# 3. 不得进行大规模爬取或对平台造成运营干扰。
+# 4. 应合理控制请求频率，避免给目标平台带来不必要的负担。
+# 5. 不得用于任何非法或不当的用途。
+#
+# 详细许可条款请参阅项目根目录下的LICENSE文件。
+# 使用本代码即表示您同意遵守上述原则和LICENSE中的所有条款。
+
+
+# -*- coding: utf-8 -*-
+import os
+import tempfile
+from unittest import IsolatedAsyncioTestCase, TestCase, mock
+
+import config
+from media_platform.bilibili.client import BilibiliClient
+from media_platform.xhs.client import XiaoHongShuClient
+from store import crawl_journal
+from store.crawl_journal import UNIT_COMMENTS, UNIT_CREATOR, UNIT_NOTE, UNIT_SEARCH_PAGE, CrawlJournal
+
+
+class TestCrawlJournal(TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.tmp_dir.name, "journal", "crawl_journal.db")
+
+    def tearDown(self):
+        crawl_journal.close_crawl_journal()
+        self.tmp_dir.cleanup()
+
+    def test_resume_skips_finished_units(self):
+        journal = CrawlJournal(self.db_path, "xhs")
+        page_items = [{"id": "note1", "xsec_token": "t1"}, {"id": "note2", "xsec_token": "t2"}]
+        journal.mark_done(UNIT_SEARCH_PAGE, "python:1", page_items)
+        journal.mark_done(UNIT_NOTE, "note1")
+        journal.mark_done(UNIT_CREATOR, "user1")
+        journal.close()
+
+        journal = CrawlJournal(self.db_path, "xhs", resume=True)
+        self.assertEqual(journal.get_payload(UNIT_SEARCH_PAGE, "python:1"), page_items)
+        self.assertIsNone(journal.get_payload(UNIT_SEARCH_PAGE, "python:2"))
+        self.assertTrue(journal.is_done(UNIT_NOTE, "note1"))
+        self.assertFalse(journal.is_done(UNIT_NOTE, "note2"))
+        self.assertTrue(journal.is_done(UNIT_CREATOR, "user1"))
+        self.assertEqual(journal.stats()["skipped"], 3)
+        journal.close()
+
+    def test_comment_cursor(self):
+        journal = CrawlJournal(self.db_path, "wb")
+        journal.save_cursor(UNIT_COMMENTS, "note1", [4937112345, 1])
+        self.assertFalse(journal.is_done(UNIT_COMMENTS, "note1"))
+        journal.close()
+
+        journal = CrawlJournal(self.db_path, "wb", resume=True)
+        self.assertEqual(journal.get_cursor(UNIT_COMMENTS, "note1"), [4937112345, 1])
+        self.assertEqual(journal.get_cursor(UNIT_COMMENTS, "note2", default=[-1, 0]), [-1, 0])
+        # 完成后不再从游标继续
+        journal.mark_done(UNIT_COMMENTS, "note1")
+        self.assertIsNone(journal.get_cursor(UNIT_COMMENTS, "note1"))
+        self.assertTrue(journal.is_done(UNIT_COMMENTS, "note1"))
+        journal.close()
+
+    def test_without_resume_clears_platform(self):
+        journal = CrawlJournal(self.db_path, "dy")
+        journal.mark_done(UNIT_NOTE, "aweme1")
+        journal.close()
+        journal = CrawlJournal(self.db_path, "ks")
+        journal.mark_done(UNIT_NOTE, "photo1")
+        journal.close()
+
+        journal = CrawlJournal(self.db_path, "dy", resume=False)
+        self.assertFalse(journal.is_done(UNIT_NOTE, "aweme1"))
+        journal.close()
+        journal = CrawlJournal(self.db_path, "ks", resume=True)
+        self.assertTrue(journal.is_done(UNIT_NOTE, "photo1"))
+        journal.close()
+
+    def test_get_crawl_journal_from_config(self):
+        with mock.patch.object(config, "CRAWL_JOURNAL_PATH", self.db_path), \
+                mock.patch.object(config, "ENABLE_CRAWL_JOURNAL", True), \
+                mock.patch.object(config, "PLATFORM", "bili"), \
+                mock.patch.object(config, "RESUME_CRAWL", True):
+            journal = crawl_journal.get_crawl_journal()
+            self.assertIs(crawl_journal.get_crawl_journal(), journal)
+            journal.mark_done(UNIT_NOTE, 1001)
+            crawl_journal.close_crawl_journal()
+            self.assertTrue(crawl_journal.get_crawl_journal().is_done(UNIT_NOTE, "1001"))
+
+
+class TestIncrementalCrawl(IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.tmp_dir.name, "crawl_journal.db")
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_content_state_survives_fresh_run(self):
+        journal = CrawlJournal(self.db_path, "xhs")
+        counters = {"liked_count": "10", "comment_count": "2"}
+        self.assertTrue(journal.need_update_content("note1", counters))
+        journal.save_content_state("note1", counters)
+        journal.save_comment_state("note1", "2", 1700000000000)
+        journal.close()
+
+        # 不带 --resume 重新运行时进度被清空, 但内容状态保留
+        journal = CrawlJournal(self.db_path, "xhs", incremental=True)
+        self.assertFalse(journal.need_update_content("note1", counters))
+        self.assertTrue(journal.need_update_content("note1", {"liked_count": "11", "comment_count": "2"}))
+        self.assertFalse(journal.need_fetch_comments("note1", "2"))
+        self.assertTrue(journal.need_fetch_comments("note1", "3"))
+        self.assertTrue(journal.need_fetch_comments("note1", None))
+        self.assertEqual(journal.get_comment_since_time("note1"), 1700000000000)
+        self.assertEqual(journal.get_comment_since_time("note2"), 0)
+        self.assertEqual(journal.stats()["unchanged_content"], 1)
+        self.assertEqual(journal.stats()["unchanged_comments"], 1)
+        journal.close()
+
+    def test_content_state_saved_only_after_store(self):
+        journal = CrawlJournal(self.db_path, "xhs", incremental=True)
+        counters = {"liked_count": "10"}
+        # 只检查不记录, 保存失败时下次仍会更新
+        self.assertTrue(journal.need_update_content("note1", counters))
+        self.assertTrue(journal.need_update_content("note1", counters))
+        journal.save_content_state("note1", counters)
+        self.assertFalse(journal.need_update_content("note1", counters))
+        journal.close()
+
+    def test_not_incremental(self):
+        journal = CrawlJournal(self.db_path, "dy")
+        journal.save_content_state("aweme1", {"digg_count": 1})
+        journal.save_comment_state("aweme1", 5, 1700000000)
+        self.assertTrue(journal.need_update_content("aweme1", {"digg_count": 1}))
+        self.assertTrue(journal.need_fetch_comments("aweme1", 5))
+        self.assertEqual(journal.get_comment_since_time("aweme1"), 0)
+        journal.close()
+
+    async def test_xhs_comments_stop_at_seen(self):
+        client = XiaoHongShuClient(headers={}, playwright_page=mock.Mock(), cookie_dict={})
+        pages = {
+            "": {"has_more": True, "cursor": "c1", "comments": [{"id": "5", "create_time": 500},
+                                                                {"id": "4", "create_time": 400}]},
+            "c1": {"has_more": True, "cursor": "c2", "comments": [{"id": "3", "create_time": 300},
+                                                                  {"id": "2", "create_time": 200}]},
+            "c2": {"has_more": False, "cursor": "", "comments": [{"id": "1", "create_time": 100}]},
+        }
+        saved = []
+
+        async def save_comments(note_id, comments):
+            saved.extend(comment["id"] for comment in comments)
+
+        with mock.patch.object(client, "get_note_comments",
+                               mock.AsyncMock(side_effect=lambda note_id, xsec_token, cursor: pages[cursor])) as get_page, \
+                mock.patch.object(client, "get_comments_all_sub_comments", mock.AsyncMock(return_value=[])):
+            await client.get_note_all_comments("note1", "token", callback=save_comments, max_count=100, since_time=300)
+        self.assertEqual(saved, ["5", "4"])
+        self.assertEqual(get_page.await_count, 2)
+
+    async def test_xhs_newest_time_ignores_sub_comments(self):
+        client = XiaoHongShuClient(headers={}, playwright_page=mock.Mock(), cookie_dict={})
+        page = {"has_more": False, "cursor": "", "comments": [{"id": "2", "create_time": 200},
+                                                                {"id": "1", "create_time": 100}]}
+
+        async def get_sub_comments(comments, xsec_token, callback):
+            # 旧评论下的新回复
+            await callback("note1", [{"id": "1-1", "create_time": 900}])
+            return []
+
+        newest_times = []
+        with mock.patch.object(client, "get_note_comments", mock.AsyncMock(return_value=page)), \
+                mock.patch.object(client, "get_comments_all_sub_comments", side_effect=get_sub_comments):
+            await client.get_note_all_comments("note1", "token", callback=mock.AsyncMock(), max_count=100,
+                                               newest_time_callback=newest_times.append)
+        self.assertEqual(newest_times, [200])
+
+    async def test_bili_newest_time_ignores_sub_comments(self):
+        client = BilibiliClient(headers={}, playwright_page=mock.Mock(), cookie_dict={})
+        page = {"cursor": {"is_end": True, "next": 0},
+                "replies": [{"rpid": 2, "ctime": 200, "rcount": 1}, {"rpid": 1, "ctime": 100}]}
+
+        async def get_level_two_comments(video_id, comment_id, order_mode, ps, callback):
+            await callback(video_id, [{"rpid": 3, "ctime": 900}])
+
+        newest_times = []
+        with mock.patch.object(client, "get_video_comments", mock.AsyncMock(return_value=page)), \
+                mock.patch.object(client, "get_video_all_level_two_comments", side_effect=get_level_two_comments):
+            await client.get_video_all_comments("aid1", is_fetch_sub_comments=True, callback=mock.AsyncMock(),
+                                                max_count=100, newest_time_callback=newest_times.append)
+        self.assertEqual(newest_times, [200])
@@ -0,0 +1,186 @@
+# 声明：本代码仅供学习和研究目的使用。使用者应遵守以下原则：
+# 1. 不得用于任何商业用途。
+# 2. 使用时应遵守目标平台的使用条款和robots.txt规则。
+# 3. 不得进行大规模爬取或对平台造成运营干扰。
+# 4. 应合理控制请求频率，避免给目标平台带来不必要的负担。
+# 5. 不得用于任何非法或不当的用途。
+#
+# 详细许可条款请参阅项目根目录下的LICENSE文件。
+# 使用本代码即表示您同意遵守上述原则和LICENSE中的所有条款。
+
+
+# -*- coding: utf-8 -*-
+import asyncio
+import time
+import unittest
+from typing import List
+from unittest import IsolatedAsyncioTestCase, TestCase, mock
+
+import config
+from store import crawl_journal
+from tools import distributed
+from tools.distributed import RedisTaskQueue
+from var import source_keyword_var
+
+try:
+    import fakeredis
+except ImportError:
+    fakeredis = None
+
+
+@unittest.skipIf(fakeredis is None, "fakeredis is not installed")
+class TestRedisTaskQueue(TestCase):
+
+    def setUp(self):
+        self.redis_client = fakeredis.FakeRedis()
+        self.queue = RedisTaskQueue("test_queue:xhs", lease_timeout_sec=60, max_attempts=2,
+                                    redis_client=self.redis_client)
+
+    def test_enqueue_is_idempotent(self):
+        self.assertEqual(self.queue.enqueue("search", ["python", "golang"]), 2)
+        self.assertEqual(self.queue.enqueue("search", ["python", "rust"]), 1)
+        self.assertEqual(self.queue.stats()["pending"], 3)
+
+    def test_lease_ack(self):
+        self.queue.enqueue("search", ["python", "golang", "rust"])
+        tasks = self.queue.lease(2)
+        self.assertEqual([task["value"] for task in tasks], ["python", "golang"])
+        self.assertEqual([task["attempts"] for task in tasks], [1, 1])
+        # 租用中的任务不会被其他 worker 租到
+        self.assertEqual([task["value"] for task in self.queue.lease(5)], ["rust"])
+        self.assertEqual(self.queue.lease(5), [])
+
+        self.queue.ack(tasks)
+        stats = self.queue.stats()
+        self.assertEqual((stats["pending"], stats["leased"], stats["done"]), (0, 1, 2))
+        self.assertFalse(self.queue.is_drained())
+
+    def test_nack_requeue_then_fail(self):
+        self.queue.enqueue("creator", ["user1"])
+        task = self.queue.lease()[0]
+        self.queue.nack([task], "timeout")
+        task = self.queue.lease()[0]
+        self.assertEqual(task["attempts"], 2)
+        self.queue.nack([task], "timeout")
+        self.assertTrue(self.queue.is_drained())
+        self.assertEqual(self.queue.stats()["failed"], 1)
+        # 失败后可以重新入队
+        self.assertEqual(self.queue.enqueue("creator", ["user1"]), 1)
+
+    def test_expired_lease_is_visible_again(self):
+        self.queue.enqueue("detail", ["note1"])
+        task = self.queue.lease()[0]
+        with mock.patch.object(time, "time", return_value=time.time() + 30):
+            self.queue.heartbeat([task])
+        with mock.patch.object(time, "time", return_value=time.time() + 61):
+            self.assertEqual(self.queue.lease(), [])
+        with mock.patch.object(time, "time", return_value=time.time() + 91):
+            self.assertEqual(self.queue.lease()[0]["attempts"], 2)
+        # 超过最大次数的超时任务直接移入失败列表
+        with mock.patch.object(time, "time", return_value=time.time() + 200):
+            self.assertEqual(self.queue.lease(), [])
+        self.assertEqual(self.queue.stats()["failed"], 1)
+
+    def test_stale_lease_is_ignored(self):
+        self.queue.enqueue("detail", ["note1"])
+        stale_task = self.queue.lease()[0]
+        with mock.patch.object(time, "time", return_value=time.time() + 61):
+            task = self.queue.lease()[0]
+        self.assertNotEqual(task["lease_token"], stale_task["lease_token"])
+        # 租约过期的 worker 续约、确认、失败都不影响新租到任务的 worker
+        self.queue.heartbeat([stale_task])
+        self.queue.ack([stale_task])
+        self.queue.nack([stale_task], "timeout")
+        stats = self.queue.stats()
+        self.assertEqual((stats["leased"], stats["done"], stats["failed"]), (1, 0, 0))
+        self.queue.ack([task])
+        self.assertEqual(self.queue.stats()["done"], 1)
+        self.assertTrue(self.queue.is_drained())
+
+
+class FakeCrawler:
+
+    def __init__(self, crawled: List, fail_values: List[str]):
+        self.crawled = crawled
+        self.fail_values = fail_values
+
+    async def start(self):
+        values = config.KEYWORDS.split(",") if config.CRAWLER_TYPE == "search" else config.XHS_CREATOR_ID_LIST
+        self.crawled.append((config.CRAWLER_TYPE, list(values)))
+        if any(value in self.fail_values for value in values):
+            raise Exception("crawl failed")
+
+
+class PartlyFailingCrawler:
+    """和真实爬虫一样吞掉单个关键词的异常继续爬取, 只记录失败的关键词"""
+
+    def __init__(self, fail_values: List[str]):
+        self.fail_values = fail_values
+
+    async def start(self):
+        async def search_keyword(keyword: str):
+            source_keyword_var.set(keyword)
+            if keyword in self.fail_values:
+                crawl_journal.report_task_error(Exception("get note detail failed"))
+
+        await asyncio.gather(*[search_keyword(keyword) for keyword in config.KEYWORDS.split(",")])
+
+
+@unittest.skipIf(fakeredis is None, "fakeredis is not installed")
+class TestDistributedCrawl(IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.queue = RedisTaskQueue("test_queue:xhs", max_attempts=2, redis_client=fakeredis.FakeRedis())
+        patcher = mock.patch.multiple(config, PLATFORM="xhs", KEYWORDS="python,golang,rust",
+                                      XHS_CREATOR_ID_LIST=["user1"], CRAWLER_TYPE="search",
+                                      DISTRIBUTED_WORKER_BATCH_SIZE=2, DISTRIBUTED_COORDINATOR_WAIT=False,
+                                      ENABLE_CRAWL_JOURNAL=False)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(crawl_journal.close_crawl_journal)
+
+    async def test_worker_nacks_reported_failures(self):
+        await distributed.run_coordinator(self.queue)
+        await distributed.run_worker(lambda: PartlyFailingCrawler(fail_values=["golang"]), self.queue)
+        stats = self.queue.stats()
+        # 同一批中没有失败的关键词照常确认, 失败的关键词重试后移入失败列表
+        self.assertEqual((stats["done"], stats["failed"]), (2, 1))
+        self.assertTrue(self.queue.is_drained())
+
+    async def test_coordinator_and_worker(self):
+        await distributed.run_coordinator(self.queue)
+        config.CRAWLER_TYPE = "creator"
+        await distributed.run_coordinator(self.queue)
+
+        crawled = []
+        await distributed.run_worker(lambda: FakeCrawler(crawled, fail_values=["rust"]), self.queue)
+        self.assertEqual(crawled, [
+            ("search", ["python", "golang"]),
+            ("search", ["rust"]),
+            ("creator", ["user1"]),
+            ("search", ["rust"]),
+        ])
+        stats = self.queue.stats()
+        self.assertEqual((stats["done"], stats["failed"]), (3, 1))
+        self.assertTrue(self.queue.is_drained())
+
+    async def test_worker_keeps_whole_batch_alive(self):
+        queue = RedisTaskQueue("test_queue:xhs", lease_timeout_sec=0.3, redis_client=fakeredis.FakeRedis())
+        queue.enqueue("search", ["python"])
+        queue.enqueue("creator", ["user1"])
+        heartbeats = []
+        heartbeat = queue.heartbeat
+
+        def record_heartbeat(tasks):
+            heartbeats.append(sorted(task["value"] for task in tasks))
+            heartbeat(tasks)
+
+        class SlowCrawler:
+            async def start(self):
+                await asyncio.sleep(0.25)
+
+        with mock.patch.object(queue, "heartbeat", record_heartbeat):
+            await distributed.run_worker(SlowCrawler, queue)
+        # 爬关键词时排在后面的创作者任务也在续约, 不会被其他 worker 租走
+        self.assertIn(["python", "user1"], heartbeats)
+        self.assertEqual(queue.stats()["done"], 2)
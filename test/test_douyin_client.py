@@ -0,0 +1,85 @@
+# 声明：本代码仅供学习和研究目的使用。使用者应遵守以下原则：
+# 1. 不得用于任何商业用途。
+# 2. 使用时应遵守目标平台的使用条款和robots.txt规则。
+# 3. 不得进行大规模爬取或对平台造成运营干扰。
+# 4. 应合理控制请求频率，避免给目标平台带来不必要的负担。
+# 5. 不得用于任何非法或不当的用途。
+#
+# 详细许可条款请参阅项目根目录下的LICENSE文件。
+# 使用本代码即表示您同意遵守上述原则和LICENSE中的所有条款。
+
+
+# -*- coding: utf-8 -*-
+import asyncio
+import json
+import time
+from unittest import IsolatedAsyncioTestCase, mock
+
+import config
+from media_platform.douyin.client import DOUYINClient
+from media_platform.douyin.exception import DataFetchError
+
+RESPONSE_DELAY_SEC = 0.3
+
+
+class FakePage:
+    async def evaluate(self, expression, *args):
+        return {}
+
+
+async def fake_get_a_bogus(*args, **kwargs):
+    return "fake_a_bogus"
+
+
+class TestDouyinClient(IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        # 这里只测试客户端本身的并发, 关闭请求限速
+        rate_limit_patcher = mock.patch.object(config, "ENABLE_RATE_LIMIT", False)
+        rate_limit_patcher.start()
+        self.addCleanup(rate_limit_patcher.stop)
+        self.server = await asyncio.start_server(self._handle_conn, "127.0.0.1", 0)
+        port = self.server.sockets[0].getsockname()[1]
+        self.dy_client = DOUYINClient(
+            headers={"User-Agent": "test", "Cookie": "", "Origin": "https://www.douyin.com"},
+            playwright_page=FakePage(),
+            cookie_dict={},
+        )
+        self.dy_client._host = f"http://127.0.0.1:{port}"
+        self.blocked = False
+
+    async def asyncTearDown(self):
+        await self.dy_client.close()
+        self.server.close()
+        await self.server.wait_closed()
+
+    async def _handle_conn(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """假的抖音详情接口, 每个请求延迟 RESPONSE_DELAY_SEC 秒后返回"""
+        try:
+            while True:
+                head = await reader.readuntil(b"\r\n\r\n")
+                aweme_id = head.split(b"aweme_id=")[1].split(b"&")[0].decode()
+                await asyncio.sleep(RESPONSE_DELAY_SEC)
+                body = b"blocked" if self.blocked else json.dumps({"aweme_detail": {"aweme_id": aweme_id}}).encode()
+                writer.write(b"HTTP/1.1 200 OK\r\nContent-Length: " + str(len(body)).encode() + b"\r\n\r\n" + body)
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    @mock.patch("media_platform.douyin.client.get_a_bogus", fake_get_a_bogus)
+    async def test_concurrent_requests_overlap(self):
+        count = 10
+        start = time.perf_counter()
+        results = await asyncio.gather(*[self.dy_client.get_video_by_id(str(i)) for i in range(count)])
+        cost = time.perf_counter() - start
+        self.assertEqual([item["aweme_id"] for item in results], [str(i) for i in range(count)])
+        # 串行至少需要 count * RESPONSE_DELAY_SEC 秒
+        self.assertLess(cost, count * RESPONSE_DELAY_SEC / 2)
+
+    @mock.patch("media_platform.douyin.client.get_a_bogus", fake_get_a_bogus)
+    async def test_blocked_raise_data_fetch_error(self):
+        self.blocked = True
+        with self.assertRaises(DataFetchError):
+            await self.dy_client.get_video_by_id("1")
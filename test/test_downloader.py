@@ -0,0 +1,136 @@
+# 声明：本代码仅供学习和研究目的使用。使用者应遵守以下原则：
+# 1. 不得用于任何商业用途。
+# 2. 使用时应遵守目标平台的使用条款和robots.txt规则。
+# 3. 不得进行大规模爬取或对平台造成运营干扰。
+# 4. 应合理控制请求频率，避免给目标平台带来不必要的负担。
+# 5. 不得用于任何非法或不当的用途。
+#
+# 详细许可条款请参阅项目根目录下的LICENSE文件。
+# 使用本代码即表示您同意遵守上述原则和LICENSE中的所有条款。
+
+
+# -*- coding: utf-8 -*-
+import asyncio
+import os
+import tempfile
+import time
+from typing import List, Optional
+from unittest import IsolatedAsyncioTestCase
+
+from tools.downloader import PART_FILE_SUFFIX, MediaDownloader
+
+FILE_CONTENT = bytes(range(256)) * 4096  # 1MB
+
+
+class TestMediaDownloader(IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.server = await asyncio.start_server(self._handle_conn, "127.0.0.1", 0)
+        self.base_url = f"http://127.0.0.1:{self.server.sockets[0].getsockname()[1]}"
+        self.support_range = True
+        # 第一次请求只返回一部分内容后断开连接
+        self.break_first_response_at: Optional[int] = None
+        self.response_delay = 0.0
+        self.range_headers: List[str] = []
+
+    async def asyncTearDown(self):
+        self.server.close()
+        await self.server.wait_closed()
+        self.tmp_dir.cleanup()
+
+    async def _handle_conn(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """支持 Range 请求的假文件服务"""
+        try:
+            head = (await reader.readuntil(b"\r\n\r\n")).decode()
+            path = head.split(" ")[1]
+            if path == "/missing":
+                writer.write(b"HTTP/1.1 404 Not Found\r\nContent-Length: 0\r\n\r\n")
+                return
+            offset = 0
+            for line in head.split("\r\n"):
+                if line.lower().startswith("range:"):
+                    self.range_headers.append(line.split(":", 1)[1].strip())
+                    if self.support_range:
+                        offset = int(line.split("=")[1].split("-")[0])
+            await asyncio.sleep(self.response_delay)
+            body = FILE_CONTENT[offset:]
+            status = b"206 Partial Content" if offset else b"200 OK"
+            writer.write(b"HTTP/1.1 " + status + b"\r\nContent-Length: " + str(len(body)).encode() + b"\r\n\r\n")
+            if self.break_first_response_at is not None:
+                writer.write(body[:self.break_first_response_at])
+                self.break_first_response_at = None
+                await writer.drain()
+                return
+            writer.write(body)
+            await writer.drain()
+        finally:
+            writer.close()
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.tmp_dir.name, "media", name)
+
+    def _read(self, path: str) -> bytes:
+        with open(path, "rb") as f:
+            return f.read()
+
+    async def test_stream_to_file(self):
+        downloader = MediaDownloader(chunk_size=16 * 1024)
+        save_path = self._path("0.mp4")
+        self.assertEqual(await downloader.download(f"{self.base_url}/video.mp4", save_path), save_path)
+        await downloader.close()
+        self.assertEqual(self._read(save_path), FILE_CONTENT)
+        self.assertFalse(os.path.exists(save_path + PART_FILE_SUFFIX))
+        self.assertEqual(downloader.stats()["bytes"], len(FILE_CONTENT))
+        self.assertGreater(downloader.stats()["bytes_per_sec"], 0)
+
+    async def test_resume_partial_file(self):
+        save_path = self._path("1.mp4")
+        os.makedirs(os.path.dirname(save_path))
+        with open(save_path + PART_FILE_SUFFIX, "wb") as f:
+            f.write(FILE_CONTENT[:1000])
+        downloader = MediaDownloader()
+        await downloader.download(f"{self.base_url}/video.mp4", save_path)
+        await downloader.close()
+        self.assertEqual(self.range_headers, ["bytes=1000-"])
+        self.assertEqual(self._read(save_path), FILE_CONTENT)
+        self.assertEqual(downloader.stats()["bytes"], len(FILE_CONTENT) - 1000)
+
+    async def test_resume_when_range_not_supported(self):
+        self.support_range = False
+        save_path = self._path("2.mp4")
+        os.makedirs(os.path.dirname(save_path))
+        with open(save_path + PART_FILE_SUFFIX, "wb") as f:
+            f.write(b"stale content")
+        downloader = MediaDownloader()
+        await downloader.download(f"{self.base_url}/video.mp4", save_path)
+        await downloader.close()
+        self.assertEqual(self._read(save_path), FILE_CONTENT)
+
+    async def test_retry_resumes_after_disconnect(self):
+        self.break_first_response_at = 300 * 1024
+        downloader = MediaDownloader(max_retries=2)
+        save_path = self._path("3.mp4")
+        self.assertEqual(await downloader.download(f"{self.base_url}/video.mp4", save_path), save_path)
+        await downloader.close()
+        self.assertEqual(len(self.range_headers), 1)
+        self.assertEqual(self._read(save_path), FILE_CONTENT)
+
+    async def test_http_error(self):
+        downloader = MediaDownloader()
+        save_path = self._path("missing.jpg")
+        self.assertIsNone(await downloader.download(f"{self.base_url}/missing", save_path))
+        await downloader.close()
+        self.assertFalse(os.path.exists(save_path))
+        self.assertEqual(downloader.stats()["fail"], 1)
+
+    async def test_submit_runs_concurrently(self):
+        self.response_delay = 0.2
+        downloader = MediaDownloader(concurrency=4, queue_size=2)
+        start = time.perf_counter()
+        futures = [await downloader.submit(f"{self.base_url}/{i}.jpg", self._path(f"{i}.jpg")) for i in range(8)]
+        await downloader.close()
+        # 逐个下载至少需要 0.2 * 8 秒
+        self.assertLess(time.perf_counter() - start, 0.2 * 8 * 0.75)
+        self.assertEqual([f.result() for f in futures], [self._path(f"{i}.jpg") for i in range(8)])
+        self.assertEqual(downloader.stats()["success"], 8)
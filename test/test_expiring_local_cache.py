@@ -17,6 +17,7 @@
 
 import time
 import unittest
+from unittest import mock
 
 from cache.local_cache import ExpiringLocalCache
 
@@ -42,6 +43,52 @@ class TestExpiringLocalCache(unittest.TestCase):
         time.sleep(12)
         self.assertIsNone(self.cache.get('key'))
 
+    def test_lru_eviction(self):
+        cache = ExpiringLocalCache(max_size=3)
+        for key in ('k1', 'k2', 'k3'):
+            cache.set(key, key, 10)
+        # 访问 k1 后 k2 成为最久未访问的 key
+        self.assertEqual(cache.get('k1'), 'k1')
+        cache.set('k4', 'k4', 10)
+        self.assertIsNone(cache.get('k2'))
+        self.assertEqual(sorted(cache.keys('*')), ['k1', 'k3', 'k4'])
+        self.assertEqual(cache.stats()['evictions'], 1)
+
+    def test_evict_expired_before_lru(self):
+        cache = ExpiringLocalCache(max_size=2)
+        cache.set('short', 1, 1)
+        cache.set('long', 2, 10)
+        with mock.patch.object(time, 'time', return_value=time.time() + 2):
+            cache.set('new', 3, 10)
+        self.assertEqual(sorted(cache.keys('*')), ['long', 'new'])
+        self.assertEqual(cache.stats()['evictions'], 0)
+
+    def test_clear_many_expired_keys(self):
+        for i in range(1000):
+            self.cache.set(f'key{i}', i, 1 if i % 2 else 10)
+        # 覆盖写入延长过期时间, 堆里的旧记录不能把新值清掉
+        self.cache.set('key1', 'renewed', 10)
+        with mock.patch.object(time, 'time', return_value=time.time() + 2):
+            self.cache._clear()
+        self.assertEqual(len(self.cache.keys('*')), 501)
+        self.assertEqual(self.cache.get('key1'), 'renewed')
+        self.assertEqual(self.cache.stats()['expirations'], 499)
+
+    def test_glob_keys(self):
+        for key in ('kuaidaili_1.1.1.1_80', 'kuaidaili_2.2.2.2_80', 'jishuhttp_3.3.3.3_80', 'ku'):
+            self.cache.set(key, 1, 10)
+        self.assertEqual(sorted(self.cache.keys('kuaidaili_*')), ['kuaidaili_1.1.1.1_80', 'kuaidaili_2.2.2.2_80'])
+        self.assertEqual(self.cache.keys('kuaidaili_1.?.1.1_80'), ['kuaidaili_1.1.1.1_80'])
+        self.assertEqual(len(self.cache.keys('*_80')), 3)
+        self.assertEqual(self.cache.keys('k?'), ['ku'])
+
+    def test_hit_miss_stats(self):
+        self.cache.set('key', 'value', 10)
+        self.cache.get('key')
+        self.cache.get('missing')
+        stats = self.cache.stats()
+        self.assertEqual((stats['hits'], stats['misses'], stats['size']), (1, 1, 1))
+
     def tearDown(self):
         del self.cache
 
@@ -0,0 +1,81 @@
+# 声明：本代码仅供学习和研究目的使用。使用者应遵守以下原则：
+# 1. 不得用于任何商业用途。
+# 2. 使用时应遵守目标平台的使用条款和robots.txt规则。
+# 3. 不得进行大规模爬取或对平台造成运营干扰。
+# 4. 应合理控制请求频率，避免给目标平台带来不必要的负担。
+# 5. 不得用于任何非法或不当的用途。
+#
+# 详细许可条款请参阅项目根目录下的LICENSE文件。
+# 使用本代码即表示您同意遵守上述原则和LICENSE中的所有条款。
+
+
+# -*- coding: utf-8 -*-
+import os
+import tempfile
+from typing import List
+from unittest import IsolatedAsyncioTestCase
+
+from store import flush_barrier
+from store.crawl_journal import UNIT_COMMENTS, UNIT_NOTE, CrawlJournal
+from store.jsonl_store import AsyncJsonlWriter
+
+
+class TestFlushBarrier(IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        flush_barrier._flush_barrier = None
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.journal = CrawlJournal(":memory:", "xhs")
+
+    def tearDown(self):
+        self.journal.close()
+        self.tmp_dir.cleanup()
+        flush_barrier._flush_barrier = None
+
+    def _writer(self, name: str) -> AsyncJsonlWriter:
+        return AsyncJsonlWriter(os.path.join(self.tmp_dir.name, name), flush_bytes=1 << 20, flush_interval=60)
+
+    async def test_run_immediately_without_pending_items(self):
+        self.journal.after_flush(self.journal.mark_done, UNIT_NOTE, "note1")
+        self.assertTrue(self.journal.is_done(UNIT_NOTE, "note1"))
+
+    async def test_mark_done_after_writer_flush(self):
+        writer = self._writer("contents")
+        await writer.write({"note_id": "note1"})
+        self.journal.after_flush(self.journal.mark_done, UNIT_NOTE, "note1")
+        self.assertFalse(self.journal.is_done(UNIT_NOTE, "note1"))
+
+        await writer.flush()
+        self.assertTrue(self.journal.is_done(UNIT_NOTE, "note1"))
+        await writer.close()
+
+    async def test_wait_for_all_writers(self):
+        contents_writer, comments_writer = self._writer("contents"), self._writer("comments")
+        await contents_writer.write({"note_id": "note1"})
+        await comments_writer.write({"comment_id": "c1"})
+        self.journal.after_flush(self.journal.save_cursor, UNIT_COMMENTS, "note1", "cursor1")
+        self.journal.after_flush(self.journal.mark_done, UNIT_COMMENTS, "note1")
+
+        await comments_writer.flush()
+        self.assertIsNone(self.journal.get_cursor(UNIT_COMMENTS, "note1"))
+        self.assertEqual(flush_barrier.get_flush_barrier().pending_count(), 2)
+
+        # 之后添加的记录不影响之前登记的回调
+        await comments_writer.write({"comment_id": "c2"})
+        await contents_writer.flush()
+        self.assertTrue(self.journal.is_done(UNIT_COMMENTS, "note1"))
+        await contents_writer.close()
+        await comments_writer.close()
+
+    async def test_async_callback(self):
+        writer = self._writer("contents")
+        seen: List[str] = []
+
+        async def _mark_seen():
+            seen.append("note1")
+
+        await writer.write({"note_id": "note1"})
+        await flush_barrier.get_flush_barrier().after_flush(_mark_seen)
+        self.assertEqual(seen, [])
+        await writer.close()
+        self.assertEqual(seen, ["note1"])
@@ -0,0 +1,138 @@
+# 声明：本代码仅供学习和研究目的使用。使用者应遵守以下原则：
+# 1. 不得用于任何商业用途。
+# 2. 使用时应遵守目标平台的使用条款和robots.txt规则。
+# 3. 不得进行大规模爬取或对平台造成运营干扰。
+# 4. 应合理控制请求频率，避免给目标平台带来不必要的负担。
+# 5. 不得用于任何非法或不当的用途。
+#
+# 详细许可条款请参阅项目根目录下的LICENSE文件。
+# 使用本代码即表示您同意遵守上述原则和LICENSE中的所有条款。
+
+
+# -*- coding: utf-8 -*-
+import json
+import os
+import tempfile
+from unittest import IsolatedAsyncioTestCase, mock
+
+import httpx
+
+import config
+from base.base_crawler import AbstractApiClient
+from tools import http_replay
+from tools.http_replay import FakePlatformServer, HttpRecorder, load_fixtures
+
+DETAIL_URL = "https://api.bilibili.com/x/web-interface/view/detail"
+GRAPHQL_URL = "https://www.kuaishou.com/graphql"
+
+
+class ReplayApiClient(AbstractApiClient):
+
+    def __init__(self):
+        self.proxies = None
+
+    async def request(self, method, url, **kwargs):
+        return await self.send(method, url, **kwargs)
+
+    async def update_cookies(self, browser_context):
+        pass
+
+
+def graphql_body(operation_name: str, photo_id: str) -> str:
+    return json.dumps({"operationName": operation_name, "variables": {"photoId": photo_id}})
+
+
+class TestHttpReplay(IsolatedAsyncioTestCase):
+
+    def test_record_and_load_fixtures(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            recorder = HttpRecorder(temp_dir)
+            recorder.record("bili", "GET", f"{DETAIL_URL}?bvid=BV1&wts=1", {},
+                            httpx.Response(200, json={"code": 0, "data": {"bvid": "BV1"}}))
+            recorder.record("ks", "POST", GRAPHQL_URL, {"data": graphql_body("visionVideoDetail", "p1")},
+                            httpx.Response(200, json={"data": {}}))
+            recorder.close()
+
+            fixtures = load_fixtures(os.path.join(temp_dir, "bili.jsonl.gz"))
+            self.assertEqual(len(fixtures), 1)
+            self.assertEqual(fixtures[0]["status_code"], 200)
+            self.assertEqual(json.loads(fixtures[0]["content"])["data"], {"bvid": "BV1"})
+            self.assertEqual(load_fixtures(os.path.join(temp_dir, "ks.jsonl.gz"))[0]["operation_name"],
+                             "visionVideoDetail")
+
+    def test_match_by_fingerprint_and_endpoint(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            recorder = HttpRecorder(temp_dir)
+            for photo_id in ("p1", "p2"):
+                recorder.record("ks", "POST", GRAPHQL_URL, {"data": graphql_body("visionVideoDetail", photo_id)},
+                                httpx.Response(200, json={"data": {"photoId": photo_id}}))
+            recorder.record("bili", "GET", f"{DETAIL_URL}?bvid=BV1&wts=1", {}, httpx.Response(200, json={}))
+            recorder.close()
+            server = FakePlatformServer(load_fixtures(os.path.join(temp_dir, "ks.jsonl.gz")), "ks")
+            bili_server = FakePlatformServer(load_fixtures(os.path.join(temp_dir, "bili.jsonl.gz")), "bili")
+
+        # 请求指纹相同时返回录制的同一个响应, 签名参数不影响匹配
+        fixture = server.match("POST", GRAPHQL_URL, graphql_body("visionVideoDetail", "p2"))
+        self.assertEqual(json.loads(fixture["content"])["data"], {"photoId": "p2"})
+        self.assertIsNotNone(bili_server.match("GET", f"{DETAIL_URL}?wts=2&bvid=BV1", None))
+        # 没有录制的请求按接口轮流返回
+        contents = [server.match("POST", GRAPHQL_URL, graphql_body("visionVideoDetail", "p3"))["content"]
+                    for _ in range(2)]
+        self.assertNotEqual(contents[0], contents[1])
+        self.assertIsNone(server.match("POST", GRAPHQL_URL, graphql_body("commentListQuery", "p1")))
+
+    def test_match_encoded_body(self):
+        feed_url = "https://edith.xiaohongshu.com/api/sns/web/v1/feed"
+        search_url = "https://www.douyin.com/aweme/v1/web/general/search/single/"
+        with tempfile.TemporaryDirectory() as temp_dir:
+            recorder = HttpRecorder(temp_dir)
+            for index in (1, 2):
+                recorder.record("xhs", "POST", feed_url, {"json": {"source_note_id": f"n{index}", "keyword": "编程"}},
+                                httpx.Response(200, json={"note_id": f"n{index}"}))
+                recorder.record("dy", "POST", search_url, {"data": {"offset": index * 10, "keyword": "编程"}},
+                                httpx.Response(200, json={"offset": index * 10}))
+            recorder.close()
+            xhs_server = FakePlatformServer(load_fixtures(os.path.join(temp_dir, "xhs.jsonl.gz")), "xhs")
+            dy_server = FakePlatformServer(load_fixtures(os.path.join(temp_dir, "dy.jsonl.gz")), "dy")
+
+        # 回放服务收到的是 httpx 编码后的请求体, 和录制时的 json、data 参数得到相同的指纹
+        for _ in range(2):
+            json_body = httpx.Request("POST", feed_url, json={"source_note_id": "n2", "keyword": "编程"}).read().decode()
+            self.assertEqual(json.loads(xhs_server.match("POST", feed_url, json_body)["content"]), {"note_id": "n2"})
+            form_body = httpx.Request("POST", search_url, data={"offset": 20, "keyword": "编程"}).read().decode()
+            self.assertEqual(json.loads(dy_server.match("POST", search_url, form_body)["content"]), {"offset": 20})
+
+    async def test_api_client_replays_through_fake_server(self):
+        fixtures = [{
+            "platform": "ks", "method": "POST", "url": GRAPHQL_URL, "fingerprint": "",
+            "operation_name": "visionVideoDetail", "status_code": 200, "content_type": "application/json",
+            "content": '{"data": {"visionVideoDetail": {}}}',
+        }]
+        server = FakePlatformServer(fixtures, "ks")
+        server_url = await server.start()
+        self.addAsyncCleanup(server.stop)
+        with tempfile.TemporaryDirectory() as temp_dir, \
+                mock.patch.multiple(config, HTTP_REPLAY_SERVER=server_url, HTTP_RECORD_DIR=temp_dir,
+                                    ENABLE_RESPONSE_CACHE=False), \
+                mock.patch.object(http_replay, "_recorder", None):
+            client = ReplayApiClient()
+            response = await client.request("POST", GRAPHQL_URL, platform="ks",
+                                            data=graphql_body("visionVideoDetail", "p1"))
+            self.assertEqual(response.json(), {"data": {"visionVideoDetail": {}}})
+            response = await client.request("POST", GRAPHQL_URL, data=graphql_body("commentListQuery", "p1"))
+            self.assertEqual(response.status_code, 404)
+            await client.close()
+            http_replay.close_http_recorder()
+            # 回放的成功响应同样会被录制
+            self.assertEqual(len(load_fixtures(os.path.join(temp_dir, "ks.jsonl.gz"))), 1)
+        self.assertEqual(server.stats(), {"requests": 2, "errors": 0, "captchas": 0, "misses": 1})
+
+    async def test_fake_server_injects_captcha(self):
+        server = FakePlatformServer([], "xhs", captcha_rate=1, seed=1)
+        server_url = await server.start()
+        self.addAsyncCleanup(server.stop)
+        async with httpx.AsyncClient(transport=http_replay.ReplayRedirectTransport(server_url)) as client:
+            response = await client.get("https://edith.xiaohongshu.com/api/sns/web/v1/feed")
+        self.assertEqual(response.status_code, 461)
+        self.assertEqual(response.headers["Verifytype"], "102")
+        self.assertEqual(server.captcha_count, 1)
@@ -0,0 +1,79 @@
+# 声明：本代码仅供学习和研究目的使用。使用者应遵守以下原则：
+# 1. 不得用于任何商业用途。
+# 2. 使用时应遵守目标平台的使用条款和robots.txt规则。
+# 3. 不得进行大规模爬取或对平台造成运营干扰。
+# 4. 应合理控制请求频率，避免给目标平台带来不必要的负担。
+# 5. 不得用于任何非法或不当的用途。
+#
+# 详细许可条款请参阅项目根目录下的LICENSE文件。
+# 使用本代码即表示您同意遵守上述原则和LICENSE中的所有条款。
+
+
+# -*- coding: utf-8 -*-
+import json
+import os
+import tempfile
+from unittest import IsolatedAsyncioTestCase
+
+from store.jsonl_store import AsyncJsonlWriter, export_jsonl_to_json, read_jsonl
+
+
+class TestAsyncJsonlWriter(IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.file_prefix = os.path.join(self.tmp_dir.name, "search_comments_2024-01-14")
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    async def test_write_and_read(self):
+        writer = AsyncJsonlWriter(self.file_prefix, flush_bytes=1 << 20, flush_interval=60)
+        for i in range(100):
+            await writer.write({"comment_id": str(i), "content": "评论内容"})
+        await writer.close()
+        items = read_jsonl(self.file_prefix + ".jsonl")
+        self.assertEqual(len(items), 100)
+        self.assertEqual(items[-1]["comment_id"], "99")
+
+    async def test_flush_keeps_file_open(self):
+        writer = AsyncJsonlWriter(self.file_prefix, flush_bytes=1 << 20, flush_interval=60)
+        await writer.write({"comment_id": "1"})
+        self.assertFalse(os.path.exists(self.file_prefix + ".jsonl"))
+        await writer.flush()
+        self.assertEqual(len(read_jsonl(self.file_prefix + ".jsonl")), 1)
+        await writer.write({"comment_id": "2"})
+        await writer.close()
+        self.assertEqual(len(writer.file_paths), 1)
+        self.assertEqual(len(read_jsonl(self.file_prefix + ".jsonl")), 2)
+
+    async def test_rotate_by_size(self):
+        writer = AsyncJsonlWriter(self.file_prefix, flush_bytes=0, rotate_max_bytes=200)
+        for i in range(50):
+            await writer.write({"comment_id": str(i), "content": "x" * 20})
+        await writer.close()
+        self.assertGreater(len(writer.file_paths), 1)
+        items = []
+        for file_path in writer.file_paths:
+            self.assertLessEqual(os.path.getsize(file_path), 200 + 64)
+            items.extend(read_jsonl(file_path))
+        self.assertEqual([item["comment_id"] for item in items], [str(i) for i in range(50)])
+
+    async def test_export_to_legacy_json(self):
+        writer = AsyncJsonlWriter(self.file_prefix, flush_bytes=0, rotate_max_bytes=100)
+        save_items = [{"note_id": str(i), "desc": "描述"} for i in range(10)]
+        for item in save_items:
+            await writer.write(item)
+        await writer.close()
+        json_file_path = self.file_prefix + ".json"
+        self.assertEqual(export_jsonl_to_json(writer.file_paths, json_file_path), 10)
+        with open(json_file_path, encoding="utf-8") as f:
+            content = f.read()
+        self.assertEqual(json.loads(content), save_items)
+        self.assertEqual(content, json.dumps(save_items, ensure_ascii=False, indent=4))
+
+    async def test_export_empty(self):
+        json_file_path = self.file_prefix + ".json"
+        self.assertEqual(export_jsonl_to_json([], json_file_path), 0)
+        with open(json_file_path, encoding="utf-8") as f:
+            self.assertEqual(json.loads(f.read()), [])
@@ -0,0 +1,103 @@
+# 声明：本代码仅供学习和研究目的使用。使用者应遵守以下原则：
+# 1. 不得用于任何商业用途。
+# 2. 使用时应遵守目标平台的使用条款和robots.txt规则。
+# 3. 不得进行大规模爬取或对平台造成运营干扰。
+# 4. 应合理控制请求频率，避免给目标平台带来不必要的负担。
+# 5. 不得用于任何非法或不当的用途。
+#
+# 详细许可条款请参阅项目根目录下的LICENSE文件。
+# 使用本代码即表示您同意遵守上述原则和LICENSE中的所有条款。
+
+
+# -*- coding: utf-8 -*-
+import json
+import logging
+import os
+import tempfile
+import unittest
+
+from tools import log_util
+from tools.log_util import JsonFormatter, LogSettings, ModuleFilter, TruncateFilter, module_of, setup_logger
+
+
+def make_record(pathname: str, level: int = logging.INFO, msg: str = "msg", args=()) -> logging.LogRecord:
+    return logging.LogRecord("test", level, pathname, 1, msg, args, None)
+
+
+class ExpensivePayload:
+    """被格式化时计数, 用于验证未输出的日志不格式化参数"""
+
+    def __init__(self):
+        self.format_count = 0
+
+    def __str__(self):
+        self.format_count += 1
+        return "payload"
+
+
+class TestLogUtil(unittest.TestCase):
+
+    def test_module_of(self):
+        root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        self.assertEqual(module_of(os.path.join(root, "store", "xhs", "__init__.py")), "store.xhs")
+        self.assertEqual(module_of(os.path.join(root, "media_platform", "xhs", "client.py")),
+                         "media_platform.xhs.client")
+
+    def test_module_filter_levels_and_sampling(self):
+        root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        store_path = os.path.join(root, "store", "xhs", "__init__.py")
+        client_path = os.path.join(root, "media_platform", "xhs", "client.py")
+        core_path = os.path.join(root, "media_platform", "xhs", "core.py")
+        module_filter = ModuleFilter(
+            {"store": logging.WARNING, "media_platform.xhs.client": logging.DEBUG}, {"media_platform.xhs.core": 0.0},
+            logging.INFO,
+        )
+        self.assertFalse(module_filter.filter(make_record(store_path, logging.INFO)))
+        self.assertTrue(module_filter.filter(make_record(store_path, logging.WARNING)))
+        self.assertTrue(module_filter.filter(make_record(client_path, logging.DEBUG)))
+        # 采样率为 0 时只输出 WARNING 及以上
+        self.assertFalse(module_filter.filter(make_record(core_path, logging.INFO)))
+        self.assertTrue(module_filter.filter(make_record(core_path, logging.ERROR)))
+        self.assertFalse(module_filter.filter(make_record(__file__, logging.DEBUG)))
+
+    def test_truncate_filter(self):
+        truncate_filter = TruncateFilter(10)
+        record = make_record(__file__, msg="res: %s, page: %s", args=("x" * 30, 2))
+        truncate_filter.filter(record)
+        self.assertEqual(record.getMessage(), "res: xxxxxxxxxx...(truncated 20 chars), page: 2")
+
+        record = make_record(__file__, msg="res: %s", args=({"data": "x" * 30},))
+        truncate_filter.filter(record)
+        self.assertEqual(record.getMessage(), "res: {'data': '...(truncated 32 chars)")
+
+        record = make_record(__file__, msg="y" * 15)
+        truncate_filter.filter(record)
+        self.assertEqual(record.getMessage(), "yyyyyyyyyy...(truncated 5 chars)")
+
+    def test_json_formatter(self):
+        record = make_record(__file__, msg="note: %s", args=("n1",))
+        record.platform = "xhs"
+        data = json.loads(JsonFormatter().format(record))
+        self.assertEqual(data["message"], "note: n1")
+        self.assertEqual(data["level"], "INFO")
+        self.assertEqual(data["module"], "test.test_log_util")
+        self.assertEqual(data["platform"], "xhs")
+
+    def test_async_output_and_lazy_formatting(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            log_file = os.path.join(temp_dir, "logs", "crawler.log")
+            logger = setup_logger("test_log_util", LogSettings(
+                level="INFO", log_format=log_util.LOG_FORMAT_JSON, log_file=log_file, max_payload_chars=100,
+            ))
+            self.addCleanup(logger.handlers.clear)
+            payload = ExpensivePayload()
+            logger.debug("skipped: %s", payload)
+            logger.info("written: %s", payload, extra={"platform": "ks"})
+            log_util.shutdown_logging("test_log_util")
+            self.assertEqual(payload.format_count, 1)
+
+            with open(log_file, encoding="utf-8") as f:
+                lines = [json.loads(line) for line in f]
+            self.assertEqual(len(lines), 1)
+            self.assertEqual(lines[0]["message"], "written: payload")
+            self.assertEqual(lines[0]["platform"], "ks")
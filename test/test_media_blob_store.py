@@ -0,0 +1,134 @@
+# 声明：本代码仅供学习和研究目的使用。使用者应遵守以下原则：
+# 1. 不得用于任何商业用途。
+# 2. 使用时应遵守目标平台的使用条款和robots.txt规则。
+# 3. 不得进行大规模爬取或对平台造成运营干扰。
+# 4. 应合理控制请求频率，避免给目标平台带来不必要的负担。
+# 5. 不得用于任何非法或不当的用途。
+#
+# 详细许可条款请参阅项目根目录下的LICENSE文件。
+# 使用本代码即表示您同意遵守上述原则和LICENSE中的所有条款。
+
+
+# -*- coding: utf-8 -*-
+import asyncio
+import hashlib
+import os
+import tempfile
+import threading
+from typing import List
+from unittest import IsolatedAsyncioTestCase
+
+from store.media_blob_store import MediaBlobStore
+from tools.downloader import MediaDownloader
+
+IMAGE_CONTENT = b"\x89PNG" + os.urandom(64 * 1024)
+
+
+class TestMediaBlobStore(IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.blob_root = os.path.join(self.tmp_dir.name, "blobs")
+        self.server = await asyncio.start_server(self._handle_conn, "127.0.0.1", 0)
+        self.base_url = f"http://127.0.0.1:{self.server.sockets[0].getsockname()[1]}"
+        self.requested_paths: List[str] = []
+
+    async def asyncTearDown(self):
+        self.server.close()
+        await self.server.wait_closed()
+        self.tmp_dir.cleanup()
+
+    async def _handle_conn(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """所有路径都返回同一张图片"""
+        try:
+            head = (await reader.readuntil(b"\r\n\r\n")).decode()
+            self.requested_paths.append(head.split(" ")[1])
+            await asyncio.sleep(0.05)
+            writer.write(b"HTTP/1.1 200 OK\r\nContent-Length: " + str(len(IMAGE_CONTENT)).encode() + b"\r\n\r\n")
+            writer.write(IMAGE_CONTENT)
+            await writer.drain()
+        finally:
+            writer.close()
+
+    def _path(self, note_id: str, name: str) -> str:
+        return os.path.join(self.tmp_dir.name, "images", note_id, name)
+
+    async def test_same_url_downloaded_once(self):
+        blob_store = MediaBlobStore(self.blob_root)
+        downloader = MediaDownloader(blob_store=blob_store)
+        url = f"{self.base_url}/avatar.jpg"
+        await downloader.download(url, self._path("note1", "0.jpg"))
+        await downloader.download(url, self._path("note2", "0.jpg"))
+        await downloader.close()
+
+        self.assertEqual(self.requested_paths, ["/avatar.jpg"])
+        digest = hashlib.sha256(IMAGE_CONTENT).hexdigest()
+        blob_path = os.path.join(self.blob_root, digest[:2], digest[2:4], digest)
+        for note_id in ("note1", "note2"):
+            self.assertTrue(os.path.samefile(self._path(note_id, "0.jpg"), blob_path))
+        stats = blob_store.stats()
+        self.assertEqual((stats["stored"], stats["url_hit"]), (1, 1))
+        self.assertEqual(stats["dedup_ratio"], 0.5)
+        self.assertEqual(stats["bytes_saved"], len(IMAGE_CONTENT))
+        blob_store.close()
+
+    async def test_same_content_from_different_urls(self):
+        blob_store = MediaBlobStore(self.blob_root)
+        downloader = MediaDownloader(blob_store=blob_store)
+        await downloader.download(f"{self.base_url}/a.jpg", self._path("note1", "0.jpg"))
+        await downloader.download(f"{self.base_url}/b.jpg", self._path("note2", "0.jpg"))
+        await downloader.close()
+
+        self.assertEqual(len(self.requested_paths), 2)
+        self.assertTrue(os.path.samefile(self._path("note1", "0.jpg"), self._path("note2", "0.jpg")))
+        self.assertEqual(blob_store.stats()["content_hit"], 1)
+        blob_store.close()
+
+    async def test_index_persists_across_runs(self):
+        url = f"{self.base_url}/sticker.png"
+        blob_store = MediaBlobStore(self.blob_root)
+        downloader = MediaDownloader(blob_store=blob_store)
+        await downloader.download(url, self._path("note1", "0.jpg"))
+        await downloader.close()
+        blob_store.close()
+
+        blob_store = MediaBlobStore(self.blob_root)
+        downloader = MediaDownloader(blob_store=blob_store)
+        await downloader.download(url, self._path("note3", "1.jpg"))
+        await downloader.close()
+        self.assertEqual(len(self.requested_paths), 1)
+        with open(self._path("note3", "1.jpg"), "rb") as f:
+            self.assertEqual(f.read(), IMAGE_CONTENT)
+        self.assertEqual(blob_store.stats()["url_hit"], 1)
+        blob_store.close()
+
+    async def test_concurrent_same_url(self):
+        blob_store = MediaBlobStore(self.blob_root)
+        downloader = MediaDownloader(concurrency=4, blob_store=blob_store)
+        url = f"{self.base_url}/emoji.png"
+        futures = [await downloader.submit(url, self._path(f"note{i}", "0.jpg")) for i in range(4)]
+        await downloader.close()
+
+        self.assertEqual(self.requested_paths, ["/emoji.png"])
+        self.assertTrue(all(f.result() for f in futures))
+        self.assertEqual(blob_store.stats()["url_hit"], 3)
+        blob_store.close()
+
+    async def test_store_io_runs_off_event_loop(self):
+        blob_store = MediaBlobStore(self.blob_root)
+        link_threads = []
+        original_link = MediaBlobStore._link
+
+        def _record_link(path: str, save_path: str):
+            link_threads.append(threading.current_thread())
+            original_link(path, save_path)
+
+        blob_store._link = _record_link
+        downloader = MediaDownloader(blob_store=blob_store)
+        url = f"{self.base_url}/cover.jpg"
+        await downloader.download(url, self._path("note1", "0.jpg"))
+        await downloader.download(url, self._path("note2", "0.jpg"))
+
+        self.assertEqual(len(link_threads), 2)
+        self.assertNotIn(threading.main_thread(), link_threads)
+        blob_store.close()
@@ -0,0 +1,135 @@
+# 声明：本代码仅供学习和研究目的使用。使用者应遵守以下原则：
+# 1. 不得用于任何商业用途。
+# 2. 使用时应遵守目标平台的使用条款和robots.txt规则。
+# 3. 不得进行大规模爬取或对平台造成运营干扰。
+# 4. 应合理控制请求频率，避免给目标平台带来不必要的负担。
+# 5. 不得用于任何非法或不当的用途。
+#
+# 详细许可条款请参阅项目根目录下的LICENSE文件。
+# 使用本代码即表示您同意遵守上述原则和LICENSE中的所有条款。
+
+
+# -*- coding: utf-8 -*-
+import asyncio
+import socket
+from typing import Optional
+from unittest import IsolatedAsyncioTestCase, mock
+
+import httpx
+
+import config
+from base.base_crawler import AbstractApiClient
+from tools import metrics
+from tools.pipeline import CrawlerPipeline
+
+
+class MetricsApiClient(AbstractApiClient):
+
+    def __init__(self):
+        self.proxies = None
+
+    def get_http_client(self, proxies: Optional[dict] = None) -> httpx.AsyncClient:
+        def handle(request: httpx.Request) -> httpx.Response:
+            if request.url.path.endswith("/error"):
+                raise httpx.ConnectError("connect failed", request=request)
+            return httpx.Response(200 if "detail" in request.url.path else 404, json={})
+
+        return httpx.AsyncClient(transport=httpx.MockTransport(handle))
+
+    async def request(self, method, url, **kwargs):
+        return await self.send(method, url, platform="bili", **kwargs)
+
+    async def update_cookies(self, browser_context):
+        pass
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+class TestMetrics(IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        metrics.reset()
+        self.addCleanup(metrics.reset)
+        patcher = mock.patch.multiple(config, ENABLE_METRICS=True, ENABLE_RATE_LIMIT=False,
+                                      ENABLE_RESPONSE_CACHE=False)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_endpoint_of(self):
+        self.assertEqual(metrics.endpoint_of("https://api.bilibili.com/x/web-interface/view/detail?bvid=BV1"),
+                         "/x/web-interface/view/detail")
+        self.assertEqual(metrics.endpoint_of("https://edith.xiaohongshu.com/api/sns/web/v1/feed"),
+                         "/api/sns/web/v1/feed")
+        self.assertEqual(metrics.endpoint_of("https://www.xiaohongshu.com/user/profile/5f3a1b2c3d4e5f6a7b8c9d0e"),
+                         "/user/profile/{id}")
+        self.assertEqual(metrics.endpoint_of("https://tieba.baidu.com/p/8888888888"), "/p/{id}")
+
+    def test_disabled_records_nothing(self):
+        with mock.patch.object(config, "ENABLE_METRICS", False):
+            metrics.observe_request("xhs", "https://edith.xiaohongshu.com/api/sns/web/v1/feed", 200, 0.1)
+            metrics.observe_sign("xhs", 0.01)
+            metrics.observe_store_write("jsonl", 0.01, 10)
+        self.assertEqual(metrics.summary(), "no metrics yet")
+
+    async def test_api_client_requests_are_observed(self):
+        client = MetricsApiClient()
+        await client.request("GET", "https://api.bilibili.com/x/web-interface/view/detail?bvid=BV1")
+        await client.request("GET", "https://api.bilibili.com/x/space/wbi/arc/search")
+        with self.assertRaises(httpx.ConnectError):
+            await client.request("GET", "https://api.bilibili.com/x/error")
+        await client.close()
+
+        self.assertEqual(sorted(metrics.REQUESTS_TOTAL.items()), [
+            (("bili", "/x/error", "error"), 1),
+            (("bili", "/x/space/wbi/arc/search", "404"), 1),
+            (("bili", "/x/web-interface/view/detail", "200"), 1),
+        ])
+        text = metrics.render()
+        self.assertIn('crawler_http_request_duration_seconds_count{platform="bili",'
+                      'endpoint="/x/web-interface/view/detail"} 1', text)
+        self.assertIn('crawler_http_request_duration_seconds_bucket{platform="bili",'
+                      'endpoint="/x/web-interface/view/detail",le="+Inf"} 1', text)
+        self.assertIn("bili requests=3 non_200=2", metrics.summary())
+
+    def test_histogram_quantile(self):
+        for latency in (0.004, 0.02, 0.02, 0.3, 20):
+            metrics.observe_sign("xhs", latency)
+        self.assertEqual(metrics.SIGN_LATENCY.quantile(0.5), 0.025)
+        self.assertEqual(metrics.SIGN_LATENCY.quantile(0.95), 10.0)
+        metrics.observe_store_write("mysql", 0.2, 150)
+        metrics.observe_store_write("mysql", 0.4, 50)
+        self.assertIn("store[mysql] flushes=2 items=200 avg_flush=0.300s", metrics.summary())
+
+    async def test_pipeline_queue_depth_and_http_endpoint(self):
+        scraped = {}
+        pipeline = CrawlerPipeline("test")
+
+        async def first(item):
+            await pipeline.put("second", item)
+
+        async def second(item):
+            if "text" not in scraped:
+                scraped["summary"] = metrics.summary()
+                reader, writer = await asyncio.open_connection("127.0.0.1", port)
+                writer.write(b"GET /metrics HTTP/1.1\r\nHost: localhost\r\n\r\n")
+                scraped["text"] = (await reader.read()).decode()
+                writer.close()
+
+        port = _free_port()
+        with mock.patch.multiple(config, METRICS_PORT=port, METRICS_SUMMARY_INTERVAL_SEC=0):
+            await metrics.start_metrics()
+            pipeline.add_stage("first", first, 1, 10)
+            pipeline.add_stage("second", second, 1, 10)
+            await pipeline.run("first", range(5))
+            await metrics.close_metrics()
+
+        self.assertTrue(scraped["text"].startswith("HTTP/1.1 200 OK"))
+        self.assertIn("# TYPE crawler_pipeline_queue_depth gauge", scraped["text"])
+        self.assertIn('crawler_pipeline_queue_depth{pipeline="test",stage="first"}', scraped["text"])
+        self.assertIn("queues test.first=", scraped["summary"])
+        # 流水线结束后不再采集
+        self.assertNotIn("crawler_pipeline_queue_depth", metrics.render())
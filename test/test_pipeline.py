@@ -0,0 +1,125 @@
+# 声明：本代码仅供学习和研究目的使用。使用者应遵守以下原则：
+# 1. 不得用于任何商业用途。
+# 2. 使用时应遵守目标平台的使用条款和robots.txt规则。
+# 3. 不得进行大规模爬取或对平台造成运营干扰。
+# 4. 应合理控制请求频率，避免给目标平台带来不必要的负担。
+# 5. 不得用于任何非法或不当的用途。
+#
+# 详细许可条款请参阅项目根目录下的LICENSE文件。
+# 使用本代码即表示您同意遵守上述原则和LICENSE中的所有条款。
+
+
+# -*- coding: utf-8 -*-
+import asyncio
+import time
+from typing import List
+from unittest import IsolatedAsyncioTestCase, mock
+
+import config
+from store import crawl_journal
+from tools.pipeline import CrawlerPipeline
+from var import source_keyword_var
+
+
+class TestCrawlerPipeline(IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        patcher = mock.patch.object(config, "ENABLE_CRAWL_JOURNAL", False)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(crawl_journal.close_crawl_journal)
+
+    async def test_all_items_processed_and_context_propagated(self):
+        pipeline = CrawlerPipeline("test")
+        stored: List[tuple] = []
+
+        async def search(keyword: str):
+            source_keyword_var.set(keyword)
+            for i in range(5):
+                await pipeline.put("detail", f"{keyword}-{i}")
+
+        async def detail(item: str):
+            await asyncio.sleep(0.001)
+            await pipeline.put("store", item)
+
+        async def store(item: str):
+            stored.append((source_keyword_var.get(), item))
+
+        pipeline.add_stage("search", search, concurrency=2, queue_size=1)
+        pipeline.add_stage("detail", detail, concurrency=3, queue_size=2)
+        pipeline.add_stage("store", store, concurrency=1, queue_size=2)
+        await pipeline.run("search", ["a", "b"])
+
+        self.assertEqual(len(stored), 10)
+        for keyword, item in stored:
+            self.assertTrue(item.startswith(keyword + "-"))
+        self.assertEqual(pipeline.stats()["store"], {"processed": 10, "error": 0})
+
+    async def test_backpressure_bounds_queue(self):
+        pipeline = CrawlerPipeline("test")
+        max_queued = 0
+
+        async def produce(count: int):
+            nonlocal max_queued
+            for i in range(count):
+                await pipeline.put("consume", i)
+                max_queued = max(max_queued, pipeline._stages["consume"].queue.qsize())
+
+        async def consume(item: int):
+            await asyncio.sleep(0.001)
+
+        pipeline.add_stage("produce", produce)
+        pipeline.add_stage("consume", consume, concurrency=2, queue_size=3)
+        await pipeline.run("produce", [50])
+
+        self.assertLessEqual(max_queued, 3)
+        self.assertEqual(pipeline.stats()["consume"]["processed"], 50)
+
+    async def test_stages_overlap(self):
+        pipeline = CrawlerPipeline("test")
+
+        async def search(page_count: int):
+            for page in range(page_count):
+                await asyncio.sleep(0.02)
+                await pipeline.put("comment", page)
+
+        async def comment(page: int):
+            await asyncio.sleep(0.02)
+
+        pipeline.add_stage("search", search)
+        pipeline.add_stage("comment", comment, concurrency=2)
+        start = time.perf_counter()
+        await pipeline.run("search", [5])
+        # 串行执行需要 5 * (0.02 + 0.02) 秒, 流水线中评论与下一页搜索同时进行
+        self.assertLess(time.perf_counter() - start, 0.17)
+
+    async def test_handler_error_does_not_stop_pipeline(self):
+        pipeline = CrawlerPipeline("test")
+        handled: List[int] = []
+
+        async def handle(item: int):
+            if item % 2:
+                raise ValueError("bad item")
+            handled.append(item)
+
+        pipeline.add_stage("handle", handle, concurrency=2)
+        await pipeline.run("handle", range(6))
+
+        self.assertEqual(sorted(handled), [0, 2, 4])
+        self.assertEqual(pipeline.stats()["handle"], {"processed": 3, "error": 3})
+
+    async def test_handler_error_reported_for_keyword(self):
+        pipeline = CrawlerPipeline("test")
+
+        async def search(keyword: str):
+            source_keyword_var.set(keyword)
+            await pipeline.put("detail", keyword)
+
+        async def detail(keyword: str):
+            if keyword == "golang":
+                raise ValueError("get note detail failed")
+
+        pipeline.add_stage("search", search).add_stage("detail", detail)
+        await pipeline.run("search", ["python", "golang"])
+
+        self.assertEqual(crawl_journal.get_crawl_journal().pop_failed_tasks(), {"golang": "get note detail failed"})
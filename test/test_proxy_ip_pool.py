@@ -13,10 +13,15 @@
 # @Author  : relakkes@gmail.com
 # @Time    : 2023/12/2 14:42
 # @Desc    :
-from unittest import IsolatedAsyncioTestCase
+import asyncio
+import time
+from typing import List, Optional, Set
+from unittest import IsolatedAsyncioTestCase, mock
 
-from proxy.proxy_ip_pool import create_ip_pool
+from proxy.base_proxy import ProxyProvider
+from proxy.proxy_ip_pool import ProxyIpPool, _proxy_key, create_ip_pool
 from proxy.types import IpInfoModel
+from tools import utils
 
 
 class TestIpPool(IsolatedAsyncioTestCase):
@@ -28,3 +33,107 @@ class TestIpPool(IsolatedAsyncioTestCase):
             print(ip_proxy_info)
             self.assertIsNotNone(ip_proxy_info.ip, msg="验证 ip 是否获取成功")
 
+
+
+class FakeProxyProvider(ProxyProvider):
+    """和真实代理商一样优先返回缓存中的代理, 不够时生成新代理"""
+
+    def __init__(self, expired_time_ts: Optional[int] = None):
+        self.proxies: List[IpInfoModel] = []
+        self.expired_time_ts = expired_time_ts
+        self.bought_count = 0
+
+    async def get_proxies(self, num: int) -> List[IpInfoModel]:
+        # 过期的代理从缓存中删除
+        now = utils.get_unix_timestamp()
+        self.proxies = [proxy for proxy in self.proxies if not proxy.expired_time_ts or proxy.expired_time_ts > now]
+        while len(self.proxies) < num:
+            self.proxies.append(IpInfoModel(ip=f"10.0.0.{self.bought_count}", port=8000, user="u", password="p",
+                                            expired_time_ts=self.expired_time_ts))
+            self.bought_count += 1
+        return self.proxies[:num]
+
+
+class FakeValidateProxyIpPool(ProxyIpPool):
+
+    def __init__(self, *args, invalid_ips: Optional[Set[str]] = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.invalid_ips = invalid_ips or set()
+
+    async def _is_valid_proxy(self, proxy: IpInfoModel) -> Optional[float]:
+        await asyncio.sleep(0.1)
+        return None if proxy.ip in self.invalid_ips else 0.1
+
+
+class TestProxyIpPoolHealth(IsolatedAsyncioTestCase):
+
+    async def test_concurrent_validate_skips_invalid(self):
+        pool = FakeValidateProxyIpPool(4, True, FakeProxyProvider(), invalid_ips={"10.0.0.1"})
+        start = time.perf_counter()
+        await pool.load_proxies()
+        # 逐个验证至少需要 0.1 * 5 秒
+        self.assertLess(time.perf_counter() - start, 0.35)
+        self.assertEqual(sorted(proxy.ip for proxy in pool.proxy_list), ["10.0.0.0", "10.0.0.2", "10.0.0.3"])
+        # 后台补充时跳过无效代理拿到新代理
+        await pool._refill()
+        self.assertEqual(len(pool.proxy_list), 4)
+        await pool.close()
+
+    async def test_lease_release_and_evict(self):
+        pool = FakeValidateProxyIpPool(2, False, FakeProxyProvider(), max_consecutive_failures=2, refill_interval_sec=60)
+        await pool.load_proxies()
+        first, second = await pool.lease(), await pool.lease()
+        self.assertNotEqual(first.ip, second.ip)
+        pool.release(second, success=True, latency=0.05)
+
+        pool.report(first, success=False)
+        self.assertEqual(len(pool.proxy_list), 2)
+        pool.release(first, success=False)
+        self.assertNotIn(first.ip, [proxy.ip for proxy in pool.proxy_list])
+        # 剔除后立即触发后台补充, 不用等补充间隔
+        await asyncio.sleep(0.05)
+        self.assertEqual(sorted(proxy.ip for proxy in pool.proxy_list), ["10.0.0.1", "10.0.0.2"])
+        await pool.close()
+
+    async def test_lease_prefers_better_score(self):
+        pool = FakeValidateProxyIpPool(2, False, FakeProxyProvider())
+        await pool.load_proxies()
+        slow = await pool.lease()
+        pool.release(slow, success=True, latency=2.0)
+        fast = await pool.lease()
+        pool.release(fast, success=True, latency=0.1)
+        self.assertNotEqual(slow.ip, fast.ip)
+        self.assertEqual((await pool.lease()).ip, fast.ip)
+        await pool.close()
+
+    async def test_expired_proxy_is_not_leased(self):
+        provider = FakeProxyProvider(expired_time_ts=utils.get_unix_timestamp() + 10)
+        pool = FakeValidateProxyIpPool(1, False, provider, expire_margin_sec=30)
+        await pool.load_proxies()
+        self.assertEqual(pool.proxy_list, [])
+        provider.expired_time_ts = utils.get_unix_timestamp() + 3600
+        # 快过期的代理还在代理商的缓存里, 多要一个才能拿到新代理
+        self.assertEqual((await pool.lease()).ip, "10.0.0.1")
+        await pool.close()
+
+    async def test_refill_buys_only_missing_proxies(self):
+        now = utils.get_unix_timestamp()
+        provider = FakeProxyProvider(expired_time_ts=now + 100)
+        pool = FakeValidateProxyIpPool(2, False, provider, expire_margin_sec=30, refill_interval_sec=60)
+        await pool.load_proxies()
+        self.assertEqual(provider.bought_count, 2)
+
+        # 快过期的代理被剔除后补充两个新代理
+        provider.expired_time_ts = now + 1000
+        with mock.patch.object(utils, "get_unix_timestamp", return_value=now + 80):
+            await pool._refill()
+        self.assertEqual(provider.bought_count, 4)
+
+        # 旧代理过期后不再算作缓存中的代理, 剔除一个代理只补买一个
+        with mock.patch.object(utils, "get_unix_timestamp", return_value=now + 200):
+            pool._evict(_proxy_key(pool.proxy_list[0]), "test")
+            await pool._refill()
+        self.assertEqual(provider.bought_count, 5)
+        self.assertEqual(len(pool.proxy_list), 2)
+        self.assertEqual(len(pool._evicted_keys), 1)
+        await pool.close()
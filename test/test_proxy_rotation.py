@@ -0,0 +1,143 @@
+# 声明：本代码仅供学习和研究目的使用。使用者应遵守以下原则：
+# 1. 不得用于任何商业用途。
+# 2. 使用时应遵守目标平台的使用条款和robots.txt规则。
+# 3. 不得进行大规模爬取或对平台造成运营干扰。
+# 4. 应合理控制请求频率，避免给目标平台带来不必要的负担。
+# 5. 不得用于任何非法或不当的用途。
+#
+# 详细许可条款请参阅项目根目录下的LICENSE文件。
+# 使用本代码即表示您同意遵守上述原则和LICENSE中的所有条款。
+
+
+# -*- coding: utf-8 -*-
+from typing import Callable, Dict, List, Optional
+from unittest import IsolatedAsyncioTestCase, mock
+
+import httpx
+
+import config
+from base.base_crawler import AbstractApiClient
+from proxy.base_proxy import ProxyProvider
+from proxy.proxy_ip_pool import ProxyIpPool
+from proxy.types import IpInfoModel
+
+
+class FakeProxyProvider(ProxyProvider):
+
+    async def get_proxies(self, num: int) -> List[IpInfoModel]:
+        return [IpInfoModel(ip=f"10.0.0.{i}", port=8000, user="u", password="p", expired_time_ts=None)
+                for i in range(num)]
+
+
+class FakeValidateProxyIpPool(ProxyIpPool):
+
+    async def _is_valid_proxy(self, proxy: IpInfoModel) -> Optional[float]:
+        return 0.1
+
+
+class FakeApiClient(AbstractApiClient):
+
+    def __init__(self, handler: Callable[[Optional[str]], httpx.Response], proxies: Optional[Dict] = None):
+        """
+        :param handler: 根据请求使用的代理IP返回响应
+        :param proxies: 初始的 httpx 代理
+        """
+        self.handler = handler
+        self.proxies = proxies
+        self.used_ips: List[Optional[str]] = []
+
+    def get_http_client(self, proxies: Optional[Dict] = None) -> httpx.AsyncClient:
+        ip = list(proxies.values())[0].split("@")[1].split(":")[0] if proxies else None
+
+        def handle(request: httpx.Request) -> httpx.Response:
+            self.used_ips.append(ip)
+            return self.handler(ip)
+
+        return httpx.AsyncClient(transport=httpx.MockTransport(handle))
+
+    async def request(self, method, url, **kwargs):
+        response = await self.send(method, url, **kwargs)
+        return response.json()
+
+    async def update_cookies(self, browser_context):
+        pass
+
+
+class TestProxyRotation(IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        patcher = mock.patch.multiple(config, BLOCK_RETRY_TIMES=2, BLOCK_RETRY_BACKOFF_SEC=0.0)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    async def _create_client(self, handler: Callable[[Optional[str]], httpx.Response]):
+        pool = FakeValidateProxyIpPool(3, True, FakeProxyProvider())
+        await pool.load_proxies()
+        proxy_info = await pool.lease()
+        client = FakeApiClient(handler, {"https://": f"http://u:p@{proxy_info.ip}:{proxy_info.port}"})
+        client.set_ip_proxy_pool(pool, proxy_info)
+        return client, pool
+
+    async def test_rotate_proxy_on_captcha(self):
+        client, pool = await self._create_client(
+            lambda ip: httpx.Response(461 if ip == "10.0.0.0" else 200, json={"ip": ip})
+        )
+        self.assertEqual(await client.request("GET", "https://example.com/api"), {"ip": "10.0.0.1"})
+        self.assertEqual(client.used_ips, ["10.0.0.0", "10.0.0.1"])
+        self.assertEqual(client.ip_proxy_info.ip, "10.0.0.1")
+        stats = {item["proxy"]: item for item in pool.stats()}
+        self.assertEqual(stats["10.0.0.0:8000"]["leased"], 0)
+        self.assertEqual(stats["10.0.0.1:8000"]["leased"], 1)
+        # 一次被风控只记一次失败
+        self.assertEqual(stats["10.0.0.0:8000"]["fail"], 1)
+        self.assertEqual(stats["10.0.0.1:8000"]["success"], 1)
+        await pool.close()
+
+    async def test_concurrent_failures_rotate_once(self):
+        client, pool = await self._create_client(
+            lambda ip: httpx.Response(461 if ip == "10.0.0.0" else 200, json={"ip": ip})
+        )
+        failed_proxy = client.ip_proxy_info
+        self.assertTrue(await client.rotate_proxy("captcha", failed_proxy))
+        rotated_proxy = client.ip_proxy_info
+        # 另一个使用旧代理的请求随后失败, 不再换掉已经换好的代理
+        self.assertTrue(await client.rotate_proxy("captcha", failed_proxy))
+        self.assertIs(client.ip_proxy_info, rotated_proxy)
+        stats = {item["proxy"]: item for item in pool.stats()}
+        self.assertEqual(sum(item["leased"] for item in stats.values()), 1)
+        self.assertEqual(stats["10.0.0.0:8000"]["fail"], 0)
+        await pool.close()
+
+    async def test_return_last_response_when_retries_used_up(self):
+        client, pool = await self._create_client(lambda ip: httpx.Response(429, json={"ip": ip}))
+        await client.request("GET", "https://example.com/api")
+        self.assertEqual(len(client.used_ips), 3)
+        self.assertEqual(len(set(client.used_ips)), 3)
+        await pool.close()
+
+    async def test_transport_error_rotates_proxy(self):
+        def handler(ip):
+            if ip == "10.0.0.0":
+                raise httpx.ConnectError("proxy refused")
+            return httpx.Response(200, json={"ip": ip})
+
+        client, pool = await self._create_client(handler)
+        self.assertEqual(await client.request("GET", "https://example.com/api"), {"ip": "10.0.0.1"})
+        await pool.close()
+
+    async def test_without_proxy_pool(self):
+        client = FakeApiClient(lambda ip: httpx.Response(471, json={}))
+        await client.request("GET", "https://example.com/api")
+        # 没有代理池时验证码不重试
+        self.assertEqual(client.used_ips, [None])
+
+        client = FakeApiClient(lambda ip: httpx.Response(429 if len(client.used_ips) == 1 else 200, json={"ok": 1}))
+        self.assertEqual(await client.request("GET", "https://example.com/api"), {"ok": 1})
+        self.assertEqual(client.used_ips, [None, None])
+
+        def refuse(ip):
+            raise httpx.ConnectError("refused")
+
+        client = FakeApiClient(refuse)
+        with self.assertRaises(httpx.ConnectError):
+            await client.request("GET", "https://example.com/api")
@@ -0,0 +1,102 @@
+# 声明：本代码仅供学习和研究目的使用。使用者应遵守以下原则：
+# 1. 不得用于任何商业用途。
+# 2. 使用时应遵守目标平台的使用条款和robots.txt规则。
+# 3. 不得进行大规模爬取或对平台造成运营干扰。
+# 4. 应合理控制请求频率，避免给目标平台带来不必要的负担。
+# 5. 不得用于任何非法或不当的用途。
+#
+# 详细许可条款请参阅项目根目录下的LICENSE文件。
+# 使用本代码即表示您同意遵守上述原则和LICENSE中的所有条款。
+
+
+# -*- coding: utf-8 -*-
+import asyncio
+import time
+from unittest import IsolatedAsyncioTestCase, mock
+
+import config
+from tools import rate_limiter
+from tools.rate_limiter import PlatformRateLimiter, TokenBucket
+
+
+class TestTokenBucket(IsolatedAsyncioTestCase):
+
+    async def test_burst_then_rate(self):
+        bucket = TokenBucket(qps=20, burst=3)
+        start = time.monotonic()
+        for _ in range(3):
+            await bucket.acquire()
+        self.assertLess(time.monotonic() - start, 0.02)
+        for _ in range(4):
+            await bucket.acquire()
+        # 突发的 3 个令牌用完后, 之后每个令牌需要等待 1 / 20 秒
+        self.assertGreaterEqual(time.monotonic() - start, 0.19)
+
+    async def test_concurrent_acquire_is_spaced(self):
+        bucket = TokenBucket(qps=50, burst=1)
+        done_at = []
+
+        async def worker():
+            await bucket.acquire()
+            done_at.append(time.monotonic())
+
+        start = time.monotonic()
+        await asyncio.gather(*[worker() for _ in range(6)])
+        done_at.sort()
+        # 第一个令牌立即获得, 之后每个令牌间隔 1 / 50 秒; 协程唤醒可能有延迟, 只检查总耗时
+        self.assertGreaterEqual(done_at[-1] - start, 5 * 0.02 * 0.95)
+        self.assertLess(done_at[0] - start, 0.02)
+
+    async def test_waiting_does_not_block_event_loop(self):
+        bucket = TokenBucket(qps=5, burst=1)
+        await bucket.acquire()
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.01)
+                ticks += 1
+
+        ticker_task = asyncio.create_task(ticker())
+        await bucket.acquire()
+        ticker_task.cancel()
+        self.assertGreater(ticks, 5)
+
+    async def test_pause(self):
+        bucket = TokenBucket(qps=100, burst=5)
+        bucket.pause(0.1)
+        start = time.monotonic()
+        await bucket.acquire()
+        self.assertGreaterEqual(time.monotonic() - start, 0.09)
+        # 暂停期间不积攒令牌, 暂停结束后按 qps 放行
+        self.assertGreater(bucket.reserve(), 0)
+
+
+class TestPlatformRateLimiter(IsolatedAsyncioTestCase):
+
+    def tearDown(self):
+        rate_limiter.reset()
+
+    def test_endpoint_rules(self):
+        limiter = PlatformRateLimiter("wb", (1, 1), {"/comments": (0.5, 1), "/comments/hotflow": (0.2, 1)})
+        self.assertIs(limiter.get_bucket("https://m.weibo.cn/comments/hotflow?id=1"),
+                      limiter.endpoint_buckets["/comments/hotflow"])
+        self.assertIs(limiter.get_bucket("/comments/other"), limiter.endpoint_buckets["/comments"])
+        self.assertIs(limiter.get_bucket("https://m.weibo.cn/api/container/getIndex"), limiter.default_bucket)
+
+    def test_get_rate_limiter_from_config(self):
+        rules = {"xhs": {"default": (2, 4), "/api/sns/web/v2/comment/page": (0.5, 1)}}
+        with mock.patch.object(config, "RATE_LIMIT_RULES", rules):
+            limiter = rate_limiter.get_rate_limiter("xhs")
+        self.assertIs(rate_limiter.get_rate_limiter("xhs"), limiter)
+        self.assertEqual((limiter.default_bucket.qps, limiter.default_bucket.burst), (2, 4))
+        self.assertEqual(limiter.endpoint_buckets["/api/sns/web/v2/comment/page"].qps, 0.5)
+
+    async def test_acquire_disabled(self):
+        with mock.patch.object(config, "ENABLE_RATE_LIMIT", False), \
+                mock.patch.object(config, "RATE_LIMIT_RULES", {"dy": {"default": (0.1, 1)}}):
+            start = time.monotonic()
+            for _ in range(5):
+                await rate_limiter.acquire("dy", "https://www.douyin.com/aweme/v1/web/aweme/detail/")
+            self.assertLess(time.monotonic() - start, 0.05)
@@ -0,0 +1,172 @@
+# 声明：本代码仅供学习和研究目的使用。使用者应遵守以下原则：
+# 1. 不得用于任何商业用途。
+# 2. 使用时应遵守目标平台的使用条款和robots.txt规则。
+# 3. 不得进行大规模爬取或对平台造成运营干扰。
+# 4. 应合理控制请求频率，避免给目标平台带来不必要的负担。
+# 5. 不得用于任何非法或不当的用途。
+#
+# 详细许可条款请参阅项目根目录下的LICENSE文件。
+# 使用本代码即表示您同意遵守上述原则和LICENSE中的所有条款。
+
+
+# -*- coding: utf-8 -*-
+import os
+import tempfile
+from typing import Optional
+from unittest import IsolatedAsyncioTestCase, mock
+
+import httpx
+
+import config
+from base.base_crawler import AbstractApiClient
+from cache import response_cache
+from cache.local_cache import AsyncExpiringLocalCache
+from cache.response_cache import ResponseCache, ResponseCacheMissError
+from cache.sqlite_cache import AsyncSqliteCache
+from media_platform.bilibili.client import BilibiliClient
+from media_platform.douyin.client import DOUYINClient
+from media_platform.xhs.client import XiaoHongShuClient
+
+DETAIL_URL = "https://api.bilibili.com/x/web-interface/view/detail"
+SEARCH_URL = "https://api.bilibili.com/x/web-interface/wbi/search/type"
+
+
+def create_response_cache(replay_only: bool = False) -> ResponseCache:
+    return ResponseCache(
+        AsyncExpiringLocalCache(),
+        endpoint_ttl={r"^/x/web-interface/view/detail$": 60, r"^/api/sns/web/v1/feed$": 60},
+        ignore_params=["wts", "w_rid", "a_bogus"],
+        replay_only=replay_only,
+    )
+
+
+class FakeApiClient(AbstractApiClient):
+
+    def __init__(self, error_count: int = 0):
+        """
+        :param error_count: 前几次请求返回 200 状态码的错误内容
+        """
+        self.proxies = None
+        self.request_count = 0
+        self.error_count = error_count
+
+    def get_http_client(self, proxies: Optional[dict] = None) -> httpx.AsyncClient:
+        def handle(request: httpx.Request) -> httpx.Response:
+            self.request_count += 1
+            code = -1 if self.request_count <= self.error_count else 0
+            return httpx.Response(200, json={"code": code, "data": {"count": self.request_count}})
+
+        return httpx.AsyncClient(transport=httpx.MockTransport(handle))
+
+    async def request(self, method, url, **kwargs):
+        response = await self.send(method, url, platform="bili", **kwargs)
+        return response.json()["data"]
+
+    def is_cacheable(self, response: httpx.Response) -> bool:
+        return response.json().get("code") == 0
+
+    async def update_cookies(self, browser_context):
+        pass
+
+
+class TestResponseCache(IsolatedAsyncioTestCase):
+
+    def test_cache_key_ignores_signature_params(self):
+        cache = create_response_cache()
+        key = cache.cache_key("GET", f"{DETAIL_URL}?bvid=BV1&wts=1&w_rid=abc", {})
+        self.assertEqual(key, cache.cache_key("get", f"{DETAIL_URL}?wts=2&w_rid=def&bvid=BV1", {}))
+        self.assertEqual(key, cache.cache_key("GET", DETAIL_URL, {"params": {"bvid": "BV1", "wts": 3}}))
+        self.assertNotEqual(key, cache.cache_key("GET", f"{DETAIL_URL}?bvid=BV2", {}))
+
+    def test_cache_key_uses_body(self):
+        cache = create_response_cache()
+        url = "https://edith.xiaohongshu.com/api/sns/web/v1/feed"
+        key = cache.cache_key("POST", url, {"data": '{"source_note_id":"n1"}', "headers": {"X-s": "sign1"}})
+        self.assertEqual(key, cache.cache_key("POST", url, {"data": '{"source_note_id":"n1"}',
+                                                            "headers": {"X-s": "sign2"}}))
+        self.assertNotEqual(key, cache.cache_key("POST", url, {"data": '{"source_note_id":"n2"}'}))
+
+    def test_endpoint_ttl(self):
+        cache = create_response_cache()
+        self.assertEqual(cache.get_ttl(f"{DETAIL_URL}?bvid=BV1"), 60)
+        self.assertEqual(cache.get_ttl(SEARCH_URL), 0)
+
+    async def test_lookup_and_store(self):
+        cache = create_response_cache()
+        self.assertIsNone(await cache.lookup("bili", "GET", DETAIL_URL, {}))
+        await cache.store("GET", DETAIL_URL, {}, httpx.Response(200, json={"code": 0}))
+        await cache.store("GET", SEARCH_URL, {}, httpx.Response(200, json={"code": 0}))
+        await cache.store("GET", f"{DETAIL_URL}?bvid=BV2", {}, httpx.Response(500, json={"code": -1}))
+
+        response = await cache.lookup("bili", "GET", f"{DETAIL_URL}?wts=1", {})
+        self.assertEqual(response.json(), {"code": 0})
+        self.assertIsNone(await cache.lookup("bili", "GET", SEARCH_URL, {}))
+        self.assertIsNone(await cache.lookup("bili", "GET", f"{DETAIL_URL}?bvid=BV2", {}))
+        self.assertEqual(cache.stats(), {"bili": {"hit": 1, "miss": 2, "hit_rate": 0.3333}})
+        await cache.close()
+
+    async def test_replay_only(self):
+        cache = create_response_cache(replay_only=True)
+        await cache.cache_client.set(cache.cache_key("GET", SEARCH_URL, {}), (200, {}, b'{"code": 0}'), 60)
+        self.assertEqual((await cache.lookup("bili", "GET", SEARCH_URL, {})).json(), {"code": 0})
+        with self.assertRaises(ResponseCacheMissError):
+            await cache.lookup("bili", "GET", DETAIL_URL, {})
+        await cache.close()
+
+    async def test_api_client_send_uses_cache(self):
+        patcher = mock.patch.multiple(config, ENABLE_RESPONSE_CACHE=True, ENABLE_RATE_LIMIT=False)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        with mock.patch.object(response_cache, "_response_cache", create_response_cache()):
+            client = FakeApiClient()
+            self.assertEqual(await client.request("GET", f"{DETAIL_URL}?bvid=BV1&wts=1"), {"count": 1})
+            self.assertEqual(await client.request("GET", f"{DETAIL_URL}?bvid=BV1&wts=2"), {"count": 1})
+            self.assertEqual(await client.request("GET", SEARCH_URL), {"count": 2})
+            self.assertEqual(await client.request("GET", SEARCH_URL), {"count": 3})
+            self.assertEqual(client.request_count, 3)
+            await response_cache.close_response_cache()
+
+    async def test_error_payload_is_not_cached(self):
+        patcher = mock.patch.multiple(config, ENABLE_RESPONSE_CACHE=True, ENABLE_RATE_LIMIT=False)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        with mock.patch.object(response_cache, "_response_cache", create_response_cache()):
+            client = FakeApiClient(error_count=1)
+            # 重试时不会读到缓存的错误
+            self.assertEqual(await client.request("GET", f"{DETAIL_URL}?bvid=BV1"), {"count": 1})
+            self.assertEqual(await client.request("GET", f"{DETAIL_URL}?bvid=BV1"), {"count": 2})
+            self.assertEqual(await client.request("GET", f"{DETAIL_URL}?bvid=BV1"), {"count": 2})
+            await response_cache.close_response_cache()
+
+    def test_platform_cacheable_predicates(self):
+        kwargs = {"headers": {}, "playwright_page": mock.Mock(), "cookie_dict": {}}
+        xhs_client = XiaoHongShuClient(**kwargs)
+        self.assertTrue(xhs_client.is_cacheable(httpx.Response(200, json={"success": True, "data": {}})))
+        self.assertFalse(xhs_client.is_cacheable(httpx.Response(200, json={"success": False, "code": 300012})))
+        self.assertFalse(xhs_client.is_cacheable(httpx.Response(200, json={"success": False, "msg": "笔记不存在"})))
+        self.assertTrue(xhs_client.is_cacheable(httpx.Response(200, html="<html></html>")))
+
+        bili_client = BilibiliClient(**kwargs)
+        self.assertTrue(bili_client.is_cacheable(httpx.Response(200, json={"code": 0, "data": {}})))
+        self.assertFalse(bili_client.is_cacheable(httpx.Response(200, json={"code": -412})))
+
+        dy_client = DOUYINClient(**kwargs)
+        self.assertTrue(dy_client.is_cacheable(httpx.Response(200, json={"aweme_detail": {}})))
+        self.assertFalse(dy_client.is_cacheable(httpx.Response(200, text="blocked")))
+        self.assertFalse(dy_client.is_cacheable(httpx.Response(200, text="")))
+
+    async def test_sqlite_cache(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            db_path = os.path.join(temp_dir, "cache", "response_cache.db")
+            cache = AsyncSqliteCache(db_path)
+            await cache.mset({"response_cache:a": (200, {}, b"a"), "response_cache:b": (200, {}, b"b")}, 60)
+            await cache.set("other", 1, -1)
+            self.assertEqual(await cache.get("response_cache:a"), (200, {}, b"a"))
+            self.assertIsNone(await cache.get("other"))
+            self.assertEqual(sorted(await cache.keys("response_cache:*")), ["response_cache:a", "response_cache:b"])
+            await cache.close()
+
+            # 重新打开后缓存仍然有效
+            cache = AsyncSqliteCache(db_path)
+            self.assertEqual(await cache.mget(["response_cache:b", "missing"]), [(200, {}, b"b"), None])
+            await cache.close()
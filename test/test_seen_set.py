@@ -0,0 +1,109 @@
+# 声明：本代码仅供学习和研究目的使用。使用者应遵守以下原则：
+# 1. 不得用于任何商业用途。
+# 2. 使用时应遵守目标平台的使用条款和robots.txt规则。
+# 3. 不得进行大规模爬取或对平台造成运营干扰。
+# 4. 应合理控制请求频率，避免给目标平台带来不必要的负担。
+# 5. 不得用于任何非法或不当的用途。
+#
+# 详细许可条款请参阅项目根目录下的LICENSE文件。
+# 使用本代码即表示您同意遵守上述原则和LICENSE中的所有条款。
+
+
+# -*- coding: utf-8 -*-
+import os
+import tempfile
+import unittest
+from unittest import IsolatedAsyncioTestCase, TestCase, mock
+
+import config
+from cache import seen_set
+from cache.cache_factory import CacheFactory
+from cache.seen_set import BloomSeenSet, RedisSeenSet, ScalableBloomFilter
+
+try:
+    import fakeredis
+except ImportError:
+    fakeredis = None
+
+
+class TestScalableBloomFilter(TestCase):
+
+    def test_no_false_negative_after_growth(self):
+        bloom = ScalableBloomFilter(initial_capacity=1000, error_rate=0.01)
+        keys = [f"xhs:note{i}" for i in range(5000)]
+        added = sum(bloom.add(key) for key in keys)
+        # 误判时新元素会被当成已存在
+        self.assertGreater(added, 5000 * 0.98)
+        self.assertGreater(len(bloom.filters), 1)
+        self.assertTrue(all(key in bloom for key in keys))
+        self.assertFalse(bloom.add(keys[0]))
+        self.assertEqual(len(bloom), added)
+
+    def test_false_positive_rate(self):
+        bloom = ScalableBloomFilter(initial_capacity=2000, error_rate=0.01)
+        for i in range(8000):
+            bloom.add(f"dy:{i}")
+        false_positives = sum(f"ks:{i}" in bloom for i in range(20000))
+        self.assertLess(false_positives / 20000, 0.02)
+
+
+class TestSeenSet(IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+
+    async def asyncTearDown(self):
+        await seen_set.close_seen_set()
+        self.tmp_dir.cleanup()
+
+    async def test_check_stats(self):
+        store = BloomSeenSet(initial_capacity=100)
+        self.assertFalse(await store.check("bili:1"))
+        # 只查询不添加
+        self.assertFalse(await store.check("bili:1"))
+        self.assertTrue(await store.add("bili:1"))
+        self.assertFalse(await store.add("bili:1"))
+        self.assertTrue(await store.check("bili:1"))
+        stats = store.stats()
+        self.assertEqual((stats["hit"], stats["miss"], stats["size"]), (1, 2, 1))
+        self.assertAlmostEqual(stats["hit_ratio"], 0.3333)
+
+    async def test_persist_to_disk(self):
+        persist_path = os.path.join(self.tmp_dir.name, "seen", "bloom.pkl")
+        store = BloomSeenSet(initial_capacity=100, persist_path=persist_path)
+        await store.add("wb:100")
+        await store.close()
+        self.assertTrue(os.path.exists(persist_path))
+
+        store = BloomSeenSet(initial_capacity=100, persist_path=persist_path)
+        self.assertTrue(await store.contains("wb:100"))
+        self.assertFalse(await store.contains("wb:101"))
+
+    async def test_is_seen_after_mark_seen(self):
+        with mock.patch.multiple(config, ENABLE_SEEN_SET=True, SEEN_SET_TYPE="memory", SEEN_SET_PERSIST_PATH="",
+                                 ENABLE_INCREMENTAL_CRAWL=False):
+            # 详情或保存失败时没有 mark_seen, 下次仍会爬取
+            self.assertFalse(await seen_set.is_seen("xhs", "note1"))
+            self.assertFalse(await seen_set.is_seen("xhs", "note1"))
+            await seen_set.mark_seen("xhs", "note1")
+            self.assertTrue(await seen_set.is_seen("xhs", "note1"))
+            # 不同平台的相同ID互不影响
+            self.assertFalse(await seen_set.is_seen("dy", "note1"))
+            # 增量爬取需要刷新已保存的内容, 不跳过
+            with mock.patch.object(config, "ENABLE_INCREMENTAL_CRAWL", True):
+                self.assertFalse(await seen_set.is_seen("xhs", "note1"))
+        with mock.patch.object(config, "ENABLE_SEEN_SET", False):
+            self.assertFalse(await seen_set.is_seen("xhs", "note1"))
+
+    @unittest.skipIf(fakeredis is None, "fakeredis is not installed")
+    async def test_redis_seen_set(self):
+        store = RedisSeenSet("test:seen", redis_client=fakeredis.FakeAsyncRedis())
+        self.assertFalse(await store.check("ks:1"))
+        self.assertTrue(await store.add("ks:1"))
+        self.assertFalse(await store.add("ks:1"))
+        self.assertTrue(await store.check("ks:1"))
+        await store.close()
+
+    def test_unknown_type(self):
+        with self.assertRaises(ValueError):
+            CacheFactory.create_seen_set("disk")
@@ -0,0 +1,140 @@
+# 声明：本代码仅供学习和研究目的使用。使用者应遵守以下原则：
+# 1. 不得用于任何商业用途。
+# 2. 使用时应遵守目标平台的使用条款和robots.txt规则。
+# 3. 不得进行大规模爬取或对平台造成运营干扰。
+# 4. 应合理控制请求频率，避免给目标平台带来不必要的负担。
+# 5. 不得用于任何非法或不当的用途。
+#
+# 详细许可条款请参阅项目根目录下的LICENSE文件。
+# 使用本代码即表示您同意遵守上述原则和LICENSE中的所有条款。
+
+
+# -*- coding: utf-8 -*-
+import asyncio
+from typing import List
+from unittest import IsolatedAsyncioTestCase, mock
+
+from tenacity import retry, stop_after_attempt
+
+import config
+from media_platform.xhs.exception import DataFetchError, IPBlockError
+from tools import session_pool
+from tools.session_pool import NoAvailableSessionError, SessionPool, SessionPoolClient
+
+
+class FakeClient:
+
+    def __init__(self, name: str, calls: List[str], error: Exception = None, delay: float = 0.0):
+        self.name = name
+        self.proxies = None
+        self.signer = f"signer-{name}"
+        self.calls = calls
+        self.error = error
+        self.delay = delay
+        self.closed = False
+
+    async def pong(self) -> bool:
+        self.calls.append(f"{self.name}:pong")
+        return True
+
+    async def get_note_by_id(self, note_id: str) -> dict:
+        self.calls.append(self.name)
+        await asyncio.sleep(self.delay)
+        if self.error:
+            raise self.error
+        return {"note_id": note_id, "client": self.name}
+
+    @retry(stop=stop_after_attempt(2))
+    async def get_note_comments(self, note_id: str) -> dict:
+        self.calls.append(self.name)
+        if self.error:
+            raise self.error
+        return {"comments": [], "client": self.name}
+
+    async def close(self):
+        self.closed = True
+
+
+class TestSessionPool(IsolatedAsyncioTestCase):
+
+    def _create_pool(self, clients: List[FakeClient], **kwargs) -> SessionPool:
+        pool = SessionPool("xhs", retire_exceptions=(IPBlockError,), **kwargs)
+        for client in clients:
+            pool.add_session(client)
+        return pool
+
+    async def test_least_loaded_spreads_concurrent_calls(self):
+        calls = []
+        pool = self._create_pool([FakeClient(f"c{i}", calls, delay=0.05) for i in range(3)])
+        results = await asyncio.gather(*[pool.call("get_note_by_id", str(i)) for i in range(6)])
+        self.assertEqual(sorted(calls), ["c0", "c0", "c1", "c1", "c2", "c2"])
+        self.assertEqual([result["note_id"] for result in results], [str(i) for i in range(6)])
+        self.assertTrue(all(stats["success"] == 2 and stats["inflight"] == 0 for stats in pool.stats()))
+
+    async def test_round_robin(self):
+        calls = []
+        pool = self._create_pool([FakeClient(f"c{i}", calls) for i in range(3)], strategy="round_robin")
+        for i in range(5):
+            await pool.call("get_note_by_id", str(i))
+        self.assertEqual(calls, ["c0", "c1", "c2", "c0", "c1"])
+
+    async def test_blocked_session_is_retired_and_retried(self):
+        calls = []
+        pool = self._create_pool([
+            FakeClient("c0", calls, error=IPBlockError("ip blocked")),
+            FakeClient("c1", calls, error=Exception("出现验证码，请求失败")),
+            FakeClient("c2", calls),
+        ], strategy="round_robin")
+        result = await pool.call("get_note_by_id", "n1")
+        self.assertEqual(result["client"], "c2")
+        self.assertEqual(calls, ["c0", "c1", "c2"])
+        self.assertEqual([session.session_id for session in pool.alive_sessions], ["xhs-2"])
+        self.assertTrue(pool.stats()[0]["retired"])
+
+        pool.sessions[2].client.error = IPBlockError("ip blocked")
+        with self.assertRaises(IPBlockError):
+            await pool.call("get_note_by_id", "n2")
+        with self.assertRaises(NoAvailableSessionError):
+            await pool.call("get_note_by_id", "n3")
+
+    async def test_blocked_after_tenacity_retry(self):
+        calls = []
+        pool = self._create_pool([FakeClient("c0", calls, error=IPBlockError("ip blocked")), FakeClient("c1", calls)])
+        result = await pool.call("get_note_comments", "n1")
+        self.assertEqual(result["client"], "c1")
+        self.assertTrue(pool.sessions[0].retired)
+
+    async def test_retire_after_consecutive_failures(self):
+        calls = []
+        pool = self._create_pool([FakeClient("c0", calls, error=DataFetchError("busy"))], max_consecutive_failures=2)
+        for _ in range(2):
+            with self.assertRaises(DataFetchError):
+                await pool.call("get_note_by_id", "n1")
+        self.assertEqual(pool.alive_sessions, [])
+        self.assertEqual(pool.stats()[0]["fail"], 2)
+
+    async def test_pool_client(self):
+        calls = []
+        main_client, account_client = FakeClient("main", calls), FakeClient("account", calls)
+        pool_client = SessionPoolClient(self._create_pool([main_client, account_client], strategy="round_robin"))
+        self.assertTrue(await pool_client.pong())
+        self.assertEqual(pool_client.signer, "signer-main")
+        await pool_client.get_note_by_id("n1")
+        await pool_client.get_note_by_id("n2")
+        self.assertEqual(calls, ["main:pong", "main", "account"])
+        await pool_client.close()
+        self.assertTrue(main_client.closed and account_client.closed)
+
+    async def test_create_session_pool_client_from_config(self):
+        calls = []
+        main_client = FakeClient("main", calls)
+
+        async def create_account_client(cookie_str, ip_proxy_info):
+            return FakeClient(cookie_str, calls)
+
+        with mock.patch.object(config, "ACCOUNT_COOKIES_LIST", []):
+            client = await session_pool.create_session_pool_client("xhs", main_client, create_account_client)
+            self.assertIs(client, main_client)
+        with mock.patch.object(config, "ACCOUNT_COOKIES_LIST", ["a1=1", "a1=2"]):
+            client = await session_pool.create_session_pool_client("xhs", main_client, create_account_client)
+        self.assertEqual([session.client.name for session in client.pool.sessions], ["main", "a1=1", "a1=2"])
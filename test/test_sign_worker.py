@@ -0,0 +1,60 @@
+# 声明：本代码仅供学习和研究目的使用。使用者应遵守以下原则：
+# 1. 不得用于任何商业用途。
+# 2. 使用时应遵守目标平台的使用条款和robots.txt规则。
+# 3. 不得进行大规模爬取或对平台造成运营干扰。
+# 4. 应合理控制请求频率，避免给目标平台带来不必要的负担。
+# 5. 不得用于任何非法或不当的用途。
+#
+# 详细许可条款请参阅项目根目录下的LICENSE文件。
+# 使用本代码即表示您同意遵守上述原则和LICENSE中的所有条款。
+
+
+# -*- coding: utf-8 -*-
+import asyncio
+import os
+import tempfile
+from unittest import IsolatedAsyncioTestCase
+
+from tools.sign_worker import NodeSignWorkerPool, SignWorkerError
+
+TEST_JS = """
+const crypto = require('crypto');
+function add(a, b) { return a + b; }
+function md5(s) { return crypto.createHash('md5').update(s).digest('hex'); }
+function crash() { process.exit(1); }
+function fail() { throw new Error('bad params'); }
+"""
+
+
+class TestNodeSignWorkerPool(IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.script_path = os.path.join(self.tmp_dir.name, "test.js")
+        with open(self.script_path, "w", encoding="utf-8") as f:
+            f.write(TEST_JS)
+        self.pool = NodeSignWorkerPool(self.script_path, size=2, timeout=5)
+
+    async def asyncTearDown(self):
+        await self.pool.close()
+        self.tmp_dir.cleanup()
+
+    async def test_call(self):
+        results = await asyncio.gather(*[self.pool.call("add", i, 1) for i in range(100)])
+        self.assertEqual(results, [i + 1 for i in range(100)])
+        self.assertEqual(await self.pool.call("md5", "abc"), "900150983cd24fb0d6963f7d28e17f72")
+        self.assertTrue(all(worker.is_alive for worker in self.pool.workers))
+
+    async def test_script_error(self):
+        with self.assertRaises(SignWorkerError):
+            await self.pool.call("fail")
+        with self.assertRaises(SignWorkerError):
+            await self.pool.call("not_exists")
+        self.assertEqual(await self.pool.call("add", 1, 2), 3)
+
+    async def test_restart_crashed_worker(self):
+        self.pool.max_retries = 0
+        with self.assertRaises(SignWorkerError):
+            await self.pool.call("crash")
+        self.assertEqual(await self.pool.call("add", "a", "b"), "ab")
+        self.assertTrue(all(worker.pending_count == 0 for worker in self.pool.workers))
@@ -0,0 +1,37 @@
+# 声明：本代码仅供学习和研究目的使用。使用者应遵守以下原则：
+# 1. 不得用于任何商业用途。
+# 2. 使用时应遵守目标平台的使用条款和robots.txt规则。
+# 3. 不得进行大规模爬取或对平台造成运营干扰。
+# 4. 应合理控制请求频率，避免给目标平台带来不必要的负担。
+# 5. 不得用于任何非法或不当的用途。
+#
+# 详细许可条款请参阅项目根目录下的LICENSE文件。
+# 使用本代码即表示您同意遵守上述原则和LICENSE中的所有条款。
+
+
+# -*- coding: utf-8 -*-
+import unittest
+
+from bench.legacy_xhs import NOTE_HTML_FIXTURE_PATH, NOTE_HTML_NOTE_ID, legacy_get_note_dict
+from media_platform.xhs.help import get_note_dict_from_html
+
+
+class TestXhsNoteHtml(unittest.TestCase):
+
+    def setUp(self):
+        with open(NOTE_HTML_FIXTURE_PATH, encoding="utf-8") as f:
+            self.html = f.read()
+
+    def test_same_as_legacy(self):
+        note = get_note_dict_from_html(self.html, NOTE_HTML_NOTE_ID)
+        self.assertEqual(note, legacy_get_note_dict(self.html, NOTE_HTML_NOTE_ID))
+        self.assertEqual(note["note_id"], NOTE_HTML_NOTE_ID)
+        self.assertEqual(note["interact_info"]["liked_count"], "1.2万")
+        self.assertEqual(note["image_list"][0]["info_list"][0]["image_scene"], "WB_PRV")
+        self.assertEqual(note["video"], "")
+
+    def test_whitespace_and_missing_note(self):
+        html = self.html.replace('"noteDetailMap":', '"noteDetailMap": ')
+        self.assertEqual(get_note_dict_from_html(html, NOTE_HTML_NOTE_ID), legacy_get_note_dict(self.html, NOTE_HTML_NOTE_ID))
+        with self.assertRaises(KeyError):
+            get_note_dict_from_html(self.html, "not_exists_note_id")
@@ -0,0 +1,48 @@
+# 声明：本代码仅供学习和研究目的使用。使用者应遵守以下原则：
+# 1. 不得用于任何商业用途。
+# 2. 使用时应遵守目标平台的使用条款和robots.txt规则。
+# 3. 不得进行大规模爬取或对平台造成运营干扰。
+# 4. 应合理控制请求频率，避免给目标平台带来不必要的负担。
+# 5. 不得用于任何非法或不当的用途。
+#
+# 详细许可条款请参阅项目根目录下的LICENSE文件。
+# 使用本代码即表示您同意遵守上述原则和LICENSE中的所有条款。
+
+
+# -*- coding: utf-8 -*-
+import random
+import string
+import unittest
+
+from bench.legacy_xhs import legacy_b64Encode, legacy_encodeUtf8, legacy_mrc, legacy_x_s_common, random_str
+from media_platform.xhs import help as xhs_help
+
+
+class TestXhsSignHelp(unittest.TestCase):
+    SAMPLE_COUNT = 3000
+
+    def setUp(self):
+        self.rnd = random.Random(20240101)
+
+    def test_mrc_golden(self):
+        alphabet = string.ascii_letters + string.digits + "+/=_-"
+        for _ in range(self.SAMPLE_COUNT):
+            e = random_str(self.rnd, 57, 200, alphabet)
+            self.assertEqual(xhs_help.mrc(e), legacy_mrc(e), e)
+
+    def test_encode_golden(self):
+        alphabet = string.printable + "小红书笔记评论😀é%~()*!.'"
+        for _ in range(self.SAMPLE_COUNT):
+            e = random_str(self.rnd, 0, 300, alphabet)
+            self.assertEqual(list(xhs_help.encodeUtf8(e)), legacy_encodeUtf8(e), e)
+            self.assertEqual(xhs_help.b64Encode(xhs_help.encodeUtf8(e)), legacy_b64Encode(legacy_encodeUtf8(e)), e)
+
+    def test_sign_golden(self):
+        alphabet = string.ascii_letters + string.digits + "+/="
+        for _ in range(self.SAMPLE_COUNT):
+            a1 = random_str(self.rnd, 40, 60, string.hexdigits.lower())
+            b1 = random_str(self.rnd, 100, 300, alphabet)
+            x_s = "XYW_" + random_str(self.rnd, 100, 500, alphabet)
+            x_t = str(self.rnd.randint(1600000000000, 1800000000000))
+            signs = xhs_help.sign(a1=a1, b1=b1, x_s=x_s, x_t=x_t)
+            self.assertEqual(signs["x-s-common"], legacy_x_s_common(a1=a1, b1=b1, x_s=x_s, x_t=x_t))
@@ -0,0 +1,61 @@
+# 声明：本代码仅供学习和研究目的使用。使用者应遵守以下原则：
+# 1. 不得用于任何商业用途。
+# 2. 使用时应遵守目标平台的使用条款和robots.txt规则。
+# 3. 不得进行大规模爬取或对平台造成运营干扰。
+# 4. 应合理控制请求频率，避免给目标平台带来不必要的负担。
+# 5. 不得用于任何非法或不当的用途。
+#
+# 详细许可条款请参阅项目根目录下的LICENSE文件。
+# 使用本代码即表示您同意遵守上述原则和LICENSE中的所有条款。
+
+
+# -*- coding: utf-8 -*-
+import asyncio
+from unittest import IsolatedAsyncioTestCase
+
+from media_platform.xhs.signer import XhsSigner
+
+
+class FakePage:
+    """模拟页面上的 window._webmsxyw 和 localStorage, 记录 evaluate 的调用次数"""
+
+    def __init__(self):
+        self.evaluate_count = 0
+        self.b1_read_count = 0
+
+    async def evaluate(self, expression, arg):
+        self.evaluate_count += 1
+        reqs, with_b1 = arg
+        await asyncio.sleep(0.01)
+        if with_b1:
+            self.b1_read_count += 1
+        return {
+            "signs": [{"X-s": f"xs_{url}", "X-t": 1700000000000} for url, _ in reqs],
+            "b1": "b1_value" if with_b1 else None,
+        }
+
+
+class TestXhsSigner(IsolatedAsyncioTestCase):
+
+    async def test_batch_sign(self):
+        page = FakePage()
+        signer = XhsSigner([page], batch_window=0.01, max_batch_size=100)
+        results = await asyncio.gather(*[signer.sign(f"/api/{i}") for i in range(50)])
+        self.assertEqual(page.evaluate_count, 1)
+        self.assertEqual([params["X-s"] for params, _ in results], [f"xs_/api/{i}" for i in range(50)])
+        self.assertTrue(all(b1 == "b1_value" for _, b1 in results))
+        self.assertEqual(signer.latency_percentiles()["count"], 50)
+
+    async def test_b1_cache_and_page_pool(self):
+        pages = [FakePage(), FakePage()]
+        signer = XhsSigner(pages, batch_window=0.001, max_batch_size=5, local_storage_ttl=60)
+        await asyncio.gather(*[signer.sign(f"/api/{i}") for i in range(20)])
+        self.assertEqual(pages[0].evaluate_count + pages[1].evaluate_count, 4)
+        self.assertEqual(pages[0].evaluate_count, pages[1].evaluate_count)
+
+        b1_read_count = sum(page.b1_read_count for page in pages)
+        await signer.sign("/api/again")
+        self.assertEqual(sum(page.b1_read_count for page in pages), b1_read_count)
+        signer.invalidate_local_storage()
+        await signer.sign("/api/again")
+        self.assertEqual(sum(page.b1_read_count for page in pages), b1_read_count + 1)
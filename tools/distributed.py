@@ -0,0 +1,372 @@
+# 声明：本代码仅供学习和研究目的使用。使用者应遵守以下原则：
+# 1. 不得用于任何商业用途。
+# 2. 使用时应遵守目标平台的使用条款和robots.txt规则。
+# 3. 不得进行大规模爬取或对平台造成运营干扰。
+# 4. 应合理控制请求频率，避免给目标平台带来不必要的负担。
+# 5. 不得用于任何非法或不当的用途。
+#
+# 详细许可条款请参阅项目根目录下的LICENSE文件。
+# 使用本代码即表示您同意遵守上述原则和LICENSE中的所有条款。
+
+
+# -*- coding: utf-8 -*-
+# @Desc    : 分布式爬取, coordinator 把关键词、创作者、指定内容拆成任务放入 redis 队列,
+#            多个机器上的 worker 进程租用任务爬取, 成功后确认, 失败或租约超时后任务重新入队,
+#            爬取结果保存到各 worker 配置的存储中
+import asyncio
+import hashlib
+import json
+import time
+import uuid
+from typing import Callable, Dict, List, Optional
+
+from redis import Redis, WatchError
+from redis.client import Pipeline
+
+import config
+from base.base_crawler import AbstractCrawler
+from store import crawl_journal
+from tools import utils
+
+# 各平台指定内容(detail)和创作者(creator)任务对应的配置项, 关键词(search)任务对应 config.KEYWORDS
+DETAIL_CONFIG_KEYS = {
+    "xhs": "XHS_SPECIFIED_NOTE_URL_LIST",
+    "dy": "DY_SPECIFIED_ID_LIST",
+    "ks": "KS_SPECIFIED_ID_LIST",
+    "bili": "BILI_SPECIFIED_ID_LIST",
+    "wb": "WEIBO_SPECIFIED_ID_LIST",
+    "tieba": "TIEBA_SPECIFIED_ID_LIST",
+    "zhihu": "ZHIHU_SPECIFIED_ID_LIST",
+}
+CREATOR_CONFIG_KEYS = {
+    "xhs": "XHS_CREATOR_ID_LIST",
+    "dy": "DY_CREATOR_ID_LIST",
+    "ks": "KS_CREATOR_ID_LIST",
+    "bili": "BILI_CREATOR_ID_LIST",
+    "wb": "WEIBO_CREATOR_ID_LIST",
+    "tieba": "TIEBA_CREATOR_URL_LIST",
+    "zhihu": "ZHIHU_CREATOR_URL_LIST",
+}
+
+
+class RedisTaskQueue:
+
+    def __init__(self, queue_name: str, lease_timeout_sec: int = 600, max_attempts: int = 3,
+                 redis_client: Optional[Redis] = None):
+        """
+        基于 redis 的可靠任务队列, 所有任务保存在一个 zset 中, score 为任务可以被租用的时间:
+        入队时为当前时间, 租用后为租约到期时间, 租约到期没有确认的任务会自动重新可见;
+        每次租用生成新的租约令牌, 续约、确认和失败时校验令牌, 租约过期后被其他 worker 租走的任务不受原 worker 影响
+        :param queue_name: 队列名称, 作为 redis key 的前缀
+        :param lease_timeout_sec: 租约时长, worker 需要在到期前续约
+        :param max_attempts: 任务最多被租用的次数, 超过后移入失败列表
+        :param redis_client: redis 客户端, 为空时按 db_config 连接, 本地调试可以传入 fakeredis
+        """
+        if redis_client is None:
+            from cache.redis_cache import RedisCache
+            redis_client = RedisCache._connet_redis()
+        self._redis = redis_client
+        self.lease_timeout_sec = lease_timeout_sec
+        self.max_attempts = max_attempts
+        self.queue_key = f"{queue_name}:queue"
+        self.task_key = f"{queue_name}:tasks"
+        self.attempt_key = f"{queue_name}:attempts"
+        self.failed_key = f"{queue_name}:failed"
+        self.done_key = f"{queue_name}:done"
+        self.lease_key = f"{queue_name}:leases"
+
+    @staticmethod
+    def _task_id(task_type: str, value: str) -> str:
+        return hashlib.md5(f"{task_type}:{value}".encode("utf-8")).hexdigest()
+
+    def enqueue(self, task_type: str, values: List[str]) -> int:
+        """
+        任务入队, 已经在队列中的相同任务不会重复入队
+        :param task_type: 任务类型, 和 CRAWLER_TYPE 一致: search / detail / creator
+        :param values: 任务内容, eg: 关键词、创作者ID
+        :return: 新入队的任务数
+        """
+        now = time.time()
+        pipe = self._redis.pipeline()
+        for index, value in enumerate(values):
+            task_id = self._task_id(task_type, value)
+            pipe.hsetnx(self.task_key, task_id, json.dumps({"task_id": task_id, "task_type": task_type, "value": value},
+                                                           ensure_ascii=False))
+            # score 相同时按成员排序, 加上微小的偏移保持入队顺序
+            pipe.zadd(self.queue_key, {task_id: now + index * 1e-6}, nx=True)
+        return sum(pipe.execute()[1::2])
+
+    def lease(self, count: int = 1) -> List[Dict]:
+        """
+        租用最多 count 个可见的任务, 多个 worker 同时租用时通过 WATCH 保证同一个任务只被一个 worker 租到
+        :param count:
+        :return: 任务列表, 每个任务包含 task_id, task_type, value, attempts, lease_token
+        """
+        with self._redis.pipeline() as pipe:
+            while True:
+                try:
+                    pipe.watch(self.queue_key)
+                    now = time.time()
+                    task_ids = [task_id.decode() if isinstance(task_id, bytes) else task_id
+                                for task_id in pipe.zrangebyscore(self.queue_key, "-inf", now, start=0, num=count)]
+                    if not task_ids:
+                        pipe.unwatch()
+                        return []
+                    lease_tokens = {task_id: uuid.uuid4().hex for task_id in task_ids}
+                    pipe.multi()
+                    pipe.zadd(self.queue_key, {task_id: now + self.lease_timeout_sec for task_id in task_ids}, xx=True)
+                    for task_id in task_ids:
+                        pipe.hincrby(self.attempt_key, task_id, 1)
+                    pipe.hset(self.lease_key, mapping=lease_tokens)
+                    attempts_list = pipe.execute()[1:-1]
+                    break
+                except WatchError:
+                    continue
+
+        tasks = []
+        for task_id, task_json, attempts in zip(task_ids, self._redis.hmget(self.task_key, task_ids), attempts_list):
+            if task_json is None:
+                self._redis.zrem(self.queue_key, task_id)
+                self._redis.hdel(self.lease_key, task_id)
+                continue
+            task = json.loads(task_json)
+            task["attempts"] = attempts
+            task["lease_token"] = lease_tokens[task_id]
+            if attempts > self.max_attempts:
+                # 多次租约超时(worker 崩溃)的任务不再重试
+                pipe = self._redis.pipeline()
+                self._move_to_failed(pipe, task, "lease expired too many times")
+                pipe.execute()
+                continue
+            tasks.append(task)
+        return tasks
+
+    def _run_if_leased(self, tasks: List[Dict], operate: Callable[[Pipeline, List[Dict]], None]) -> List[Dict]:
+        """
+        WATCH 租约令牌, 在一个事务中只对租约仍属于自己的任务执行 operate
+        :param tasks: lease 返回的任务
+        :param operate: 向事务中添加命令, 参数为事务和租约仍有效的任务
+        :return: 租约仍有效的任务
+        """
+        if not tasks:
+            return []
+        task_ids = [task["task_id"] for task in tasks]
+        with self._redis.pipeline() as pipe:
+            while True:
+                try:
+                    pipe.watch(self.lease_key)
+                    lease_tokens = [token.decode() if isinstance(token, bytes) else token
+                                    for token in pipe.hmget(self.lease_key, task_ids)]
+                    owned_tasks = [task for task, token in zip(tasks, lease_tokens)
+                                   if token is not None and token == task.get("lease_token")]
+                    if not owned_tasks:
+                        pipe.unwatch()
+                        return []
+                    pipe.multi()
+                    operate(pipe, owned_tasks)
+                    pipe.execute()
+                    return owned_tasks
+                except WatchError:
+                    continue
+
+    def _log_lost_leases(self, action: str, tasks: List[Dict], owned_tasks: List[Dict]):
+        if len(owned_tasks) < len(tasks):
+            owned_ids = {task["task_id"] for task in owned_tasks}
+            utils.logger.warning(
+                f"[RedisTaskQueue.{action}] lease of tasks "
+                f"{[task['value'] for task in tasks if task['task_id'] not in owned_ids]} is lost, skip them"
+            )
+
+    def heartbeat(self, tasks: List[Dict]):
+        """
+        续约, 长时间运行的任务需要定期调用
+        :param tasks:
+        :return:
+        """
+        deadline = time.time() + self.lease_timeout_sec
+        owned_tasks = self._run_if_leased(
+            tasks, lambda pipe, owned: pipe.zadd(self.queue_key, {task["task_id"]: deadline for task in owned}, xx=True)
+        )
+        self._log_lost_leases("heartbeat", tasks, owned_tasks)
+
+    def ack(self, tasks: List[Dict]):
+        """
+        确认任务完成, 从队列中删除, 租约已经被其他 worker 拿走的任务不处理
+        :param tasks:
+        :return:
+        """
+        def operate(pipe: Pipeline, owned_tasks: List[Dict]):
+            task_ids = [task["task_id"] for task in owned_tasks]
+            pipe.zrem(self.queue_key, *task_ids)
+            pipe.hdel(self.task_key, *task_ids)
+            pipe.hdel(self.attempt_key, *task_ids)
+            pipe.hdel(self.lease_key, *task_ids)
+            pipe.incrby(self.done_key, len(task_ids))
+
+        self._log_lost_leases("ack", tasks, self._run_if_leased(tasks, operate))
+
+    def nack(self, tasks: List[Dict], error: str = ""):
+        """
+        任务失败, 没有超过最大次数时立即重新入队, 否则移入失败列表, 租约已经被其他 worker 拿走的任务不处理
+        :param tasks:
+        :param error: 失败原因
+        :return:
+        """
+        def operate(pipe: Pipeline, owned_tasks: List[Dict]):
+            now = time.time()
+            for task in owned_tasks:
+                if task["attempts"] >= self.max_attempts:
+                    self._move_to_failed(pipe, task, error)
+                else:
+                    pipe.zadd(self.queue_key, {task["task_id"]: now}, xx=True)
+                    pipe.hdel(self.lease_key, task["task_id"])
+
+        self._log_lost_leases("nack", tasks, self._run_if_leased(tasks, operate))
+
+    def _move_to_failed(self, pipe: Pipeline, task: Dict, error: str):
+        utils.logger.error(f"[RedisTaskQueue._move_to_failed] task {task} failed after {task['attempts']} attempts, "
+                           f"error: {error}")
+        pipe.zrem(self.queue_key, task["task_id"])
+        pipe.hdel(self.task_key, task["task_id"])
+        pipe.hdel(self.attempt_key, task["task_id"])
+        pipe.hdel(self.lease_key, task["task_id"])
+        failed_task = {key: value for key, value in task.items() if key != "lease_token"}
+        pipe.rpush(self.failed_key, json.dumps({**failed_task, "error": error}, ensure_ascii=False))
+
+    def stats(self) -> Dict:
+        now = time.time()
+        return {
+            "pending": self._redis.zcount(self.queue_key, "-inf", now),
+            "leased": self._redis.zcount(self.queue_key, f"({now}", "+inf"),
+            "done": int(self._redis.get(self.done_key) or 0),
+            "failed": self._redis.llen(self.failed_key),
+        }
+
+    def is_drained(self) -> bool:
+        """
+        队列中没有待处理和租用中的任务
+        :return:
+        """
+        return self._redis.zcard(self.queue_key) == 0
+
+
+def create_task_queue(platform: str) -> RedisTaskQueue:
+    """
+    按配置创建平台的任务队列, 不同平台的任务互不影响
+    :param platform:
+    :return:
+    """
+    return RedisTaskQueue(
+        f"{config.DISTRIBUTED_QUEUE_NAME}:{platform}",
+        lease_timeout_sec=config.DISTRIBUTED_LEASE_TIMEOUT_SEC,
+        max_attempts=config.DISTRIBUTED_MAX_ATTEMPTS,
+    )
+
+
+def get_task_values(platform: str, task_type: str) -> List[str]:
+    """
+    从配置中读取需要拆分成任务的关键词、指定内容或创作者
+    :param platform: 平台名称
+    :param task_type: search / detail / creator
+    :return:
+    """
+    if task_type == "search":
+        return [keyword.strip() for keyword in config.KEYWORDS.split(",") if keyword.strip()]
+    if task_type == "detail":
+        return list(getattr(config, DETAIL_CONFIG_KEYS[platform]))
+    if task_type == "creator":
+        return list(getattr(config, CREATOR_CONFIG_KEYS[platform]))
+    raise ValueError(f"Unsupported distributed crawler type: {task_type}")
+
+
+def apply_task_values(platform: str, task_type: str, values: List[str]):
+    """
+    把租到的任务写回配置, 爬虫按配置只爬这些关键词、指定内容或创作者
+    :param platform: 平台名称
+    :param task_type: search / detail / creator
+    :param values: 任务内容
+    :return:
+    """
+    config.CRAWLER_TYPE = task_type
+    if task_type == "search":
+        config.KEYWORDS = ",".join(values)
+    elif task_type == "detail":
+        setattr(config, DETAIL_CONFIG_KEYS[platform], list(values))
+    elif task_type == "creator":
+        setattr(config, CREATOR_CONFIG_KEYS[platform], list(values))
+    else:
+        raise ValueError(f"Unsupported distributed crawler type: {task_type}")
+
+
+async def run_coordinator(queue: Optional[RedisTaskQueue] = None):
+    """
+    把当前配置的关键词、指定内容或创作者拆成任务入队, 开启等待时一直输出进度直到所有任务处理完
+    :param queue: 任务队列, 为空时按配置创建
+    :return:
+    """
+    queue = queue or create_task_queue(config.PLATFORM)
+    values = get_task_values(config.PLATFORM, config.CRAWLER_TYPE)
+    enqueued = queue.enqueue(config.CRAWLER_TYPE, values)
+    utils.logger.info(f"[run_coordinator] enqueue {enqueued}/{len(values)} {config.PLATFORM} {config.CRAWLER_TYPE} "
+                      f"tasks, queue stats: {queue.stats()}")
+    while config.DISTRIBUTED_COORDINATOR_WAIT and not queue.is_drained():
+        await asyncio.sleep(config.DISTRIBUTED_POLL_INTERVAL_SEC)
+        utils.logger.info(f"[run_coordinator] queue stats: {queue.stats()}")
+
+
+async def _keep_alive(queue: RedisTaskQueue, tasks: List[Dict]):
+    while True:
+        await asyncio.sleep(queue.lease_timeout_sec / 3)
+        queue.heartbeat(tasks)
+
+
+async def run_worker(create_crawler: Callable[[], AbstractCrawler], queue: Optional[RedisTaskQueue] = None):
+    """
+    循环租用任务并爬取, 同一类型的一批任务启动一次爬虫, 队列中没有任务时退出
+    :param create_crawler: 创建当前平台爬虫的函数
+    :param queue: 任务队列, 为空时按配置创建
+    :return:
+    """
+    queue = queue or create_task_queue(config.PLATFORM)
+    while True:
+        tasks = queue.lease(config.DISTRIBUTED_WORKER_BATCH_SIZE)
+        if not tasks:
+            if queue.is_drained():
+                break
+            # 其他 worker 租用中的任务可能因失败或超时重新入队
+            await asyncio.sleep(config.DISTRIBUTED_POLL_INTERVAL_SEC)
+            continue
+
+        tasks_by_type: Dict[str, List[Dict]] = {}
+        for task in tasks:
+            tasks_by_type.setdefault(task["task_type"], []).append(task)
+        # 整批任务一起续约, 排在后面的任务类型等待前面的爬完时租约也不会过期, 已确认或失败的任务不再续约
+        unfinished_tasks = list(tasks)
+        keep_alive_task = asyncio.create_task(_keep_alive(queue, unfinished_tasks))
+        try:
+            for task_type, type_tasks in tasks_by_type.items():
+                values = [task["value"] for task in type_tasks]
+                utils.logger.info(f"[run_worker] begin crawl {len(values)} {task_type} tasks: {values}")
+                apply_task_values(config.PLATFORM, task_type, values)
+                journal = crawl_journal.get_crawl_journal()
+                journal.pop_failed_tasks()
+                try:
+                    await create_crawler().start()
+                except Exception as e:
+                    utils.logger.error(f"[run_worker] crawl {task_type} tasks {values} error: {e}")
+                    queue.nack(type_tasks, str(e))
+                else:
+                    # 爬虫吞掉异常继续爬取时会记录失败的任务, 这些任务退回队列重试, 其余任务确认完成
+                    failed_tasks = journal.pop_failed_tasks()
+                    for task in type_tasks:
+                        if task["value"] in failed_tasks:
+                            utils.logger.error(f"[run_worker] crawl {task_type} task {task['value']} error: "
+                                               f"{failed_tasks[task['value']]}")
+                            queue.nack([task], failed_tasks[task["value"]])
+                    queue.ack([task for task in type_tasks if task["value"] not in failed_tasks])
+                finally:
+                    for task in type_tasks:
+                        unfinished_tasks.remove(task)
+        finally:
+            keep_alive_task.cancel()
+    utils.logger.info(f"[run_worker] task queue is drained, queue stats: {queue.stats()}")
@@ -0,0 +1,290 @@
+# 声明：本代码仅供学习和研究目的使用。使用者应遵守以下原则：
+# 1. 不得用于任何商业用途。
+# 2. 使用时应遵守目标平台的使用条款和robots.txt规则。
+# 3. 不得进行大规模爬取或对平台造成运营干扰。
+# 4. 应合理控制请求频率，避免给目标平台带来不必要的负担。
+# 5. 不得用于任何非法或不当的用途。
+#
+# 详细许可条款请参阅项目根目录下的LICENSE文件。
+# 使用本代码即表示您同意遵守上述原则和LICENSE中的所有条款。
+
+
+# -*- coding: utf-8 -*-
+# @Desc    : 媒体文件下载器, 独立于 API 爬取的协程池, 响应按块流式写入临时文件, 完成后原子重命名,
+#            临时文件存在时通过 HTTP Range 断点续传, 并统计下载速度
+import asyncio
+import hashlib
+import os
+import time
+from typing import Dict, List, Optional, Tuple
+
+import aiofiles
+import httpx
+
+import config
+from store.media_blob_store import MediaBlobStore, close_media_blob_store, get_media_blob_store
+from tools import utils
+
+PART_FILE_SUFFIX = ".part"
+
+
+def _sha256_file(file_path: str):
+    hasher = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            hasher.update(block)
+    return hasher
+
+
+class MediaDownloader:
+
+    def __init__(
+            self,
+            proxies: Optional[Dict] = None,
+            concurrency: int = 4,
+            queue_size: int = 100,
+            chunk_size: int = 64 * 1024,
+            max_retries: int = 3,
+            timeout: float = 60,
+            blob_store: Optional[MediaBlobStore] = None,
+    ):
+        """
+        Args:
+            proxies: 代理
+            concurrency: 同时下载的文件数量
+            queue_size: 等待下载的队列长度, 队列满时 submit 会等待
+            chunk_size: 每次写入文件的块大小(字节)
+            max_retries: 网络异常时的重试次数, 重试从已下载的位置续传
+            timeout: 单次请求的超时时间(秒)
+            blob_store: 按内容去重的文件存储, 为空时直接保存到 save_path
+        """
+        self.proxies = proxies
+        self.concurrency = max(1, concurrency)
+        self.chunk_size = chunk_size
+        self.max_retries = max_retries
+        self.timeout = timeout
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=max(1, queue_size))
+        self._workers: List[asyncio.Task] = []
+        self._client: Optional[httpx.AsyncClient] = None
+        self.blob_store = blob_store
+        self._inflight: Dict[str, asyncio.Future] = {}
+
+        self.downloaded_bytes = 0
+        self.download_seconds = 0.0
+        self.success_count = 0
+        self.fail_count = 0
+
+    def _get_client(self) -> httpx.AsyncClient:
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                proxies=self.proxies,
+                timeout=self.timeout,
+                follow_redirects=True,
+                limits=httpx.Limits(max_connections=self.concurrency * 2,
+                                    max_keepalive_connections=self.concurrency),
+            )
+        return self._client
+
+    def start(self):
+        """
+        启动下载协程, submit 时会自动调用
+        Returns:
+
+        """
+        if not self._workers:
+            self._workers = [asyncio.create_task(self._worker()) for _ in range(self.concurrency)]
+
+    async def submit(self, url: str, save_path: str, headers: Optional[Dict] = None) -> asyncio.Future:
+        """
+        提交下载任务, 不等待下载完成, 队列满时等待
+        Args:
+            url: 文件地址
+            save_path: 保存路径
+            headers: 请求头, eg: Referer
+
+        Returns: 下载完成后结果为保存路径, 下载失败时结果为 None
+
+        """
+        self.start()
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((url, save_path, headers, future))
+        return future
+
+    async def _worker(self):
+        while True:
+            url, save_path, headers, future = await self._queue.get()
+            result = None
+            try:
+                result = await self.download(url, save_path, headers)
+            except Exception as e:
+                self.fail_count += 1
+                utils.logger.error(f"[MediaDownloader._worker] download {url} error: {e}")
+            finally:
+                if not future.done():
+                    future.set_result(result)
+                self._queue.task_done()
+
+    async def download(self, url: str, save_path: str, headers: Optional[Dict] = None) -> Optional[str]:
+        """
+        下载文件到 save_path, 已存在的文件直接跳过, 网络异常时从已下载的位置续传
+        Args:
+            url: 文件地址
+            save_path: 保存路径
+            headers: 请求头
+
+        Returns: 保存路径, 下载失败时返回 None
+
+        """
+        if os.path.exists(save_path):
+            utils.logger.info(f"[MediaDownloader.download] {save_path} already exists, skip")
+            return save_path
+        if self.blob_store is None:
+            return await self._download(url, save_path, headers)
+
+        # 同一个 url 正在下载时等它完成, 之后直接复用下载好的文件
+        while url in self._inflight:
+            await self._inflight[url]
+        self._inflight[url] = asyncio.get_running_loop().create_future()
+        try:
+            if await self.blob_store.async_link_url(url, save_path):
+                utils.logger.info(f"[MediaDownloader.download] {url} already downloaded, link to {save_path}")
+                return save_path
+            return await self._download(url, save_path, headers)
+        finally:
+            self._inflight.pop(url).set_result(None)
+
+    async def _download(self, url: str, save_path: str, headers: Optional[Dict]) -> Optional[str]:
+        save_dir = os.path.dirname(save_path)
+        if save_dir:
+            os.makedirs(save_dir, exist_ok=True)
+
+        part_path = save_path + PART_FILE_SUFFIX
+        start = time.perf_counter()
+        file_bytes = 0
+        for attempt in range(self.max_retries + 1):
+            try:
+                written, digest = await self._download_to_part(url, part_path, headers)
+                file_bytes += written
+                break
+            except (httpx.TransportError, httpx.HTTPStatusError) as e:
+                if isinstance(e, httpx.HTTPStatusError) or attempt >= self.max_retries:
+                    self.fail_count += 1
+                    utils.logger.error(f"[MediaDownloader.download] download {url} error: {e}")
+                    return None
+                utils.logger.warning(f"[MediaDownloader.download] download {url} interrupted: {e}, resume ...")
+
+        if self.blob_store is not None:
+            await self.blob_store.async_add_file(url, part_path, digest, save_path)
+        else:
+            os.replace(part_path, save_path)
+        cost = time.perf_counter() - start
+        self.downloaded_bytes += file_bytes
+        self.download_seconds += cost
+        self.success_count += 1
+        utils.logger.info(
+            f"[MediaDownloader.download] save {save_path} success, {file_bytes} bytes, "
+            f"{file_bytes / max(cost, 1e-6) / 1024:.1f} KB/s")
+        return save_path
+
+    async def _download_to_part(self, url: str, part_path: str, headers: Optional[Dict]) -> Tuple[int, str]:
+        """
+        把响应写入临时文件, 临时文件已存在时请求剩余部分, 写入的同时计算文件摘要
+        Returns: (本次写入的字节数, 完整文件的 sha256 摘要)
+
+        """
+        offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+        req_headers = dict(headers or {})
+        if offset:
+            req_headers["Range"] = f"bytes={offset}-"
+
+        written = 0
+        async with self._get_client().stream("GET", url, headers=req_headers) as response:
+            if offset and response.status_code == 416:
+                # 临时文件已经是完整的
+                return 0, (await asyncio.to_thread(_sha256_file, part_path)).hexdigest()
+            response.raise_for_status()
+            # 服务端不支持 Range 时返回完整内容, 从头写入
+            if offset and response.status_code == 206:
+                mode, hasher = "ab", await asyncio.to_thread(_sha256_file, part_path)
+            else:
+                mode, hasher = "wb", hashlib.sha256()
+            async with aiofiles.open(part_path, mode) as f:
+                async for chunk in response.aiter_bytes(self.chunk_size):
+                    await f.write(chunk)
+                    hasher.update(chunk)
+                    written += len(chunk)
+        return written, hasher.hexdigest()
+
+    async def join(self):
+        """
+        等待已提交的任务全部下载完成
+        Returns:
+
+        """
+        await self._queue.join()
+
+    def stats(self) -> Dict:
+        return {
+            "success": self.success_count,
+            "fail": self.fail_count,
+            "bytes": self.downloaded_bytes,
+            "bytes_per_sec": round(self.downloaded_bytes / self.download_seconds, 2) if self.download_seconds else 0.0,
+        }
+
+    async def close(self):
+        """
+        等待队列中的任务下载完成后关闭
+        Returns:
+
+        """
+        if self._workers:
+            await self.join()
+            for worker in self._workers:
+                worker.cancel()
+            await asyncio.gather(*self._workers, return_exceptions=True)
+            self._workers = []
+            utils.logger.info(f"[MediaDownloader.close] media download finished, {self.stats()}")
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+_downloaders: Dict[Optional[tuple], MediaDownloader] = {}
+
+
+def get_media_downloader(proxies: Optional[Dict] = None) -> MediaDownloader:
+    """
+    获取(或创建)代理对应的媒体下载器
+    Args:
+        proxies: 代理, 与 API 客户端使用的代理一致
+
+    Returns:
+
+    """
+    key = tuple(sorted(proxies.items())) if isinstance(proxies, dict) else proxies
+    downloader = _downloaders.get(key)
+    if downloader is None:
+        downloader = MediaDownloader(
+            proxies=proxies,
+            concurrency=config.MEDIA_DOWNLOAD_CONCURRENCY,
+            queue_size=config.MEDIA_DOWNLOAD_QUEUE_SIZE,
+            chunk_size=config.MEDIA_DOWNLOAD_CHUNK_SIZE,
+            max_retries=config.MEDIA_DOWNLOAD_MAX_RETRIES,
+            timeout=config.MEDIA_DOWNLOAD_TIMEOUT_SEC,
+            blob_store=get_media_blob_store() if config.ENABLE_MEDIA_DEDUP else None,
+        )
+        _downloaders[key] = downloader
+    return downloader
+
+
+async def close_all():
+    """
+    等待所有下载任务完成并关闭下载器, 程序退出前调用
+    Returns:
+
+    """
+    downloaders = list(_downloaders.values())
+    _downloaders.clear()
+    for downloader in downloaders:
+        await downloader.close()
+    close_media_blob_store()
@@ -0,0 +1,330 @@
+# 声明：本代码仅供学习和研究目的使用。使用者应遵守以下原则：
+# 1. 不得用于任何商业用途。
+# 2. 使用时应遵守目标平台的使用条款和robots.txt规则。
+# 3. 不得进行大规模爬取或对平台造成运营干扰。
+# 4. 应合理控制请求频率，避免给目标平台带来不必要的负担。
+# 5. 不得用于任何非法或不当的用途。
+#
+# 详细许可条款请参阅项目根目录下的LICENSE文件。
+# 使用本代码即表示您同意遵守上述原则和LICENSE中的所有条款。
+
+
+# -*- coding: utf-8 -*-
+# @Desc    : 平台接口的录制与回放: 录制模式下把 API 客户端的请求和响应按平台保存为 gzip jsonl 存档;
+#            本地假平台服务按请求指纹回放存档, 可以注入延迟、服务端错误和验证码响应;
+#            配置 HTTP_REPLAY_SERVER 后 API 客户端的所有请求都转发到假平台服务, 不再访问真实平台
+#            用法: python -m tools.http_replay --fixtures data/fixtures/ks.jsonl.gz --platform ks --port 8765
+import argparse
+import asyncio
+import gzip
+import json
+import os
+import random
+from typing import Any, Dict, List, Optional, Tuple
+
+import httpx
+
+import config
+from cache.response_cache import request_fingerprint
+from tools import utils
+
+# 转发到假平台服务时, 原请求的 scheme://host 放在这个请求头里
+REPLAY_ORIGIN_HEADER = "X-Replay-Origin"
+
+# 各平台被风控时的响应: 状态码, 响应头, 响应体, 没有配置的平台返回 429
+CAPTCHA_RESPONSES: Dict[str, Tuple[int, Dict[str, str], bytes]] = {
+    "xhs": (461, {"Verifytype": "102", "Verifyuuid": "replay"}, b'{"success": false, "code": 461}'),
+    "dy": (200, {}, b"blocked"),
+    "bili": (200, {}, b'{"code": -412, "message": "request was banned"}'),
+    "wb": (418, {}, b""),
+    "tieba": (200, {}, b"blocked"),
+    "zhihu": (403, {}, b'{"error": {"message": "forbidden"}}'),
+}
+DEFAULT_CAPTCHA_RESPONSE = (429, {}, b'{"message": "too many requests"}')
+
+
+def _request_body(request_kwargs: Dict[str, Any]) -> Optional[str]:
+    body = request_kwargs.get("content") or request_kwargs.get("data")
+    if body is None and request_kwargs.get("json") is not None:
+        body = json.dumps(request_kwargs["json"], ensure_ascii=False)
+    if isinstance(body, dict):
+        return json.dumps(body, ensure_ascii=False)
+    if isinstance(body, bytes):
+        return body.decode("utf-8", errors="replace")
+    return body
+
+
+def _operation_name(body: Optional[str]) -> str:
+    """
+    GraphQL 接口(快手)所有请求的 path 相同, 按请求体里的 operationName 区分接口
+    """
+    if not body or "operationName" not in body:
+        return ""
+    try:
+        return json.loads(body).get("operationName") or ""
+    except (ValueError, AttributeError):
+        return ""
+
+
+def _fallback_key(method: str, url: str, body: Optional[str]) -> Tuple[str, str, str]:
+    parts = httpx.URL(url)
+    return method.upper(), f"{parts.scheme}://{parts.host}{parts.path}", _operation_name(body)
+
+
+class HttpRecorder:
+
+    def __init__(self, record_dir: str):
+        """
+        把请求和响应追加到 {record_dir}/{platform}.jsonl.gz 存档
+        :param record_dir: 存档目录
+        """
+        self.record_dir = record_dir
+        os.makedirs(record_dir, exist_ok=True)
+        self._files: Dict[str, Any] = {}
+        self.record_count = 0
+
+    def record(self, platform: Optional[str], method: str, url: str, request_kwargs: Dict[str, Any],
+               response: httpx.Response):
+        """
+        录制一次请求
+        :param platform: 平台名称
+        :param method: 请求方法
+        :param url: 请求 url
+        :param request_kwargs: httpx 请求参数
+        :param response: 响应
+        :return:
+        """
+        platform = platform or "unknown"
+        archive = self._files.get(platform)
+        if archive is None:
+            archive = gzip.open(os.path.join(self.record_dir, f"{platform}.jsonl.gz"), "at", encoding="utf-8")
+            self._files[platform] = archive
+        body = _request_body(request_kwargs)
+        archive.write(json.dumps({
+            "platform": platform,
+            "method": method.upper(),
+            "url": url,
+            "fingerprint": request_fingerprint(method, url, request_kwargs,
+                                               set(config.RESPONSE_CACHE_IGNORE_PARAMS)),
+            "operation_name": _operation_name(body),
+            "status_code": response.status_code,
+            "content_type": response.headers.get("content-type", ""),
+            "content": response.text,
+        }, ensure_ascii=False) + "\n")
+        self.record_count += 1
+
+    def close(self):
+        for archive in self._files.values():
+            archive.close()
+        self._files.clear()
+
+
+def load_fixtures(path: str) -> List[Dict]:
+    """
+    读取录制的存档
+    :param path: {platform}.jsonl.gz 文件路径
+    :return:
+    """
+    with gzip.open(path, "rt", encoding="utf-8") as archive:
+        return [json.loads(line) for line in archive if line.strip()]
+
+
+class ReplayRedirectTransport(httpx.AsyncBaseTransport):
+
+    def __init__(self, server_url: str, **transport_kwargs):
+        """
+        把所有请求转发到假平台服务, 原请求的 scheme://host 放在 X-Replay-Origin 请求头里
+        :param server_url: 假平台服务地址, eg: http://127.0.0.1:8765
+        :param transport_kwargs: httpx.AsyncHTTPTransport 的参数
+        """
+        self._server_url = httpx.URL(server_url)
+        self._transport = httpx.AsyncHTTPTransport(**transport_kwargs)
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        request.headers[REPLAY_ORIGIN_HEADER] = f"{request.url.scheme}://{request.url.host}"
+        request.url = request.url.copy_with(
+            scheme=self._server_url.scheme, host=self._server_url.host, port=self._server_url.port
+        )
+        return await self._transport.handle_async_request(request)
+
+    async def aclose(self) -> None:
+        await self._transport.aclose()
+
+
+class FakePlatformServer:
+
+    def __init__(self, fixtures: List[Dict], platform: str, latency_ms: float = 0, error_rate: float = 0,
+                 captcha_rate: float = 0, seed: Optional[int] = None):
+        """
+        回放录制存档的本地假平台服务
+        :param fixtures: 录制的存档
+        :param platform: 平台名称, 决定验证码响应的格式
+        :param latency_ms: 每个响应的延迟(毫秒)
+        :param error_rate: 返回 500 的比例
+        :param captcha_rate: 返回验证码(风控)响应的比例
+        :param seed: 随机数种子
+        """
+        self.platform = platform
+        self.latency_ms = latency_ms
+        self.error_rate = error_rate
+        self.captcha_rate = captcha_rate
+        self._random = random.Random(seed)
+        self._by_fingerprint: Dict[str, Dict] = {}
+        # 请求指纹没有匹配时, 按 方法 + 接口 path + operationName 轮流返回同一接口录制的响应
+        self._by_endpoint: Dict[Tuple[str, str, str], List[Dict]] = {}
+        self._endpoint_counter: Dict[Tuple[str, str, str], int] = {}
+        for fixture in fixtures:
+            if fixture.get("fingerprint"):
+                self._by_fingerprint[fixture["fingerprint"]] = fixture
+            method, endpoint, _ = _fallback_key(fixture["method"], fixture["url"], None)
+            key = (method, endpoint, fixture.get("operation_name", ""))
+            self._by_endpoint.setdefault(key, []).append(fixture)
+        self.request_count = 0
+        self.error_count = 0
+        self.captcha_count = 0
+        self.miss_count = 0
+        self._server = None
+        self._serve_task: Optional[asyncio.Task] = None
+
+    def match(self, method: str, url: str, body: Optional[str]) -> Optional[Dict]:
+        """
+        按请求指纹查找录制的响应, 找不到时使用同一接口录制的其他响应
+        :param method:
+        :param url:
+        :param body:
+        :return:
+        """
+        fingerprint = request_fingerprint(method, url, {"content": body}, set(config.RESPONSE_CACHE_IGNORE_PARAMS))
+        fixture = self._by_fingerprint.get(fingerprint)
+        if fixture is not None:
+            return fixture
+        key = _fallback_key(method, url, body)
+        candidates = self._by_endpoint.get(key)
+        if not candidates:
+            return None
+        index = self._endpoint_counter.get(key, 0)
+        self._endpoint_counter[key] = index + 1
+        return candidates[index % len(candidates)]
+
+    async def handle(self, request):
+        from starlette.responses import Response
+
+        self.request_count += 1
+        if self.latency_ms:
+            await asyncio.sleep(self.latency_ms / 1000)
+        if self.error_rate and self._random.random() < self.error_rate:
+            self.error_count += 1
+            return Response(b"internal server error", status_code=500)
+        if self.captcha_rate and self._random.random() < self.captcha_rate:
+            self.captcha_count += 1
+            status_code, headers, content = CAPTCHA_RESPONSES.get(self.platform, DEFAULT_CAPTCHA_RESPONSE)
+            return Response(content, status_code=status_code, headers=headers)
+
+        origin = request.headers.get(REPLAY_ORIGIN_HEADER, f"{request.url.scheme}://{request.url.hostname}")
+        url = f"{origin}{request.url.path}"
+        if request.url.query:
+            url = f"{url}?{request.url.query}"
+        body = (await request.body()).decode("utf-8", errors="replace") or None
+        fixture = self.match(request.method, url, body)
+        if fixture is None:
+            self.miss_count += 1
+            return Response(b'{"message": "not recorded"}', status_code=404, media_type="application/json")
+        return Response(fixture["content"].encode("utf-8"), status_code=fixture["status_code"],
+                        media_type=fixture.get("content_type") or None)
+
+    def create_app(self):
+        from starlette.applications import Starlette
+        from starlette.routing import Route
+
+        return Starlette(routes=[
+            Route("/{path:path}", self.handle, methods=["GET", "POST", "PUT", "DELETE", "HEAD", "OPTIONS"]),
+        ])
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> str:
+        """
+        在当前事件循环中启动服务
+        :param host:
+        :param port: 为 0 时随机选择空闲端口
+        :return: 服务地址
+        """
+        import uvicorn
+
+        self._server = uvicorn.Server(uvicorn.Config(self.create_app(), host=host, port=port, log_level="warning"))
+        self._serve_task = asyncio.create_task(self._server.serve())
+        while not self._server.started:
+            if self._serve_task.done():
+                self._serve_task.result()
+            await asyncio.sleep(0.01)
+        bound_port = self._server.servers[0].sockets[0].getsockname()[1]
+        return f"http://{host}:{bound_port}"
+
+    async def stop(self):
+        if self._server is None:
+            return
+        self._server.should_exit = True
+        await self._serve_task
+        self._server = None
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "requests": self.request_count,
+            "errors": self.error_count,
+            "captchas": self.captcha_count,
+            "misses": self.miss_count,
+        }
+
+
+_recorder: Optional[HttpRecorder] = None
+
+
+def get_http_recorder() -> HttpRecorder:
+    """
+    获取(或按配置创建)全局的录制器
+    :return:
+    """
+    global _recorder
+    if _recorder is None:
+        _recorder = HttpRecorder(config.HTTP_RECORD_DIR)
+    return _recorder
+
+
+def close_http_recorder():
+    """
+    关闭录制存档, 程序退出前调用
+    :return:
+    """
+    global _recorder
+    if _recorder is None:
+        return
+    utils.logger.info(
+        f"[tools.http_replay.close_http_recorder] recorded {_recorder.record_count} requests "
+        f"into {_recorder.record_dir}"
+    )
+    _recorder.close()
+    _recorder = None
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="fake platform server replaying recorded fixtures")
+    parser.add_argument("--fixtures", required=True, help="recorded {platform}.jsonl.gz archive")
+    parser.add_argument("--platform", required=True)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency-ms", type=float, default=0)
+    parser.add_argument("--error-rate", type=float, default=0)
+    parser.add_argument("--captcha-rate", type=float, default=0)
+    args = parser.parse_args()
+
+    server = FakePlatformServer(load_fixtures(args.fixtures), args.platform, latency_ms=args.latency_ms,
+                                error_rate=args.error_rate, captcha_rate=args.captcha_rate)
+    url = await server.start(args.host, args.port)
+    utils.logger.info(f"[tools.http_replay.main] fake {args.platform} server is running on {url}, "
+                      f"set HTTP_REPLAY_SERVER = \"{url}\" to replay")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await server.stop()
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,265 @@
+# 声明：本代码仅供学习和研究目的使用。使用者应遵守以下原则：
+# 1. 不得用于任何商业用途。
+# 2. 使用时应遵守目标平台的使用条款和robots.txt规则。
+# 3. 不得进行大规模爬取或对平台造成运营干扰。
+# 4. 应合理控制请求频率，避免给目标平台带来不必要的负担。
+# 5. 不得用于任何非法或不当的用途。
+#
+# 详细许可条款请参阅项目根目录下的LICENSE文件。
+# 使用本代码即表示您同意遵守上述原则和LICENSE中的所有条款。
+
+
+# -*- coding: utf-8 -*-
+# @Desc    : 日志: 按模块配置级别和采样率, 文本或 JSON 输出, 超长的参数截断,
+#            日志记录放入队列后由后台线程格式化和写入, 事件循环中只做级别判断和入队;
+#            调用方使用 %-style 参数(utils.logger.info("... %s", payload)), 未输出的日志不会格式化参数
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+from datetime import datetime
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple
+
+LOG_FORMAT_TEXT = "text"
+LOG_FORMAT_JSON = "json"
+
+TEXT_FORMAT = "%(asctime)s %(name)s %(levelname)s (%(filename)s:%(lineno)d) - %(message)s"
+DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+_PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# LogRecord 自带的属性, 其余属性是调用方通过 extra 传入的结构化字段
+_RECORD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+
+@lru_cache(maxsize=1024)
+def module_of(pathname: str) -> str:
+    """
+    源文件对应的模块名, eg: /path/to/MediaCrawler/store/xhs/__init__.py -> store.xhs
+    :param pathname: LogRecord.pathname
+    :return:
+    """
+    path = os.path.abspath(pathname)
+    if path.startswith(_PROJECT_ROOT + os.sep):
+        path = path[len(_PROJECT_ROOT) + 1:]
+    path = os.path.splitext(path)[0].replace(os.sep, ".")
+    if path.endswith(".__init__"):
+        path = path[:-len(".__init__")]
+    return path
+
+
+def _truncate(text: str, max_chars: int) -> str:
+    if len(text) <= max_chars:
+        return text
+    return f"{text[:max_chars]}...(truncated {len(text) - max_chars} chars)"
+
+
+class ModuleFilter(logging.Filter):
+
+    def __init__(self, module_levels: Dict[str, int], sample_rates: Dict[str, float], default_level: int):
+        """
+        按模块过滤日志, 模块按最长前缀匹配
+        :param module_levels: 模块 -> 日志级别, eg: {"store": logging.WARNING}
+        :param sample_rates: 模块 -> INFO 及以下级别日志的采样率, eg: {"store": 0.1}
+        :param default_level: 没有配置的模块的日志级别
+        """
+        super().__init__()
+        self.module_levels = module_levels
+        self.sample_rates = sample_rates
+        self.default_level = default_level
+        self._rules = lru_cache(maxsize=1024)(self._resolve)
+
+    def _resolve(self, pathname: str) -> Tuple[int, float]:
+        module = module_of(pathname)
+        level, rate = self.default_level, 1.0
+        level_prefix, rate_prefix = "", ""
+        for prefix, prefix_level in self.module_levels.items():
+            if _match_module(module, prefix) and len(prefix) > len(level_prefix):
+                level, level_prefix = prefix_level, prefix
+        for prefix, prefix_rate in self.sample_rates.items():
+            if _match_module(module, prefix) and len(prefix) > len(rate_prefix):
+                rate, rate_prefix = prefix_rate, prefix
+        return level, rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        level, rate = self._rules(record.pathname)
+        if record.levelno < level:
+            return False
+        if rate < 1.0 and record.levelno <= logging.INFO:
+            return random.random() < rate
+        return True
+
+
+def _match_module(module: str, prefix: str) -> bool:
+    return module == prefix or module.startswith(prefix + ".")
+
+
+class TruncateFilter(logging.Filter):
+
+    def __init__(self, max_chars: int):
+        """
+        截断超长的日志参数和消息, 避免整页 API 响应写进日志
+        :param max_chars: 每个参数、消息的最大字符数
+        """
+        super().__init__()
+        self.max_chars = max_chars
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if not record.args:
+            # 没有参数的消息(f-string)整体截断, 有参数时消息是格式模板, 不截断
+            if isinstance(record.msg, str):
+                record.msg = _truncate(record.msg, self.max_chars)
+        elif isinstance(record.args, dict):
+            if "%(" in str(record.msg):
+                record.args = {key: self._truncate_arg(value) for key, value in record.args.items()}
+            else:
+                # 只有一个字典参数时 LogRecord 会把它当作命名参数, 按 %s 格式化时等同于 str(字典)
+                record.args = (_truncate(str(record.args), self.max_chars),)
+        else:
+            record.args = tuple(self._truncate_arg(arg) for arg in record.args)
+        return True
+
+    def _truncate_arg(self, arg: Any) -> Any:
+        if isinstance(arg, (int, float, bool)) or arg is None:
+            return arg
+        return _truncate(str(arg), self.max_chars)
+
+
+class JsonFormatter(logging.Formatter):
+    """每条日志一行 JSON, 调用方通过 extra 传入的字段原样输出"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        data = {
+            "time": datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "module": module_of(record.pathname),
+            "location": f"{record.filename}:{record.lineno}",
+            "message": record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRS and key not in data:
+                data[key] = value
+        if record.exc_info:
+            data["exc_info"] = self.formatException(record.exc_info)
+        if record.stack_info:
+            data["stack_info"] = self.formatStack(record.stack_info)
+        return json.dumps(data, ensure_ascii=False, default=str)
+
+
+class DeferredQueueHandler(logging.handlers.QueueHandler):
+    """
+    放入进程内队列时不格式化日志, 消息和参数在后台线程中格式化;
+    参数是可变对象时, 输出的是后台线程格式化时的内容
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+def _parse_level(level: Any) -> int:
+    if isinstance(level, int):
+        return level
+    return logging.getLevelName(str(level).upper())
+
+
+class LogSettings:
+
+    def __init__(self, level: Any = logging.INFO, module_levels: Optional[Dict[str, Any]] = None,
+                 sample_rates: Optional[Dict[str, float]] = None, log_format: str = LOG_FORMAT_TEXT,
+                 log_file: str = "", max_payload_chars: int = 0, async_output: bool = True):
+        """
+        :param level: 默认日志级别
+        :param module_levels: 模块 -> 日志级别
+        :param sample_rates: 模块 -> INFO 及以下级别日志的采样率
+        :param log_format: text | json
+        :param log_file: 日志文件路径, 为空时只输出到控制台
+        :param max_payload_chars: 每个参数、消息的最大字符数, 为 0 时不截断
+        :param async_output: 是否在后台线程中格式化和写入日志
+        """
+        self.level = _parse_level(level)
+        self.module_levels = {module: _parse_level(value) for module, value in (module_levels or {}).items()}
+        self.sample_rates = dict(sample_rates or {})
+        self.log_format = log_format
+        self.log_file = log_file
+        self.max_payload_chars = max_payload_chars
+        self.async_output = async_output
+
+
+# logger 名称 -> 后台写日志的线程
+_listeners: Dict[str, logging.handlers.QueueListener] = {}
+
+
+def _create_output_handlers(settings: LogSettings) -> List[logging.Handler]:
+    handlers: List[logging.Handler] = [logging.StreamHandler()]
+    if settings.log_file:
+        if os.path.dirname(settings.log_file):
+            os.makedirs(os.path.dirname(settings.log_file), exist_ok=True)
+        handlers.append(logging.FileHandler(settings.log_file, encoding="utf-8"))
+    if settings.log_format == LOG_FORMAT_JSON:
+        formatter: logging.Formatter = JsonFormatter()
+    else:
+        formatter = logging.Formatter(TEXT_FORMAT, datefmt=DATE_FORMAT)
+    for handler in handlers:
+        handler.setFormatter(formatter)
+        if settings.max_payload_chars > 0:
+            handler.addFilter(TruncateFilter(settings.max_payload_chars))
+    return handlers
+
+
+def setup_logger(name: str, settings: LogSettings) -> logging.Logger:
+    """
+    配置日志: 重复调用时替换原来的配置
+    :param name: logger 名称
+    :param settings: 日志配置
+    :return:
+    """
+    shutdown_logging(name)
+    logger = logging.getLogger(name)
+    for handler in list(logger.handlers):
+        logger.removeHandler(handler)
+        handler.close()
+    for log_filter in list(logger.filters):
+        logger.removeFilter(log_filter)
+
+    # logger 的级别取各模块中最低的级别, 再由 ModuleFilter 按模块过滤, 低于所有模块级别的日志不会创建记录
+    logger.setLevel(min([settings.level, *settings.module_levels.values()]))
+    if settings.module_levels or settings.sample_rates:
+        logger.addFilter(ModuleFilter(settings.module_levels, settings.sample_rates, settings.level))
+    # 不再传给 root logger, 避免重复输出
+    logger.propagate = False
+
+    handlers = _create_output_handlers(settings)
+    if settings.async_output:
+        log_queue: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue()
+        listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+        listener.start()
+        _listeners[name] = listener
+        logger.addHandler(DeferredQueueHandler(log_queue))
+    else:
+        for handler in handlers:
+            logger.addHandler(handler)
+    return logger
+
+
+def shutdown_logging(name: Optional[str] = None):
+    """
+    写完队列中剩余的日志并停止后台线程, 程序退出时自动调用
+    :param name: logger 名称, 为空时停止所有 logger 的后台线程
+    :return:
+    """
+    names = [name] if name is not None else list(_listeners.keys())
+    for logger_name in names:
+        listener = _listeners.pop(logger_name, None)
+        if listener is None:
+            continue
+        listener.stop()
+        for handler in listener.handlers:
+            handler.close()
+
+
+atexit.register(shutdown_logging)
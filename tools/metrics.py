@@ -0,0 +1,390 @@
+# 声明：本代码仅供学习和研究目的使用。使用者应遵守以下原则：
+# 1. 不得用于任何商业用途。
+# 2. 使用时应遵守目标平台的使用条款和robots.txt规则。
+# 3. 不得进行大规模爬取或对平台造成运营干扰。
+# 4. 应合理控制请求频率，避免给目标平台带来不必要的负担。
+# 5. 不得用于任何非法或不当的用途。
+#
+# 详细许可条款请参阅项目根目录下的LICENSE文件。
+# 使用本代码即表示您同意遵守上述原则和LICENSE中的所有条款。
+
+
+# -*- coding: utf-8 -*-
+# @Desc    : 爬取过程的指标统计: API 请求耗时和状态、签名耗时、存储写入耗时和批大小、流水线队列长度、代理健康度,
+#            通过 Prometheus 文本格式的 /metrics HTTP 接口暴露, 并定时输出一行汇总日志;
+#            未开启 ENABLE_METRICS 时各埋点函数直接返回
+import asyncio
+import re
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+from urllib.parse import urlsplit
+
+import config
+from tools import utils
+
+# 请求、签名、存储写入耗时的分桶上界(秒)
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# 存储批大小的分桶上界(条)
+BATCH_SIZE_BUCKETS = (1, 5, 10, 25, 50, 100, 200, 500, 1000)
+
+# url path 中的内容、用户ID替换为占位符, 避免每个ID一个时间序列
+_ID_SEGMENT_RE = re.compile(r"^(\d+|[0-9A-Za-z_-]{16,}|(?=.*\d)[0-9A-Za-z_-]{8,})$")
+
+# (指标名, 标签值, 当前值)
+GaugeSample = Tuple[str, Dict[str, str], float]
+GaugeCollector = Callable[[], Iterable[GaugeSample]]
+
+
+class Counter:
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str]):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, labels: Tuple[str, ...], amount: float = 1):
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def items(self) -> List[Tuple[Tuple[str, ...], float]]:
+        return list(self._values.items())
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        for labels, value in self._values.items():
+            lines.append(f"{self.name}{_format_labels(self.labelnames, labels)} {value}")
+        return lines
+
+    def clear(self):
+        self._values.clear()
+
+
+class Histogram:
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str], buckets: Sequence[float]):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        # 标签值 -> [各分桶计数(不累加, 最后一个是 +Inf), 总和, 总数]
+        self._values: Dict[Tuple[str, ...], list] = {}
+
+    def observe(self, labels: Tuple[str, ...], value: float):
+        state = self._values.get(labels)
+        if state is None:
+            state = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            self._values[labels] = state
+        index = 0
+        for bound in self.buckets:
+            if value <= bound:
+                break
+            index += 1
+        state[0][index] += 1
+        state[1] += value
+        state[2] += 1
+
+    def merged(self, predicate: Callable[[Tuple[str, ...]], bool] = lambda labels: True) -> Tuple[List[int], float, int]:
+        """
+        合并满足条件的标签的分桶计数
+        :param predicate: 标签值过滤条件
+        :return: (分桶计数, 总和, 总数)
+        """
+        bucket_counts, total, count = [0] * (len(self.buckets) + 1), 0.0, 0
+        for labels, (counts, value_sum, value_count) in self._values.items():
+            if not predicate(labels):
+                continue
+            bucket_counts = [a + b for a, b in zip(bucket_counts, counts)]
+            total += value_sum
+            count += value_count
+        return bucket_counts, total, count
+
+    def quantile(self, q: float, predicate: Callable[[Tuple[str, ...]], bool] = lambda labels: True) -> float:
+        """
+        按分桶估算分位数, 返回所在分桶的上界, 落在 +Inf 分桶时返回最大的上界
+        :param q: 0~1
+        :param predicate: 标签值过滤条件
+        :return:
+        """
+        bucket_counts, _, count = self.merged(predicate)
+        if count == 0:
+            return 0.0
+        rank, cumulative = q * count, 0
+        for bound, bucket_count in zip(self.buckets, bucket_counts):
+            cumulative += bucket_count
+            if cumulative >= rank:
+                return bound
+        return self.buckets[-1]
+
+    def label_values(self) -> List[Tuple[str, ...]]:
+        return list(self._values.keys())
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        for labels, (counts, value_sum, value_count) in self._values.items():
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                le = "+Inf" if bound == float("inf") else repr(float(bound))
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames + ('le',), labels + (le,))} "
+                             f"{cumulative}")
+            label_str = _format_labels(self.labelnames, labels)
+            lines.append(f"{self.name}_sum{label_str} {value_sum}")
+            lines.append(f"{self.name}_count{label_str} {value_count}")
+        return lines
+
+    def clear(self):
+        self._values.clear()
+
+
+def _escape_label_value(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labelnames: Sequence[str], labels: Sequence[str]) -> str:
+    if not labelnames:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape_label_value(str(value))}"'
+                          for name, value in zip(labelnames, labels)) + "}"
+
+
+REQUEST_LATENCY = Histogram("crawler_http_request_duration_seconds", "API client request latency",
+                            ("platform", "endpoint"), LATENCY_BUCKETS)
+REQUESTS_TOTAL = Counter("crawler_http_requests_total", "API client requests by status code",
+                         ("platform", "endpoint", "status"))
+SIGN_LATENCY = Histogram("crawler_sign_duration_seconds", "request signing latency", ("signer",), LATENCY_BUCKETS)
+STORE_WRITE_LATENCY = Histogram("crawler_store_write_duration_seconds", "store write (flush) latency",
+                                ("store",), LATENCY_BUCKETS)
+STORE_BATCH_SIZE = Histogram("crawler_store_batch_size", "records written per store flush",
+                             ("store",), BATCH_SIZE_BUCKETS)
+_METRICS = (REQUEST_LATENCY, REQUESTS_TOTAL, SIGN_LATENCY, STORE_WRITE_LATENCY, STORE_BATCH_SIZE)
+
+# 由各模块注册的采集函数在抓取时计算的指标
+GAUGE_HELP = {
+    "crawler_pipeline_queue_depth": "items waiting in the pipeline stage queue",
+    "crawler_proxy_available": "proxies available in the proxy pool",
+    "crawler_proxy_leased": "callers currently leasing the proxy",
+    "crawler_proxy_latency_ewma_seconds": "exponentially weighted average request latency of the proxy",
+    "crawler_proxy_error_ewma": "exponentially weighted average error rate of the proxy",
+}
+_collectors: Dict[str, GaugeCollector] = {}
+
+
+def endpoint_of(url: str) -> str:
+    """
+    url 对应的接口名称: 去掉查询参数, path 中的ID替换为 {id}
+    :param url:
+    :return:
+    """
+    path = urlsplit(url).path or "/"
+    return "/".join("{id}" if _ID_SEGMENT_RE.match(segment) else segment for segment in path.split("/"))
+
+
+def observe_request(platform: Optional[str], url: str, status, latency: float):
+    """
+    记录一次 API 请求
+    :param platform: 平台名称
+    :param url: 请求 url
+    :param status: 响应状态码, 网络错误时为 "error"
+    :param latency: 请求耗时(秒)
+    :return:
+    """
+    if not config.ENABLE_METRICS:
+        return
+    endpoint = endpoint_of(url)
+    platform = platform or "unknown"
+    REQUEST_LATENCY.observe((platform, endpoint), latency)
+    REQUESTS_TOTAL.inc((platform, endpoint, str(status)))
+
+
+def observe_sign(signer: str, latency: float):
+    """
+    记录一次签名
+    :param signer: 签名方式, eg: xhs, douyin.js
+    :param latency: 签名耗时(秒)
+    :return:
+    """
+    if not config.ENABLE_METRICS:
+        return
+    SIGN_LATENCY.observe((signer,), latency)
+
+
+def observe_store_write(store: str, latency: float, batch_size: int):
+    """
+    记录一次存储写入
+    :param store: 存储类型, eg: mysql, jsonl
+    :param latency: 写入耗时(秒)
+    :param batch_size: 写入的记录数
+    :return:
+    """
+    if not config.ENABLE_METRICS:
+        return
+    STORE_WRITE_LATENCY.observe((store,), latency)
+    STORE_BATCH_SIZE.observe((store,), batch_size)
+
+
+def register_collector(key: str, collector: GaugeCollector):
+    """
+    注册抓取时计算当前值的采集函数, 如队列长度、代理健康度, 同一个 key 重复注册时覆盖
+    :param key: 采集函数的唯一标识
+    :param collector: 返回 (指标名, 标签, 值) 列表的函数, 指标名需要在 GAUGE_HELP 中声明
+    :return:
+    """
+    _collectors[key] = collector
+
+
+def unregister_collector(key: str):
+    _collectors.pop(key, None)
+
+
+def collect_gauges() -> Dict[str, List[Tuple[Dict[str, str], float]]]:
+    gauges: Dict[str, List[Tuple[Dict[str, str], float]]] = {}
+    for key, collector in list(_collectors.items()):
+        try:
+            for name, labels, value in collector():
+                gauges.setdefault(name, []).append((labels, value))
+        except Exception as e:
+            utils.logger.error(f"[tools.metrics.collect_gauges] collector {key} error: {e}")
+    return gauges
+
+
+def render() -> str:
+    """
+    Prometheus 文本格式的全部指标
+    :return:
+    """
+    lines: List[str] = []
+    for metric in _METRICS:
+        lines.extend(metric.render())
+    for name, samples in collect_gauges().items():
+        lines.append(f"# HELP {name} {GAUGE_HELP.get(name, name)}")
+        lines.append(f"# TYPE {name} gauge")
+        for labels, value in samples:
+            lines.append(f"{name}{_format_labels(tuple(labels.keys()), tuple(labels.values()))} {value}")
+    return "\n".join(lines) + "\n"
+
+
+def summary() -> str:
+    """
+    一行指标汇总: 各平台请求数、错误数和耗时分位数, 签名耗时, 存储写入, 队列长度, 可用代理数
+    :return:
+    """
+    parts = []
+    platforms = sorted({labels[0] for labels in REQUEST_LATENCY.label_values()})
+    for platform in platforms:
+        count = REQUEST_LATENCY.merged(lambda labels: labels[0] == platform)[2]
+        errors = sum(value for labels, value in REQUESTS_TOTAL.items()
+                     if labels[0] == platform and labels[2] != "200")
+        p50 = REQUEST_LATENCY.quantile(0.5, lambda labels: labels[0] == platform)
+        p95 = REQUEST_LATENCY.quantile(0.95, lambda labels: labels[0] == platform)
+        parts.append(f"{platform} requests={count} non_200={errors:g} p50<={p50}s p95<={p95}s")
+    for (signer,) in SIGN_LATENCY.label_values():
+        _, _, count = SIGN_LATENCY.merged(lambda labels: labels[0] == signer)
+        p95 = SIGN_LATENCY.quantile(0.95, lambda labels: labels[0] == signer)
+        parts.append(f"sign[{signer}] count={count} p95<={p95}s")
+    for (store,) in STORE_WRITE_LATENCY.label_values():
+        _, items, flushes = STORE_BATCH_SIZE.merged(lambda labels: labels[0] == store)
+        _, cost, _ = STORE_WRITE_LATENCY.merged(lambda labels: labels[0] == store)
+        parts.append(f"store[{store}] flushes={flushes} items={items:g} "
+                     f"avg_flush={cost / flushes if flushes else 0:.3f}s")
+    gauges = collect_gauges()
+    queue_depths = [f"{labels.get('pipeline')}.{labels.get('stage')}={value:g}"
+                    for labels, value in gauges.get("crawler_pipeline_queue_depth", [])]
+    if queue_depths:
+        parts.append(f"queues {' '.join(queue_depths)}")
+    available = gauges.get("crawler_proxy_available")
+    if available:
+        parts.append(f"proxies available={sum(value for _, value in available):g}")
+    return ", ".join(parts) or "no metrics yet"
+
+
+def reset():
+    """
+    清空所有指标, 测试用
+    :return:
+    """
+    for metric in _METRICS:
+        metric.clear()
+
+
+async def _handle_http(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+    try:
+        request_line = await reader.readline()
+        # 读完请求头, 不关心内容
+        while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+            pass
+        parts = request_line.decode("latin-1").split()
+        if len(parts) >= 2 and parts[0] == "GET" and parts[1].split("?")[0] == "/metrics":
+            status, content_type, body = "200 OK", "text/plain; version=0.0.4; charset=utf-8", render().encode()
+        else:
+            status, content_type, body = "404 Not Found", "text/plain; charset=utf-8", b"not found\n"
+        writer.write(f"HTTP/1.1 {status}\r\nContent-Type: {content_type}\r\nContent-Length: {len(body)}\r\n"
+                     f"Connection: close\r\n\r\n".encode() + body)
+        await writer.drain()
+    except ConnectionError:
+        pass
+    finally:
+        writer.close()
+
+
+class MetricsService:
+
+    def __init__(self, host: str, port: int, summary_interval: float):
+        """
+        /metrics HTTP 服务和定时汇总日志
+        :param host: HTTP 服务地址
+        :param port: HTTP 服务端口, 为 0 时不启动 HTTP 服务
+        :param summary_interval: 汇总日志间隔(秒), 为 0 时不定时输出
+        """
+        self.host = host
+        self.port = port
+        self.summary_interval = summary_interval
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._summary_task: Optional[asyncio.Task] = None
+
+    async def start(self):
+        if self.port:
+            self._server = await asyncio.start_server(_handle_http, self.host, self.port)
+            utils.logger.info(f"[MetricsService.start] serving metrics on http://{self.host}:{self.port}/metrics")
+        if self.summary_interval > 0:
+            self._summary_task = asyncio.create_task(self._summary_loop())
+
+    async def _summary_loop(self):
+        while True:
+            await asyncio.sleep(self.summary_interval)
+            utils.logger.info(f"[MetricsService] {summary()}")
+
+    async def close(self):
+        if self._summary_task is not None:
+            self._summary_task.cancel()
+            self._summary_task = None
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+        utils.logger.info(f"[MetricsService.close] {summary()}")
+
+
+_service: Optional[MetricsService] = None
+
+
+async def start_metrics():
+    """
+    按配置启动 /metrics HTTP 服务和定时汇总日志, 未开启指标统计时直接返回
+    :return:
+    """
+    global _service
+    if not config.ENABLE_METRICS or _service is not None:
+        return
+    _service = MetricsService(config.METRICS_HOST, config.METRICS_PORT, config.METRICS_SUMMARY_INTERVAL_SEC)
+    await _service.start()
+
+
+async def close_metrics():
+    """
+    输出最后一次汇总并关闭 HTTP 服务, 程序退出前调用
+    :return:
+    """
+    global _service
+    if _service is None:
+        return
+    await _service.close()
+    _service = None
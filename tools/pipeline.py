@@ -0,0 +1,141 @@
+# 声明：本代码仅供学习和研究目的使用。使用者应遵守以下原则：
+# 1. 不得用于任何商业用途。
+# 2. 使用时应遵守目标平台的使用条款和robots.txt规则。
+# 3. 不得进行大规模爬取或对平台造成运营干扰。
+# 4. 应合理控制请求频率，避免给目标平台带来不必要的负担。
+# 5. 不得用于任何非法或不当的用途。
+#
+# 详细许可条款请参阅项目根目录下的LICENSE文件。
+# 使用本代码即表示您同意遵守上述原则和LICENSE中的所有条款。
+
+
+# -*- coding: utf-8 -*-
+# @Desc    : 多阶段爬取流水线, 搜索 -> 详情 -> 存储/媒体/评论 各阶段通过有界队列衔接,
+#            每个阶段有独立的协程池, 上游在下游队列满时等待(背压), 不再在每一页结束时等待全部任务完成
+import asyncio
+import contextvars
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Tuple
+
+from store import crawl_journal
+from tools import metrics, utils
+
+StageHandler = Callable[[Any], Awaitable[None]]
+
+
+class PipelineStage:
+    def __init__(self, name: str, handler: StageHandler, concurrency: int = 1, queue_size: int = 100):
+        """
+        Args:
+            name: 阶段名称
+            handler: 处理单个元素的协程函数, 需要向下游传递时调用 pipeline.put
+            concurrency: 该阶段的协程数量
+            queue_size: 该阶段的队列长度, 队列满时 put 会等待
+        """
+        self.name = name
+        self.handler = handler
+        self.concurrency = max(1, concurrency)
+        self.queue: asyncio.Queue[Tuple[contextvars.Context, Any]] = asyncio.Queue(maxsize=max(1, queue_size))
+        self.processed_count = 0
+        self.error_count = 0
+        self.workers: List[asyncio.Task] = []
+
+
+class CrawlerPipeline:
+    def __init__(self, name: str):
+        """
+        Args:
+            name: 流水线名称, 用于日志
+        """
+        self.name = name
+        self._stages: Dict[str, PipelineStage] = {}
+
+    def add_stage(self, name: str, handler: StageHandler, concurrency: int = 1,
+                  queue_size: int = 100) -> "CrawlerPipeline":
+        """
+        添加一个阶段, 阶段需要按上游到下游的顺序添加
+        Args:
+            name: 阶段名称
+            handler: 处理单个元素的协程函数
+            concurrency: 该阶段的协程数量
+            queue_size: 该阶段的队列长度
+
+        Returns:
+
+        """
+        self._stages[name] = PipelineStage(name, handler, concurrency, queue_size)
+        return self
+
+    async def put(self, stage_name: str, item: Any):
+        """
+        把元素放入指定阶段的队列, 队列满时等待
+        放入时记录当前的上下文变量(如 source_keyword_var), 下游处理该元素时使用同样的上下文
+        Args:
+            stage_name: 阶段名称
+            item: 元素
+
+        Returns:
+
+        """
+        await self._stages[stage_name].queue.put((contextvars.copy_context(), item))
+
+    async def _worker(self, stage: PipelineStage):
+        while True:
+            ctx, item = await stage.queue.get()
+            try:
+                # 在放入元素时的上下文中执行处理函数
+                await ctx.run(asyncio.ensure_future, stage.handler(item))
+                stage.processed_count += 1
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                stage.error_count += 1
+                utils.logger.error(f"[CrawlerPipeline.{self.name}] stage {stage.name} handle item error: {e}")
+                # 按元素所属的搜索关键词记录失败
+                ctx.run(crawl_journal.report_task_error, e)
+            finally:
+                stage.queue.task_done()
+
+    async def run(self, first_stage: str, items: Iterable[Any]):
+        """
+        启动所有阶段的协程, 把 items 放入第一个阶段, 等到所有阶段的队列都处理完后结束
+        Args:
+            first_stage: 第一个阶段的名称
+            items: 第一个阶段的输入
+
+        Returns:
+
+        """
+        for stage in self._stages.values():
+            stage.workers = [asyncio.create_task(self._worker(stage)) for _ in range(stage.concurrency)]
+        metrics.register_collector(f"pipeline:{self.name}", self._collect_queue_depths)
+        try:
+            for item in items:
+                await self.put(first_stage, item)
+            # 按上游到下游的顺序等待, 上游处理完后不会再有新的元素进入下游
+            for stage in self._stages.values():
+                await stage.queue.join()
+        finally:
+            for stage in self._stages.values():
+                for worker in stage.workers:
+                    worker.cancel()
+                await asyncio.gather(*stage.workers, return_exceptions=True)
+                stage.workers = []
+            metrics.unregister_collector(f"pipeline:{self.name}")
+        utils.logger.info(f"[CrawlerPipeline.{self.name}] finished, {self.stats()}")
+
+    def _collect_queue_depths(self) -> List[metrics.GaugeSample]:
+        return [
+            ("crawler_pipeline_queue_depth", {"pipeline": self.name, "stage": name}, stage.queue.qsize())
+            for name, stage in self._stages.items()
+        ]
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        """
+        各阶段已处理和出错的元素数量
+        Returns:
+
+        """
+        return {
+            name: {"processed": stage.processed_count, "error": stage.error_count}
+            for name, stage in self._stages.items()
+        }
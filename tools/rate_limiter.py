@@ -0,0 +1,194 @@
+# 声明：本代码仅供学习和研究目的使用。使用者应遵守以下原则：
+# 1. 不得用于任何商业用途。
+# 2. 使用时应遵守目标平台的使用条款和robots.txt规则。
+# 3. 不得进行大规模爬取或对平台造成运营干扰。
+# 4. 应合理控制请求频率，避免给目标平台带来不必要的负担。
+# 5. 不得用于任何非法或不当的用途。
+#
+# 详细许可条款请参阅项目根目录下的LICENSE文件。
+# 使用本代码即表示您同意遵守上述原则和LICENSE中的所有条款。
+
+
+# -*- coding: utf-8 -*-
+# @Desc    : 按平台、按接口的令牌桶限速, 所有 API 客户端发请求前统一在这里获取令牌,
+#            替代散落在各处的 time.sleep / asyncio.sleep, 等待时只挂起当前协程
+import asyncio
+import random
+import time
+from typing import Dict, Optional, Tuple
+from urllib.parse import urlparse
+
+import config
+from tools import utils
+
+
+class TokenBucket:
+    """令牌桶, 每秒补充 qps 个令牌, 最多积攒 burst 个"""
+
+    def __init__(self, qps: float, burst: int = 1, jitter: float = 0.0):
+        """
+        Args:
+            qps: 每秒允许的请求数, 小于等于 0 时不限速
+            burst: 允许的突发请求数(桶容量)
+            jitter: 每次获取令牌后额外等待的随机时间上限(秒), 避免请求间隔过于规律
+        """
+        self.qps = qps
+        self.burst = max(1, burst)
+        self.jitter = max(0.0, jitter)
+        self._tokens = float(self.burst)
+        # 令牌数量对应的时间点, 暂停时会被推到未来
+        self._updated_at = time.monotonic()
+
+    def _refill(self, now: float):
+        if self.qps > 0 and now > self._updated_at:
+            self._tokens = min(self.burst, self._tokens + (now - self._updated_at) * self.qps)
+            self._updated_at = now
+
+    def reserve(self) -> float:
+        """
+        预定一个令牌, 令牌不足时预支未来的令牌, 保证并发的调用按先后顺序排队
+        Returns: 需要等待的时间(秒)
+
+        """
+        now = time.monotonic()
+        if self.qps <= 0:
+            return max(0.0, self._updated_at - now)
+        self._refill(now)
+        self._tokens -= 1
+        wait = self._updated_at - now
+        if self._tokens < 0:
+            wait += -self._tokens / self.qps
+        return max(0.0, wait)
+
+    async def acquire(self):
+        """
+        获取一个令牌, 令牌不足时只挂起当前协程等待
+        Returns:
+
+        """
+        wait = self.reserve()
+        if self.jitter:
+            wait += random.uniform(0, self.jitter)
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    def pause(self, seconds: float):
+        """
+        暂停发放令牌, 之后的获取都会等待到暂停结束, 暂停期间不积攒令牌, eg: 疑似被风控时暂缓请求
+        Args:
+            seconds: 暂停时长(秒)
+
+        Returns:
+
+        """
+        now = time.monotonic()
+        if now + seconds <= self._updated_at:
+            return
+        self._refill(now)
+        # 暂停结束时最多立即放行一个请求, 之后按 qps 放行
+        self._tokens = min(self._tokens, 1.0)
+        self._updated_at = now + seconds
+
+
+class PlatformRateLimiter:
+    """一个平台的限速器, 配置了单独规则的接口使用自己的令牌桶, 其余接口共用平台默认的令牌桶"""
+
+    def __init__(self, platform: str, default_rule: Tuple[float, int], endpoint_rules: Dict[str, Tuple[float, int]],
+                 jitter: float = 0.0):
+        """
+        Args:
+            platform: 平台名称
+            default_rule: 平台默认的 (qps, burst)
+            endpoint_rules: 接口路径前缀 -> (qps, burst)
+            jitter: 随机抖动上限(秒)
+        """
+        self.platform = platform
+        self.default_bucket = TokenBucket(*default_rule, jitter=jitter)
+        # 前缀越长越优先匹配
+        self.endpoint_buckets: Dict[str, TokenBucket] = {
+            prefix: TokenBucket(*rule, jitter=jitter)
+            for prefix, rule in sorted(endpoint_rules.items(), key=lambda kv: len(kv[0]), reverse=True)
+        }
+
+    def get_bucket(self, url: str) -> TokenBucket:
+        path = urlparse(url).path if "://" in url else url
+        for prefix, bucket in self.endpoint_buckets.items():
+            if path.startswith(prefix):
+                return bucket
+        return self.default_bucket
+
+    async def acquire(self, url: str):
+        """
+        请求 url 前获取令牌
+        Args:
+            url: 请求的完整 url 或路径
+
+        Returns:
+
+        """
+        await self.get_bucket(url).acquire()
+
+    def pause(self, seconds: float):
+        """
+        暂停该平台的所有请求
+        Args:
+            seconds: 暂停时长(秒)
+
+        Returns:
+
+        """
+        utils.logger.info(f"[PlatformRateLimiter.pause] pause {self.platform} requests for {seconds}s")
+        self.default_bucket.pause(seconds)
+        for bucket in self.endpoint_buckets.values():
+            bucket.pause(seconds)
+
+
+_limiters: Dict[str, PlatformRateLimiter] = {}
+
+
+def get_rate_limiter(platform: str) -> PlatformRateLimiter:
+    """
+    获取(或按配置创建)平台的限速器
+    Args:
+        platform: 平台名称, eg: xhs, dy, ks, bili, wb, tieba, zhihu
+
+    Returns:
+
+    """
+    limiter = _limiters.get(platform)
+    if limiter is None:
+        rules: Dict[str, Tuple[float, int]] = dict(config.RATE_LIMIT_RULES.get(platform, {}))
+        default_rule = rules.pop("default", (config.RATE_LIMIT_DEFAULT_QPS, config.RATE_LIMIT_DEFAULT_BURST))
+        limiter = PlatformRateLimiter(platform, default_rule, rules, jitter=config.RATE_LIMIT_JITTER_SEC)
+        _limiters[platform] = limiter
+    return limiter
+
+
+async def acquire(platform: str, url: str):
+    """
+    请求前获取平台对应接口的令牌, 未开启限速时直接返回
+    Args:
+        platform: 平台名称
+        url: 请求的 url
+
+    Returns:
+
+    """
+    if not config.ENABLE_RATE_LIMIT:
+        return
+    await get_rate_limiter(platform).acquire(url)
+
+
+def reset(platform: Optional[str] = None):
+    """
+    丢弃已创建的限速器, 修改配置后重新按配置创建
+    Args:
+        platform: 平台名称, 为空时丢弃全部
+
+    Returns:
+
+    """
+    if platform is None:
+        _limiters.clear()
+    else:
+        _limiters.pop(platform, None)
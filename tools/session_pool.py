@@ -0,0 +1,289 @@
+# 声明：本代码仅供学习和研究目的使用。使用者应遵守以下原则：
+# 1. 不得用于任何商业用途。
+# 2. 使用时应遵守目标平台的使用条款和robots.txt规则。
+# 3. 不得进行大规模爬取或对平台造成运营干扰。
+# 4. 应合理控制请求频率，避免给目标平台带来不必要的负担。
+# 5. 不得用于任何非法或不当的用途。
+#
+# 详细许可条款请参阅项目根目录下的LICENSE文件。
+# 使用本代码即表示您同意遵守上述原则和LICENSE中的所有条款。
+
+
+# -*- coding: utf-8 -*-
+# @Desc    : 多账号会话池, 每个会话是一组(账号cookie, 代理IP, API 客户端), 一次爬取的搜索页、详情、评论任务
+#            按最少进行中请求或轮询分发到各个会话上, 触发验证码或 IP 被封的会话会被停用, 退出时输出每个会话的吞吐
+import asyncio
+import functools
+import itertools
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple, Type
+
+from tenacity import RetryError
+
+import config
+from proxy.proxy_ip_pool import ProxyIpPool
+from proxy.types import IpInfoModel
+from tools import utils
+
+STRATEGY_LEAST_LOADED = "least_loaded"
+STRATEGY_ROUND_ROBIN = "round_robin"
+
+# 异常信息包含这些关键字时认为会话被风控(出现验证码、账号被封)
+BLOCKED_KEYWORDS = ("验证码", "captcha", "account blocked")
+
+# 这些方法只在主会话(浏览器登录的账号)上调用
+_MAIN_SESSION_METHODS = {"pong", "update_cookies"}
+
+
+class NoAvailableSessionError(Exception):
+    """会话池中所有会话都已被停用"""
+
+
+class CrawlerSession:
+
+    def __init__(self, session_id: str, client: Any, proxies: Optional[Dict] = None,
+                 ip_proxy_info: Optional[IpInfoModel] = None):
+        """
+        一个账号的会话
+        :param session_id: 会话标识
+        :param client: 该账号的 API 客户端
+        :param proxies: 该会话使用的 httpx 代理
+        :param ip_proxy_info: 从代理池租用的代理IP, 会话停用时归还给代理池
+        """
+        self.session_id = session_id
+        self.client = client
+        self.proxies = proxies
+        self.ip_proxy_info = ip_proxy_info
+        self.inflight = 0
+        self.request_count = 0
+        self.success_count = 0
+        self.fail_count = 0
+        self.consecutive_fail_count = 0
+        self.total_latency = 0.0
+        self.retired = False
+        self.retire_reason = ""
+        self.start_time = time.monotonic()
+
+    def stats(self) -> Dict:
+        elapsed = max(time.monotonic() - self.start_time, 1e-6)
+        return {
+            "session": self.session_id,
+            "requests": self.request_count,
+            "success": self.success_count,
+            "fail": self.fail_count,
+            "inflight": self.inflight,
+            "avg_latency_ms": round(self.total_latency / self.request_count * 1000, 1) if self.request_count else 0.0,
+            "success_per_min": round(self.success_count / elapsed * 60, 2),
+            "retired": self.retired,
+            "retire_reason": self.retire_reason,
+        }
+
+
+class SessionPool:
+
+    def __init__(self, platform: str, strategy: str = STRATEGY_LEAST_LOADED,
+                 retire_exceptions: Tuple[Type[BaseException], ...] = (),
+                 max_consecutive_failures: int = 5, ip_proxy_pool: Optional[ProxyIpPool] = None):
+        """
+        :param platform: 平台名称
+        :param strategy: 调度策略, least_loaded: 进行中请求最少的会话优先, round_robin: 轮询
+        :param retire_exceptions: 出现这些异常时停用会话, 一般是平台的 IPBlockError
+        :param max_consecutive_failures: 会话连续失败多少次后停用, 为 0 时不限制
+        :param ip_proxy_pool: 会话代理IP所属的代理池
+        """
+        if strategy not in (STRATEGY_LEAST_LOADED, STRATEGY_ROUND_ROBIN):
+            raise ValueError(f"Unknown session schedule strategy: {strategy}")
+        self.platform = platform
+        self.strategy = strategy
+        self.retire_exceptions = retire_exceptions
+        self.max_consecutive_failures = max_consecutive_failures
+        self.ip_proxy_pool = ip_proxy_pool
+        self.sessions: List[CrawlerSession] = []
+        self._round_robin_counter = itertools.count()
+
+    def add_session(self, client: Any, proxies: Optional[Dict] = None,
+                    ip_proxy_info: Optional[IpInfoModel] = None) -> CrawlerSession:
+        session = CrawlerSession(f"{self.platform}-{len(self.sessions)}", client, proxies, ip_proxy_info)
+        self.sessions.append(session)
+        return session
+
+    @property
+    def alive_sessions(self) -> List[CrawlerSession]:
+        return [session for session in self.sessions if not session.retired]
+
+    def acquire(self) -> CrawlerSession:
+        """
+        按调度策略选择一个会话
+        :return:
+        """
+        alive_sessions = self.alive_sessions
+        if not alive_sessions:
+            raise NoAvailableSessionError(f"[SessionPool.acquire] all {self.platform} sessions are retired")
+        if self.strategy == STRATEGY_ROUND_ROBIN:
+            # 按全部会话的顺序轮询并跳过已停用的会话, 停用会话后其他会话的轮询顺序不变
+            while True:
+                session = self.sessions[next(self._round_robin_counter) % len(self.sessions)]
+                if not session.retired:
+                    break
+        else:
+            session = min(alive_sessions, key=lambda item: (item.inflight, item.request_count))
+        session.inflight += 1
+        return session
+
+    def release(self, session: CrawlerSession, latency: float, error: Optional[BaseException] = None):
+        """
+        归还会话并记录请求结果, 被风控或连续失败次数过多时停用会话
+        :param session:
+        :param latency: 请求耗时(秒)
+        :param error: 请求失败时的异常
+        :return:
+        """
+        session.inflight -= 1
+        session.request_count += 1
+        session.total_latency += latency
+        if error is None:
+            session.success_count += 1
+            session.consecutive_fail_count = 0
+            return
+        session.fail_count += 1
+        session.consecutive_fail_count += 1
+        if self.is_blocked(error):
+            self.retire(session, f"blocked: {error}")
+        elif 0 < self.max_consecutive_failures <= session.consecutive_fail_count:
+            self.retire(session, f"{session.consecutive_fail_count} consecutive failures, last error: {error}")
+
+    def retire(self, session: CrawlerSession, reason: str):
+        if session.retired:
+            return
+        session.retired = True
+        session.retire_reason = reason
+        # API 客户端被风控时会自己换代理, 归还的是客户端当前使用的代理;
+        # 每次请求的结果客户端已经反馈给代理池, 这里只归还不再记失败
+        ip_proxy_info = getattr(session.client, "ip_proxy_info", None) or session.ip_proxy_info
+        if self.ip_proxy_pool and ip_proxy_info:
+            self.ip_proxy_pool.release(ip_proxy_info, success=None)
+        utils.logger.warning(
+            f"[SessionPool.retire] retire session {session.session_id}, reason: {reason}, "
+            f"{len(self.alive_sessions)} sessions left"
+        )
+
+    def is_blocked(self, error: BaseException) -> bool:
+        """
+        异常是否说明会话被风控, tenacity 重试用完后抛出的 RetryError 按最后一次的异常判断
+        :param error:
+        :return:
+        """
+        if isinstance(error, RetryError) and error.last_attempt.failed:
+            error = error.last_attempt.exception()
+        if self.retire_exceptions and isinstance(error, self.retire_exceptions):
+            return True
+        error_msg = str(error)
+        return any(keyword in error_msg for keyword in BLOCKED_KEYWORDS)
+
+    async def call(self, method_name: str, *args, **kwargs) -> Any:
+        """
+        选择一个会话调用其 API 客户端的方法, 会话被风控时换一个会话重新调用
+        :param method_name: API 客户端的方法名
+        :return:
+        """
+        while True:
+            session = self.acquire()
+            start = time.perf_counter()
+            try:
+                result = await getattr(session.client, method_name)(*args, **kwargs)
+            except asyncio.CancelledError:
+                session.inflight -= 1
+                raise
+            except Exception as e:
+                self.release(session, time.perf_counter() - start, e)
+                if session.retired and self.alive_sessions and self.is_blocked(e):
+                    utils.logger.info(
+                        f"[SessionPool.call] {method_name} is blocked on session {session.session_id}, "
+                        f"retry on another session"
+                    )
+                    continue
+                raise
+            self.release(session, time.perf_counter() - start)
+            return result
+
+    def stats(self) -> List[Dict]:
+        return [session.stats() for session in self.sessions]
+
+    async def close(self):
+        """
+        输出每个会话的统计并关闭所有会话的 API 客户端
+        :return:
+        """
+        for session_stats in self.stats():
+            utils.logger.info(f"[SessionPool.close] {self.platform} session stats: {session_stats}")
+        for session in self.sessions:
+            await session.client.close()
+
+
+class SessionPoolClient:
+
+    def __init__(self, pool: SessionPool):
+        """
+        和 API 客户端用法一致的代理对象, 协程方法的调用会分发到会话池中的各个会话,
+        其余属性和登录相关的方法使用主会话的 API 客户端
+        :param pool: 会话池, 第一个会话是主会话
+        """
+        self.pool = pool
+
+    @property
+    def main_client(self) -> Any:
+        return self.pool.sessions[0].client
+
+    def __getattr__(self, name: str) -> Any:
+        attr = getattr(self.main_client, name)
+        if name in _MAIN_SESSION_METHODS or not asyncio.iscoroutinefunction(attr):
+            return attr
+
+        @functools.wraps(attr)
+        async def dispatch(*args, **kwargs):
+            return await self.pool.call(name, *args, **kwargs)
+
+        return dispatch
+
+    async def close(self):
+        await self.pool.close()
+
+
+async def create_session_pool_client(
+        platform: str,
+        main_client: Any,
+        create_account_client: Callable[[str, Optional[IpInfoModel]], Awaitable[Any]],
+        retire_exceptions: Tuple[Type[BaseException], ...] = (),
+        ip_proxy_pool: Optional[ProxyIpPool] = None,
+) -> Any:
+    """
+    按配置的多个账号创建会话池, 没有配置额外账号时直接返回主账号的 API 客户端
+    :param platform: 平台名称
+    :param main_client: 浏览器登录的主账号的 API 客户端
+    :param create_account_client: 根据账号 cookie 和代理IP 创建 API 客户端
+    :param retire_exceptions: 出现这些异常时停用会话
+    :param ip_proxy_pool: 开启 IP 代理时的代理池, 每个额外账号分配一个独立的代理IP
+    :return:
+    """
+    if not config.ACCOUNT_COOKIES_LIST:
+        return main_client
+    pool = SessionPool(
+        platform,
+        strategy=config.SESSION_SCHEDULE_STRATEGY,
+        retire_exceptions=retire_exceptions,
+        max_consecutive_failures=config.SESSION_MAX_CONSECUTIVE_FAILURES,
+        ip_proxy_pool=ip_proxy_pool,
+    )
+    pool.add_session(main_client, getattr(main_client, "proxies", None))
+    for cookie_str in config.ACCOUNT_COOKIES_LIST:
+        ip_proxy_info = await ip_proxy_pool.get_proxy() if ip_proxy_pool else None
+        client = await create_account_client(cookie_str, ip_proxy_info)
+        if ip_proxy_pool:
+            # 每个请求的结果由 API 客户端反馈给代理池, 被风控时换代理重试
+            client.set_ip_proxy_pool(ip_proxy_pool, ip_proxy_info)
+        pool.add_session(client, getattr(client, "proxies", None), ip_proxy_info)
+    utils.logger.info(
+        f"[create_session_pool_client] create {len(pool.sessions)} {platform} sessions, "
+        f"strategy: {pool.strategy}"
+    )
+    return SessionPoolClient(pool)
@@ -0,0 +1,226 @@
+# 声明：本代码仅供学习和研究目的使用。使用者应遵守以下原则：
+# 1. 不得用于任何商业用途。
+# 2. 使用时应遵守目标平台的使用条款和robots.txt规则。
+# 3. 不得进行大规模爬取或对平台造成运营干扰。
+# 4. 应合理控制请求频率，避免给目标平台带来不必要的负担。
+# 5. 不得用于任何非法或不当的用途。
+#
+# 详细许可条款请参阅项目根目录下的LICENSE文件。
+# 使用本代码即表示您同意遵守上述原则和LICENSE中的所有条款。
+
+
+# -*- coding: utf-8 -*-
+# @Desc    : 常驻 Node 签名进程池, 签名脚本只加载一次, 通过 stdin/stdout 按行收发 json,
+#            替代 execjs 每次调用都重新启动 node 进程并重新执行整个签名脚本
+import asyncio
+import itertools
+import json
+import os
+import shutil
+import time
+from typing import Any, Dict, List, Optional
+
+import config
+from tools import metrics, utils
+
+SIGN_WORKER_JS = "libs/sign_worker.js"
+
+
+class SignWorkerError(Exception):
+    """签名进程返回的错误或进程异常退出"""
+
+
+class NodeSignWorker:
+    """单个常驻 node 签名进程"""
+
+    def __init__(self, script_path: str, timeout: float = 10):
+        """
+        Args:
+            script_path: 签名脚本路径, eg: libs/douyin.js
+            timeout: 单次签名的超时时间(秒)
+        """
+        self.script_path = script_path
+        self.timeout = timeout
+        self._process: Optional[asyncio.subprocess.Process] = None
+        self._reader_task: Optional[asyncio.Task] = None
+        self._pending: Dict[int, asyncio.Future] = {}
+        self._id_iter = itertools.count(1)
+        self._start_lock = asyncio.Lock()
+
+    @property
+    def is_alive(self) -> bool:
+        return self._process is not None and self._process.returncode is None
+
+    @property
+    def pending_count(self) -> int:
+        return len(self._pending)
+
+    async def start(self):
+        """
+        启动 node 进程, 进程已存在时不做任何事, 进程退出后再次调用会重新启动
+        Returns:
+
+        """
+        async with self._start_lock:
+            if self.is_alive:
+                return
+            node_path = shutil.which("node") or shutil.which("nodejs")
+            if not node_path:
+                raise SignWorkerError("node runtime not found, please install nodejs")
+            self._process = await asyncio.create_subprocess_exec(
+                node_path, SIGN_WORKER_JS, self.script_path,
+                stdin=asyncio.subprocess.PIPE,
+                stdout=asyncio.subprocess.PIPE,
+                limit=1024 * 1024,
+            )
+            self._reader_task = asyncio.create_task(self._read_loop(self._process))
+            utils.logger.info(
+                f"[NodeSignWorker.start] start sign worker pid: {self._process.pid}, script: {self.script_path}")
+
+    async def _read_loop(self, process: asyncio.subprocess.Process):
+        try:
+            while True:
+                line = await process.stdout.readline()
+                if not line:
+                    break
+                try:
+                    resp: Dict = json.loads(line)
+                except json.JSONDecodeError:
+                    utils.logger.warning(f"[NodeSignWorker._read_loop] invalid response: {line[:200]}")
+                    continue
+                future = self._pending.pop(resp.get("id"), None)
+                if future is None or future.done():
+                    continue
+                if "error" in resp:
+                    future.set_exception(SignWorkerError(resp["error"]))
+                else:
+                    future.set_result(resp.get("result"))
+        finally:
+            await process.wait()
+            log = utils.logger.info if process.returncode == 0 else utils.logger.warning
+            log(f"[NodeSignWorker._read_loop] sign worker pid: {process.pid} exited, code: {process.returncode}")
+            # 进程退出后, 尚未返回的调用全部失败, 由调用方决定是否重试
+            pending, self._pending = self._pending, {}
+            for future in pending.values():
+                if not future.done():
+                    future.set_exception(SignWorkerError(f"sign worker exited, code: {process.returncode}"))
+
+    async def call(self, fn_name: str, *args) -> Any:
+        """
+        调用签名脚本中的函数
+        Args:
+            fn_name: 函数名
+            *args: 参数, 需要可以 json 序列化
+
+        Returns: 函数返回值
+
+        """
+        req_id = next(self._id_iter)
+        future = asyncio.get_running_loop().create_future()
+        # 先登记再启动进程, 保证进程池按待处理数量分发时能看到这次调用
+        self._pending[req_id] = future
+        try:
+            await self.start()
+            self._process.stdin.write(
+                (json.dumps({"id": req_id, "fn": fn_name, "args": args}, ensure_ascii=False) + "\n").encode("utf-8"))
+            await self._process.stdin.drain()
+            return await asyncio.wait_for(future, timeout=self.timeout)
+        except (BrokenPipeError, ConnectionResetError) as e:
+            raise SignWorkerError(f"sign worker is broken: {e}")
+        finally:
+            self._pending.pop(req_id, None)
+
+    async def close(self):
+        """
+        关闭 node 进程
+        Returns:
+
+        """
+        if self._process is None:
+            return
+        if self.is_alive:
+            self._process.stdin.close()
+            try:
+                await asyncio.wait_for(self._process.wait(), timeout=3)
+            except asyncio.TimeoutError:
+                self._process.kill()
+        if self._reader_task is not None:
+            await self._reader_task
+        self._process = None
+        self._reader_task = None
+
+
+class NodeSignWorkerPool:
+    """同一个签名脚本的多个常驻 node 进程, 调用分发到待处理请求最少的进程"""
+
+    def __init__(self, script_path: str, size: int = 2, timeout: float = 10, max_retries: int = 1):
+        """
+        Args:
+            script_path: 签名脚本路径
+            size: 进程数量
+            timeout: 单次签名的超时时间(秒)
+            max_retries: 进程异常退出时的重试次数, 重试会自动重启进程
+        """
+        self.script_path = script_path
+        self.signer_name = os.path.basename(script_path)
+        self.max_retries = max_retries
+        self.workers: List[NodeSignWorker] = [NodeSignWorker(script_path, timeout) for _ in range(max(1, size))]
+
+    async def call(self, fn_name: str, *args) -> Any:
+        """
+        调用签名脚本中的函数
+        Args:
+            fn_name: 函数名
+            *args: 参数
+
+        Returns: 函数返回值
+
+        """
+        for attempt in range(self.max_retries + 1):
+            worker = min(self.workers, key=lambda w: w.pending_count)
+            start = time.perf_counter()
+            try:
+                result = await worker.call(fn_name, *args)
+                metrics.observe_sign(self.signer_name, time.perf_counter() - start)
+                return result
+            except SignWorkerError:
+                # 脚本本身抛出的错误不重试, 只有进程退出才重试
+                if worker.is_alive or attempt >= self.max_retries:
+                    raise
+                utils.logger.warning(f"[NodeSignWorkerPool.call] sign worker crashed, retry {fn_name} ...")
+
+    async def close(self):
+        for worker in self.workers:
+            await worker.close()
+
+
+_pools: Dict[str, NodeSignWorkerPool] = {}
+
+
+def get_sign_pool(script_path: str) -> NodeSignWorkerPool:
+    """
+    获取(或创建)签名脚本对应的进程池, 进程在第一次调用时启动
+    Args:
+        script_path: 签名脚本路径
+
+    Returns:
+
+    """
+    pool = _pools.get(script_path)
+    if pool is None:
+        pool = NodeSignWorkerPool(script_path, size=config.SIGN_WORKER_POOL_SIZE,
+                                  timeout=config.SIGN_WORKER_TIMEOUT_SEC)
+        _pools[script_path] = pool
+    return pool
+
+
+async def close_all():
+    """
+    关闭所有签名进程, 程序退出前调用
+    Returns:
+
+    """
+    pools = list(_pools.values())
+    _pools.clear()
+    for pool in pools:
+        await pool.close()
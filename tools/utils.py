@@ -12,21 +12,29 @@
 import argparse
 import logging
 
+import config
+
 from .crawler_util import *
+from .log_util import DATE_FORMAT, TEXT_FORMAT, LogSettings, setup_logger
 from .slider_util import *
 from .time_util import *
 
 
 def init_loging_config():
-    level = logging.INFO
     logging.basicConfig(
-        level=level,
-        format="%(asctime)s %(name)s %(levelname)s (%(filename)s:%(lineno)d) - %(message)s",
-        datefmt='%Y-%m-%d %H:%M:%S'
+        level=logging.INFO,
+        format=TEXT_FORMAT,
+        datefmt=DATE_FORMAT
     )
-    _logger = logging.getLogger("MediaCrawler")
-    _logger.setLevel(level)
-    return _logger
+    return setup_logger("MediaCrawler", LogSettings(
+        level=config.LOG_LEVEL,
+        module_levels=config.LOG_MODULE_LEVELS,
+        sample_rates=config.LOG_SAMPLE_RATES,
+        log_format=config.LOG_FORMAT,
+        log_file=config.LOG_FILE,
+        max_payload_chars=config.LOG_MAX_PAYLOAD_CHARS,
+        async_output=config.LOG_ASYNC_OUTPUT,
+    ))
 
 
 logger = init_loging_config()